@@ -1,6 +1,8 @@
 import asyncio
+import html
 import os
 import random
+from collections import defaultdict
 from datetime import date, datetime, time, timedelta
 from pathlib import Path
 
@@ -12,12 +14,14 @@ from aiogram_dialog.widgets.kbd import Back, Button, Column, Row, Select, Switch
 from aiogram_dialog.widgets.text import Const, Format, Jinja
 
 from bot.dialogs.schedule_view import cleanup_old_cache, get_cache_info
-from bot.scheduler import evening_broadcast, morning_summary_broadcast
+from bot.scheduler import dispatch_outbox_delivery, evening_broadcast, morning_summary_broadcast
 from bot.tasks import copy_message_task, send_message_task
 from bot.text_formatters import generate_reminder_text
+from core.broadcast_outbox import BroadcastOutbox, text_hash
 from core.config import MOSCOW_TZ
 from core.events_manager import EventsManager
 from core.feedback_manager import FeedbackManager
+from core.leader_election import LeaderElector
 from core.manager import TimetableManager
 from core.metrics import TASKS_SENT_TO_QUEUE
 from core.semester_settings import SemesterSettingsManager
@@ -74,7 +78,12 @@ async def on_test_morning(callback: CallbackQuery, button: Button, manager: Dial
     user_data_manager = manager.middleware_data.get("user_data_manager")
     timetable_manager = manager.middleware_data.get("manager")
     await callback.answer("🚀 Запускаю постановку задач на утреннюю рассылку...")
-    await morning_summary_broadcast(user_data_manager, timetable_manager)
+    await morning_summary_broadcast(
+        user_data_manager,
+        timetable_manager,
+        manager.middleware_data.get("redis_client"),
+        manager.middleware_data.get("broadcast_outbox"),
+    )
     await callback.message.answer("✅ Задачи для утренней рассылки поставлены в очередь.")
 
 
@@ -82,7 +91,12 @@ async def on_test_evening(callback: CallbackQuery, button: Button, manager: Dial
     user_data_manager = manager.middleware_data.get("user_data_manager")
     timetable_manager = manager.middleware_data.get("manager")
     await callback.answer("🚀 Запускаю постановку задач на вечернюю рассылку...")
-    await evening_broadcast(user_data_manager, timetable_manager)
+    await evening_broadcast(
+        user_data_manager,
+        timetable_manager,
+        manager.middleware_data.get("redis_client"),
+        manager.middleware_data.get("broadcast_outbox"),
+    )
     await callback.message.answer("✅ Задачи для вечерней рассылки поставлены в очередь.")
 
 
@@ -108,15 +122,22 @@ async def on_test_reminders_for_week(callback: CallbackQuery, button: Button, ma
         f"ℹ️ Тестирую логику для случайного пользователя: <code>{test_user_id}</code> (группа <code>{test_group_name}</code>)",
     )
 
+    # Пары на неделю вперёд одним запросом к материализованному календарю
+    week_start = date.today()
+    lessons_by_date = defaultdict(list)
+    for occurrence in await timetable_manager.get_occurrences(
+        "group", test_group_name, week_start, week_start + timedelta(days=6)
+    ):
+        lessons_by_date[occurrence["date"]].append(occurrence)
+
     for i in range(7):
-        test_date = date.today() + timedelta(days=i)
+        test_date = week_start + timedelta(days=i)
         await bot.send_message(
             admin_id,
             f"--- 🗓️ <b>Тест для даты: {test_date.strftime('%A, %d.%m.%Y')}</b> ---",
         )
-        schedule_info = await timetable_manager.get_schedule_for_day(test_group_name, target_date=test_date)
 
-        if not (schedule_info and not schedule_info.get("error") and schedule_info.get("lessons")):
+        if not lessons_by_date.get(test_date):
             await bot.send_message(admin_id, "<i>Нет пар — нет напоминаний. ✅</i>")
         else:
             try:
@@ -177,8 +198,13 @@ async def on_check_graduated_groups(callback: CallbackQuery, button: Button, man
         # Импортируем функцию из scheduler
         from bot.scheduler import handle_graduated_groups
 
-        await handle_graduated_groups(user_data_manager, timetable_manager, redis_client)
-        await bot.send_message(admin_id, "✅ Проверка выпустившихся групп завершена!")
+        affected = await handle_graduated_groups(
+            user_data_manager,
+            timetable_manager,
+            redis_client,
+            outbox=manager.middleware_data.get("broadcast_outbox"),
+        )
+        await bot.send_message(admin_id, f"✅ Проверка выпустившихся групп завершена! Затронуто пользователей: {affected}")
     except Exception as e:
         await bot.send_message(admin_id, f"❌ Ошибка при проверке выпустившихся групп: {e}")
         import traceback
@@ -964,6 +990,13 @@ async def on_edit_spring_semester(callback: CallbackQuery, button: Button, manag
     await manager.switch_to(Admin.edit_spring_semester)
 
 
+async def _invalidate_semester_calendar(manager: DialogManager):
+    """Сбрасывает календарь недель после смены дат семестров — здесь, в воркерах и других репликах."""
+    timetable_manager: TimetableManager | None = manager.middleware_data.get("manager")
+    if timetable_manager is not None:
+        await timetable_manager.publish_calendar_change()
+
+
 async def on_fall_semester_input(message: Message, widget: TextInput, manager: DialogManager, data: str):
     """Обработка ввода даты осеннего семестра."""
     try:
@@ -984,6 +1017,7 @@ async def on_fall_semester_input(message: Message, widget: TextInput, manager: D
         success = await settings_manager.update_semester_settings(date_obj, spring_start, message.from_user.id)
 
         if success:
+            await _invalidate_semester_calendar(manager)
             await message.answer("✅ Дата начала осеннего семестра успешно обновлена!")
         else:
             await message.answer("❌ Ошибка при обновлении настроек.")
@@ -1016,6 +1050,7 @@ async def on_spring_semester_input(message: Message, widget: TextInput, manager:
         success = await settings_manager.update_semester_settings(fall_start, date_obj, message.from_user.id)
 
         if success:
+            await _invalidate_semester_calendar(manager)
             await message.answer("✅ Дата начала весеннего семестра успешно обновлена!")
         else:
             await message.answer("❌ Ошибка при обновлении настроек.")
@@ -1036,7 +1071,7 @@ async def build_segment_users(
 ):
     """Строит список пользователей для сегментированной рассылки с оптимизацией."""
     group_prefix_up = (group_prefix or "").upper().strip()
-    all_ids = await user_data_manager.get_all_user_ids()
+    all_ids = await user_data_manager.get_all_user_ids(exclude_blocked=True)
     selected_ids: list[int] = []
     from datetime import datetime as dt
 
@@ -1063,6 +1098,54 @@ async def build_segment_users(
     return selected_ids
 
 
+async def _enqueue_admin_broadcast(
+    manager: DialogManager,
+    kind: str,
+    admin_id: int,
+    recipients: list,
+    *,
+    from_chat_id: int | None = None,
+    message_id: int | None = None,
+) -> int:
+    """
+    Ставит рассылку администратора в очередь. recipients — пары (user_id, текст); для копирования
+    медиа текст None. Если подключён outbox, рассылка сначала записывается в журнал и переживает рестарт.
+    """
+    outbox: BroadcastOutbox | None = manager.middleware_data.get("broadcast_outbox")
+    if outbox is not None:
+        texts, rows = {}, []
+        for user_id, text in recipients:
+            digest = None
+            if text is not None:
+                digest = text_hash(text)
+                texts[digest] = text
+            rows.append((user_id, digest))
+        job_id = await outbox.create_job(
+            kind,
+            rows,
+            texts=texts or None,
+            from_chat_id=from_chat_id,
+            message_id=message_id,
+            created_by=admin_id,
+        )
+        return await outbox.pump(job_id, dispatch_outbox_delivery) if job_id else 0
+
+    count = 0
+    for user_id, text in recipients:
+        if message_id is None:
+            send_message_task.send(user_id, text)
+            TASKS_SENT_TO_QUEUE.labels(actor_name="send_message_task").inc()
+        else:
+            copy_message_task.send(user_id, from_chat_id, message_id)
+            TASKS_SENT_TO_QUEUE.labels(actor_name="copy_message_task").inc()
+        count += 1
+
+        # Периодически уступаем управление event loop
+        if count % 50 == 0:
+            await asyncio.sleep(0)
+    return count
+
+
 def render_template(template_text: str, user_info) -> str:
     placeholders = {
         "user_id": str(user_info.user_id),
@@ -1144,7 +1227,8 @@ async def on_confirm_segment_send(callback: CallbackQuery, button: Button, manag
 
     # Запускаем постановку задач в фоне, чтобы не блокировать event loop
     async def _process_segment_broadcast():
-        count = 0
+        recipients = []
+        from_chat_id = message_id = None
 
         if message_type == "text":
             template = manager.dialog_data.get("segment_template", "")
@@ -1152,26 +1236,27 @@ async def on_confirm_segment_send(callback: CallbackQuery, button: Button, manag
                 info = await udm.get_full_user_info(uid)
                 if not info:
                     continue
-                text = render_template(template, info)
-                send_message_task.send(uid, text)
-                TASKS_SENT_TO_QUEUE.labels(actor_name="send_message_task").inc()
-                count += 1
+                recipients.append((uid, render_template(template, info)))
 
                 # Периодически уступаем управление event loop
-                if count % 50 == 0:
+                if len(recipients) % 50 == 0:
                     await asyncio.sleep(0)
         else:  # media
             from_chat_id = manager.dialog_data.get("segment_message_chat_id")
             message_id = manager.dialog_data.get("segment_message_id")
             if from_chat_id and message_id:
-                for uid in user_ids:
-                    copy_message_task.send(uid, from_chat_id, message_id)
-                    TASKS_SENT_TO_QUEUE.labels(actor_name="copy_message_task").inc()
-                    count += 1
+                recipients = [(uid, None) for uid in user_ids]
 
-                    # Периодически уступаем управление event loop
-                    if count % 50 == 0:
-                        await asyncio.sleep(0)
+        count = 0
+        if recipients:
+            count = await _enqueue_admin_broadcast(
+                manager,
+                f"segment_{message_type}",
+                admin_id,
+                recipients,
+                from_chat_id=from_chat_id,
+                message_id=message_id,
+            )
 
         message_type_text = "текстовых" if message_type == "text" else "медиа"
         await bot.send_message(
@@ -1186,6 +1271,61 @@ async def on_confirm_segment_send(callback: CallbackQuery, button: Button, manag
     await manager.switch_to(Admin.menu)
 
 
+BROADCAST_STATUS_LABELS = {
+    "sending": "ставится в очередь",
+    "enqueued": "доставляется",
+    "done": "завершена",
+    "expired": "просрочена",
+}
+
+
+def _format_eta(moment) -> str:
+    return moment.astimezone(MOSCOW_TZ).strftime("%H:%M")
+
+
+async def get_broadcast_menu_data(dialog_manager: DialogManager, **kwargs):
+    """Прогресс последних рассылок из outbox и плановое время завершения для раздела «Рассылки»."""
+    outbox: BroadcastOutbox | None = dialog_manager.middleware_data.get("broadcast_outbox")
+    lines = []
+    pacing = "план темпа не ведётся"
+    if outbox is not None:
+        try:
+            for progress in await outbox.list_recent_progress(limit=5):
+                line = (
+                    f"#{progress.job_id} {progress.kind}: {progress.percent_delivered}% "
+                    f"({progress.done}/{progress.total}, ошибок {progress.failed}) — "
+                    f"{BROADCAST_STATUS_LABELS.get(progress.status, progress.status)}"
+                )
+                if progress.eta is not None:
+                    line += f", завершение ≈ {_format_eta(progress.eta)}"
+                lines.append(line)
+        except Exception as e:
+            lines.append(f"Не удалось получить прогресс рассылок: {html.escape(str(e))}")
+        if outbox.pacer is not None:
+            try:
+                horizon = await outbox.pacer.horizon()
+                pacing = f"занята до ≈ {_format_eta(horizon)} МСК" if horizon else "свободна"
+                pacing += f" ({outbox.pacer.rate} сообщ./с)"
+            except Exception as e:
+                pacing = f"недоступна ({html.escape(str(e))})"
+    return {
+        "broadcasts_progress": "\n".join(lines) if lines else "Рассылок в журнале пока нет.",
+        "broadcasts_pacing": pacing,
+    }
+
+
+async def get_diagnostics_data(dialog_manager: DialogManager, **kwargs):
+    """Состояние лидерства планировщика для раздела «Диагностика»."""
+    leader: LeaderElector | None = dialog_manager.middleware_data.get("leader_elector")
+    if leader is None:
+        return {"scheduler_leader": "одиночный режим"}
+    status = leader.describe()
+    if not leader.is_leader:
+        current = await leader.current_leader()
+        status += f", лидер: {current}" if current else ", лидер не выбран"
+    return {"scheduler_leader": status}
+
+
 async def on_period_selected(callback: CallbackQuery, widget: Select, manager: DialogManager, item_id: str):
     """Обновляет период в `dialog_data` при нажатии на кнопку."""
     manager.dialog_data["stats_period"] = int(item_id)
@@ -1273,25 +1413,23 @@ async def on_broadcast_received(*args, **kwargs):
     if message.content_type == ContentType.TEXT:
         template = message.text
         # Получаем всех пользователей
-        all_users = await user_data_manager.get_all_user_ids()
+        all_users = await user_data_manager.get_all_user_ids(exclude_blocked=True)
         await message.reply("🚀 Рассылка поставлена в очередь...")
 
         # Запускаем постановку задач в фоне, чтобы не блокировать event loop
         async def _process_broadcast():
-            sent_count = 0
+            recipients = []
             for user_id in all_users:
                 user_info = await user_data_manager.get_full_user_info(user_id)
                 if not user_info:
                     continue
-                text = render_template(template, user_info)
-                send_message_task.send(user_id, text)
-                TASKS_SENT_TO_QUEUE.labels(actor_name="send_message_task").inc()
-                sent_count += 1
+                recipients.append((user_id, render_template(template, user_info)))
 
                 # Периодически уступаем управление event loop
-                if sent_count % 50 == 0:
+                if len(recipients) % 50 == 0:
                     await asyncio.sleep(0)
 
+            sent_count = await _enqueue_admin_broadcast(manager, "admin_text", admin_id, recipients)
             await bot.send_message(admin_id, f"✅ Рассылка завершена. Поставлено задач: {sent_count}")
 
         # Запускаем в фоне
@@ -1301,22 +1439,20 @@ async def on_broadcast_received(*args, **kwargs):
         await manager.switch_to(Admin.menu)
     else:
         # Обработка медиа: Ставим задачи на копирование сообщения всем пользователям
-        all_users = await user_data_manager.get_all_user_ids()
+        all_users = await user_data_manager.get_all_user_ids(exclude_blocked=True)
         await message.reply(f"🚀 Начинаю постановку задач на медиа-рассылку для {len(all_users)} пользователей...")
 
         # Запускаем постановку задач в фоне, чтобы не блокировать event loop
         async def _process_media_broadcast():
             try:
-                count = 0
-                for user_id in all_users:
-                    copy_message_task.send(user_id, message.chat.id, message.message_id)
-                    TASKS_SENT_TO_QUEUE.labels(actor_name="copy_message_task").inc()
-                    count += 1
-
-                    # Периодически уступаем управление event loop
-                    if count % 50 == 0:
-                        await asyncio.sleep(0)
-
+                count = await _enqueue_admin_broadcast(
+                    manager,
+                    "admin_media",
+                    admin_id,
+                    [(user_id, None) for user_id in all_users],
+                    from_chat_id=message.chat.id,
+                    message_id=message.message_id,
+                )
                 await bot.send_message(admin_id, f"✅ Медиа-рассылка завершена! Поставлено задач: {count}")
             except Exception as e:
                 await bot.send_message(admin_id, f"❌ Ошибка при медиа-рассылке: {e}")
@@ -1549,15 +1685,20 @@ admin_dialog = Dialog(
     ),
     # Раздел: Рассылки
     Window(
-        Const("📬 Раздел ‘Рассылки’"),
+        Const("📬 Раздел ‘Рассылки’\n"),
+        Format("<b>Последние рассылки:</b>\n{broadcasts_progress}\n"),
+        Format("⏱ Очередь отправки: {broadcasts_pacing}"),
         SwitchTo(Const("📣 Массовая рассылка"), id="go_broadcast", state=Admin.broadcast),
         SwitchTo(Const("🎯 Сегментированная"), id="go_segment", state=Admin.segment_menu),
         SwitchTo(Const("◀️ Назад к разделам"), id="back_sections_broadcasts", state=Admin.menu),
+        getter=get_broadcast_menu_data,
         state=Admin.broadcast_menu,
+        parse_mode="HTML",
     ),
     # Раздел: Диагностика
     Window(
-        Const("🧪 Раздел ‘Диагностика’"),
+        Const("🧪 Раздел ‘Диагностика’\n"),
+        Format("👑 Планировщик: {scheduler_leader}"),
         Button(
             Const("⚙️ Тест утренней"),
             id=WidgetIds.TEST_MORNING,
@@ -1575,6 +1716,7 @@ admin_dialog = Dialog(
         ),
         Button(Const("🧪 Тест алёрта"), id="test_alert2", on_click=on_test_alert),
         SwitchTo(Const("◀️ Назад к разделам"), id="back_sections_diag", state=Admin.menu),
+        getter=get_diagnostics_data,
         state=Admin.diagnostics_menu,
     ),
     # Раздел: Кэш и генерация
@@ -8,6 +8,7 @@ class DialogDataKeys(str, Enum):
     SEARCH_TYPE = "search_type"
     TEACHER_NAME = "teacher_name"
     CLASSROOM_NUMBER = "classroom_number"
+    SUBJECT_QUERY = "subject_query"
     FOUND_ITEMS = "found_items"
     CURRENT_DATE_ISO = "current_date_iso"
 
@@ -34,6 +35,7 @@ class WidgetIds(str, Enum):
     # Find Menu
     FIND_TEACHER_BTN = "find_teacher_btn"
     FIND_CLASSROOM_BTN = "find_classroom_btn"
+    FIND_SUBJECT_BTN = "find_subject_btn"
     BACK_TO_MAIN_SCHEDULE = "back_to_main_schedule"
     BACK_TO_CHOICE = "back_to_choice"
     SELECT_FOUND_ITEM = "select_found_item"
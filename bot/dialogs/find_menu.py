@@ -8,7 +8,7 @@ from aiogram_dialog.widgets.kbd import Back, Button, Column, Row, Select, Switch
 from aiogram_dialog.widgets.media import StaticMedia
 from aiogram_dialog.widgets.text import Const, Format
 
-from bot.text_formatters import format_classroom_schedule_text, format_teacher_schedule_text
+from bot.text_formatters import format_classroom_schedule_text, format_subject_search_text, format_teacher_schedule_text
 from core.config import CLASSROOM_IMAGE_PATH, SEARCH_IMAGE_PATH, TEACHER_IMAGE_PATH
 from core.manager import TimetableManager
 
@@ -74,6 +74,25 @@ async def on_classroom_input(message: Message, message_input: MessageInput, mana
         await manager.switch_to(FindMenu.select_item)
 
 
+async def get_subject_search_data(dialog_manager: DialogManager, **kwargs):
+    manager: TimetableManager = dialog_manager.middleware_data.get("manager")
+    query = dialog_manager.dialog_data.get(DialogDataKeys.SUBJECT_QUERY, "")
+    results = manager.search_subjects(query) if query else []
+    return {"result_text": format_subject_search_text(query, results)}
+
+
+async def on_subject_input(message: Message, message_input: MessageInput, manager: DialogManager):
+    timetable_manager: TimetableManager = manager.middleware_data.get("manager")
+    query = (message.text or "").strip()
+    if not timetable_manager.search_subjects(query, limit=1):
+        await message.answer("❌ Предмет не найден. Попробуйте ввести часть названия, например «теор мех».")
+        return
+
+    manager.dialog_data[DialogDataKeys.SEARCH_TYPE] = "subject"
+    manager.dialog_data[DialogDataKeys.SUBJECT_QUERY] = query
+    await manager.switch_to(FindMenu.subject_result)
+
+
 async def on_item_selected(callback: CallbackQuery, widget: Any, manager: DialogManager, item_id: str):
     search_type = manager.dialog_data.get(DialogDataKeys.SEARCH_TYPE)
 
@@ -113,6 +132,11 @@ find_dialog = Dialog(
                 id=WidgetIds.FIND_CLASSROOM_BTN,
                 state=FindMenu.enter_classroom,
             ),
+            SwitchTo(
+                Const("📚 По предмету"),
+                id=WidgetIds.FIND_SUBJECT_BTN,
+                state=FindMenu.enter_subject,
+            ),
         ),
         Button(
             Const("◀️ Назад"),
@@ -138,6 +162,14 @@ find_dialog = Dialog(
         state=FindMenu.enter_classroom,
         disable_web_page_preview=True,
     ),
+    Window(
+        StaticMedia(path=SEARCH_IMAGE_PATH),
+        Const("Введите название предмета или его часть (например, «теор мех»):"),
+        MessageInput(on_subject_input),
+        SwitchTo(Const("◀️ Назад"), id=f"{WidgetIds.BACK_TO_CHOICE}_subject", state=FindMenu.choice),
+        state=FindMenu.enter_subject,
+        disable_web_page_preview=True,
+    ),
     Window(
         Const("Найдено несколько совпадений. Пожалуйста, выберите:"),
         Column(
@@ -201,4 +233,21 @@ find_dialog = Dialog(
         parse_mode="HTML",
         disable_web_page_preview=True,
     ),
+    Window(
+        Format("{result_text}"),
+        SwitchTo(
+            Const("🔎 Другой предмет"),
+            id=f"{WidgetIds.BACK_TO_CHOICE}_subject_again",
+            state=FindMenu.enter_subject,
+        ),
+        SwitchTo(
+            Const("◀️ Новый поиск"),
+            id=f"{WidgetIds.BACK_TO_CHOICE}_4",
+            state=FindMenu.choice,
+        ),
+        state=FindMenu.subject_result,
+        getter=get_subject_search_data,
+        parse_mode="HTML",
+        disable_web_page_preview=True,
+    ),
 )
@@ -187,7 +187,12 @@ async def get_schedule_data(dialog_manager: DialogManager, **kwargs):
     except Exception:
         pass
 
-    dynamic_header, progress_bar = generate_dynamic_header(day_info.get("lessons", []), current_date)
+    # Таймлайн дня общий с напоминаниями и кэшируется менеджером: время пар не разбирается на каждый показ
+    timeline = None
+    if day_info.get("lessons"):
+        entity_type = "teacher" if user_type == "teacher" else "group"
+        timeline = await manager.get_day_timeline(group, current_date, entity_type=entity_type)
+    dynamic_header, progress_bar = generate_dynamic_header(day_info.get("lessons", []), current_date, timeline=timeline)
 
     # Рассчитываем номер недели с начала семестра
     week_number = await calculate_semester_week_number(current_date, session_factory)
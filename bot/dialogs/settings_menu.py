@@ -6,6 +6,7 @@ from aiogram_dialog.widgets.kbd import Back, Button, Column, Row, Select, Switch
 from aiogram_dialog.widgets.text import Const, Format, Jinja
 
 from bot.scheduler import cancel_reminders_for_user, plan_reminders_for_user
+from core.config import DEFAULT_EVENING_DIGEST_TIME, DEFAULT_MORNING_DIGEST_TIME, EVENING_DIGEST_SLOTS, MORNING_DIGEST_SLOTS
 from core.user_data import UserDataManager
 
 from .constants import WidgetIds
@@ -13,6 +14,12 @@ from .states import SettingsMenu
 
 # theme_dialog импортируется в main.py
 
+# Виджет выбора времени сводки → настройка рассылки
+DIGEST_TIME_WIDGETS = {
+    "select_evening_time": WidgetIds.EVENING_NOTIFY.value,
+    "select_morning_time": WidgetIds.MORNING_SUMMARY.value,
+}
+
 
 def get_status_text(status: bool) -> str:
     return "✅ Включена" if status else "❌ Отключена"
@@ -41,9 +48,11 @@ async def get_settings_data(dialog_manager: DialogManager, **kwargs):
     }
 
     current_theme_name = themes_info.get(current_theme, "🎨 Стандартная")
+    evening_status = settings.get(WidgetIds.EVENING_NOTIFY.value, False)
+    morning_status = settings.get(WidgetIds.MORNING_SUMMARY.value, False)
 
     return {
-        "evening_status_text": get_status_text(settings.get(WidgetIds.EVENING_NOTIFY.value, False)),
+        "evening_status_text": get_status_text(evening_status),
         "morning_status_text": get_status_text(settings.get(WidgetIds.MORNING_SUMMARY.value, False)),
         "reminders_status_text": get_status_text(reminders_status),
         "are_reminders_enabled": reminders_status,
@@ -55,6 +64,12 @@ async def get_settings_data(dialog_manager: DialogManager, **kwargs):
         "current_theme": current_theme,
         "reminder_times": [30, 60, 90, 120],
         "current_reminder_time": reminder_time,
+        "is_evening_enabled": evening_status,
+        "is_morning_enabled": morning_status,
+        "evening_time": settings.get("evening_time") or DEFAULT_EVENING_DIGEST_TIME,
+        "morning_time": settings.get("morning_time") or DEFAULT_MORNING_DIGEST_TIME,
+        "evening_times": list(EVENING_DIGEST_SLOTS),
+        "morning_times": list(MORNING_DIGEST_SLOTS),
     }
 
 
@@ -101,6 +116,17 @@ async def on_time_selected(callback: CallbackQuery, widget: Select, manager: Dia
     await manager.switch_to(SettingsMenu.main)
 
 
+async def on_digest_time_selected(callback: CallbackQuery, widget: Select, manager: DialogManager, item_id: str):
+    """Сохраняет время утренней или вечерней сводки."""
+    user_data_manager: UserDataManager = manager.middleware_data.get("user_data_manager")
+    setting_name = DIGEST_TIME_WIDGETS[widget.widget_id]
+    if await user_data_manager.set_digest_time(callback.from_user.id, setting_name, item_id):
+        await callback.answer(f"Сводка будет приходить в {item_id}.")
+    else:
+        await callback.answer("Это время недоступно, выберите другое.", show_alert=True)
+    await manager.switch_to(SettingsMenu.main)
+
+
 async def on_back_click(callback: CallbackQuery, button: Button, manager: DialogManager):
     await manager.done()
 
@@ -245,18 +271,34 @@ async def on_news_clicked(callback: CallbackQuery, button: Button, manager: Dial
 settings_dialog = Dialog(
     Window(
         Const("⚙️ <b>Настройки уведомлений</b>\n"),
-        Format(f"Сводка на завтра (20:00): <b>{{evening_status_text}}</b>"),
-        Format(f"Сводка на сегодня (8:00): <b>{{morning_status_text}}</b>"),
+        Format("Сводка на завтра ({evening_time}): <b>{evening_status_text}</b>"),
+        Format("Сводка на сегодня ({morning_time}): <b>{morning_status_text}</b>"),
         Format(f"Напоминания о парах: <b>{{reminders_status_text}}</b>"),
-        Button(
-            Format("{evening_button_text}"),
-            id=WidgetIds.EVENING_NOTIFY,
-            on_click=on_toggle_setting,
+        Row(
+            Button(
+                Format("{evening_button_text}"),
+                id=WidgetIds.EVENING_NOTIFY,
+                on_click=on_toggle_setting,
+            ),
+            SwitchTo(
+                Const("🕗 Время"),
+                id="to_evening_time",
+                state=SettingsMenu.evening_time,
+                when="is_evening_enabled",
+            ),
         ),
-        Button(
-            Format("{morning_button_text}"),
-            id=WidgetIds.MORNING_SUMMARY,
-            on_click=on_toggle_setting,
+        Row(
+            Button(
+                Format("{morning_button_text}"),
+                id=WidgetIds.MORNING_SUMMARY,
+                on_click=on_toggle_setting,
+            ),
+            SwitchTo(
+                Const("🕗 Время"),
+                id="to_morning_time",
+                state=SettingsMenu.morning_time,
+                when="is_morning_enabled",
+            ),
         ),
         Row(
             Button(
@@ -300,6 +342,36 @@ settings_dialog = Dialog(
         state=SettingsMenu.reminders_time,
         getter=get_settings_data,
     ),
+    Window(
+        Const("Выберите, во сколько присылать сводку на завтра:"),
+        Row(
+            Select(
+                Jinja("{% if item == evening_time %}" "✅ {{ item }}" "{% else %}" "{{ item }}" "{% endif %}"),
+                id="select_evening_time",
+                item_id_getter=lambda item: item,
+                items="evening_times",
+                on_click=on_digest_time_selected,
+            )
+        ),
+        SwitchTo(Const("◀️ Назад"), id="back_from_evening_time", state=SettingsMenu.main),
+        state=SettingsMenu.evening_time,
+        getter=get_settings_data,
+    ),
+    Window(
+        Const("Выберите, во сколько присылать сводку на сегодня:"),
+        Row(
+            Select(
+                Jinja("{% if item == morning_time %}" "✅ {{ item }}" "{% else %}" "{{ item }}" "{% endif %}"),
+                id="select_morning_time",
+                item_id_getter=lambda item: item,
+                items="morning_times",
+                on_click=on_digest_time_selected,
+            )
+        ),
+        SwitchTo(Const("◀️ Назад"), id="back_from_morning_time", state=SettingsMenu.main),
+        state=SettingsMenu.morning_time,
+        getter=get_settings_data,
+    ),
     # Добавляем окна из theme_dialog
     Window(
         Const(
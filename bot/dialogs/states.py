@@ -17,6 +17,8 @@ class Schedule(StatesGroup):
 class SettingsMenu(StatesGroup):
     main = State()
     reminders_time = State()
+    evening_time = State()
+    morning_time = State()
     choose_theme = State()
     theme_subscription_gate = State()
 
@@ -25,8 +27,10 @@ class FindMenu(StatesGroup):
     choice = State()
     enter_teacher = State()
     enter_classroom = State()
+    enter_subject = State()
     select_item = State()
     view_result = State()
+    subject_result = State()
 
 
 class About(StatesGroup):
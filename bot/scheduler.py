@@ -2,9 +2,7 @@ import asyncio
 import json
 import logging
 import os
-from datetime import datetime
-from datetime import datetime as _dt
-from datetime import time, timedelta
+from datetime import date, datetime, time, timedelta
 
 from aiogram import Bot
 from aiogram.types import CallbackQuery
@@ -12,7 +10,13 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.date import DateTrigger
 from redis.asyncio.client import Redis
 
-from bot.tasks import send_lesson_reminder_task, send_message_task
+from bot.tasks import (
+    copy_message_task,
+    send_broadcast_batch_task,
+    send_broadcast_text_task,
+    send_lesson_reminder_task,
+    send_message_task,
+)
 from bot.text_formatters import (
     format_schedule_text,
     format_teacher_schedule_text,
@@ -21,22 +25,47 @@ from bot.text_formatters import (
     get_footer_with_promo,
 )
 from core.admin_reports import send_daily_reports, send_monthly_reports, send_weekly_reports
+from core.backups import BackupStore, pg_dump_command
+from core.broadcast_outbox import BroadcastOutbox, OutboxDelivery, text_hash
+from core.broadcast_pacing import BroadcastPacer
 from core.config import (
+    BROADCAST_SEND_CHUNK_SIZE,
     CHECK_INTERVAL_MINUTES,
+    DAY_MAP,
+    EVENING_DIGEST_SLOTS,
+    MORNING_DIGEST_SLOTS,
     MOSCOW_TZ,
     OPENWEATHERMAP_API_KEY,
     OPENWEATHERMAP_CITY_ID,
     OPENWEATHERMAP_UNITS,
+    REDIS_BROADCAST_TEXT_PREFIX,
     REDIS_SCHEDULE_CACHE_KEY,
     REDIS_SCHEDULE_HASH_KEY,
+    SCHEDULE_DIFF_NOTIFICATIONS,
 )
 from core.image_cache_manager import ImageCacheManager
 from core.image_generator import generate_schedule_image
-from core.manager import TimetableManager
-from core.metrics import ERRORS_TOTAL, LAST_SCHEDULE_UPDATE_TS, SUBSCRIBED_USERS, TASKS_SENT_TO_QUEUE, USERS_TOTAL
+from core.leader_election import LeaderElector, leader_only
+from core.manager import TimetableManager, decode_schedule_cache
+from core.metrics import (
+    BLOCKED_SUBSCRIBED_USERS,
+    BROADCAST_BLOCKED_SHARE,
+    BROADCAST_RECIPIENTS,
+    BROADCAST_RENDERS,
+    ERRORS_TOTAL,
+    LAST_SCHEDULE_UPDATE_TS,
+    SUBSCRIBED_USERS,
+    TASKS_SENT_TO_QUEUE,
+    USERS_TOTAL,
+)
 from core.parser import fetch_and_parse_all_schedules
-from core.schedule_diff import ScheduleDiffDetector, ScheduleDiffFormatter
-from core.user_data import UserDataManager
+from core.reminder_slots import ReminderSlotStore, SlotEntry, format_slot
+from core.schedule_diff import GroupScheduleDiff, ScheduleDiffDetector, ScheduleDiffFormatter
+from core.schedule_fingerprints import FINGERPRINTS_DATA_KEY, ScheduleFingerprintStore, changed_slots, compute_fingerprints
+from core.schedule_history import ScheduleHistoryStore
+from core.scheduler_telemetry import SchedulerTelemetry
+from core.timeline import parse_hhmm
+from core.user_data import UserDataManager, lesson_reminder_offset
 from core.weather_api import WeatherAPI
 
 logger = logging.getLogger(__name__)
@@ -67,27 +96,167 @@ def print_progress_bar(
         print()  # Новая строка в конце
 
 
-async def evening_broadcast(user_data_manager: UserDataManager, timetable_manager: TimetableManager):
-    tomorrow = datetime.now(MOSCOW_TZ) + timedelta(days=1)
-    logger.info(f"Начинаю постановку задач на вечернюю рассылку для даты {tomorrow.date().isoformat()}")
+# --- Рассылки ---
+BROADCAST_TEXT_PREFIX = REDIS_BROADCAST_TEXT_PREFIX
+BROADCAST_TEXT_TTL = 24 * 3600
+# Вечерняя/утренняя рассылка теряет смысл к следующей — после этого прерванную постановку не продолжаем
+SCHEDULED_BROADCAST_EXPIRES = timedelta(hours=6)
+# Уведомления о выпуске группы ставятся в очередь пачками, между пачками отдаём управление event loop
+GRADUATED_NOTIFY_BATCH = 500
 
-    weather_api = WeatherAPI(OPENWEATHERMAP_API_KEY, OPENWEATHERMAP_CITY_ID, OPENWEATHERMAP_UNITS)
-    tomorrow_9am = MOSCOW_TZ.localize(datetime.combine(tomorrow.date(), time(9, 0)))
-    weather_forecast = await weather_api.get_forecast_for_time(tomorrow_9am)
 
-    users_to_notify = await user_data_manager.get_users_for_evening_notify()
-    if not users_to_notify:
-        logger.info("Вечерняя рассылка: нет пользователей для уведомления.")
+def dispatch_outbox_delivery(delivery: OutboxDelivery):
+    """
+    Ставит доставку из outbox в очередь воркеров; воркер подтвердит её по delivery_id.
+    Пачка получателей (delivery.recipients) уходит одной задачей send_broadcast_batch_task.
+    Если у доставки есть delay_ms (план темпа рассылок), сообщение придёт воркеру к началу её слота.
+    """
+    if delivery.recipients:
+        actor, actor_name = send_broadcast_batch_task, "send_broadcast_batch_task"
+        payload = {"text_key": delivery.text_key, "from_chat_id": delivery.from_chat_id, "message_id": delivery.message_id}
+        if delivery.message_id is None and not delivery.text_key:
+            payload["text"] = delivery.text
+        args = ([list(pair) for pair in delivery.recipients],)
+        actor.send_with_options(args=args, kwargs=payload, delay=delivery.delay_ms or None)
+        TASKS_SENT_TO_QUEUE.labels(actor_name=actor_name).inc()
+        return
+    if delivery.message_id is not None:
+        actor, actor_name = copy_message_task, "copy_message_task"
+        args = (delivery.user_id, delivery.from_chat_id, delivery.message_id)
+    elif delivery.text_key:
+        actor, actor_name = send_broadcast_text_task, "send_broadcast_text_task"
+        args = (delivery.user_id, delivery.text_key)
+    elif delivery.text:
+        actor, actor_name = send_message_task, "send_message_task"
+        args = (delivery.user_id, delivery.text)
+    else:
         return
+    if delivery.delay_ms:
+        actor.send_with_options(args=args, kwargs={"delivery_id": delivery.delivery_id}, delay=delivery.delay_ms)
+    else:
+        actor.send(*args, delivery_id=delivery.delivery_id)
+    TASKS_SENT_TO_QUEUE.labels(actor_name=actor_name).inc()
 
-    logger.info(f"Вечерняя рассылка: обработка {len(users_to_notify)} пользователей")
-    processed_count = 0
 
-    for user_id, group_name in users_to_notify:
-        # Получаем тип пользователя
-        user = await user_data_manager.get_full_user_info(user_id)
-        user_type = getattr(user, "user_type", "student")
+async def broadcast_outbox_tick(outbox: BroadcastOutbox):
+    """Переносит подтверждения воркеров и продолжает рассылки, прерванные рестартом."""
+    try:
+        await outbox.tick(dispatch_outbox_delivery)
+    except Exception as e:
+        logger.error(f"Ошибка обслуживания outbox рассылок: {e}", exc_info=True)
+
+
+class BroadcastRenderCache:
+    """
+    Рендерит текст рассылки один раз на ключ (группа, тип пользователя, дата).
+
+    Отрендеренный текст кладётся в Redis по хешу, а доставки ссылаются на него ключом — в очередь
+    уходят короткие сообщения. Без Redis текст передаётся в задачу напрямую, но рендерится так же один раз.
+    С outbox доставки не ставятся сразу, а копятся и записываются в журнал в flush().
+    """
+
+    def __init__(self, broadcast: str, redis_client: Redis | None = None, outbox: BroadcastOutbox | None = None):
+        self.broadcast = broadcast
+        self.redis = redis_client
+        self.outbox = outbox
+        self.renders = 0
+        self.recipients = 0
+        self._rendered: dict[tuple, tuple[str | None, str | None]] = {}
+        self._outbox_texts: dict[str, str] = {}
+        self._outbox_recipients: list[tuple[int, str]] = []
+
+    async def _store(self, text: str) -> str | None:
+        if self.redis is None:
+            return None
+        text_key = f"{BROADCAST_TEXT_PREFIX}{text_hash(text)}"
+        try:
+            await self.redis.set(text_key, text, ex=BROADCAST_TEXT_TTL)
+            return text_key
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить текст рассылки в Redis, отправляем текстом: {e}")
+            return None
+
+    async def deliver(self, user_id: int, key: tuple, render) -> bool:
+        """
+        Ставит доставку получателю. render() вызывается только для первого получателя с таким ключом.
+
+        Returns:
+            False, если для ключа отправлять нечего (render вернул None).
+        """
+        self.recipients += 1
+        BROADCAST_RECIPIENTS.labels(broadcast=self.broadcast).inc()
+        if key not in self._rendered:
+            text = await render()
+            self.renders += 1
+            BROADCAST_RENDERS.labels(broadcast=self.broadcast).inc()
+            if text and self.outbox is not None:
+                # Текст хранится в журнале, в Redis его положит продюсер outbox
+                digest = text_hash(text)
+                self._outbox_texts[digest] = text
+                self._rendered[key] = (text, digest)
+            else:
+                self._rendered[key] = (text, await self._store(text) if text else None)
+
+        text, text_key = self._rendered[key]
+        if not text:
+            return False
+        if self.outbox is not None:
+            self._outbox_recipients.append((user_id, text_key))
+        elif text_key:
+            send_broadcast_text_task.send(user_id, text_key)
+            TASKS_SENT_TO_QUEUE.labels(actor_name="send_broadcast_text_task").inc()
+        else:
+            send_message_task.send(user_id, text)
+            TASKS_SENT_TO_QUEUE.labels(actor_name="send_message_task").inc()
+        return True
+
+    async def flush(self) -> int | None:
+        """Записывает накопленные доставки в outbox и ставит их в очередь. Возвращает id задания."""
+        if self.outbox is None or not self._outbox_recipients:
+            return None
+        job_id = await self.outbox.create_job(
+            self.broadcast,
+            self._outbox_recipients,
+            texts=self._outbox_texts,
+            expires_in=SCHEDULED_BROADCAST_EXPIRES,
+        )
+        self._outbox_recipients = []
+        if job_id is not None:
+            await self.outbox.pump(job_id, dispatch_outbox_delivery)
+        return job_id
+
+
+async def prefetch_weather_forecast(redis_client: Redis):
+    """Обновляет общий кэш прогноза погоды незадолго до рассылок, чтобы они не ждали API."""
+    if not OPENWEATHERMAP_API_KEY:
+        return
+    try:
+        weather_api = WeatherAPI(OPENWEATHERMAP_API_KEY, OPENWEATHERMAP_CITY_ID, OPENWEATHERMAP_UNITS, redis_client)
+        if await weather_api.prefetch():
+            logger.info("Прогноз погоды обновлён в общем кэше перед рассылкой")
+    except Exception as e:
+        logger.warning(f"Не удалось заранее получить прогноз погоды: {e}")
+
+
+async def evening_broadcast(
+    user_data_manager: UserDataManager,
+    timetable_manager: TimetableManager,
+    redis_client: Redis | None = None,
+    outbox: BroadcastOutbox | None = None,
+    slot: str | None = None,
+):
+    """Вечерняя сводка на завтра. slot — время «ЧЧ:ММ»: только пользователи этого слота (None — все)."""
+    tomorrow = datetime.now(MOSCOW_TZ) + timedelta(days=1)
+    logger.info(
+        f"Начинаю постановку задач на вечернюю рассылку для даты {tomorrow.date().isoformat()}"
+        + (f" (слот {slot})" if slot else "")
+    )
+
+    weather_api = WeatherAPI(OPENWEATHERMAP_API_KEY, OPENWEATHERMAP_CITY_ID, OPENWEATHERMAP_UNITS, redis_client)
+    tomorrow_9am = MOSCOW_TZ.localize(datetime.combine(tomorrow.date(), time(9, 0)))
+    weather_forecast = await weather_api.get_forecast_for_time(tomorrow_9am)
 
+    async def render(group_name: str, user_type: str) -> str:
         # Генерируем intro с учетом типа пользователя
         intro_text = generate_evening_intro(weather_forecast, target_date=tomorrow, user_type=user_type)
 
@@ -113,176 +282,326 @@ async def evening_broadcast(user_data_manager: UserDataManager, timetable_manage
             else:
                 text_body = "🎉 <b>Завтра занятий нет!</b>"
 
-        text = f"{intro_text}{text_body}{get_footer_with_promo()}"
+        return f"{intro_text}{text_body}{get_footer_with_promo()}"
 
-        send_message_task.send(user_id, text)
-        TASKS_SENT_TO_QUEUE.labels(actor_name="send_message_task").inc()
+    renderer = BroadcastRenderCache("evening", redis_client, outbox)
+    processed_count = 0
+
+    # Получатели вместе с типом пользователя приходят одним потоковым запросом
+    async for recipient in user_data_manager.iter_broadcast_recipients("evening_notify", slot=slot):
+        group_name, user_type = recipient.group, recipient.user_type or "student"
+        key = (group_name, user_type, tomorrow.date())
+        await renderer.deliver(recipient.user_id, key, lambda: render(group_name, user_type))
         processed_count += 1
 
         # Периодически освобождаем event loop для обработки других событий
         if processed_count % 50 == 0:
             await asyncio.sleep(0)
-            logger.debug(f"Вечерняя рассылка: обработано {processed_count}/{len(users_to_notify)} пользователей")
+            logger.debug(f"Вечерняя рассылка: обработано {processed_count} пользователей")
 
-    logger.info(f"Вечерняя рассылка: завершено. Обработано {processed_count} пользователей")
+    if not processed_count:
+        logger.info("Вечерняя рассылка: нет пользователей для уведомления.")
+        return
+    await renderer.flush()
+    logger.info(
+        f"Вечерняя рассылка: завершено. Обработано {processed_count} пользователей, уникальных текстов: {renderer.renders}"
+    )
 
 
-async def morning_summary_broadcast(user_data_manager: UserDataManager, timetable_manager: TimetableManager):
+async def morning_summary_broadcast(
+    user_data_manager: UserDataManager,
+    timetable_manager: TimetableManager,
+    redis_client: Redis | None = None,
+    outbox: BroadcastOutbox | None = None,
+    slot: str | None = None,
+):
+    """Утренняя сводка на сегодня. slot — время «ЧЧ:ММ»: только пользователи этого слота (None — все)."""
     today = datetime.now(MOSCOW_TZ)
-    logger.info(f"Начинаю постановку задач на утреннюю рассылку для даты {today.date().isoformat()}")
+    logger.info(
+        f"Начинаю постановку задач на утреннюю рассылку для даты {today.date().isoformat()}"
+        + (f" (слот {slot})" if slot else "")
+    )
 
-    weather_api = WeatherAPI(OPENWEATHERMAP_API_KEY, OPENWEATHERMAP_CITY_ID, OPENWEATHERMAP_UNITS)
+    weather_api = WeatherAPI(OPENWEATHERMAP_API_KEY, OPENWEATHERMAP_CITY_ID, OPENWEATHERMAP_UNITS, redis_client)
     today_9am = MOSCOW_TZ.localize(datetime.combine(today.date(), time(9, 0)))
     weather_forecast = await weather_api.get_forecast_for_time(today_9am)
 
-    users_to_notify = await user_data_manager.get_users_for_morning_summary()
-    if not users_to_notify:
-        logger.info("Утренняя рассылка: нет пользователей для уведомления.")
-        return
-
-    logger.info(f"Утренняя рассылка: обработка {len(users_to_notify)} пользователей")
-    processed_count = 0
-
-    for user_id, group_name in users_to_notify:
-        # Получаем тип пользователя
-        user = await user_data_manager.get_full_user_info(user_id)
-        user_type = getattr(user, "user_type", "student")
-
-        # Генерируем intro с учетом типа пользователя
-        intro_text = generate_morning_intro(weather_forecast, user_type=user_type)
-
+    async def render(group_name: str, user_type: str) -> str | None:
         # Получаем расписание в зависимости от типа пользователя
         if user_type == "teacher":
             schedule_info = await timetable_manager.get_teacher_schedule(group_name, target_date=today.date())
         else:
             schedule_info = await timetable_manager.get_schedule_for_day(group_name, target_date=today.date())
 
-        if schedule_info and not schedule_info.get("error") and schedule_info.get("lessons"):
-            # Форматируем расписание в зависимости от типа пользователя
-            if user_type == "teacher":
-                schedule_text = format_teacher_schedule_text(schedule_info)
-            else:
-                schedule_text = format_schedule_text(schedule_info)
+        if not (schedule_info and not schedule_info.get("error") and schedule_info.get("lessons")):
+            return None
 
-            text = f"{intro_text}\n<b>Ваше расписание на сегодня:</b>\n\n{schedule_text}{get_footer_with_promo()}"
-            send_message_task.send(user_id, text)
-            TASKS_SENT_TO_QUEUE.labels(actor_name="send_message_task").inc()
+        # Генерируем intro и форматируем расписание с учетом типа пользователя
+        intro_text = generate_morning_intro(weather_forecast, user_type=user_type)
+        if user_type == "teacher":
+            schedule_text = format_teacher_schedule_text(schedule_info)
+        else:
+            schedule_text = format_schedule_text(schedule_info)
+        return f"{intro_text}\n<b>Ваше расписание на сегодня:</b>\n\n{schedule_text}{get_footer_with_promo()}"
+
+    renderer = BroadcastRenderCache("morning", redis_client, outbox)
+    processed_count = 0
+
+    # Получатели вместе с типом пользователя приходят одним потоковым запросом
+    async for recipient in user_data_manager.iter_broadcast_recipients("morning_summary", slot=slot):
+        group_name, user_type = recipient.group, recipient.user_type or "student"
+        key = (group_name, user_type, today.date())
+        if await renderer.deliver(recipient.user_id, key, lambda: render(group_name, user_type)):
             processed_count += 1
 
         # Периодически освобождаем event loop для обработки других событий
-        if processed_count % 50 == 0:
+        if renderer.recipients % 50 == 0:
             await asyncio.sleep(0)
-            logger.debug(f"Утренняя рассылка: обработано {processed_count}/{len(users_to_notify)} пользователей")
+            logger.debug(f"Утренняя рассылка: обработано {renderer.recipients} пользователей")
 
-    logger.info(f"Утренняя рассылка: завершено. Отправлено сообщений: {processed_count}")
+    if not renderer.recipients:
+        logger.info("Утренняя рассылка: нет пользователей для уведомления.")
+        return
+    await renderer.flush()
+    logger.info(
+        f"Утренняя рассылка: завершено. Получателей: {renderer.recipients}, отправлено сообщений: {processed_count}, "
+        f"уникальных текстов: {renderer.renders}"
+    )
 
 
-async def lesson_reminders_planner(
+# --- Напоминания о парах: одна задача планировщика на минутный слот ---
+# Хранилище слотов задаётся в setup_scheduler; состояние живёт в Redis и переживает рестарт
+reminder_slot_store: ReminderSlotStore | None = None
+
+# Аренда лидерства при нескольких репликах бота: задачи выполняются, только пока аренда наша
+scheduler_leader: LeaderElector | None = None
+
+# Пропущенные за время передачи лидерства запуски выполняются один раз после возобновления
+LEADER_JOB_DEFAULTS = {"coalesce": True, "misfire_grace_time": 120}
+
+# Время ежедневного планирования напоминаний о парах
+REMINDER_PLANNER_TIME = time(6, 0)
+
+
+def _leader_job(func):
+    return leader_only(scheduler_leader, func) if scheduler_leader is not None else func
+
+
+def _sorted_lessons(schedule_info: dict | None) -> list | None:
+    """Пары дня, отсортированные по началу, или None, если пар нет или время некорректно."""
+    if not (schedule_info and not schedule_info.get("error") and schedule_info.get("lessons")):
+        return None
+    try:
+        return sorted(schedule_info["lessons"], key=lambda lesson: parse_hhmm(lesson["start_time_raw"]))
+    except (ValueError, KeyError, AttributeError):
+        return None
+
+
+def _ensure_slot_job(scheduler: AsyncIOScheduler, store: ReminderSlotStore, timetable_manager, day, minute: int):
+    run_at = MOSCOW_TZ.localize(datetime.combine(day, time(minute // 60, minute % 60)))
+    slot = format_slot(minute)
+    scheduler.add_job(
+        _leader_job(fire_reminder_slot),
+        trigger=DateTrigger(run_date=run_at),
+        args=(store, timetable_manager, day.isoformat(), slot),
+        id=f"reminder_slot_{day.isoformat()}_{slot}",
+        replace_existing=True,
+    )
+
+
+async def _schedule_user_reminders(
     scheduler: AsyncIOScheduler,
-    user_data_manager: UserDataManager,
+    store: ReminderSlotStore,
     timetable_manager: TimetableManager,
+    now_in_moscow: datetime,
+    user_id: int,
+    group_name: str,
+    offset: int,
+    lessons: list,
+) -> bool:
+    """
+    Записывает пользователя в индекс группы и добавляет недостающие слоты.
+
+    Слоты перерывов общие для группы и создаются один раз в день. Возвращает False,
+    если напоминание о первой паре уже прошло (в этот день пользователь не планируется).
+    """
+    today = now_in_moscow.date()
+    now_minute = now_in_moscow.hour * 60 + now_in_moscow.minute
+    try:
+        first_minute = parse_hhmm(lessons[0]["start_time_raw"]) - offset
+        end_minutes = [parse_hhmm(lesson["end_time_raw"]) for lesson in lessons]
+    except (ValueError, KeyError) as e:
+        logger.warning(f"Ошибка планирования напоминаний для user_id={user_id}: {e}")
+        return False
+    # Напоминание не раньше полуночи и только если его время ещё не прошло
+    if first_minute < max(now_minute, 0):
+        return False
+
+    await store.add_user(today.isoformat(), user_id, group_name, offset)
+    if await store.add_entry(today.isoformat(), first_minute, SlotEntry("first", str(offset), group_name)):
+        _ensure_slot_job(scheduler, store, timetable_manager, today, first_minute)
+
+    if await store.mark_group_planned(today.isoformat(), group_name):
+        for lesson, end_minute in zip(lessons, end_minutes):
+            if end_minute < now_minute:
+                continue  # Пропускаем прошедшие напоминания
+            entry = SlotEntry("end", lesson["end_time_raw"], group_name)
+            if await store.add_entry(today.isoformat(), end_minute, entry):
+                _ensure_slot_job(scheduler, store, timetable_manager, today, end_minute)
+    return True
+
+
+async def fire_reminder_slot(store: ReminderSlotStore, timetable_manager: TimetableManager, day_iso: str, slot: str):
+    """Срабатывание слота: получатели берутся из индекса групп на момент отправки."""
+    day = date.fromisoformat(day_iso)
+    entries = await store.pop_slot(day_iso, slot)
+    lessons_cache: dict[str, list | None] = {}
+    sent = 0
+
+    for entry in entries:
+        if entry.group not in lessons_cache:
+            lessons_cache[entry.group] = _sorted_lessons(
+                await timetable_manager.get_schedule_for_day(entry.group, target_date=day)
+            )
+        lessons = lessons_cache[entry.group]
+        if not lessons:
+            continue
+        users = await store.group_users(day_iso, entry.group)
+
+        if entry.kind == "first":
+            offset = int(entry.value)
+            for user_id, user_offset in users.items():
+                if user_offset == offset:
+                    send_lesson_reminder_task.send(user_id, lessons[0], "first", None, offset)
+                    sent += 1
+            continue
+
+        index = next((i for i, lesson in enumerate(lessons) if lesson.get("end_time_raw") == entry.value), None)
+        if index is None:
+            continue  # Расписание изменилось — пары с таким окончанием больше нет
+        is_last = index == len(lessons) - 1
+        next_lesson = None if is_last else lessons[index + 1]
+        break_duration = None
+        if next_lesson:
+            break_duration = parse_hhmm(next_lesson["start_time_raw"]) - parse_hhmm(entry.value)
+        for user_id in users:
+            send_lesson_reminder_task.send(user_id, next_lesson, "final" if is_last else "break", break_duration, None)
+            sent += 1
+
+    if sent:
+        TASKS_SENT_TO_QUEUE.labels(actor_name="send_lesson_reminder_task").inc(sent)
+    logger.info(f"Слот напоминаний {day_iso} {slot}: записей {len(entries)}, отправлено {sent}")
+
+
+async def restore_reminder_slots(
+    scheduler: AsyncIOScheduler,
+    timetable_manager: TimetableManager,
+    store: ReminderSlotStore | None = None,
 ):
+    """Восстанавливает задачи слотов на сегодня из Redis после рестарта."""
+    store = store or reminder_slot_store
+    if store is None:
+        return
     now_in_moscow = datetime.now(MOSCOW_TZ)
     today = now_in_moscow.date()
+    slots = await store.pending_slots(today.isoformat(), now_in_moscow.hour * 60 + now_in_moscow.minute)
+    for _, minute in slots:
+        _ensure_slot_job(scheduler, store, timetable_manager, today, minute)
+    if slots:
+        logger.info(f"Восстановлено слотов напоминаний: {len(slots)}")
+
+
+def on_leader_elected(
+    scheduler: AsyncIOScheduler,
+    user_data_manager: UserDataManager,
+    timetable_manager: TimetableManager,
+    telemetry: SchedulerTelemetry | None = None,
+):
+    """
+    Реплика стала лидером: возобновляет планировщик и поднимает задачи на сегодня.
+
+    Задачи слотов напоминаний создаются динамически и были только в планировщике прежнего лидера:
+    они восстанавливаются из Redis. Если утреннее планирование уже прошло (или было пропущено при
+    передаче лидерства), оно запускается повторно — уже запланированное не дублируется. Работа идёт
+    задачами планировщика, чтобы не задерживать продление аренды. Запуски, пришедшиеся на время
+    резерва, телеметрия не считает пропусками.
+    """
+    if telemetry is not None:
+        telemetry.mark_active()
+    scheduler.resume()
+    scheduler.add_job(
+        _leader_job(restore_reminder_slots),
+        "date",
+        args=[scheduler, timetable_manager],
+        id="restore_reminder_slots",
+        replace_existing=True,
+    )
+    if datetime.now(MOSCOW_TZ).time() >= REMINDER_PLANNER_TIME:
+        scheduler.add_job(
+            _leader_job(lesson_reminders_planner),
+            "date",
+            args=[scheduler, user_data_manager, timetable_manager],
+            id="lesson_reminders_catch_up",
+            replace_existing=True,
+        )
 
-    users_to_plan = await user_data_manager.get_users_for_lesson_reminders()
-    if not users_to_plan:
+
+async def lesson_reminders_planner(
+    scheduler: AsyncIOScheduler,
+    user_data_manager: UserDataManager,
+    timetable_manager: TimetableManager,
+    store: ReminderSlotStore | None = None,
+):
+    store = store or reminder_slot_store
+    if store is None:
+        logger.warning("Хранилище слотов напоминаний не настроено, планирование пропущено")
         return
+    now_in_moscow = datetime.now(MOSCOW_TZ)
+    today = now_in_moscow.date()
 
-    logger.info(f"Планирование напоминаний: обработка {len(users_to_plan)} пользователей")
     processed_count = 0
+    group_lessons: dict[str, list | None] = {}
 
-    for user_id, group_name, reminder_time in users_to_plan:
+    # Группа, время напоминания и тип пользователя приходят одним потоковым запросом
+    async for recipient in user_data_manager.iter_broadcast_recipients("lesson_reminders"):
         processed_count += 1
-        try:
-            # Пропускаем преподавателей
-            user = await user_data_manager.get_full_user_info(user_id)
-            if getattr(user, "user_type", "student") == "teacher":
-                continue
-        except Exception:
-            pass
-        schedule_info = await timetable_manager.get_schedule_for_day(group_name, target_date=today)
-        if not (schedule_info and not schedule_info.get("error") and schedule_info.get("lessons")):
+        # Пропускаем преподавателей
+        if recipient.user_type == "teacher":
             continue
-
-        try:
-            lessons = sorted(
-                schedule_info["lessons"],
-                key=lambda x: datetime.strptime(x["start_time_raw"], "%H:%M").time(),
+        group_name = recipient.group
+        # Расписание группы запрашивается один раз на группу, а не на каждого пользователя
+        if group_name not in group_lessons:
+            group_lessons[group_name] = _sorted_lessons(
+                await timetable_manager.get_schedule_for_day(group_name, target_date=today)
             )
-        except (ValueError, KeyError):
-            continue
-
+        lessons = group_lessons[group_name]
         if lessons:
-            try:
-                start_time_obj = datetime.strptime(lessons[0]["start_time_raw"], "%H:%M").time()
-                start_dt = MOSCOW_TZ.localize(datetime.combine(today, start_time_obj))
-                reminder_dt = start_dt - timedelta(minutes=reminder_time)
-
-                # Планируем только если время напоминания еще не прошло
-                if reminder_dt >= now_in_moscow:
-                    run_at = reminder_dt
-                    scheduler.add_job(
-                        send_lesson_reminder_task.send,
-                        trigger=DateTrigger(run_date=run_at),
-                        args=(user_id, lessons[0], "first", None, reminder_time),
-                        id=f"reminder_{user_id}_{today.isoformat()}_first",
-                        replace_existing=True,
-                    )
-                else:
-                    # Если время напоминания уже прошло, пропускаем напоминание
-                    continue
-            except (ValueError, KeyError) as e:
-                logger.warning(f"Ошибка планирования напоминания о первой паре для user_id={user_id}: {e}")
-
-        for i, lesson in enumerate(lessons):
-            try:
-                end_time_obj = datetime.strptime(lesson["end_time_raw"], "%H:%M").time()
-                reminder_dt = MOSCOW_TZ.localize(datetime.combine(today, end_time_obj))
-
-                # Планируем только если время напоминания еще не прошло
-                if reminder_dt < now_in_moscow:
-                    continue  # Пропускаем прошедшие напоминания
-                run_at = reminder_dt
-                is_last_lesson = i == len(lessons) - 1
-                reminder_type = "final" if is_last_lesson else "break"
-                next_lesson = lessons[i + 1] if not is_last_lesson else None
-                break_duration = None
-                if next_lesson:
-                    next_start_time_obj = datetime.strptime(next_lesson["start_time_raw"], "%H:%M").time()
-                    break_duration = int(
-                        (datetime.combine(today, next_start_time_obj) - datetime.combine(today, end_time_obj)).total_seconds()
-                        / 60
-                    )
-
-                scheduler.add_job(
-                    send_lesson_reminder_task.send,
-                    trigger=DateTrigger(run_date=run_at),
-                    args=(user_id, next_lesson, reminder_type, break_duration, None),
-                    id=f"reminder_{user_id}_{today.isoformat()}_{lesson['end_time_raw']}",
-                    replace_existing=True,
-                )
-            except (ValueError, KeyError) as e:
-                logger.warning(f"Ошибка планирования напоминания в перерыве для user_id={user_id}: {e}")
+            await _schedule_user_reminders(
+                scheduler,
+                store,
+                timetable_manager,
+                now_in_moscow,
+                recipient.user_id,
+                group_name,
+                lesson_reminder_offset(recipient.reminder_time_minutes),
+                lessons,
+            )
 
         # Периодически освобождаем event loop для обработки других событий
         if processed_count % 50 == 0:
             await asyncio.sleep(0)
-            logger.debug(f"Планирование напоминаний: обработано {processed_count}/{len(users_to_plan)} пользователей")
+            logger.debug(f"Планирование напоминаний: обработано {processed_count} пользователей")
 
     logger.info(f"Планирование напоминаний: завершено. Обработано {processed_count} пользователей")
 
 
-async def cancel_reminders_for_user(scheduler: AsyncIOScheduler, user_id: int):
+async def cancel_reminders_for_user(scheduler: AsyncIOScheduler, user_id: int, store: ReminderSlotStore | None = None):
+    """Отменяет сегодняшние напоминания пользователя: удаление из индекса группы, задачи слотов не трогаются."""
+    store = store or reminder_slot_store
+    if store is None:
+        return
     try:
-        now_in_moscow = datetime.now(MOSCOW_TZ)
-        today_iso = now_in_moscow.date().isoformat()
-        for job in list(scheduler.get_jobs()):
-            if job.id and job.id.startswith(f"reminder_{user_id}_{today_iso}"):
-                try:
-                    scheduler.remove_job(job.id)
-                except Exception:
-                    pass
+        await store.remove_user(datetime.now(MOSCOW_TZ).date().isoformat(), user_id)
     except Exception as e:
         logger.warning(f"cancel_reminders_for_user failed for {user_id}: {e}")
 
@@ -292,7 +611,11 @@ async def plan_reminders_for_user(
     user_data_manager: UserDataManager,
     timetable_manager: TimetableManager,
     user_id: int,
+    store: ReminderSlotStore | None = None,
 ):
+    store = store or reminder_slot_store
+    if store is None:
+        return
     try:
         # Получаем группу и время напоминания
         user = await user_data_manager.get_full_user_info(user_id)
@@ -301,93 +624,30 @@ async def plan_reminders_for_user(
             return
         if not user or not user.group or not user.lesson_reminders:
             return
-        today = datetime.now(MOSCOW_TZ).date()
         now_in_moscow = datetime.now(MOSCOW_TZ)
 
-        # Сначала проверяем, есть ли вообще смысл планировать напоминания
-        # Получаем расписание только если время напоминания еще актуально
-        schedule_info = await timetable_manager.get_schedule_for_day(user.group, target_date=today)
-        if not (schedule_info and not schedule_info.get("error") and schedule_info.get("lessons")):
-            return
-
-        # Сортируем пары
-        try:
-            lessons = sorted(
-                schedule_info["lessons"],
-                key=lambda x: datetime.strptime(x["start_time_raw"], "%H:%M").time(),
-            )
-        except (ValueError, KeyError):
+        schedule_info = await timetable_manager.get_schedule_for_day(user.group, target_date=now_in_moscow.date())
+        lessons = _sorted_lessons(schedule_info)
+        if not lessons:
             return
 
-        # Первая пара с учётом времени напоминания
-        if lessons:
-            try:
-                start_time_obj = datetime.strptime(lessons[0]["start_time_raw"], "%H:%M").time()
-                start_dt = MOSCOW_TZ.localize(datetime.combine(today, start_time_obj))
-                reminder_dt = start_dt - timedelta(minutes=(user.reminder_time_minutes or 60))
-
-                # ИСПРАВЛЕНИЕ: Проверяем время напоминания ПЕРЕД любыми действиями
-                if reminder_dt < now_in_moscow:
-                    logger.info(
-                        f"Время напоминания уже прошло для пользователя {user_id} (напоминание должно было быть в {reminder_dt}, сейчас {now_in_moscow}), пропускаем"
-                    )
-                    return
-
-                run_at = reminder_dt
-                scheduler.add_job(
-                    send_lesson_reminder_task.send,
-                    trigger=DateTrigger(run_date=run_at),
-                    args=(
-                        user_id,
-                        lessons[0],
-                        "first",
-                        None,
-                        user.reminder_time_minutes,
-                    ),
-                    id=f"reminder_{user_id}_{today.isoformat()}_first",
-                    replace_existing=True,
-                )
-                logger.info(f"Запланировано напоминание для пользователя {user_id} на {reminder_dt}")
-            except Exception as e:
-                logger.warning(f"Ошибка планирования напоминания о первой паре для user_id={user_id}: {e}")
-        # Перерывы/конец
-        for i, lesson in enumerate(lessons):
-            try:
-                end_time_obj = datetime.strptime(lesson["end_time_raw"], "%H:%M").time()
-                reminder_dt = MOSCOW_TZ.localize(datetime.combine(today, end_time_obj))
-                # Планируем только если время напоминания еще не прошло
-                if reminder_dt < now_in_moscow:
-                    continue  # Пропускаем прошедшие напоминания
-                run_at = reminder_dt
-                is_last = i == len(lessons) - 1
-                next_lesson = lessons[i + 1] if not is_last else None
-                break_duration = None
-                if next_lesson:
-                    next_start_time_obj = datetime.strptime(next_lesson["start_time_raw"], "%H:%M").time()
-                    break_duration = int(
-                        (datetime.combine(today, next_start_time_obj) - datetime.combine(today, end_time_obj)).total_seconds()
-                        / 60
-                    )
-                scheduler.add_job(
-                    send_lesson_reminder_task.send,
-                    trigger=DateTrigger(run_date=run_at),
-                    args=(
-                        user_id,
-                        next_lesson,
-                        ("final" if is_last else "break"),
-                        break_duration,
-                        None,
-                    ),
-                    id=f"reminder_{user_id}_{today.isoformat()}_{lesson['end_time_raw']}",
-                    replace_existing=True,
-                )
-            except Exception:
-                continue
+        offset = user.reminder_time_minutes or 60
+        if await _schedule_user_reminders(
+            scheduler, store, timetable_manager, now_in_moscow, user_id, user.group, offset, lessons
+        ):
+            logger.info(f"Запланированы напоминания для пользователя {user_id} (за {offset} мин до первой пары)")
+        else:
+            logger.info(f"Время напоминания уже прошло для пользователя {user_id}, пропускаем")
     except Exception as e:
         logger.warning(f"plan_reminders_for_user failed for {user_id}: {e}")
 
 
-async def monitor_schedule_changes(user_data_manager: UserDataManager, redis_client: Redis, bot: Bot):
+async def monitor_schedule_changes(
+    user_data_manager: UserDataManager,
+    redis_client: Redis,
+    bot: Bot,
+    outbox: BroadcastOutbox | None = None,
+):
     logger.info("Проверка изменений в расписании...")
 
     global global_timetable_manager_instance  # Оставляем для возможности переприсвоения
@@ -415,7 +675,7 @@ async def monitor_schedule_changes(user_data_manager: UserDataManager, redis_cli
     async with redis_client.lock("timetable_manager_update_lock"):
         if new_schedule_data is None:
             logger.info("Данные расписания не изменились или недоступны (условный запрос).")
-            LAST_SCHEDULE_UPDATE_TS.set(_dt.now(MOSCOW_TZ).timestamp())
+            LAST_SCHEDULE_UPDATE_TS.set(datetime.now(MOSCOW_TZ).timestamp())
             return
 
         if not new_schedule_data:
@@ -436,12 +696,35 @@ async def monitor_schedule_changes(user_data_manager: UserDataManager, redis_cli
             new_manager = TimetableManager(new_schedule_data, redis_client)
             await new_manager.save_to_cache()
 
-            # Отправляем дифф-уведомления пользователям (ОТКЛЮЧЕНО)
-            # await send_schedule_diff_notifications(
-            #     user_data_manager=user_data_manager,
-            #     old_manager=global_timetable_manager_instance,
-            #     new_manager=new_manager
-            # )
+            # Фиксируем версию в истории сразу, не дожидаясь планового бэкапа
+            try:
+                await ScheduleHistoryStore(redis_client).record(new_schedule_data)
+            except Exception as e:
+                logger.warning(f"Не удалось записать версию в историю расписания: {e}")
+
+            # Дифф-уведомления: сравниваются отпечатки дней, дифф строится только для изменившихся групп.
+            # Отпечатки сохраняются и при выключенных уведомлениях, чтобы включение не дало лавину диффов,
+            # но только после того, как уведомления поставлены в очередь: при ошибке отправки они не обновляются
+            try:
+                fingerprints = new_schedule_data.get(FINGERPRINTS_DATA_KEY) or compute_fingerprints(new_schedule_data)
+                fingerprint_store = ScheduleFingerprintStore(redis_client)
+                previous = await fingerprint_store.load()
+                changed = changed_slots(previous, fingerprints) if previous else None
+                if SCHEDULE_DIFF_NOTIFICATIONS and changed and global_timetable_manager_instance is not None:
+                    await send_schedule_diff_notifications(
+                        user_data_manager, global_timetable_manager_instance, new_manager, changed, outbox
+                    )
+                await fingerprint_store.save(fingerprints, previous)
+            except Exception as e:
+                logger.error(f"Ошибка при подготовке дифф-уведомлений: {e}", exc_info=True)
+
+            # Группы, пропавшие из нового снапшота, обрабатываются сразу, без периодического обхода пользователей
+            try:
+                vanished_groups = _group_names(global_timetable_manager_instance) - _group_names(new_manager)
+                if vanished_groups:
+                    await handle_graduated_groups(user_data_manager, new_manager, redis_client, vanished_groups, outbox)
+            except Exception as e:
+                logger.error(f"Ошибка при обработке исчезнувших групп: {e}", exc_info=True)
 
             # Переприсваиваем глобальный экземпляр
             global_timetable_manager_instance = new_manager
@@ -465,24 +748,25 @@ async def monitor_schedule_changes(user_data_manager: UserDataManager, redis_cli
             logger.info("Изменений в расписании не обнаружено.")
 
     # Обновляем метку времени при КАЖДОЙ успешной проверке
-    LAST_SCHEDULE_UPDATE_TS.set(_dt.now(MOSCOW_TZ).timestamp())
+    LAST_SCHEDULE_UPDATE_TS.set(datetime.now(MOSCOW_TZ).timestamp())
 
 
 # --- Резервные копии расписания ---
-BACKUP_PREFIX = "timetable:backup:"
-
-
 async def backup_current_schedule(redis_client: Redis):
+    """Записывает текущее расписание из кэша в историю версий (сохраняются только изменившиеся группы)."""
     try:
-        data = await redis_client.get(REDIS_SCHEDULE_HASH_KEY)
-        # Сохраняем «снапшот» ключа хеша и дамп данных кэша расписания
         from core.config import REDIS_SCHEDULE_CACHE_KEY
 
-        cached_json = await redis_client.get(REDIS_SCHEDULE_CACHE_KEY)
-        if cached_json:
-            ts = _dt.now(MOSCOW_TZ).strftime("%Y%m%d_%H%M%S")
-            await redis_client.set(f"{BACKUP_PREFIX}{ts}", cached_json)
-            logger.info("Создана резервная копия расписания: %s", ts)
+        cached_data = await redis_client.get(REDIS_SCHEDULE_CACHE_KEY)
+        if cached_data:
+            history = ScheduleHistoryStore(redis_client)
+            version = await history.record(decode_schedule_cache(cached_data))
+            if version is None:
+                logger.info("Расписание не изменилось, новая версия истории не создана")
+            else:
+                logger.info("Создана версия истории расписания: %s", version)
+            # Снапшот уже в истории — полные копии старого формата больше не нужны для восстановления
+            await history.drop_legacy_backups()
     except Exception as e:
         logger.error("Ошибка при создании резервной копии расписания: %s", e)
 
@@ -491,8 +775,11 @@ async def collect_db_metrics(user_data_manager: UserDataManager):
     try:
         total_users = await user_data_manager.get_total_users_count()
         subscribed_users = await user_data_manager.get_subscribed_users_count()
+        blocked_users = await user_data_manager.get_blocked_subscribed_users_count()
         USERS_TOTAL.set(total_users)
         SUBSCRIBED_USERS.set(subscribed_users)
+        BLOCKED_SUBSCRIBED_USERS.set(blocked_users)
+        BROADCAST_BLOCKED_SHARE.set(blocked_users / subscribed_users if subscribed_users else 0)
     except Exception as e:
         logger.error(f"Ошибка при сборе метрик из БД: {e}")
 
@@ -508,329 +795,245 @@ async def cleanup_image_cache(redis_client: Redis):
 # Массовые функции генерации изображений удалены: теплый прогрев, полная генерация, pre-cache helper
 
 
-async def auto_backup(redis_client: Redis):
-    try:
-        # Backup DB using Docker (safer approach)
-        db_url = os.getenv("DATABASE_URL")
-        if db_url:
-            backup_file = f"db_backup_{datetime.now(MOSCOW_TZ).strftime('%Y%m%d_%H%M%S')}.sql"
-            backup_path = f"/app/data/{backup_file}"
-
-            # Extract connection details from DATABASE_URL
-            import re
-
-            match = re.match(r"postgresql://([^:]+):([^@]+)@([^:]+):(\d+)/(.+)", db_url)
-            if match:
-                user, password, host, port, dbname = match.groups()
-
-                # Use docker exec to run pg_dump inside PostgreSQL container
-                cmd = [
-                    "docker",
-                    "exec",
-                    "-i",
-                    "voenmeh_postgres",
-                    "pg_dump",
-                    "-h",
-                    "localhost",
-                    "-U",
-                    user,
-                    "-d",
-                    dbname,
-                ]
-
-                try:
-                    import subprocess
-
-                    with open(backup_path, "w") as f:
-                        result = subprocess.run(
-                            cmd,
-                            stdout=f,
-                            stderr=subprocess.PIPE,
-                            text=True,
-                            timeout=300,
-                            env={**os.environ, "PGPASSWORD": password},
-                        )
-
-                    if result.returncode == 0:
-                        logger.info(f"Database backup created: {backup_file}")
-                    else:
-                        logger.error(f"Failed to create database backup: {backup_file}")
-                        logger.error(f"Error: {result.stderr}")
-                except subprocess.TimeoutExpired:
-                    logger.error(f"Database backup timed out: {backup_file}")
-                except Exception as e:
-                    logger.error(f"Exception during database backup: {e}")
-            else:
-                logger.error("Could not parse DATABASE_URL for backup")
-        else:
-            logger.warning("DATABASE_URL not found, skipping database backup")
-
-        # Backup schedules from Redis
-        from core.config import REDIS_SCHEDULE_CACHE_KEY
+async def auto_backup(redis_client: Redis, store: BackupStore | None = None):
+    """
+    Ночные файловые копии: дамп БД и снапшот расписания.
 
-        schedules = await redis_client.get(REDIS_SCHEDULE_CACHE_KEY)
+    Копия не сохраняется, если содержимое не изменилось с прошлой; старые копии удаляются по ротации.
+    pg_dump и запись файлов не блокируют event loop.
+    """
+    store = store or BackupStore()
 
-        if schedules:
-            try:
-                # Try to decompress the data (it's likely gzip-compressed)
-                import gzip
-                import json
-                import pickle
-
-                try:
-                    # First try to decompress as gzip + pickle (the format used by TimetableManager)
-                    decompressed = gzip.decompress(schedules)
-                    schedule_data = pickle.loads(decompressed)
-                    logger.info("Successfully decompressed schedule data using gzip+pickle")
-                except (gzip.BadGzipFile, pickle.UnpicklingError):
-                    try:
-                        # Fallback: try as plain JSON
-                        schedule_data = json.loads(schedules.decode("utf-8"))
-                        logger.info("Successfully parsed schedule data as plain JSON")
-                    except UnicodeDecodeError:
-                        # Last resort: try to decode with error handling
-                        schedule_data = json.loads(schedules.decode("utf-8", errors="replace"))
-                        logger.warning("Successfully parsed schedule data with error replacement")
-
-                # Write the decompressed data as readable JSON
-                backup_file = f"schedules_backup_{datetime.now(MOSCOW_TZ).strftime('%Y%m%d_%H%M%S')}.json"
-                with open(backup_file, "w", encoding="utf-8") as f:
-                    json.dump(schedule_data, f, ensure_ascii=False, indent=2)
-                logger.info(f"Schedule backup created: {backup_file}")
+    db_url = os.getenv("DATABASE_URL")
+    if db_url:
+        try:
+            cmd, env = pg_dump_command(db_url)
+            await store.save_command_output("db", cmd, env=env)
+        except Exception as e:
+            logger.error(f"Не удалось создать резервную копию БД: {e}")
+    else:
+        logger.warning("DATABASE_URL не задан, резервная копия БД пропущена")
 
-            except Exception as e:
-                logger.error(f"Failed to process schedule data for backup: {e}")
-                # Fallback: save raw data as binary
-                backup_file = f"schedules_backup_raw_{datetime.now(MOSCOW_TZ).strftime('%Y%m%d_%H%M%S')}.bin"
-                with open(backup_file, "wb") as f:
-                    f.write(schedules)
-                logger.info(f"Raw schedule backup created: {backup_file}")
-        else:
-            logger.info("No schedule data found in Redis cache")
+    try:
+        cached_data = await redis_client.get(REDIS_SCHEDULE_CACHE_KEY)
+        if not cached_data:
+            logger.info("Кэш расписания пуст, резервная копия расписания пропущена")
+            return
+        await store.save_json("schedules", decode_schedule_cache(cached_data))
+    except Exception as e:
+        logger.error(f"Не удалось создать резервную копию расписания: {e}", exc_info=True)
 
-        logger.info("Auto-backup completed successfully")
 
-    except Exception as e:
-        logger.error(f"Auto-backup failed with error: {e}")
-        import traceback
+async def _diff_dates(new_manager: TimetableManager, days_ahead: int) -> dict[tuple[str, str], list[date]]:
+    """
+    Ближайшие даты по (код недели, день недели) — какие дни уведомления касаются пользователей.
 
-        logger.error(traceback.format_exc())
+    Тип недели берётся из академического календаря, как и в get_schedule_for_day.
+    """
+    today = datetime.now(MOSCOW_TZ).date()
+    result: dict[tuple[str, str], list[date]] = {}
+    for offset in range(days_ahead):
+        day = today + timedelta(days=offset)
+        day_name = DAY_MAP[day.weekday()]
+        if not day_name:
+            continue
+        week_code, _ = await new_manager.get_academic_week_type(day)
+        result.setdefault((week_code, day_name), []).append(day)
+    return result
+
+
+def build_group_diff_message(
+    group: str,
+    slots: list[tuple[str, str]],
+    old_schedule: dict | None,
+    new_schedule: dict | None,
+    dates: dict[tuple[str, str], list[date]],
+) -> str | None:
+    """Дифф группы по изменившимся дням: каждый день сравнивается один раз, сообщение одно на группу."""
+    old_schedule, new_schedule = old_schedule or {}, new_schedule or {}
+    diffs = []
+    for week_code, day_name in slots:
+        slot_dates = dates.get((week_code, day_name))
+        if not slot_dates:
+            continue  # Изменение не касается ближайших дней
+        changes = ScheduleDiffDetector.compare_day_schedules(
+            {"lessons": (old_schedule.get(week_code) or {}).get(day_name, [])},
+            {"lessons": (new_schedule.get(week_code) or {}).get(day_name, [])},
+        )
+        if changes:
+            diffs.extend(GroupScheduleDiff(group=group, date=day, changes=changes) for day in slot_dates)
+    parts = [ScheduleDiffFormatter.format_group_diff(diff) for diff in sorted(diffs, key=lambda diff: diff.date)]
+    parts = [part for part in parts if part]
+    return "\n\n".join(parts) if parts else None
 
 
 async def send_schedule_diff_notifications(
     user_data_manager: UserDataManager,
     old_manager: TimetableManager,
     new_manager: TimetableManager,
-):
+    changed: dict[str, list[tuple[str, str]]],
+    outbox: BroadcastOutbox | None = None,
+    days_ahead: int = 7,
+) -> int:
     """
     Отправляет пользователям уведомления только о реальных изменениях в расписании.
-    """
-    try:
-        # Получаем всех пользователей с их группами
-        users_with_groups = await user_data_manager.get_all_users_with_groups()
-        if not users_with_groups:
-            logger.info("Нет пользователей для отправки дифф-уведомлений")
-            return
 
-        # Группируем пользователей по группам для оптимизации
-        groups_to_users = {}
-        for user_id, group_name in users_with_groups:
-            if group_name:
-                if group_name not in groups_to_users:
-                    groups_to_users[group_name] = []
-                groups_to_users[group_name].append(user_id)
-
-        # Проверяем изменения для каждой группы на следующие несколько дней
-        from datetime import date, timedelta
-
-        today = date.today()
-        dates_to_check = [today + timedelta(days=i) for i in range(7)]  # Проверяем неделю вперед
-
-        total_notifications_sent = 0
-        groups_with_changes = set()  # Отслеживаем группы с изменениями
-        processed_groups_count = 0
-
-        for group_name, user_ids in groups_to_users.items():
-            processed_groups_count += 1
-            group_has_changes = False
-
-            for check_date in dates_to_check:
-                try:
-                    # Получаем старое и новое расписание на дату
-                    old_schedule = await old_manager.get_schedule_for_day(group_name, target_date=check_date)
-                    new_schedule = await new_manager.get_schedule_for_day(group_name, target_date=check_date)
-
-                    # Сравниваем расписания
-                    diff = ScheduleDiffDetector.compare_group_schedules(
-                        group=group_name,
-                        target_date=check_date,
-                        old_schedule_data=old_schedule,
-                        new_schedule_data=new_schedule,
-                    )
+    changed — изменившиеся по отпечаткам дни групп (см. ScheduleFingerprintStore.update): дифф
+    строится только для них, один раз на группу. Получатели загружаются одним запросом по
+    изменившимся группам, доставка идёт через outbox и очередь воркеров.
+    """
+    if not changed:
+        return 0
 
-                    # Если есть изменения, отправляем уведомления
-                    if diff.has_changes():
-                        group_has_changes = True
-                        groups_with_changes.add(group_name)  # Добавляем группу в список с изменениями
-                        message = ScheduleDiffFormatter.format_group_diff(diff)
+    dates = await _diff_dates(new_manager, days_ahead)
+    messages: dict[str, str] = {}
+    for index, (group, slots) in enumerate(changed.items(), start=1):
+        try:
+            message = build_group_diff_message(
+                group, slots, old_manager._schedules.get(group), new_manager._schedules.get(group), dates
+            )
+        except Exception as e:
+            logger.error(f"Ошибка при сравнении расписания группы {group}: {e}")
+            continue
+        if message:
+            messages[group] = message
+        # Периодически освобождаем event loop для обработки других событий
+        if index % 50 == 0:
+            await asyncio.sleep(0)
 
-                        if message:
-                            # Отправляем уведомление всем пользователям группы
-                            for user_id in user_ids:
-                                send_message_task.send(user_id, message)
-                                TASKS_SENT_TO_QUEUE.labels(actor_name="send_message_task").inc()
-                                total_notifications_sent += 1
+    if not messages:
+        logger.info(f"Изменения отпечатков у {len(changed)} групп не затрагивают ближайшие {days_ahead} дней")
+        return 0
+
+    recipients = await user_data_manager.get_users_in_groups(list(messages))
+    digests = {group: text_hash(text) for group, text in messages.items()}
+    if outbox is not None:
+        job_id = await outbox.create_job(
+            "schedule_diff",
+            [(user_id, digests[group]) for user_id, group in recipients],
+            texts={digests[group]: text for group, text in messages.items()},
+            expires_in=SCHEDULED_BROADCAST_EXPIRES,
+        )
+        if job_id is not None:
+            await outbox.pump(job_id, dispatch_outbox_delivery)
+    else:
+        for user_id, group in recipients:
+            send_message_task.send(user_id, messages[group])
+            TASKS_SENT_TO_QUEUE.labels(actor_name="send_message_task").inc()
 
-                            logger.info(
-                                f"Отправлены дифф-уведомления для группы {group_name} на {check_date}: {len(user_ids)} пользователей"
-                            )
+    logger.info(
+        f"Дифф-уведомления: изменились {len(changed)} групп, с изменениями на ближайшие дни {len(messages)}, "
+        f"получателей {len(recipients)}"
+    )
 
-                except Exception as e:
-                    logger.error(f"Ошибка при сравнении расписания группы {group_name} на {check_date}: {e}")
-                    continue
+    # Уведомляем администраторов о количестве отправленных уведомлений
+    if recipients:
+        try:
+            admin_message = (
+                f"📊 <b>Отчет о дифф-уведомлениях</b>\n\n"
+                f"Обнаружены изменения в расписании\n"
+                f"📤 Поставлено уведомлений: {len(recipients)}\n"
+                f"👥 Затронуто групп: {len(messages)}\n"
+                f"⏱️ Проверены даты: {days_ahead} дней вперед"
+            )
+            for admin_id in await user_data_manager.get_admin_users():
+                send_message_task.send(admin_id, admin_message)
+                TASKS_SENT_TO_QUEUE.labels(actor_name="send_message_task").inc()
+        except Exception as e:
+            logger.warning(f"Не удалось уведомить администраторов о дифф-уведомлениях: {e}")
+    return len(recipients)
 
-            if not group_has_changes:
-                logger.debug(f"Нет изменений в расписании группы {group_name}")
 
-            # Периодически освобождаем event loop для обработки других событий
-            if processed_groups_count % 10 == 0:
-                await asyncio.sleep(0)
-                logger.debug(f"Обработка diff: проверено {processed_groups_count}/{len(groups_to_users)} групп")
+def _group_names(manager: TimetableManager | None) -> set[str]:
+    if manager is None:
+        return set()
+    return {group for group in manager._schedules.keys() if not group.startswith("__")}
 
-        logger.info(f"Отправлено {total_notifications_sent} дифф-уведомлений о изменениях в расписании")
 
-        # Уведомляем администраторов о количестве отправленных уведомлений
-        if total_notifications_sent > 0:
-            try:
-                admin_users = await user_data_manager.get_admin_users()
-                admin_message = (
-                    f"📊 <b>Отчет о дифф-уведомлениях</b>\n\n"
-                    f"Обнаружены изменения в расписании\n"
-                    f"📤 Отправлено уведомлений: {total_notifications_sent}\n"
-                    f"👥 Затронуто групп: {len(groups_with_changes)}\n"
-                    f"⏱️ Проверены даты: {len(dates_to_check)} дней вперед"
-                )
-                for admin_id in admin_users:
-                    send_message_task.send(admin_id, admin_message)
-                    TASKS_SENT_TO_QUEUE.labels(actor_name="send_message_task").inc()
-            except Exception as e:
-                logger.warning(f"Не удалось уведомить администраторов о дифф-уведомлениях: {e}")
-
-    except Exception as e:
-        logger.error(f"Критическая ошибка при отправке дифф-уведомлений: {e}")
-        import traceback
-
-        logger.error(traceback.format_exc())
+def _graduated_message(old_group: str, available_groups: list[str]) -> str:
+    return (
+        f"⚠️ <b>Внимание!</b>\n\n"
+        f"Группа <b>{old_group}</b> больше не существует в расписании.\n"
+        f"Возможно, группа выпустилась или была переименована.\n\n"
+        f"Пожалуйста, выберите новую группу:\n"
+        f"<code>/start</code> - для выбора группы\n\n"
+        f"Доступные группы: {', '.join(available_groups[:10])}"
+        + (f"\n... и еще {len(available_groups) - 10} групп" if len(available_groups) > 10 else "")
+    )
 
 
 async def handle_graduated_groups(
     user_data_manager: UserDataManager,
     timetable_manager: TimetableManager,
     redis_client: Redis,
-):
+    vanished_groups: set[str] | None = None,
+    outbox: BroadcastOutbox | None = None,
+) -> int:
     """
     Обрабатывает ситуации, когда группы выпустились и больше не существуют в расписании.
-    Уведомляет пользователей и предлагает выбрать новую группу.
+
+    Вызывается монитором расписания, когда новый снапшот не содержит части прежних групп
+    (vanished_groups). При ручной проверке из админ-панели исчезнувшие группы определяются
+    одним DISTINCT-запросом по группам студентов. Группа сбрасывается одним UPDATE на все
+    исчезнувшие группы, уведомления ставятся в очередь пачками. Возвращает число затронутых пользователей.
     """
     try:
-        logger.info("🔍 Проверяю наличие выпустившихся групп...")
-
-        # Получаем всех пользователей с их группами
-        users_with_groups = await user_data_manager.get_all_users_with_groups()
-        if not users_with_groups:
-            logger.info("Нет пользователей для проверки")
-            return
-
-        # Получаем актуальные группы из расписания
-        current_groups = set(timetable_manager._schedules.keys())
-        # Исключаем служебные ключи
-        current_groups = {g for g in current_groups if not g.startswith("__")}
-
-        graduated_groups = set()
-        affected_users = []
-
-        # Проверяем каждую группу пользователей
-        for user_id, group_name in users_with_groups:
-            if group_name and group_name.upper() not in current_groups:
-                graduated_groups.add(group_name.upper())
-                affected_users.append((user_id, group_name))
-
-        if not affected_users:
+        current_groups = _group_names(timetable_manager)
+        if not current_groups:
+            # Пустой снапшот — это сбой загрузки, а не выпуск всех групп сразу
+            logger.warning("Расписание без групп, проверка выпустившихся групп пропущена")
+            return 0
+
+        if vanished_groups is None:
+            logger.info("🔍 Проверяю наличие выпустившихся групп...")
+            vanished_groups = {group.upper() for group in await user_data_manager.get_student_groups()}
+        graduated_groups = sorted(set(vanished_groups) - current_groups)
+        if not graduated_groups:
             logger.info("✅ Все группы пользователей актуальны")
-            return
-
-        logger.warning(f"⚠️ Обнаружены выпустившиеся группы: {', '.join(graduated_groups)}")
-        logger.info(f"📊 Затронуто пользователей: {len(affected_users)}")
-
-        # Получаем список доступных групп для предложения
-        available_groups = sorted(list(current_groups))
-
-        # Уведомляем пользователей
-        bot = None
-        try:
-            from main import bot_instance
-
-            bot = bot_instance
-        except:
-            logger.warning("Не удалось получить экземпляр бота для уведомлений")
-            return
-
-        if not bot:
-            logger.warning("Бот недоступен для отправки уведомлений")
-            return
-
-        notified_count = 0
-        for user_id, old_group in affected_users:
-            try:
-                # Формируем сообщение
-                message_text = (
-                    f"⚠️ <b>Внимание!</b>\n\n"
-                    f"Группа <b>{old_group}</b> больше не существует в расписании.\n"
-                    f"Возможно, группа выпустилась или была переименована.\n\n"
-                    f"Пожалуйста, выберите новую группу:\n"
-                    f"<code>/start</code> - для выбора группы\n\n"
-                    f"Доступные группы: {', '.join(available_groups[:10])}"
-                    + (f"\n... и еще {len(available_groups) - 10} групп" if len(available_groups) > 10 else "")
-                )
+            return 0
 
-                # Используем фоновую задачу для отправки уведомлений
-                send_message_task.send(user_id, message_text)
+        affected_users = await user_data_manager.clear_groups(graduated_groups)
+        logger.warning(
+            f"⚠️ Выпустившиеся группы: {', '.join(graduated_groups)}; затронуто пользователей: {len(affected_users)}"
+        )
+        if not affected_users:
+            return 0
+
+        available_groups = sorted(current_groups)
+        messages = {group: _graduated_message(group, available_groups) for group in {g for _, g in affected_users}}
+        if outbox is not None:
+            digests = {group: text_hash(text) for group, text in messages.items()}
+            job_id = await outbox.create_job(
+                "graduated",
+                [(user_id, digests[group]) for user_id, group in affected_users],
+                texts={digests[group]: text for group, text in messages.items()},
+            )
+            if job_id is not None:
+                await outbox.pump(job_id, dispatch_outbox_delivery)
+        else:
+            for index, (user_id, group) in enumerate(affected_users, start=1):
+                send_message_task.send(user_id, messages[group])
                 TASKS_SENT_TO_QUEUE.labels(actor_name="send_message_task").inc()
-
-                # Очищаем группу пользователя
-                await user_data_manager.set_user_group(user_id, None)
-
-                notified_count += 1
-                logger.info(f"✅ Запланировано уведомление пользователя {user_id} о выпуске группы {old_group}")
-
-                # Периодически освобождаем event loop
-                if notified_count % 50 == 0:
+                # Освобождаем event loop между пачками постановки
+                if index % GRADUATED_NOTIFY_BATCH == 0:
                     await asyncio.sleep(0)
-                    logger.debug(f"Обработка выпускных групп: обработано {notified_count}/{len(affected_users)} пользователей")
-
-            except Exception as e:
-                logger.error(f"❌ Ошибка уведомления пользователя {user_id}: {e}")
-
-        logger.info(f"📊 Уведомлено пользователей: {notified_count}/{len(affected_users)}")
 
         # Сохраняем статистику в Redis для мониторинга
         try:
-            stats_key = "graduated_groups_stats"
             stats_data = {
                 "timestamp": datetime.now(MOSCOW_TZ).isoformat(),
-                "graduated_groups": list(graduated_groups),
+                "graduated_groups": graduated_groups,
                 "affected_users": len(affected_users),
-                "notified_users": notified_count,
+                "notified_users": len(affected_users),
             }
-            await redis_client.set(stats_key, json.dumps(stats_data, ensure_ascii=False), ex=86400)
+            await redis_client.set("graduated_groups_stats", json.dumps(stats_data, ensure_ascii=False), ex=86400)
         except Exception as e:
             logger.warning(f"Не удалось сохранить статистику: {e}")
+        return len(affected_users)
 
     except Exception as e:
-        logger.error(f"❌ Ошибка при обработке выпустившихся групп: {e}")
-        import traceback
-
-        logger.error(traceback.format_exc())
+        logger.error(f"❌ Ошибка при обработке выпустившихся групп: {e}", exc_info=True)
+        return 0
 
 
 def setup_scheduler(
@@ -838,65 +1041,121 @@ def setup_scheduler(
     manager: TimetableManager,
     user_data_manager: UserDataManager,
     redis_client: Redis,
+    broadcast_outbox: BroadcastOutbox | None = None,
+    leader: LeaderElector | None = None,
 ) -> AsyncIOScheduler:
-    scheduler = AsyncIOScheduler(timezone=str(MOSCOW_TZ))
+    global scheduler_leader
+    scheduler_leader = leader
+    if leader is not None:
+        scheduler = AsyncIOScheduler(timezone=str(MOSCOW_TZ), job_defaults=LEADER_JOB_DEFAULTS)
+    else:
+        scheduler = AsyncIOScheduler(timezone=str(MOSCOW_TZ))
 
     global global_timetable_manager_instance
     global_timetable_manager_instance = manager
 
-    scheduler.add_job(evening_broadcast, "cron", hour=20, minute=0, args=[user_data_manager, manager])
+    # Рассылки идут через outbox: прогресс в БД, после рестарта постановка продолжается с чекпоинта
+    outbox = broadcast_outbox or BroadcastOutbox(
+        user_data_manager.async_session_maker,
+        redis_client,
+        pacer=BroadcastPacer(redis_client),
+        chunk_size=BROADCAST_SEND_CHUNK_SIZE,
+    )
+    # Сводки уходят пачками по слотам времени, выбранным пользователями: пик нагрузки делится между слотами.
+    # Прогноз погоды обновляется в общем кэше за 10 минут до каждого слота.
+    broadcast_args = [user_data_manager, manager, redis_client, outbox]
+    prefetch_minutes = set()
+    for broadcast, slots in ((evening_broadcast, EVENING_DIGEST_SLOTS), (morning_summary_broadcast, MORNING_DIGEST_SLOTS)):
+        for slot in slots:
+            minute = parse_hhmm(slot)
+            prefetch_minutes.add((minute - 10) % (24 * 60))
+            scheduler.add_job(
+                broadcast,
+                "cron",
+                hour=minute // 60,
+                minute=minute % 60,
+                args=broadcast_args,
+                kwargs={"slot": slot},
+                id=f"{broadcast.__name__}_{slot}",
+            )
+    for minute in sorted(prefetch_minutes):
+        scheduler.add_job(
+            prefetch_weather_forecast,
+            "cron",
+            hour=minute // 60,
+            minute=minute % 60,
+            args=[redis_client],
+            id=f"prefetch_weather_forecast_{format_slot(minute)}",
+        )
     scheduler.add_job(
-        morning_summary_broadcast,
-        "cron",
-        hour=8,
-        minute=0,
-        args=[user_data_manager, manager],
+        broadcast_outbox_tick,
+        "interval",
+        seconds=30,
+        args=[outbox],
+        next_run_time=datetime.now(MOSCOW_TZ),
+        id="broadcast_outbox_tick",
     )
+    global reminder_slot_store
+    reminder_slot_store = ReminderSlotStore(redis_client)
     scheduler.add_job(
         lesson_reminders_planner,
         "cron",
-        hour=6,
-        minute=0,
+        hour=REMINDER_PLANNER_TIME.hour,
+        minute=REMINDER_PLANNER_TIME.minute,
         args=[scheduler, user_data_manager, manager],
+        id="lesson_reminders_planner",
     )
+    # После рестарта поднимаем задачи слотов на сегодня из Redis
+    scheduler.add_job(restore_reminder_slots, "date", args=[scheduler, manager], id="restore_reminder_slots")
     scheduler.add_job(
         monitor_schedule_changes,
         "interval",
         minutes=CHECK_INTERVAL_MINUTES,
-        args=[user_data_manager, redis_client, bot],
-    )
-    scheduler.add_job(collect_db_metrics, "interval", minutes=1, args=[user_data_manager])
-    scheduler.add_job(backup_current_schedule, "cron", hour="*/6", args=[redis_client])
-    scheduler.add_job(auto_backup, "cron", hour=2, args=[redis_client])
-    scheduler.add_job(
-        handle_graduated_groups,
-        "interval",
-        minutes=10,
-        args=[user_data_manager, manager, redis_client],
+        args=[user_data_manager, redis_client, bot, outbox],
+        id="monitor_schedule_changes",
     )
+    scheduler.add_job(collect_db_metrics, "interval", minutes=1, args=[user_data_manager], id="collect_db_metrics")
+    scheduler.add_job(backup_current_schedule, "cron", hour="*/6", args=[redis_client], id="backup_current_schedule")
+    scheduler.add_job(auto_backup, "cron", hour=2, args=[redis_client], id="auto_backup")
 
-    # Задачи для отправки отчётов администраторам
-    scheduler.add_job(send_daily_reports, "cron", hour=9, minute=0, args=[bot, user_data_manager])  # Ежедневно в 9:00
+    # Задачи для отправки отчётов администраторам. Разнесены на несколько минут, чтобы в понедельник
+    # и 1-го числа отчёты не собирались одновременно
+    scheduler.add_job(
+        send_daily_reports, "cron", hour=9, minute=0, args=[bot, user_data_manager], id="send_daily_reports"
+    )  # Ежедневно в 9:00
     scheduler.add_job(
         send_weekly_reports,
         "cron",
         hour=9,
-        minute=0,
+        minute=5,
         day_of_week="mon",
         args=[bot, user_data_manager],
-    )  # Еженедельно по понедельникам в 9:00
+        id="send_weekly_reports",
+    )  # Еженедельно по понедельникам в 9:05
     scheduler.add_job(
         send_monthly_reports,
         "cron",
         hour=9,
-        minute=0,
+        minute=10,
         day=1,
         args=[bot, user_data_manager],
-    )  # Ежемесячно 1-го числа в 9:00
+        id="send_monthly_reports",
+    )  # Ежемесячно 1-го числа в 9:10
 
     # Дополнительные задания можно включать через флаг окружения (по умолчанию выключены для облегчения нагрузки и совместимости с тестами)
     if os.getenv("ENABLE_IMAGE_CACHE_JOBS", "0") in ("1", "true", "True"):
         # Ежечасная очистка устаревших изображений из кэша
-        scheduler.add_job(cleanup_image_cache, "cron", minute=5, args=[redis_client])
+        scheduler.add_job(cleanup_image_cache, "cron", minute=5, args=[redis_client], id="cleanup_image_cache")
+
+    # Длительность, опоздания, пропуски и наложения запусков по каждой задаче
+    telemetry = SchedulerTelemetry().install(scheduler)
+
+    if leader is not None:
+        # Перед запуском задача сверяет аренду в Redis, поэтому бывший лидер после паузы её пропустит
+        for job in scheduler.get_jobs():
+            job.modify(func=leader_only(leader, job.func))
+        # Резервная реплика держит планировщик на паузе; новый лидер поднимает задачи на сегодня
+        leader.on_elected = lambda: on_leader_elected(scheduler, user_data_manager, manager, telemetry)
+        leader.on_demoted = scheduler.pause
 
     return scheduler
@@ -3,7 +3,7 @@ import logging
 import os
 import threading
 import time
-from typing import Any, Dict
+from typing import Any, Dict, List, Tuple
 
 import dramatiq
 from aiogram import Bot
@@ -24,19 +24,25 @@ except Exception:
 
 
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.types import FSInputFile, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto
-from aiolimiter import AsyncLimiter
 from dotenv import load_dotenv
 from dramatiq.brokers.rabbitmq import RabbitmqBroker
 from dramatiq.encoder import JSONEncoder
 from redis import asyncio as redis
 
+from bot import worker_runtime
 from bot.text_formatters import generate_reminder_text
 from bot.utils.image_compression import get_telegram_safe_image_path
-from core.config import MEDIA_PATH, SUBSCRIPTION_CHANNEL
+from bot.worker_lanes import BULK, INTERACTIVE, LEGACY_DEFAULT, TIME_CRITICAL, QueueWaitMiddleware, lane
+from bot.worker_resources import WorkerResources, WorkerResourcesMiddleware
+from core.config import MEDIA_PATH, REDIS_BROADCAST_ACKS_KEY, SUBSCRIPTION_CHANNEL, TELEGRAM_API_BASE_URL
 from core.image_cache_manager import ImageCacheManager
 from core.image_generator import generate_schedule_image
 from core.image_service import ImageService
+from core.metrics import BROADCAST_BATCH_RECIPIENTS
+from core.send_rate_limiter import SendRateLimiter
 from core.user_data import UserDataManager
 
 load_dotenv()
@@ -48,6 +54,7 @@ def get_redis_client(decode_responses: bool = False):
 
     Важно: не переиспользуем глобальные пулы между потоками/лупами Dramatiq,
     чтобы избежать ошибок вида "Future attached to a different loop".
+    Задачи берут клиент через реестр `resources`: один клиент на loop рабочего потока.
     """
     return redis.Redis.from_url(
         redis_url,
@@ -200,40 +207,69 @@ if not BOT_TOKEN:
     raise RuntimeError("BOT_TOKEN не найден. Воркер не может работать.")
 
 # Для обратной совместимости с тестами, которые патчат BOT_INSTANCE
-BOT_INSTANCE = None  # Не используется напрямую; бот создаётся внутри задач
-rate_limiter = AsyncLimiter(25, 1)
+BOT_INSTANCE = None  # Не используется напрямую; бот берётся из среды выполнения потока
 
 
-async def _send_message(user_id: int, text: str, max_retries: int = 3):
-    """Enhanced message sending with connection error handling."""
+def _create_bot() -> Bot:
+    session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_BASE_URL)) if TELEGRAM_API_BASE_URL else None
+    return Bot(token=BOT_TOKEN, session=session, default=DefaultBotProperties(parse_mode="HTML"))
+
+
+def _bot_session():
+    """Общий Bot рабочего потока (одна aiohttp-сессия на поток) или временный Bot вне воркера."""
+    return worker_runtime.bot_session(_create_bot)
+
+
+def _create_user_data_manager() -> UserDataManager:
+    return UserDataManager(db_url=os.getenv("DATABASE_URL") or "", redis_url=redis_url)
+
+
+# Redis-клиенты и UserDataManager (движок БД) переиспользуются задачами процесса воркера
+resources = WorkerResources(get_redis_client, _create_user_data_manager)
+
+# Общий для всех процессов и контейнеров воркера лимит отправки (бот целиком и каждый чат) и пауза после 429
+rate_limiter = SendRateLimiter(lambda: resources.redis())
+
+# Каждый рабочий поток получает свой долгоживущий event loop и Bot, акторы выполняются в нём
+rabbitmq_broker.add_middleware(worker_runtime.WorkerRuntimeMiddleware(_create_bot))
+rabbitmq_broker.add_middleware(WorkerResourcesMiddleware(resources))
+# Время ожидания в очереди по полосам (интерактивная, срочная, массовая)
+rabbitmq_broker.add_middleware(QueueWaitMiddleware())
+# Дочитываем сообщения, поставленные в default до разделения на полосы (акторы находятся по имени)
+rabbitmq_broker.declare_queue(LEGACY_DEFAULT)
+
+
+async def _send_message(user_id: int, text: str, max_retries: int = 3) -> bool:
+    """Enhanced message sending with connection error handling.
+
+    Returns False, если пользователь заблокировал бота и сообщение не доставлено.
+    """
     last_exception = None
 
     for attempt in range(max_retries):
         try:
             log.info(f"Попытка отправки сообщения пользователю {user_id} (попытка {attempt + 1}/{max_retries})")
-            # Создаём экземпляр бота в рамках текущего event loop,
-            # чтобы избежать ошибок повторного использования закрытого лупа/сессии
-            bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode="HTML"))
-            async with bot:
-                async with rate_limiter:
+            async with _bot_session() as bot:
+                async with rate_limiter.chat(user_id):
                     await bot.send_message(user_id, text, disable_web_page_preview=True)
             log.info(f"Сообщение успешно отправлено пользователю {user_id}")
-            return  # Success, exit retry loop
+            return True  # Success, exit retry loop
 
         except TelegramForbiddenError as e:
             # Пользователь заблокировал бота — не ретраем, просто фиксируем
             log.info(f"User {user_id} blocked the bot. Skipping send.")
-            return
+            return False
         except TelegramBadRequest as e:
             # Частые кейсы, которые не нужно ретраить, например 'bot was blocked by the user'
             text_error = str(e)
             if "bot was blocked by the user" in text_error.lower():
                 log.info(f"User {user_id} blocked the bot (BadRequest). Skipping send.")
-                return
+                return False
             log.error(f"BadRequest sending to {user_id}: {e}")
             raise
         except RetryAfter as e:
-            # Рейт-лимит от Telegram: пробросим исключение, чтобы сработал dramatiq retry/backoff
+            # Рейт-лимит от Telegram: rate_limiter.chat уже поставил общую паузу всем воркерам,
+            # пробросим исключение, чтобы сработал dramatiq retry/backoff
             log.warning(f"RetryAfter while sending to {user_id}: {e}")
             raise
         except (ConnectionError, TimeoutError, asyncio.TimeoutError) as e:
@@ -255,32 +291,192 @@ async def _send_message(user_id: int, text: str, max_retries: int = 3):
         raise last_exception
 
 
-async def _copy_message(user_id: int, from_chat_id: int, message_id: int):
+async def _copy_message(user_id: int, from_chat_id: int, message_id: int) -> bool:
     try:
         log.info(f"Попытка копирования сообщения (ID: {message_id}) пользователю {user_id}")
-        bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode="HTML"))
-        async with bot:
-            async with rate_limiter:
+        async with _bot_session() as bot:
+            async with rate_limiter.chat(user_id):
                 await bot.copy_message(chat_id=user_id, from_chat_id=from_chat_id, message_id=message_id)
         log.info(f"Сообщение (ID: {message_id}) успешно скопировано пользователю {user_id}")
+        return True
     except TelegramForbiddenError as e:
         log.info(f"User {user_id} has blocked the bot: {e}. Skipping further attempts.")
+        return False
     except Exception as e:
         log.error(f"Dramatiq task FAILED to copy message (ID: {message_id}) to {user_id}: {e}")
         raise
 
 
-@dramatiq.actor
-def send_message_task(user_id: int, text: str):
-    asyncio.run(_send_message(user_id, text))
+async def _ack_delivery(delivery_id: int | None, ok: bool):
+    """Подтверждает доставку рассылки из outbox: бот перенесёт подтверждение в БД."""
+    if delivery_id is None:
+        return
+    await _ack_deliveries([(delivery_id, ok)])
+
+
+async def _ack_deliveries(acks: List[Tuple[int, bool]]):
+    """Подтверждает несколько доставок одним запросом к Redis."""
+    if not acks:
+        return
+    try:
+        values = [f"{delivery_id}:{1 if ok else 0}" for delivery_id, ok in acks]
+        await resources.redis().rpush(REDIS_BROADCAST_ACKS_KEY, *values)
+    except Exception as e:
+        log.error(f"Не удалось подтвердить доставки {[delivery_id for delivery_id, _ in acks]}: {e}")
+
+
+async def _mark_blocked(user_ids: List[int]):
+    """Отмечает заблокировавших бота: следующие рассылки их не выбирают, пока они снова не напишут боту."""
+    if not user_ids:
+        return
+    try:
+        marked = await resources.user_data().mark_users_blocked(user_ids)
+        if marked:
+            log.info(f"Отмечено заблокировавших бота пользователей: {marked}")
+    except Exception as e:
+        log.error(f"Не удалось отметить заблокировавших бота пользователей {user_ids}: {e}")
+
+
+@dramatiq.actor(**lane(BULK))
+def broadcast_delivery_failed_task(message_data: Dict[str, Any], retry_info: Dict[str, Any]):
+    """Вызывается Dramatiq, когда ретраи доставки исчерпаны: отмечаем доставку как неудачную."""
+    delivery_id = (message_data.get("kwargs") or {}).get("delivery_id")
+    if delivery_id is not None:
+        log.error(f"Доставка рассылки {delivery_id} не удалась после {retry_info.get('retries')} попыток")
+        worker_runtime.run(_ack_delivery(delivery_id, False))
+
+
+@dramatiq.actor(**lane(BULK), on_retry_exhausted="broadcast_delivery_failed_task")
+def send_message_task(user_id: int, text: str, delivery_id: int | None = None):
+    async def _inner():
+        delivered = await _send_message(user_id, text)
+        await _ack_delivery(delivery_id, delivered is not False)
+        if delivered is False:
+            await _mark_blocked([user_id])
+
+    worker_runtime.run(_inner())
+
+
+@dramatiq.actor(
+    **lane(BULK), max_retries=5, min_backoff=1000, time_limit=30000, on_retry_exhausted="broadcast_delivery_failed_task"
+)
+def send_broadcast_text_task(user_id: int, text_key: str, delivery_id: int | None = None):
+    """Доставляет текст рассылки, отрендеренный один раз и сохранённый в Redis по ключу."""
+
+    async def _inner():
+        text = await resources.redis().get(text_key)
+        if not text:
+            log.error(f"Текст рассылки {text_key} не найден (истёк TTL?), сообщение для {user_id} не отправлено")
+            await _ack_delivery(delivery_id, False)
+            return
+        delivered = await _send_message(user_id, text)
+        await _ack_delivery(delivery_id, delivered is not False)
+        if delivered is False:
+            await _mark_blocked([user_id])
+
+    worker_runtime.run(_inner())
 
 
-@dramatiq.actor(max_retries=5, min_backoff=1000, time_limit=30000)
-def copy_message_task(user_id: int, from_chat_id: int, message_id: int):
-    asyncio.run(_copy_message(user_id, from_chat_id, message_id))
+@dramatiq.actor(
+    **lane(BULK), max_retries=5, min_backoff=1000, time_limit=30000, on_retry_exhausted="broadcast_delivery_failed_task"
+)
+def copy_message_task(user_id: int, from_chat_id: int, message_id: int, delivery_id: int | None = None):
+    async def _inner():
+        delivered = await _copy_message(user_id, from_chat_id, message_id)
+        await _ack_delivery(delivery_id, delivered is not False)
+        if delivered is False:
+            await _mark_blocked([user_id])
+
+    worker_runtime.run(_inner())
 
 
-@dramatiq.actor(max_retries=5, min_backoff=1000, time_limit=30000)
+def _retry_individually(
+    delivery_id: int,
+    user_id: int,
+    text_key: str | None,
+    text: str | None,
+    from_chat_id: int | None,
+    message_id: int | None,
+):
+    """Ставит одного получателя пачки в обычную задачу доставки (со своими ретраями и подтверждением)."""
+    if message_id is not None:
+        copy_message_task.send(user_id, from_chat_id, message_id, delivery_id=delivery_id)
+    elif text_key:
+        send_broadcast_text_task.send(user_id, text_key, delivery_id=delivery_id)
+    else:
+        send_message_task.send(user_id, text, delivery_id=delivery_id)
+
+
+@dramatiq.actor(**lane(BULK), max_retries=0, time_limit=300000)
+def send_broadcast_batch_task(
+    recipients: List[List[int]],
+    text_key: str | None = None,
+    text: str | None = None,
+    from_chat_id: int | None = None,
+    message_id: int | None = None,
+):
+    """
+    Доставляет рассылку пачке получателей [[id доставки, user_id], ...] в одной сессии бота.
+
+    Содержимое — ключ текста в Redis, сам текст или сообщение для копирования. Каждый получатель
+    подтверждается отдельно. Целиком пачка не ретраится (иначе уже получившие сообщение получили бы его
+    снова): получатель с временной ошибкой уходит в обычную задачу доставки, при 429 остаток пачки
+    переставляется в очередь с задержкой retry_after.
+    """
+
+    async def _inner():
+        payload = text
+        if message_id is None and text_key:
+            payload = await resources.redis().get(text_key)
+            if not payload:
+                log.error(f"Текст рассылки {text_key} не найден (истёк TTL?), пачка из {len(recipients)} не отправлена")
+                BROADCAST_BATCH_RECIPIENTS.labels(outcome="failed").inc(len(recipients))
+                await _ack_deliveries([(delivery_id, False) for delivery_id, _ in recipients])
+                return
+
+        acks: List[Tuple[int, bool]] = []
+        blocked: List[int] = []
+        try:
+            for index, (delivery_id, user_id) in enumerate(recipients):
+                try:
+                    if message_id is not None:
+                        delivered = await _copy_message(user_id, from_chat_id, message_id)
+                    else:
+                        delivered = await _send_message(user_id, payload)
+                except RetryAfter as e:
+                    rest = recipients[index:]
+                    delay_ms = int(getattr(e, "retry_after", 1) * 1000)
+                    log.warning(f"Рассылка: 429 от Telegram, {len(rest)} получателей пачки отложены на {delay_ms} мс")
+                    send_broadcast_batch_task.send_with_options(
+                        args=(rest,),
+                        kwargs={"text_key": text_key, "text": text, "from_chat_id": from_chat_id, "message_id": message_id},
+                        delay=delay_ms,
+                    )
+                    BROADCAST_BATCH_RECIPIENTS.labels(outcome="deferred").inc(len(rest))
+                    break
+                except TelegramBadRequest as e:
+                    # Постоянная ошибка (чат не найден и т.п.): повтор не поможет
+                    log.error(f"Рассылка: получатель {user_id} отклонён Telegram: {e}")
+                    acks.append((delivery_id, False))
+                    BROADCAST_BATCH_RECIPIENTS.labels(outcome="failed").inc()
+                    continue
+                except Exception as e:
+                    log.warning(f"Рассылка: не удалось отправить {user_id} в пачке, повторим отдельно: {e}")
+                    _retry_individually(delivery_id, user_id, text_key, text, from_chat_id, message_id)
+                    BROADCAST_BATCH_RECIPIENTS.labels(outcome="retried").inc()
+                    continue
+                acks.append((delivery_id, delivered is not False))
+                BROADCAST_BATCH_RECIPIENTS.labels(outcome="sent" if delivered is not False else "blocked").inc()
+                if delivered is False:
+                    blocked.append(user_id)
+        finally:
+            await _ack_deliveries(acks)
+            await _mark_blocked(blocked)
+
+    worker_runtime.run(_inner())
+
+
+@dramatiq.actor(**lane(TIME_CRITICAL), max_retries=5, min_backoff=1000, time_limit=30000)
 def send_lesson_reminder_task(
     user_id: int,
     lesson: Dict[str, Any] | None,
@@ -291,12 +487,12 @@ def send_lesson_reminder_task(
     async def _inner():
         try:
             text_to_send = generate_reminder_text(lesson, reminder_type, break_duration, reminder_time_minutes)
-            if text_to_send:
-                await _send_message(user_id, text_to_send)
+            if text_to_send and await _send_message(user_id, text_to_send) is False:
+                await _mark_blocked([user_id])
         except Exception as e:
             log.error(f"Dramatiq task send_lesson_reminder_task FAILED to prepare reminder for {user_id}: {e}")
 
-    asyncio.run(_inner())
+    worker_runtime.run(_inner())
 
 
 # Семафор для ограничения количества одновременных задач генерации изображений
@@ -304,7 +500,7 @@ def send_lesson_reminder_task(
 _generation_semaphore = threading.Semaphore(int(os.getenv("IMAGE_GENERATION_SEMAPHORE", "4")))  # Оптимизировано для 4 ядер
 
 
-@dramatiq.actor(max_retries=3, min_backoff=2000, time_limit=300000)
+@dramatiq.actor(**lane(INTERACTIVE), max_retries=3, min_backoff=2000, time_limit=300000)
 def generate_week_image_task(
     cache_key: str,
     week_schedule: Dict[str, Any],
@@ -322,17 +518,12 @@ def generate_week_image_task(
             log.info(f"🎨 [{'АВТО' if is_auto_generation else 'USER'}] Генерация изображения для {cache_key} (семафор получен)")
 
             try:
-                redis_client = get_redis_client(decode_responses=False)
-                cache_manager = ImageCacheManager(redis_client, cache_ttl_hours=192)
-                # Создаём бота в текущем лупе только если он действительно понадобится
-                bot_for_images: Bot | None = None
-                if not is_auto_generation:
-                    bot_for_images = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode="HTML"))
-                image_service = ImageService(cache_manager, bot_for_images)
-
+                cache_manager = ImageCacheManager(resources.redis(decode_responses=False), cache_ttl_hours=192)
                 week_key = cache_key.split("_")[-1]
 
                 if is_auto_generation:
+                    # Автогенерации бот не нужен: изображение только кладётся в кэш
+                    image_service = ImageService(cache_manager, None)
                     success, _ = await image_service._generate_and_cache_image(
                         cache_key, week_schedule, week_name, group, generated_by="mass"
                     )
@@ -341,16 +532,13 @@ def generate_week_image_task(
                     else:
                         log.error(f"❌ [АВТО] Не удалось сгенерировать изображение {cache_key}")
                 else:
-                    # Используем контекстный менеджер для корректного закрытия сессии бота
-                    assert bot_for_images is not None
-                    async with bot_for_images:
+                    async with _bot_session() as bot_for_images:
+                        image_service = ImageService(cache_manager, bot_for_images)
                         # Вычисляем тему пользователя, если доступен user_id
                         user_theme = None
                         try:
                             if user_id is not None:
-                                db_url = os.getenv("DATABASE_URL")
-                                udm = UserDataManager(db_url=db_url or "", redis_url=redis_url)
-                                user_theme = await udm.get_user_theme(user_id)
+                                user_theme = await resources.user_data().get_user_theme(user_id)
                         except Exception:
                             user_theme = None
                         success, _ = await image_service.get_or_generate_week_image(
@@ -369,16 +557,8 @@ def generate_week_image_task(
                 log.error(f"❌ generate_week_image_task failed: {e}")
                 if not is_auto_generation and user_id:
                     await _send_error_message(user_id, "Произошла ошибка при генерации")
-            finally:
-                if "redis_client" in locals():
-                    try:
-                        aclose = getattr(redis_client, "aclose", None)
-                        if aclose and asyncio.iscoroutinefunction(aclose):
-                            await aclose()
-                    except Exception:
-                        pass
 
-    asyncio.run(_inner())
+    worker_runtime.run(_inner())
 
 
 async def _send_error_message(user_id: int, error_text: str):
@@ -392,7 +572,7 @@ async def _send_error_message(user_id: int, error_text: str):
         log.error(f"❌ Не удалось отправить сообщение об ошибке пользователю {user_id}: {e}")
 
 
-@dramatiq.actor(max_retries=3, min_backoff=1500, time_limit=30000)
+@dramatiq.actor(**lane(INTERACTIVE), max_retries=3, min_backoff=1500, time_limit=30000)
 def check_theme_subscription_task(user_id: int, callback_data: str = None):
     """
     Проверяет подписку пользователя на канал для доступа к темам.
@@ -401,9 +581,8 @@ def check_theme_subscription_task(user_id: int, callback_data: str = None):
 
     async def _inner():
         try:
-            r = get_redis_client(decode_responses=True)
-            bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode="HTML"))
-            async with bot:
+            r = resources.redis()
+            async with _bot_session() as bot:
                 is_subscribed = False
                 cache_key = f"theme_sub_status:{user_id}"
                 try:
@@ -477,16 +656,15 @@ def check_theme_subscription_task(user_id: int, callback_data: str = None):
         except Exception as e:
             log.error(f"❌ check_theme_subscription_task failed: {e}")
 
-    asyncio.run(_inner())
+    worker_runtime.run(_inner())
 
 
-@dramatiq.actor(max_retries=3, min_backoff=1500, time_limit=60000)
+@dramatiq.actor(**lane(INTERACTIVE), max_retries=3, min_backoff=1500, time_limit=60000)
 def send_week_original_if_subscribed_task(user_id: int, group: str, week_key: str):
     async def _inner():
         try:
-            r = get_redis_client(decode_responses=True)
-            bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode="HTML"))
-            async with bot:
+            r = resources.redis()
+            async with _bot_session() as bot:
                 is_subscribed = False
                 cache_key = f"sub_status:{user_id}"
                 try:
@@ -541,4 +719,4 @@ def send_week_original_if_subscribed_task(user_id: int, group: str, week_key: st
         except Exception as e:
             log.error(f"send_week_original_if_subscribed_task failed: {e}")
 
-    asyncio.run(_inner())
+    worker_runtime.run(_inner())
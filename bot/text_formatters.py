@@ -1,10 +1,11 @@
 import logging
 import random
-from datetime import date, datetime, time, timedelta
+from datetime import date, datetime, timedelta
 from typing import Any, Dict, List, Optional, Tuple
 
 from core.config import MOSCOW_TZ
 from core.semester_settings import SemesterSettingsManager
+from core.timeline import DayTimeline
 
 
 async def calculate_semester_week_number(target_date: date, session_factory) -> int:
@@ -276,6 +277,42 @@ def format_classroom_schedule_text(schedule_info: dict) -> str:
     return header + "\n\n".join(lesson_parts)
 
 
+def format_subject_search_text(query: str, results: list, max_slots: int = 12) -> str:
+    """Форматирует результаты поиска предмета по всем группам."""
+    if not results:
+        return f"❌ По запросу «{query}» предметы не найдены."
+
+    day_short = {
+        "Понедельник": "Пн",
+        "Вторник": "Вт",
+        "Среда": "Ср",
+        "Четверг": "Чт",
+        "Пятница": "Пт",
+        "Суббота": "Сб",
+    }
+    week_labels = {"0": "", "1": " (нечёт.)", "2": " (чёт.)"}
+
+    parts = [f"📚 <b>Поиск предмета:</b> {query}"]
+    for result in results:
+        # Сворачиваем занятия с одинаковым днём/временем/неделей в одну строку со списком групп
+        slots: dict[tuple, list[str]] = {}
+        for occ in result.get("occurrences", []):
+            slot_key = (occ.get("day", ""), occ.get("time", ""), occ.get("week_code", "0"))
+            groups = slots.setdefault(slot_key, [])
+            if occ.get("group") not in groups:
+                groups.append(occ.get("group"))
+
+        lines = [f"\n<b>{result.get('subject', 'Предмет не указан')}</b>"]
+        for (day, time_str, week_code), groups in list(slots.items())[:max_slots]:
+            day_str = day_short.get(day, day)
+            lines.append(f"• {day_str} {time_str}{week_labels.get(week_code, '')}: {', '.join(groups)}")
+        if len(slots) > max_slots:
+            lines.append(f"<i>… и ещё {len(slots) - max_slots}</i>")
+        parts.append("\n".join(lines))
+
+    return "\n".join(parts)
+
+
 def format_full_week_text(week_schedule: dict, week_name: str) -> str:
     """Форматирует текст расписания на всю неделю с корректной сортировкой пар."""
     days_order = ["ПОНЕДЕЛЬНИК", "ВТОРНИК", "СРЕДА", "ЧЕТВЕРГ", "ПЯТНИЦА", "СУББОТА"]
@@ -328,8 +365,12 @@ def format_full_week_text(week_schedule: dict, week_name: str) -> str:
 # --- ДИНАМИЧЕСКИЕ ЗАГОЛОВКИ ---
 
 
-def generate_dynamic_header(lessons: list, target_date: date) -> tuple[str, str]:
-    """Генерирует контекстный заголовок и прогресс-бар."""
+def generate_dynamic_header(lessons: list, target_date: date, timeline: DayTimeline | None = None) -> tuple[str, str]:
+    """Генерирует контекстный заголовок и прогресс-бар.
+
+    Если передан готовый таймлайн дня (например, из TimetableManager.get_day_timeline),
+    время пар повторно не разбирается.
+    """
     is_today = target_date == datetime.now(MOSCOW_TZ).date()
 
     if is_today and not lessons:
@@ -339,63 +380,50 @@ def generate_dynamic_header(lessons: list, target_date: date) -> tuple[str, str]
         return "", ""
 
     try:
-        sorted_lessons = sorted(
-            lessons,
-            key=lambda x: datetime.strptime(x["start_time_raw"], "%H:%M").time(),
-        )
-        now_time = datetime.now(MOSCOW_TZ).time()
-
-        MORNING_START_TIME = time(5, 0)
-
-        passed_lessons_count = sum(
-            1 for lesson in sorted_lessons if now_time > datetime.strptime(lesson["end_time_raw"], "%H:%M").time()
-        )
-        total_lessons = len(sorted_lessons)
+        timeline = timeline or DayTimeline.from_lessons(lessons)
+        now = datetime.now(MOSCOW_TZ)
+        now_minutes = now.hour * 60 + now.minute + now.second / 60
+
+        MORNING_START_MINUTES = 5 * 60
+
+        status = timeline.status_at(now_minutes)
+        passed_lessons_count = status.passed
+        total_lessons = status.total
         progress_bar_emojis = "🟩" * passed_lessons_count + "⬜️" * (total_lessons - passed_lessons_count)
         progress_bar = f"<i>Прогресс дня: {passed_lessons_count}/{total_lessons}</i> {progress_bar_emojis}\n"
 
-        first_lesson_start = datetime.strptime(sorted_lessons[0]["start_time_raw"], "%H:%M").time()
-        last_lesson_end = datetime.strptime(sorted_lessons[-1]["end_time_raw"], "%H:%M").time()
-
         def get_safe_times(time_str: str) -> tuple[str, str]:
             time_str_unified = time_str.replace("–", "-").replace("—", "-")
             parts = [p.strip() for p in time_str_unified.split("-")]
             return (parts[0], parts[1]) if len(parts) >= 2 else (parts[0] if parts else "", "")
 
-        if now_time < MORNING_START_TIME:
+        if now_minutes < MORNING_START_MINUTES:
             return "🌙 <b>Поздняя ночь.</b> Скоро утро!", progress_bar
 
-        if now_time < first_lesson_start:
-            start_time_str, _ = get_safe_times(sorted_lessons[0]["time"])
+        if status.state == "before":
+            start_time_str, _ = get_safe_times(status.next["time"])
             return (
                 f"☀️ <b>Доброе утро!</b> Первая пара в {start_time_str}.",
                 progress_bar,
             )
 
-        if now_time > last_lesson_end:
+        if status.state == "finished":
             return "✅ <b>Пары на сегодня закончились.</b> Отдыхайте!", progress_bar
 
-        for i, lesson in enumerate(sorted_lessons):
-            start_time = datetime.strptime(lesson["start_time_raw"], "%H:%M").time()
-            end_time = datetime.strptime(lesson["end_time_raw"], "%H:%M").time()
-            _, lesson_end_time_str = get_safe_times(lesson["time"])
-
-            if start_time <= now_time <= end_time:
-                end_text = f"Закончится в {lesson_end_time_str}." if lesson_end_time_str else ""
-                return (
-                    f"⏳ <b>Идет пара:</b> {lesson['subject']}.\n{end_text}",
-                    progress_bar,
-                )
+        if status.state == "lesson":
+            _, lesson_end_time_str = get_safe_times(status.current["time"])
+            end_text = f"Закончится в {lesson_end_time_str}." if lesson_end_time_str else ""
+            return (
+                f"⏳ <b>Идет пара:</b> {status.current['subject']}.\n{end_text}",
+                progress_bar,
+            )
 
-            if i + 1 < len(sorted_lessons):
-                next_lesson = sorted_lessons[i + 1]
-                next_start_time_obj = datetime.strptime(next_lesson["start_time_raw"], "%H:%M").time()
-                next_start_time_str, _ = get_safe_times(next_lesson["time"])
-                if end_time < now_time < next_start_time_obj:
-                    return (
-                        f"☕️ <b>Перерыв до {next_start_time_str}.</b>\nСледующая пара: {next_lesson['subject']}.",
-                        progress_bar,
-                    )
+        if status.state == "break":
+            next_start_time_str, _ = get_safe_times(status.next["time"])
+            return (
+                f"☕️ <b>Перерыв до {next_start_time_str}.</b>\nСледующая пара: {status.next['subject']}.",
+                progress_bar,
+            )
 
         return "", progress_bar
     except (ValueError, IndexError, KeyError) as e:
@@ -0,0 +1,59 @@
+"""
+Полосы (lanes) очередей Dramatiq: интерактивная, срочная и массовая работа воркера.
+
+Раньше все акторы жили в очереди default, и рассылка на 10 000 получателей задерживала и
+generate_week_image_task (пользователь смотрит на «генерирую…»), и напоминания о парах.
+Теперь у каждой полосы своя очередь RabbitMQ и свой пул воркеров (отдельный сервис в
+docker-compose со своими --processes/--threads), поэтому массовая отправка не занимает потоки
+интерактивных задач, а очередь рассылки не стоит перед ними в RabbitMQ.
+
+Приоритет актора действует, когда один процесс слушает несколько полос (локальный запуск
+`dramatiq bot.tasks` без --queues): из уже полученных сообщений первыми выполняются
+интерактивные, затем срочные, затем массовые.
+
+QueueWaitMiddleware меряет время ожидания сообщения в очереди полосы: от последней постановки в
+неё до начала выполнения. Отложенные сообщения и ретраи воркер ставит в очередь заново, когда
+подходит их время, поэтому задержка не считается ожиданием.
+
+Переход: очередь default объявляется и дочитывается массовым воркером (`--queues bulk default`),
+чтобы сообщения, поставленные до обновления, не остались без потребителя.
+"""
+
+from typing import Any, Dict
+
+from dramatiq.common import current_millis, q_name
+from dramatiq.middleware import Middleware
+
+from core.metrics import WORKER_QUEUE_WAIT
+
+# Пользователь ждёт ответа прямо сейчас: картинки расписания, проверка подписки
+INTERACTIVE = "interactive"
+# Привязано ко времени: напоминания о парах
+TIME_CRITICAL = "time_critical"
+# Массовая отправка: рассылки, сводки, копирование сообщений администратора
+BULK = "bulk"
+
+# Очередь, в которой жили все акторы до разделения на полосы. Сообщения, поставленные в неё старой
+# версией, дочитывает массовый воркер; после релиза, когда очередь опустеет, её можно убрать
+LEGACY_DEFAULT = "default"
+
+# Меньше — раньше (приоритет актора Dramatiq)
+LANE_PRIORITIES = {INTERACTIVE: 0, TIME_CRITICAL: 10, BULK: 100}
+
+
+def lane(name: str) -> Dict[str, Any]:
+    """Параметры актора для полосы: `@dramatiq.actor(**lane(BULK), max_retries=...)`."""
+    return {"queue_name": name, "priority": LANE_PRIORITIES[name]}
+
+
+class QueueWaitMiddleware(Middleware):
+    """Наблюдает время ожидания сообщений в очереди по полосам."""
+
+    def before_enqueue(self, broker, message, delay):
+        # Вызывается и при первой постановке, и когда воркер возвращает отложенное сообщение в очередь
+        message.options["enqueued_at"] = current_millis() + (delay or 0)
+
+    def before_process_message(self, broker, message):
+        enqueued_at = message.options.get("enqueued_at", message.message_timestamp)
+        wait = max(0, current_millis() - enqueued_at) / 1000
+        WORKER_QUEUE_WAIT.labels(lane=q_name(message.queue_name)).observe(wait)
@@ -0,0 +1,166 @@
+"""
+Реестр ресурсов процесса воркера Dramatiq: Redis-клиенты и UserDataManager (движок SQLAlchemy с пулом).
+
+Раньше задачи создавали Redis-клиент на каждое сообщение, а generate_week_image_task — ещё и
+UserDataManager, то есть новый движок и пул соединений с БД, только чтобы прочитать тему пользователя.
+Реестр создаёт ресурсы лениво при первом обращении и переиспользует их между задачами процесса.
+
+Асинхронные драйверы (redis.asyncio, asyncpg) привязывают соединения к event loop, в котором они
+созданы, а у каждого рабочего потока свой loop (bot/worker_runtime.py). Поэтому внутри процесса
+ресурсы разделены по loop: у рабочего потока один Redis-клиент на режим декодирования и один
+UserDataManager, и закрываются они вместе с loop потока. Для loop вне рабочих потоков (тесты,
+прямой вызов функции актора) ресурсы живут, пока жив сам loop.
+
+WorkerResourcesMiddleware сбрасывает реестр при старте процесса, закрывает оставшееся при его
+остановке и после каждого сообщения обновляет метрики числа соединений.
+"""
+
+import asyncio
+import logging
+import threading
+import weakref
+from typing import Callable, Dict, Optional
+
+from dramatiq.middleware import Middleware
+from redis.asyncio import Redis
+
+from bot import worker_runtime
+from core.metrics import WORKER_DB_CONNECTIONS, WORKER_REDIS_CONNECTIONS, WORKER_RESOURCES_CREATED
+from core.user_data import UserDataManager
+
+logger = logging.getLogger(__name__)
+
+RedisFactory = Callable[[bool], Redis]
+UserDataFactory = Callable[[], UserDataManager]
+
+
+class _LoopResources:
+    """Ресурсы одного event loop."""
+
+    def __init__(self):
+        self.redis: Dict[bool, Redis] = {}
+        self.user_data: Optional[UserDataManager] = None
+
+    async def aclose(self):
+        for client in self.redis.values():
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"Ошибка при закрытии Redis-клиента воркера: {e}")
+        self.redis.clear()
+        if self.user_data is not None:
+            await self.user_data.close()
+            self.user_data = None
+
+
+def _pool_counts(pool) -> tuple[int, int]:
+    """(занято, свободно) в пуле SQLAlchemy или redis-py; пулы без учёта соединений дают нули."""
+    if hasattr(pool, "checkedout"):
+        return pool.checkedout(), pool.checkedin()
+    in_use = getattr(pool, "_in_use_connections", ())
+    available = getattr(pool, "_available_connections", ())
+    return len(in_use), len(available)
+
+
+class WorkerResources:
+    """Лениво создаваемые Redis-клиенты и UserDataManager процесса воркера (по одному набору на event loop)."""
+
+    def __init__(self, redis_factory: RedisFactory, user_data_factory: UserDataFactory):
+        self.redis_factory = redis_factory
+        self.user_data_factory = user_data_factory
+        self._lock = threading.Lock()
+        self._by_loop: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopResources]" = weakref.WeakKeyDictionary()
+
+    def _current(self) -> _LoopResources:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            resources = self._by_loop.get(loop)
+            if resources is not None:
+                return resources
+            resources = self._by_loop[loop] = _LoopResources()
+        runtime = worker_runtime.current()
+        if runtime is not None and runtime.loop is loop:
+            runtime.on_close(lambda: self._release(loop))
+        return resources
+
+    def redis(self, decode_responses: bool = True) -> Redis:
+        """Общий Redis-клиент текущего event loop."""
+        resources = self._current()
+        client = resources.redis.get(decode_responses)
+        if client is None:
+            client = resources.redis[decode_responses] = self.redis_factory(decode_responses)
+            WORKER_RESOURCES_CREATED.labels(resource="redis").inc()
+        return client
+
+    def user_data(self) -> UserDataManager:
+        """Общий UserDataManager (и движок БД) текущего event loop."""
+        resources = self._current()
+        if resources.user_data is None:
+            resources.user_data = self.user_data_factory()
+            WORKER_RESOURCES_CREATED.labels(resource="user_data").inc()
+        return resources.user_data
+
+    async def _release(self, loop: asyncio.AbstractEventLoop):
+        with self._lock:
+            resources = self._by_loop.pop(loop, None)
+        if resources is not None:
+            await resources.aclose()
+        self.observe()
+
+    def observe(self):
+        """Обновляет метрики соединений по всем loop процесса."""
+        with self._lock:
+            items = list(self._by_loop.values())
+        db_in_use = db_idle = redis_in_use = redis_idle = 0
+        for resources in items:
+            for client in list(resources.redis.values()):
+                in_use, idle = _pool_counts(client.connection_pool)
+                redis_in_use += in_use
+                redis_idle += idle
+            if resources.user_data is not None:
+                in_use, idle = _pool_counts(resources.user_data.engine.sync_engine.pool)
+                db_in_use += in_use
+                db_idle += idle
+        WORKER_DB_CONNECTIONS.labels(state="in_use").set(db_in_use)
+        WORKER_DB_CONNECTIONS.labels(state="idle").set(db_idle)
+        WORKER_REDIS_CONNECTIONS.labels(state="in_use").set(redis_in_use)
+        WORKER_REDIS_CONNECTIONS.labels(state="idle").set(redis_idle)
+
+    def reset(self):
+        """Забывает все ресурсы без закрытия (в новом процессе унаследованные соединения не используются)."""
+        with self._lock:
+            self._by_loop = weakref.WeakKeyDictionary()
+        self.observe()
+
+    def close(self):
+        """Закрывает ресурсы, loop которых ещё не закрыт (рабочие потоки освобождают свои сами)."""
+        with self._lock:
+            items = list(self._by_loop.items())
+            self._by_loop = weakref.WeakKeyDictionary()
+        for loop, resources in items:
+            if loop.is_closed() or loop.is_running():
+                continue
+            try:
+                loop.run_until_complete(resources.aclose())
+            except Exception as e:
+                logger.warning(f"Ошибка при закрытии ресурсов воркера: {e}")
+        self.observe()
+
+
+class WorkerResourcesMiddleware(Middleware):
+    """Связывает реестр ресурсов с жизненным циклом процесса воркера и обновляет метрики соединений."""
+
+    def __init__(self, resources: WorkerResources):
+        self.resources = resources
+
+    def after_process_boot(self, broker):
+        self.resources.reset()
+
+    def after_worker_shutdown(self, broker, worker):
+        self.resources.close()
+        logger.info("Ресурсы процесса воркера закрыты")
+
+    def after_process_message(self, broker, message, *, result=None, exception=None):
+        self.resources.observe()
+
+    after_skip_message = after_process_message
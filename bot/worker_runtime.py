@@ -0,0 +1,145 @@
+"""
+Среда выполнения асинхронного кода в акторах Dramatiq.
+
+Акторы Dramatiq синхронные, и раньше каждый из них вызывал asyncio.run и создавал новый Bot:
+на каждое сообщение — новый event loop, новая aiohttp-сессия и TLS-рукопожатие с api.telegram.org.
+Теперь у каждого рабочего потока Dramatiq свой долгоживущий event loop и общий Bot (одна сессия
+с пулом keep-alive соединений). Они создаются при старте потока (WorkerRuntimeMiddleware) и
+закрываются при его остановке, а акторы выполняют свои корутины в этом loop через run().
+
+Вне рабочих потоков (тесты, прямой вызов функции актора) run() работает как asyncio.run,
+а bot_session() открывает и закрывает временный Bot — как было до появления среды выполнения.
+"""
+
+import asyncio
+import logging
+import threading
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, TypeVar
+
+from aiogram import Bot
+from dramatiq.middleware import Middleware
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+BotFactory = Callable[[], Bot]
+
+_local = threading.local()
+
+
+class WorkerRuntime:
+    """Event loop рабочего потока и общий для его задач Bot."""
+
+    def __init__(self, bot_factory: BotFactory):
+        self.bot_factory = bot_factory
+        self.loop = asyncio.new_event_loop()
+        self._bot: Optional[Bot] = None
+        self._close_callbacks: List[Callable[[], Awaitable[None]]] = []
+
+    @property
+    def bot(self) -> Bot:
+        # Сессия aiohttp создаётся при первом запросе, уже внутри loop этого потока
+        if self._bot is None:
+            self._bot = self.bot_factory()
+        return self._bot
+
+    def on_close(self, callback: Callable[[], Awaitable[None]]):
+        """Регистрирует корутину, которая выполнится в loop потока перед его закрытием (освобождение ресурсов)."""
+        self._close_callbacks.append(callback)
+
+    def run(self, coro: Awaitable[T]) -> T:
+        """Выполняет корутину в loop потока. Прерванная задача (TimeLimit, ошибка) отменяется, loop остаётся рабочим."""
+        task = self.loop.create_task(coro)
+        try:
+            return self.loop.run_until_complete(task)
+        except BaseException:
+            if not task.done():
+                task.cancel()
+                try:
+                    self.loop.run_until_complete(task)
+                except BaseException:
+                    pass
+            raise
+
+    def close(self):
+        try:
+            for callback in reversed(self._close_callbacks):
+                try:
+                    self.loop.run_until_complete(callback())
+                except Exception as e:
+                    logger.warning(f"Ошибка при освобождении ресурсов потока {threading.current_thread().name}: {e}")
+            if self._bot is not None:
+                self.loop.run_until_complete(self._bot.session.close())
+            pending = [task for task in asyncio.all_tasks(self.loop) if not task.done()]
+            for task in pending:
+                task.cancel()
+            if pending:
+                self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+        except Exception as e:
+            logger.warning(f"Ошибка при остановке среды выполнения потока {threading.current_thread().name}: {e}")
+        finally:
+            self._bot = None
+            self._close_callbacks.clear()
+            self.loop.close()
+
+
+def current() -> Optional[WorkerRuntime]:
+    """Среда выполнения текущего потока (None — поток не является рабочим потоком воркера)."""
+    return getattr(_local, "runtime", None)
+
+
+def boot(bot_factory: BotFactory) -> WorkerRuntime:
+    """Создаёт среду выполнения для текущего потока (повторный вызов возвращает уже созданную)."""
+    runtime = current()
+    if runtime is None:
+        runtime = WorkerRuntime(bot_factory)
+        asyncio.set_event_loop(runtime.loop)
+        _local.runtime = runtime
+        logger.info(f"Среда выполнения потока {threading.current_thread().name} запущена")
+    return runtime
+
+
+def shutdown():
+    """Закрывает Bot и event loop текущего потока."""
+    runtime = current()
+    if runtime is None:
+        return
+    _local.runtime = None
+    runtime.close()
+    asyncio.set_event_loop(None)
+    logger.info(f"Среда выполнения потока {threading.current_thread().name} остановлена")
+
+
+def run(coro: Awaitable[T]) -> T:
+    """Выполняет корутину в loop рабочего потока, а вне воркера — через asyncio.run."""
+    runtime = current()
+    if runtime is None:
+        return asyncio.run(coro)
+    return runtime.run(coro)
+
+
+@asynccontextmanager
+async def bot_session(bot_factory: BotFactory) -> AsyncIterator[Bot]:
+    """Общий Bot рабочего потока; вне воркера — временный Bot, сессия которого закрывается на выходе."""
+    runtime = current()
+    if runtime is not None and runtime.loop is asyncio.get_running_loop():
+        yield runtime.bot
+        return
+    bot = bot_factory()
+    async with bot:
+        yield bot
+
+
+class WorkerRuntimeMiddleware(Middleware):
+    """Создаёт среду выполнения при старте каждого рабочего потока Dramatiq и закрывает её при остановке."""
+
+    def __init__(self, bot_factory: BotFactory):
+        self.bot_factory = bot_factory
+
+    def after_worker_thread_boot(self, broker, thread):
+        boot(self.bot_factory)
+
+    def before_worker_thread_shutdown(self, broker, thread):
+        shutdown()
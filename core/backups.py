@@ -0,0 +1,196 @@
+"""
+Файловые резервные копии (дамп БД, снапшот расписания) с адресацией по содержимому.
+
+Имя файла — «<вид>_<ГГГГММДД_ЧЧММСС>_<хеш>.<расширение>.gz», где хеш — первые 16 символов SHA-256
+несжатого содержимого. Если хеш совпал с последней копией того же вида, новая копия не сохраняется.
+После каждой копии старые удаляются по количеству и по возрасту (самая свежая остаётся всегда).
+
+Всё, что блокирует (сжатие, запись на диск, удаление файлов), выполняется вне event loop:
+вывод pg_dump читается из асинхронного подпроцесса и потоково сжимается в файл в пуле потоков.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy.engine import make_url
+
+from core.config import BACKUP_DIR, BACKUP_KEEP_COUNT, BACKUP_MAX_AGE_DAYS, MOSCOW_TZ
+from core.metrics import BACKUP_DURATION, BACKUP_RUNS, BACKUP_SIZE_BYTES
+from core.schedule_history import content_hash
+
+logger = logging.getLogger(__name__)
+
+BACKUP_NAME_RE = re.compile(r"^(?P<kind>[a-z_]+)_(?P<stamp>\d{8}_\d{6})_(?P<digest>[0-9a-f]{16})\.[a-z]+\.gz$")
+STAMP_FORMAT = "%Y%m%d_%H%M%S"
+DIGEST_LENGTH = 16
+CHUNK_SIZE = 256 * 1024
+PG_DUMP_TIMEOUT = 300
+POSTGRES_CONTAINER = "voenmeh_postgres"
+
+
+@dataclass
+class BackupFile:
+    path: Path
+    kind: str
+    created_at: datetime
+    digest: str
+
+
+def pg_dump_command(db_url: str) -> tuple[List[str], Dict[str, str]]:
+    """Команда pg_dump внутри контейнера PostgreSQL и окружение с паролем. Понимает URL с драйвером (+asyncpg)."""
+    url = make_url(db_url)
+    cmd = ["docker", "exec", "-i", POSTGRES_CONTAINER, "pg_dump", "-h", "localhost", "-U", url.username, "-d", url.database]
+    return cmd, {**os.environ, "PGPASSWORD": url.password or ""}
+
+
+class BackupStore:
+    """Каталог резервных копий: дедупликация по хешу содержимого и ротация."""
+
+    def __init__(
+        self,
+        directory: str | Path = BACKUP_DIR,
+        keep_count: int = BACKUP_KEEP_COUNT,
+        max_age_days: int = BACKUP_MAX_AGE_DAYS,
+    ):
+        self.directory = Path(directory)
+        self.keep_count = max(1, keep_count)
+        self.max_age = timedelta(days=max_age_days)
+
+    def list(self, kind: str) -> List[BackupFile]:
+        """Копии вида kind, новые первыми."""
+        if not self.directory.is_dir():
+            return []
+        files = []
+        for path in self.directory.iterdir():
+            match = BACKUP_NAME_RE.match(path.name)
+            if not match or match["kind"] != kind:
+                continue
+            created_at = MOSCOW_TZ.localize(datetime.strptime(match["stamp"], STAMP_FORMAT))
+            files.append(BackupFile(path, kind, created_at, match["digest"]))
+        return sorted(files, key=lambda item: (item.created_at, item.path.stat().st_mtime_ns), reverse=True)
+
+    def _latest_digest(self, kind: str) -> Optional[str]:
+        files = self.list(kind)
+        return files[0].digest if files else None
+
+    def _target(self, kind: str, digest: str, suffix: str) -> Path:
+        stamp = datetime.now(MOSCOW_TZ).strftime(STAMP_FORMAT)
+        return self.directory / f"{kind}_{stamp}_{digest}{suffix}"
+
+    def prune(self, kind: str) -> int:
+        """Удаляет копии сверх keep_count и старше max_age. Возвращает число удалённых."""
+        files = self.list(kind)
+        threshold = datetime.now(MOSCOW_TZ) - self.max_age
+        removed = 0
+        for index, item in enumerate(files):
+            if index == 0 or (index < self.keep_count and item.created_at >= threshold):
+                continue
+            try:
+                item.path.unlink()
+                removed += 1
+            except FileNotFoundError:
+                continue
+        if removed:
+            logger.info(f"Резервные копии {kind}: удалено устаревших {removed}")
+        return removed
+
+    def _write_json(self, kind: str, payload: bytes, digest: str) -> Optional[Path]:
+        if self._latest_digest(kind) == digest:
+            return None
+        self.directory.mkdir(parents=True, exist_ok=True)
+        target = self._target(kind, digest, ".json.gz")
+        partial = target.with_name(target.name + ".partial")
+        with gzip.open(partial, "wb", compresslevel=6) as f:
+            f.write(payload)
+        partial.replace(target)
+        return target
+
+    async def save_json(self, kind: str, data: Any) -> Optional[Path]:
+        """Сохраняет данные как сжатый JSON. None — содержимое не изменилось с прошлой копии."""
+        started = time.perf_counter()
+        digest = content_hash(data)[:DIGEST_LENGTH]
+        payload = json.dumps(data, ensure_ascii=False, default=str).encode("utf-8")
+        path = await asyncio.to_thread(self._write_json, kind, payload, digest)
+        return await self._finish(kind, path, started)
+
+    async def save_command_output(
+        self,
+        kind: str,
+        cmd: Sequence[str],
+        *,
+        env: Optional[Dict[str, str]] = None,
+        suffix: str = ".sql.gz",
+        timeout: float = PG_DUMP_TIMEOUT,
+    ) -> Optional[Path]:
+        """
+        Потоково сжимает stdout команды в файл. None — вывод совпал с последней копией (файл не сохраняется).
+
+        Бросает RuntimeError при ненулевом коде возврата и asyncio.TimeoutError по таймауту;
+        в обоих случаях недописанный файл удаляется.
+        """
+        started = time.perf_counter()
+        await asyncio.to_thread(self.directory.mkdir, parents=True, exist_ok=True)
+        partial = self.directory / f"{kind}{suffix}.partial"
+        output = await asyncio.to_thread(gzip.open, partial, "wb", 6)
+        hasher = hashlib.sha256()
+        process = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, env=env
+        )
+
+        async def stream() -> bytes:
+            # stderr читается параллельно, чтобы заполненный буфер не остановил pg_dump
+            stderr = asyncio.ensure_future(process.stderr.read())
+            while chunk := await process.stdout.read(CHUNK_SIZE):
+                hasher.update(chunk)
+                await asyncio.to_thread(output.write, chunk)
+            await process.wait()
+            return await stderr
+
+        try:
+            stderr = await asyncio.wait_for(stream(), timeout)
+            await asyncio.to_thread(output.close)
+            if process.returncode != 0:
+                raise RuntimeError(f"{cmd[0]} завершился с кодом {process.returncode}: {stderr.decode(errors='replace')}")
+        except BaseException:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            await asyncio.to_thread(output.close)
+            await asyncio.to_thread(partial.unlink, True)
+            BACKUP_RUNS.labels(kind=kind, status="failed").inc()
+            raise
+
+        digest = hasher.hexdigest()[:DIGEST_LENGTH]
+
+        def publish() -> Optional[Path]:
+            if self._latest_digest(kind) == digest:
+                partial.unlink(missing_ok=True)
+                return None
+            target = self._target(kind, digest, suffix)
+            partial.replace(target)
+            return target
+
+        return await self._finish(kind, await asyncio.to_thread(publish), started)
+
+    async def _finish(self, kind: str, path: Optional[Path], started: float) -> Optional[Path]:
+        BACKUP_DURATION.labels(kind=kind).observe(time.perf_counter() - started)
+        if path is None:
+            BACKUP_RUNS.labels(kind=kind, status="unchanged").inc()
+            logger.info(f"Резервная копия {kind} не создана: содержимое не изменилось")
+        else:
+            size = (await asyncio.to_thread(path.stat)).st_size
+            BACKUP_SIZE_BYTES.labels(kind=kind).set(size)
+            BACKUP_RUNS.labels(kind=kind, status="created").inc()
+            logger.info(f"Резервная копия {kind} создана: {path.name} ({size} байт)")
+        await asyncio.to_thread(self.prune, kind)
+        return path
@@ -0,0 +1,436 @@
+"""
+Исходящий журнал рассылок (outbox) в PostgreSQL.
+
+Рассылка сначала целиком записывается в БД: задание (BroadcastJob) и по строке на получателя
+(BroadcastDelivery) — одной транзакцией. Затем продюсер ставит доставки в очередь Dramatiq пачками
+по возрастанию id и после каждой пачки сохраняет чекпоинт (id последней поставленной доставки).
+Воркер по завершении отправки пишет подтверждение в Redis-список, бот периодически переносит
+подтверждения в БД.
+
+После рестарта продюсер продолжает с чекпоинта: повторно в очередь может попасть не больше одной
+пачки (доставка «как минимум один раз»), а администратор видит процент доставленных.
+
+С планировщиком темпа (BroadcastPacer) доставки ставятся в очередь с задержкой до своего слота
+отправки, а у задания появляется ожидаемое время завершения.
+
+С chunk_size > 1 соседние доставки с одинаковым содержимым и слотом объединяются в одну пачку
+(OutboxDelivery.recipients): воркер отправляет её одной задачей, подтверждая каждого получателя отдельно.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from redis.asyncio import Redis
+from sqlalchemy import func, insert, or_, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from core.broadcast_pacing import BroadcastPacer, BroadcastPlan
+from core.config import REDIS_BROADCAST_ACKS_KEY, REDIS_BROADCAST_TEXT_PREFIX
+from core.db.models import BroadcastDelivery, BroadcastJob
+from core.metrics import BROADCAST_OUTBOX_DELIVERIES
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_TEXT_TTL = 24 * 3600
+# Продюсер, не обновлявший аренду дольше этого времени, считается упавшим — задание можно подхватить
+PRODUCER_LEASE = timedelta(minutes=2)
+ACTIVE_JOB_STATUSES = ("sending", "enqueued")
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class OutboxDelivery(NamedTuple):
+    """Доставка, готовая к постановке в очередь воркеров."""
+
+    delivery_id: int
+    user_id: int
+    text: Optional[str] = None
+    text_key: Optional[str] = None  # Ключ текста в Redis (если Redis доступен)
+    from_chat_id: Optional[int] = None
+    message_id: Optional[int] = None
+    delay_ms: int = 0  # Задержка до слота отправки по плану темпа
+    # Пачка получателей ((id доставки, user_id), ...) с тем же содержимым; пусто — одиночная доставка
+    recipients: Tuple[Tuple[int, int], ...] = ()
+
+
+def chunk_deliveries(deliveries: List[OutboxDelivery], size: int) -> Iterator[OutboxDelivery]:
+    """
+    Объединяет подряд идущие доставки с одинаковым содержимым и задержкой в пачки до size получателей.
+    Одиночные доставки (size <= 1 или доставка без соседей) возвращаются как есть.
+    """
+    if size <= 1:
+        yield from deliveries
+        return
+
+    def payload(delivery: OutboxDelivery) -> tuple:
+        return delivery.text, delivery.text_key, delivery.from_chat_id, delivery.message_id, delivery.delay_ms
+
+    chunk: List[OutboxDelivery] = []
+    for delivery in deliveries:
+        if chunk and (len(chunk) >= size or payload(chunk[0]) != payload(delivery)):
+            yield _merge(chunk)
+            chunk = []
+        chunk.append(delivery)
+    if chunk:
+        yield _merge(chunk)
+
+
+def _merge(chunk: List[OutboxDelivery]) -> OutboxDelivery:
+    if len(chunk) == 1:
+        return chunk[0]
+    return chunk[0]._replace(recipients=tuple((item.delivery_id, item.user_id) for item in chunk))
+
+
+@dataclass
+class BroadcastProgress:
+    job_id: int
+    kind: str
+    status: str
+    total: int
+    pending: int = 0
+    queued: int = 0
+    done: int = 0
+    failed: int = 0
+    created_at: Optional[datetime] = None
+    eta: Optional[datetime] = None  # Плановое завершение отправки (UTC), если рассылка шла по плану темпа
+
+    @property
+    def percent_delivered(self) -> float:
+        return round(100 * self.done / self.total, 1) if self.total else 0.0
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "expired")
+
+
+class BroadcastOutbox:
+    """
+    Менеджер исходящего журнала рассылок.
+    Работает через переданный async_sessionmaker; Redis нужен для текстов и подтверждений воркеров.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        redis_client: Optional[Redis] = None,
+        batch_size: int = 500,
+        pacer: Optional[BroadcastPacer] = None,
+        chunk_size: int = 1,
+    ):
+        self.session_factory = session_factory
+        self.redis = redis_client
+        self.batch_size = batch_size
+        self.pacer = pacer
+        self.chunk_size = chunk_size
+
+    async def create_job(
+        self,
+        kind: str,
+        recipients: Iterable[Tuple[int, Optional[str]]],
+        *,
+        texts: Optional[Dict[str, str]] = None,
+        from_chat_id: Optional[int] = None,
+        message_id: Optional[int] = None,
+        created_by: Optional[int] = None,
+        expires_in: Optional[timedelta] = None,
+    ) -> Optional[int]:
+        """
+        Записывает рассылку и всех получателей одной транзакцией.
+
+        recipients — пары (user_id, хеш текста из texts или None для копирования медиа).
+        Повторы user_id отбрасываются. Возвращает id задания или None, если получателей нет.
+        """
+        seen = set()
+        rows = []
+        for user_id, digest in recipients:
+            if user_id in seen:
+                continue
+            seen.add(user_id)
+            rows.append({"user_id": user_id, "text_hash": digest, "status": "pending"})
+        if not rows:
+            return None
+
+        now = _now()
+        async with self.session_factory() as session:
+            job = BroadcastJob(
+                kind=kind,
+                status="sending",
+                texts=json.dumps(texts, ensure_ascii=False) if texts else None,
+                from_chat_id=from_chat_id,
+                message_id=message_id,
+                total=len(rows),
+                checkpoint=0,
+                created_by=created_by,
+                created_at=now,
+                expires_at=now + expires_in if expires_in else None,
+            )
+            session.add(job)
+            await session.flush()
+            for start in range(0, len(rows), self.batch_size):
+                chunk = rows[start : start + self.batch_size]
+                await session.execute(
+                    insert(BroadcastDelivery), [{**row, "job_id": job.id, "updated_at": now} for row in chunk]
+                )
+            await session.commit()
+            logger.info(f"Рассылка {kind}: создано задание {job.id} на {len(rows)} получателей")
+            return job.id
+
+    async def _claim(self, job_id: int) -> bool:
+        """Берёт аренду продюсера на задание, если её никто не держит (или держатель пропал)."""
+        now = _now()
+        async with self.session_factory() as session:
+            result = await session.execute(
+                update(BroadcastJob)
+                .where(
+                    BroadcastJob.id == job_id,
+                    BroadcastJob.status == "sending",
+                    or_(BroadcastJob.heartbeat_at.is_(None), BroadcastJob.heartbeat_at < now - PRODUCER_LEASE),
+                )
+                .values(heartbeat_at=now)
+            )
+            await session.commit()
+            return result.rowcount == 1
+
+    async def _store_texts(self, texts: Dict[str, str]) -> Dict[str, str]:
+        """Кладёт тексты в Redis для воркеров (после рестарта — заново). Возвращает {хеш: ключ}."""
+        if self.redis is None:
+            return {}
+        keys = {}
+        try:
+            for digest, text in texts.items():
+                key = f"{REDIS_BROADCAST_TEXT_PREFIX}{digest}"
+                await self.redis.set(key, text, ex=BROADCAST_TEXT_TTL)
+                keys[digest] = key
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить тексты рассылки в Redis, отправляем текстом: {e}")
+            return {}
+        return keys
+
+    async def _plan(self, job: BroadcastJob) -> Optional[BroadcastPlan]:
+        """Резервирует слоты отправки под оставшиеся доставки задания (без планировщика — None)."""
+        if self.pacer is None:
+            return None
+        async with self.session_factory() as session:
+            remaining = await session.scalar(
+                select(func.count())
+                .select_from(BroadcastDelivery)
+                .where(BroadcastDelivery.job_id == job.id, BroadcastDelivery.id > job.checkpoint)
+            )
+        if not remaining:
+            return None
+        try:
+            return await self.pacer.reserve(job.id, job.kind, remaining)
+        except Exception as e:
+            logger.warning(f"Рассылка {job.id}: не удалось запланировать темп, ставим без задержек: {e}")
+            return None
+
+    async def pump(self, job_id: int, dispatch: Callable[[OutboxDelivery], None]) -> int:
+        """
+        Ставит в очередь доставки задания, начиная с чекпоинта.
+
+        dispatch вызывается для каждой доставки (или пачки доставок, см. chunk_size); после каждой пачки
+        из БД чекпоинт и аренда сохраняются.
+        С планировщиком темпа у доставок заполнен delay_ms — задержка до их слота отправки.
+        Возвращает число поставленных доставок (0, если заданием уже занимается другой продюсер).
+        """
+        if not await self._claim(job_id):
+            return 0
+        async with self.session_factory() as session:
+            job = await session.get(BroadcastJob, job_id)
+        texts = json.loads(job.texts) if job.texts else {}
+        text_keys = await self._store_texts(texts)
+        plan = await self._plan(job)
+
+        checkpoint, enqueued = job.checkpoint, 0
+        while True:
+            async with self.session_factory() as session:
+                rows = (
+                    await session.execute(
+                        select(BroadcastDelivery.id, BroadcastDelivery.user_id, BroadcastDelivery.text_hash)
+                        .where(BroadcastDelivery.job_id == job_id, BroadcastDelivery.id > checkpoint)
+                        .order_by(BroadcastDelivery.id)
+                        .limit(self.batch_size)
+                    )
+                ).all()
+                if not rows:
+                    break
+                now_ts = time.time()
+                deliveries = [
+                    OutboxDelivery(
+                        delivery_id=delivery_id,
+                        user_id=user_id,
+                        text=texts.get(digest) if digest else None,
+                        text_key=text_keys.get(digest) if digest else None,
+                        from_chat_id=job.from_chat_id,
+                        message_id=job.message_id,
+                        delay_ms=plan.delay_ms(index, now_ts) if plan else 0,
+                    )
+                    for index, (delivery_id, user_id, digest) in enumerate(rows, start=enqueued)
+                ]
+                for delivery in chunk_deliveries(deliveries, self.chunk_size):
+                    dispatch(delivery)
+                now = _now()
+                await session.execute(
+                    update(BroadcastDelivery)
+                    .where(
+                        BroadcastDelivery.job_id == job_id,
+                        BroadcastDelivery.id > checkpoint,
+                        BroadcastDelivery.id <= rows[-1].id,
+                        BroadcastDelivery.status == "pending",
+                    )
+                    .values(status="queued", updated_at=now)
+                )
+                checkpoint = rows[-1].id
+                await session.execute(
+                    update(BroadcastJob).where(BroadcastJob.id == job_id).values(checkpoint=checkpoint, heartbeat_at=now)
+                )
+                await session.commit()
+            enqueued += len(rows)
+            BROADCAST_OUTBOX_DELIVERIES.labels(status="queued").inc(len(rows))
+            # Уступаем event loop между пачками
+            await asyncio.sleep(0)
+
+        async with self.session_factory() as session:
+            await session.execute(
+                update(BroadcastJob)
+                .where(BroadcastJob.id == job_id, BroadcastJob.status == "sending")
+                .values(status="enqueued", heartbeat_at=None)
+            )
+            await session.commit()
+        logger.info(f"Рассылка {job_id}: в очередь поставлено {enqueued} доставок (чекпоинт {checkpoint})")
+        return enqueued
+
+    async def apply_acks(self, acks: Iterable[Tuple[int, bool]]) -> int:
+        """Отмечает доставки завершёнными по подтверждениям воркеров: (id доставки, успешно ли)."""
+        done_ids, failed_ids = [], []
+        for delivery_id, ok in acks:
+            (done_ids if ok else failed_ids).append(delivery_id)
+        if not done_ids and not failed_ids:
+            return 0
+        now = _now()
+        async with self.session_factory() as session:
+            for status, ids in (("done", done_ids), ("failed", failed_ids)):
+                for start in range(0, len(ids), self.batch_size):
+                    await session.execute(
+                        update(BroadcastDelivery)
+                        .where(BroadcastDelivery.id.in_(ids[start : start + self.batch_size]))
+                        .values(status=status, updated_at=now)
+                    )
+            await session.commit()
+        BROADCAST_OUTBOX_DELIVERIES.labels(status="done").inc(len(done_ids))
+        BROADCAST_OUTBOX_DELIVERIES.labels(status="failed").inc(len(failed_ids))
+        return len(done_ids) + len(failed_ids)
+
+    async def sync_acks(self, max_batches: int = 20) -> int:
+        """Переносит подтверждения воркеров из Redis в БД."""
+        if self.redis is None:
+            return 0
+        applied = 0
+        for _ in range(max_batches):
+            raw = await self.redis.lpop(REDIS_BROADCAST_ACKS_KEY, self.batch_size)
+            if not raw:
+                break
+            acks = []
+            for item in raw:
+                item = item.decode() if isinstance(item, bytes) else str(item)
+                delivery_id, _, ok = item.partition(":")
+                if delivery_id.isdigit():
+                    acks.append((int(delivery_id), ok == "1"))
+            applied += await self.apply_acks(acks)
+        return applied
+
+    async def _finalize(self):
+        """Закрывает задания без незавершённых доставок и просроченные задания."""
+        now = _now()
+        async with self.session_factory() as session:
+            await session.execute(
+                update(BroadcastJob)
+                .where(BroadcastJob.status.in_(ACTIVE_JOB_STATUSES), BroadcastJob.expires_at < now)
+                .values(status="expired", finished_at=now, heartbeat_at=None)
+            )
+            result = await session.execute(select(BroadcastJob.id).where(BroadcastJob.status == "enqueued"))
+            enqueued_ids = result.scalars().all()
+            for job_id in enqueued_ids:
+                unfinished = await session.scalar(
+                    select(func.count())
+                    .select_from(BroadcastDelivery)
+                    .where(BroadcastDelivery.job_id == job_id, BroadcastDelivery.status.in_(("pending", "queued")))
+                )
+                if not unfinished:
+                    await session.execute(
+                        update(BroadcastJob).where(BroadcastJob.id == job_id).values(status="done", finished_at=now)
+                    )
+            await session.commit()
+
+    async def resume_unfinished(self, dispatch: Callable[[OutboxDelivery], None]) -> List[int]:
+        """Продолжает постановку заданий, продюсер которых остановился (рестарт, падение)."""
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(BroadcastJob.id).where(BroadcastJob.status == "sending").order_by(BroadcastJob.id)
+            )
+            job_ids = result.scalars().all()
+        resumed = []
+        for job_id in job_ids:
+            if await self.pump(job_id, dispatch):
+                logger.warning(f"Рассылка {job_id}: постановка в очередь возобновлена с чекпоинта")
+                resumed.append(job_id)
+        return resumed
+
+    async def tick(self, dispatch: Callable[[OutboxDelivery], None]) -> List[int]:
+        """Периодическое обслуживание: подтверждения, закрытие заданий, возобновление прерванных."""
+        await self.sync_acks()
+        await self._finalize()
+        return await self.resume_unfinished(dispatch)
+
+    async def get_progress(self, job_id: int) -> Optional[BroadcastProgress]:
+        async with self.session_factory() as session:
+            job = await session.get(BroadcastJob, job_id)
+            if job is None:
+                return None
+            counts = dict(
+                (
+                    await session.execute(
+                        select(BroadcastDelivery.status, func.count())
+                        .where(BroadcastDelivery.job_id == job_id)
+                        .group_by(BroadcastDelivery.status)
+                    )
+                ).all()
+            )
+        return BroadcastProgress(
+            job_id=job.id,
+            kind=job.kind,
+            status=job.status,
+            total=job.total,
+            created_at=job.created_at,
+            **{status: counts.get(status, 0) for status in ("pending", "queued", "done", "failed")},
+        )
+
+    async def list_recent_progress(self, limit: int = 5) -> List[BroadcastProgress]:
+        """Прогресс последних рассылок (новые сверху) для админ-панели."""
+        async with self.session_factory() as session:
+            result = await session.execute(select(BroadcastJob.id).order_by(BroadcastJob.id.desc()).limit(limit))
+            job_ids = result.scalars().all()
+        progress = [item for item in [await self.get_progress(job_id) for job_id in job_ids] if item is not None]
+        if self.pacer is not None:
+            try:
+                plans = await self.pacer.get_plans(item.job_id for item in progress if not item.finished)
+            except Exception as e:
+                logger.warning(f"Не удалось получить планы рассылок: {e}")
+                plans = {}
+            for item in progress:
+                if item.job_id in plans:
+                    item.eta = plans[item.job_id].eta
+        return progress
@@ -0,0 +1,156 @@
+"""
+Планировщик темпа рассылок под общий лимит Telegram.
+
+Лимит отправки в Telegram общий для бота, а не для процесса воркера: `AsyncLimiter` в воркере
+ограничивает только свой процесс, и при изменении числа воркеров меняется и фактическая скорость.
+Планировщик ведёт в Redis общий «горизонт» — момент, до которого уже запланированы отправки всех
+рассылок. Новая рассылка резервирует секундные слоты после горизонта (по BROADCAST_MESSAGES_PER_SECOND
+сообщений на слот), каждая доставка ставится в очередь с задержкой до начала своего слота, а конец
+резервации — ожидаемое время завершения рассылки.
+"""
+
+import json
+import logging
+import math
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional
+
+from redis.asyncio import Redis
+
+from core.config import BROADCAST_MESSAGES_PER_SECOND, REDIS_BROADCAST_PACING_PREFIX
+from core.metrics import BROADCAST_PACING_BACKLOG
+from core.redis_values import as_str
+
+logger = logging.getLogger(__name__)
+
+# Сколько хранить план рассылки (для ETA в админ-панели)
+PLAN_TTL = 2 * 24 * 3600
+# Запас жизни ключа горизонта после окончания последней резервации
+HORIZON_GRACE_SECONDS = 60
+
+# Атомарно резервирует duration секунд после горизонта (или после now, если горизонт в прошлом).
+# Если у задания уже есть план, его слоты не резервируются повторно: оставшиеся доставки ставятся
+# в окно прежнего плана, а если не помещаются и план последний — окно продлевается вместо добавления в конец.
+# Возвращает начало резервации строкой: числа Lua в ответе Redis обрезаются до целого.
+RESERVE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local duration = tonumber(ARGV[2])
+local horizon = tonumber(redis.call('GET', KEYS[1]) or '0')
+local start = math.max(now, horizon)
+local previous = redis.call('HGET', KEYS[2], ARGV[4])
+if previous then
+    local plan = cjson.decode(previous)
+    local previous_start = math.max(now, plan.start)
+    local previous_finish = plan.start + math.ceil(plan.count / plan.rate)
+    if previous_start + duration <= previous_finish then
+        return tostring(previous_start)
+    end
+    if previous_finish >= horizon then
+        start = previous_start
+    end
+end
+local finish = start + duration
+redis.call('SET', KEYS[1], tostring(finish), 'EX', math.ceil(finish - now) + tonumber(ARGV[3]))
+return tostring(start)
+"""
+
+
+@dataclass
+class BroadcastPlan:
+    """Резервация слотов рассылки: count доставок по rate в секунду, начиная с start (unix time)."""
+
+    job_id: int
+    kind: str
+    count: int
+    rate: int
+    start: float
+
+    @property
+    def finish(self) -> float:
+        return self.start + math.ceil(self.count / self.rate)
+
+    @property
+    def eta(self) -> datetime:
+        return datetime.fromtimestamp(self.finish, timezone.utc)
+
+    def slot_start(self, index: int) -> float:
+        """Начало секундного слота доставки с порядковым номером index."""
+        return self.start + index // self.rate
+
+    def delay_ms(self, index: int, now: Optional[float] = None) -> int:
+        """Задержка постановки доставки index относительно now (0 — слот уже наступил)."""
+        now = time.time() if now is None else now
+        return max(0, int((self.slot_start(index) - now) * 1000))
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, raw) -> "BroadcastPlan":
+        return cls(**json.loads(as_str(raw)))
+
+
+class BroadcastPacer:
+    """Общий для всех реплик бота планировщик слотов отправки рассылок."""
+
+    def __init__(
+        self,
+        redis_client: Redis,
+        rate: int = BROADCAST_MESSAGES_PER_SECOND,
+        key_prefix: str = REDIS_BROADCAST_PACING_PREFIX,
+    ):
+        self.redis = redis_client
+        self.rate = max(1, int(rate))
+        self.horizon_key = f"{key_prefix}horizon"
+        self.plans_key = f"{key_prefix}plans"
+
+    async def reserve(self, job_id: int, kind: str, count: int) -> BroadcastPlan:
+        """
+        Резервирует слоты под count доставок после уже запланированных рассылок.
+
+        Повторная резервация (продолжение рассылки после рестарта) перезаписывает план задания,
+        но не сдвигает общий горизонт на уже зарезервированные заданием слоты.
+        """
+        now = time.time()
+        duration = math.ceil(count / self.rate)
+        raw = await self.redis.eval(
+            RESERVE_SCRIPT, 2, self.horizon_key, self.plans_key, now, duration, HORIZON_GRACE_SECONDS, job_id
+        )
+        plan = BroadcastPlan(job_id=job_id, kind=kind, count=count, rate=self.rate, start=float(as_str(raw)))
+        await self.redis.hset(self.plans_key, mapping={str(job_id): plan.to_json()})
+        await self.redis.expire(self.plans_key, PLAN_TTL)
+        BROADCAST_PACING_BACKLOG.set(max(0.0, plan.finish - now))
+        if plan.start > now:
+            logger.info(
+                f"Рассылка {job_id}: {count} доставок начнутся через {plan.start - now:.0f} с "
+                f"(после уже запланированных), завершение ≈ {plan.eta:%H:%M:%S} UTC"
+            )
+        return plan
+
+    async def get_plans(self, job_ids: Iterable[int]) -> Dict[int, BroadcastPlan]:
+        """Планы заданий, для которых они сохранены."""
+        job_ids = list(job_ids)
+        if not job_ids:
+            return {}
+        raw = await self.redis.hmget(self.plans_key, [str(job_id) for job_id in job_ids])
+        plans = {}
+        for job_id, value in zip(job_ids, raw):
+            if value is None:
+                continue
+            try:
+                plans[job_id] = BroadcastPlan.from_json(value)
+            except (TypeError, ValueError):
+                continue
+        return plans
+
+    async def horizon(self) -> Optional[datetime]:
+        """Когда закончатся все запланированные отправки (None — очередь рассылок свободна)."""
+        raw = await self.redis.get(self.horizon_key)
+        now = time.time()
+        finish = float(as_str(raw)) if raw is not None else 0.0
+        BROADCAST_PACING_BACKLOG.set(max(0.0, finish - now))
+        if finish <= now:
+            return None
+        return datetime.fromtimestamp(finish, timezone.utc)
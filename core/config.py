@@ -18,10 +18,25 @@ USER_AGENT = (
 DAY_MAP = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", None]
 MOSCOW_TZ = pytz.timezone("Europe/Moscow")
 
+# Время утренней и вечерней сводок: пользователь выбирает слот, рассылка идёт отдельной пачкой на слот
+EVENING_DIGEST_SLOTS = ("18:00", "19:00", "20:00", "21:00", "22:00")
+MORNING_DIGEST_SLOTS = ("06:30", "07:00", "07:30", "08:00")
+DEFAULT_EVENING_DIGEST_TIME = "20:00"
+DEFAULT_MORNING_DIGEST_TIME = "08:00"
+
 # --- Настройки базы данных и Redis ---
 # Имена ключей в Redis
 REDIS_SCHEDULE_CACHE_KEY = "timetable:schedule_cache"
 REDIS_SCHEDULE_HASH_KEY = "timetable:schedule_hash"
+REDIS_SCHEDULE_HISTORY_PREFIX = "timetable:history:"
+REDIS_SCHEDULE_FINGERPRINTS_KEY = "timetable:fingerprints"  # Отпечатки дней расписания по группам
+REDIS_CALENDAR_VERSION_KEY = "timetable:calendar_version"  # Растёт при смене дат семестров (сброс календарей)
+REDIS_BROADCAST_TEXT_PREFIX = "broadcast:text:"
+REDIS_BROADCAST_ACKS_KEY = "broadcast:outbox:acks"  # Подтверждения доставок от воркеров
+REDIS_BROADCAST_PACING_PREFIX = "broadcast:pacing:"  # Общий горизонт слотов отправки и планы рассылок
+REDIS_SCHEDULER_LEADER_KEY = "scheduler:leader"  # Аренда лидера планировщика среди реплик бота
+REDIS_WEATHER_FORECAST_PREFIX = "weather:forecast:"  # Общий кэш прогноза погоды для бота и воркеров
+REDIS_SEND_LIMITER_PREFIX = "ratelimit:{telegram}:"  # GCRA-лимитер исходящих сообщений (hash tag — один слот кластера)
 
 
 # --- Пути к медиа- и скриншот-файлам ---
@@ -35,18 +50,41 @@ class Settings(BaseSettings):
     RABBITMQ_PASSWORD: str | None = None
     MEDIA_PATH: str = "bot/media"
     SCREENSHOTS_PATH: str = "bot/screenshots"
+    # Предкомпилированный индекс расписания (mmap) для быстрого старта процессов
+    TIMETABLE_INDEX_PATH: str = "data/timetable.idx"
     # Optional environment variables
     OPENWEATHERMAP_API_KEY: str | None = None
+    # Адрес API прогноза; для локальной разработки можно указать заглушку
+    OPENWEATHERMAP_BASE_URL: str = "https://api.openweathermap.org/data/2.5/forecast"
+    # Адрес Bot API (пусто — api.telegram.org); для нагрузочных проверок можно указать локальную заглушку
+    TELEGRAM_API_BASE_URL: str | None = None
     ADMIN_ID: str | None = None
     FEEDBACK_CHAT_ID: str | None = None
     SUBSCRIPTION_CHANNEL: str | None = None
     CHECK_INTERVAL_MINUTES: int = 30
-    # Worker optimization settings for 4 cores / 8GB RAM
-    DRAMATIQ_PROCESSES: int = 2
-    DRAMATIQ_THREADS: int = 4
+    # Worker optimization settings for 4 cores / 8GB RAM: процессы и потоки по полосам (bot/worker_lanes.py)
+    DRAMATIQ_INTERACTIVE_PROCESSES: int = 1
+    DRAMATIQ_INTERACTIVE_THREADS: int = 4
+    DRAMATIQ_TIME_CRITICAL_THREADS: int = 2
+    DRAMATIQ_BULK_PROCESSES: int = 1
+    DRAMATIQ_BULK_THREADS: int = 4
     IMAGE_GENERATION_SEMAPHORE: int = 4
     IMAGE_SERVICE_SEMAPHORE: int = 2
     IMAGE_CACHE_MAX_MB: int = 750  # Increased for 8GB RAM
+    # Сколько версий расписания хранить в истории (базовый снапшот + дельты)
+    SCHEDULE_HISTORY_MAX_VERSIONS: int = 60
+    SCHEDULER_LEADER_TTL_SECONDS: int = 15
+    SCHEDULE_DIFF_NOTIFICATIONS: bool = True
+    # Общий бюджет рассылок (сообщений в секунду на весь бот); Telegram допускает ~30, часть оставляем диалогам
+    BROADCAST_MESSAGES_PER_SECOND: int = 25
+    # Сколько получателей рассылки отправляется одной задачей воркера (1 — по задаче на получателя)
+    BROADCAST_SEND_CHUNK_SIZE: int = 25
+    # Общий для всех процессов и контейнеров воркера лимит исходящих сообщений в Telegram
+    TELEGRAM_SEND_RATE_PER_SECOND: int = 25
+    # Файловые резервные копии (дамп БД, расписание): каталог и ротация
+    BACKUP_DIR: str = "data/backups"
+    BACKUP_KEEP_COUNT: int = 14
+    BACKUP_MAX_AGE_DAYS: int = 30
     model_config = {"env_file": ".env", "extra": "ignore"}
 
 
@@ -55,8 +93,31 @@ settings = Settings()
 # Интервал проверки изменений в расписании на сайте (в минутах)
 CHECK_INTERVAL_MINUTES = settings.CHECK_INTERVAL_MINUTES
 
+# Ограничение глубины истории расписания
+SCHEDULE_HISTORY_MAX_VERSIONS = settings.SCHEDULE_HISTORY_MAX_VERSIONS
+
+# Срок аренды лидера планировщика: за это время резервная реплика перехватывает задачи упавшей
+SCHEDULER_LEADER_TTL_SECONDS = settings.SCHEDULER_LEADER_TTL_SECONDS
+
+# Уведомления об изменениях в расписании (по отпечаткам дней, только изменившиеся группы)
+SCHEDULE_DIFF_NOTIFICATIONS = settings.SCHEDULE_DIFF_NOTIFICATIONS
+
+# Темп рассылок: слоты распределяются между всеми рассылками и не зависят от числа воркеров
+BROADCAST_MESSAGES_PER_SECOND = settings.BROADCAST_MESSAGES_PER_SECOND
+# Получатели рассылки объединяются в пачки: одно сообщение в очереди на пачку вместо одного на получателя
+BROADCAST_SEND_CHUNK_SIZE = settings.BROADCAST_SEND_CHUNK_SIZE
+
+# Лимит отправки воркеров: делится через Redis, не умножается при добавлении процессов и контейнеров
+TELEGRAM_SEND_RATE_PER_SECOND = settings.TELEGRAM_SEND_RATE_PER_SECOND
+
+# Резервные копии: одинаковые по содержимому не сохраняются, старые удаляются по количеству и возрасту
+BACKUP_DIR = Path(settings.BACKUP_DIR)
+BACKUP_KEEP_COUNT = settings.BACKUP_KEEP_COUNT
+BACKUP_MAX_AGE_DAYS = settings.BACKUP_MAX_AGE_DAYS
+
 MEDIA_PATH = Path(settings.MEDIA_PATH)
 SCREENSHOTS_PATH = Path(settings.SCREENSHOTS_PATH)
+TIMETABLE_INDEX_PATH = Path(settings.TIMETABLE_INDEX_PATH)
 
 # Основные медиа
 WELCOME_IMAGE_PATH = MEDIA_PATH / "welcome.png"
@@ -78,6 +139,8 @@ ABOUT_INLINE_IMG = SCREENSHOTS_PATH / "about_inline.png"
 OPENWEATHERMAP_API_KEY = settings.OPENWEATHERMAP_API_KEY
 OPENWEATHERMAP_CITY_ID = "498817"
 OPENWEATHERMAP_UNITS = "metric"
+OPENWEATHERMAP_BASE_URL = settings.OPENWEATHERMAP_BASE_URL
+TELEGRAM_API_BASE_URL = settings.TELEGRAM_API_BASE_URL
 
 # --- Настройки администратора и обратной связи ---
 admin_ids_str = settings.ADMIN_ID
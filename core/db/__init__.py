@@ -1,3 +1,3 @@
-from .models import Base, Event, Feedback, SemesterSettings, User
+from .models import Base, BroadcastDelivery, BroadcastJob, Event, Feedback, SemesterSettings, User
 
-__all__ = ["Base", "User", "SemesterSettings", "Event", "Feedback"]
+__all__ = ["Base", "User", "SemesterSettings", "Event", "Feedback", "BroadcastJob", "BroadcastDelivery"]
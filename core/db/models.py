@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from datetime import datetime
 
-from sqlalchemy import TIMESTAMP, BigInteger, Boolean, Date, Index, Integer, String, Text
+from sqlalchemy import TIMESTAMP, BigInteger, Boolean, Date, ForeignKey, Index, Integer, String, Text, UniqueConstraint
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
 
@@ -28,9 +28,16 @@ class User(Base):
 
     reminder_time_minutes: Mapped[int] = mapped_column(Integer, default=60, server_default="60", nullable=False)
 
+    # Время сводок «ЧЧ:ММ» — один из слотов EVENING_DIGEST_SLOTS / MORNING_DIGEST_SLOTS
+    evening_time: Mapped[str] = mapped_column(String(5), default="20:00", server_default="20:00", nullable=False)
+    morning_time: Mapped[str] = mapped_column(String(5), default="08:00", server_default="08:00", nullable=False)
+
     # Пользовательская тема оформления (standard, light, dark, classic, coffee)
     theme: Mapped[str] = mapped_column(String, default="standard", server_default="standard", nullable=False)
 
+    # Пользователь заблокировал бота (или удалил аккаунт): рассылки его пропускают, пока он снова не напишет боту
+    is_blocked: Mapped[bool] = mapped_column(Boolean, default=False, server_default="f", nullable=False)
+
     # Индексы для оптимизации частых запросов
     __table_args__ = (
         Index("idx_user_group", "group"),  # Для поиска по группам
@@ -44,6 +51,9 @@ class User(Base):
             "lesson_reminders",
         ),  # Для рассылок
         Index("idx_user_theme", "theme"),  # Для поиска по теме
+        Index("idx_user_evening_slot", "evening_notify", "evening_time"),  # Вечерняя сводка по слотам
+        Index("idx_user_morning_slot", "morning_summary", "morning_time"),  # Утренняя сводка по слотам
+        Index("idx_user_blocked", "is_blocked"),  # Исключение заблокировавших бота из рассылок
     )
 
 
@@ -99,3 +109,48 @@ class Feedback(Base):
         Index("idx_feedback_is_answered", "is_answered"),
         Index("idx_feedback_created_at", "created_at"),
     )
+
+
+class BroadcastJob(Base):
+    """Рассылка в исходящем журнале (outbox): что отправлять и докуда дошла постановка в очередь."""
+
+    __tablename__ = "broadcast_jobs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    kind: Mapped[str] = mapped_column(String(32), nullable=False)  # evening, morning, admin_text, admin_media, segment_*
+    # sending, enqueued, done, expired
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default="sending", server_default="sending")
+    texts: Mapped[str | None] = mapped_column(Text, nullable=True)  # JSON {sha256: текст} — уникальные тексты рассылки
+    from_chat_id: Mapped[int | None] = mapped_column(BigInteger, nullable=True)  # Для копирования медиа
+    message_id: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    total: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    # id последней поставленной доставки
+    checkpoint: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0, server_default="0")
+    heartbeat_at: Mapped[datetime | None] = mapped_column(TIMESTAMP, nullable=True)  # Аренда продюсера, ставящего задачи
+    created_by: Mapped[int | None] = mapped_column(BigInteger, nullable=True)  # Telegram ID администратора
+    created_at: Mapped[datetime] = mapped_column(TIMESTAMP, server_default=func.now())
+    expires_at: Mapped[datetime | None] = mapped_column(TIMESTAMP, nullable=True)  # После этого момента не досылаем
+    finished_at: Mapped[datetime | None] = mapped_column(TIMESTAMP, nullable=True)
+
+    __table_args__ = (
+        Index("idx_broadcast_jobs_status", "status"),
+        Index("idx_broadcast_jobs_created_at", "created_at"),
+    )
+
+
+class BroadcastDelivery(Base):
+    """Доставка рассылки одному получателю: pending → queued → done/failed."""
+
+    __tablename__ = "broadcast_deliveries"
+
+    id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    job_id: Mapped[int] = mapped_column(Integer, ForeignKey("broadcast_jobs.id", ondelete="CASCADE"), nullable=False)
+    user_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    text_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)  # Ключ текста в BroadcastJob.texts
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default="pending", server_default="pending")
+    updated_at: Mapped[datetime] = mapped_column(TIMESTAMP, server_default=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("job_id", "user_id", name="uq_broadcast_delivery_job_user"),
+        Index("idx_broadcast_deliveries_job_status", "job_id", "status"),
+    )
@@ -0,0 +1,195 @@
+"""
+Выбор лидера планировщика среди реплик бота через аренду в Redis.
+
+Лидер держит ключ аренды со значением «<реплика>» и TTL, продлевая его чаще, чем истекает TTL.
+Перед каждой задачей реплика сверяет значение аренды в Redis, поэтому задача бывшего лидера,
+«проснувшегося» после паузы, пропускается. Fencing-токенов нет: задачи пишут в БД, Redis и Telegram,
+и проверить токен в каждом из этих мест нельзя, так что защита — это проверка аренды перед запуском.
+
+Аренда захватывается SET NX PX, продление и освобождение выполняются Lua-скриптами «проверить значение
+и изменить», чтобы реплика не могла продлить или удалить чужую аренду. Если продлить аренду не удалось до локального дедлайна,
+реплика снимает с себя лидерство сама, не дожидаясь истечения ключа.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+from collections.abc import Awaitable, Callable
+from typing import Optional
+
+from redis.asyncio import Redis
+
+from core.config import REDIS_SCHEDULER_LEADER_KEY, SCHEDULER_LEADER_TTL_SECONDS
+from core.metrics import SCHEDULER_LEADER, SCHEDULER_LEADER_TRANSITIONS
+from core.redis_values import as_optional_str
+
+logger = logging.getLogger(__name__)
+
+RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class LeaderElector:
+    """Аренда лидерства в Redis с продлением и быстрой передачей."""
+
+    def __init__(
+        self,
+        redis_client: Redis,
+        key: str = REDIS_SCHEDULER_LEADER_KEY,
+        ttl: float = SCHEDULER_LEADER_TTL_SECONDS,
+        identity: Optional[str] = None,
+        on_elected: Optional[Callable[[], object]] = None,
+        on_demoted: Optional[Callable[[], object]] = None,
+    ):
+        self.redis = redis_client
+        self.key = key
+        self.ttl = ttl
+        self.identity = identity or f"{socket.gethostname()}:{os.getpid()}"
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        # Продлеваем трижды за срок аренды; резерв проверяет свободу аренды так же часто
+        self.renew_interval = ttl / 3
+        self._lease_value: Optional[str] = None
+        self._deadline = 0.0
+        self._stopped = asyncio.Event()
+
+    @property
+    def is_leader(self) -> bool:
+        return self._lease_value is not None and time.monotonic() < self._deadline
+
+    async def _notify(self, callback: Optional[Callable[[], object]]):
+        if callback is None:
+            return
+        try:
+            result = callback()
+            if isinstance(result, Awaitable):
+                await result
+        except Exception as e:
+            logger.error(f"Ошибка обработчика смены лидерства: {e}", exc_info=True)
+
+    async def _become_leader(self, started: float):
+        self._lease_value = self.identity
+        self._deadline = started + self.ttl
+        SCHEDULER_LEADER.set(1)
+        SCHEDULER_LEADER_TRANSITIONS.labels(transition="elected").inc()
+        logger.info(f"Реплика {self.identity} стала лидером планировщика")
+        await self._notify(self.on_elected)
+
+    async def _step_down(self, reason: str):
+        if self._lease_value is None:
+            return
+        self._lease_value = None
+        SCHEDULER_LEADER.set(0)
+        SCHEDULER_LEADER_TRANSITIONS.labels(transition="demoted").inc()
+        logger.warning(f"Реплика {self.identity} больше не лидер планировщика: {reason}")
+        await self._notify(self.on_demoted)
+
+    async def try_acquire(self) -> bool:
+        """Захватывает свободную аренду."""
+        started = time.monotonic()
+        if not await self.redis.set(self.key, self.identity, nx=True, px=int(self.ttl * 1000)):
+            return False
+        await self._become_leader(started)
+        return True
+
+    async def renew(self) -> bool:
+        """Продлевает собственную аренду; при потере снимает лидерство."""
+        if self._lease_value is None:
+            return False
+        started = time.monotonic()
+        try:
+            renewed = await self.redis.eval(RENEW_SCRIPT, 1, self.key, self._lease_value, int(self.ttl * 1000))
+        except Exception as e:
+            # Redis недоступен: лидерство держится до локального дедлайна, затем снимается
+            logger.warning(f"Не удалось продлить аренду лидера: {e}")
+            if time.monotonic() >= self._deadline:
+                await self._step_down("аренда истекла без продления")
+            return self.is_leader
+        if not renewed:
+            await self._step_down("аренда перехвачена или истекла")
+            return False
+        # Дедлайн считается от момента отправки запроса — с запасом на задержку сети
+        self._deadline = started + self.ttl
+        return True
+
+    async def validate(self) -> bool:
+        """Проверка перед побочными эффектами: аренда в Redis всё ещё принадлежит этой реплике."""
+        if not self.is_leader:
+            return False
+        try:
+            return as_optional_str(await self.redis.get(self.key)) == self._lease_value
+        except Exception as e:
+            logger.warning(f"Не удалось проверить аренду лидера: {e}")
+            return False
+
+    async def current_leader(self) -> Optional[str]:
+        """Реплика, держащая аренду, или None."""
+        try:
+            return as_optional_str(await self.redis.get(self.key))
+        except Exception:
+            return None
+
+    async def step(self) -> bool:
+        """Один цикл: лидер продлевает аренду, резерв пытается её захватить."""
+        if self._lease_value is not None:
+            return await self.renew()
+        try:
+            return await self.try_acquire()
+        except Exception as e:
+            logger.warning(f"Не удалось выполнить выбор лидера: {e}")
+            return False
+
+    async def run(self):
+        """Фоновый цикл выбора лидера до вызова release()."""
+        SCHEDULER_LEADER.set(0)
+        while not self._stopped.is_set():
+            await self.step()
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=self.renew_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def release(self):
+        """Останавливает цикл и освобождает аренду, чтобы резервная реплика приняла задачи сразу."""
+        self._stopped.set()
+        value = self._lease_value
+        await self._step_down("реплика останавливается")
+        if value is None:
+            return
+        try:
+            await self.redis.eval(RELEASE_SCRIPT, 1, self.key, value)
+        except Exception as e:
+            logger.warning(f"Не удалось освободить аренду лидера: {e}")
+
+    def describe(self) -> str:
+        """Строка для админ-панели."""
+        if self.is_leader:
+            return f"лидер (реплика {self.identity})"
+        return f"резерв (реплика {self.identity})"
+
+
+def leader_only(elector: LeaderElector, func: Callable[..., Awaitable]) -> Callable[..., Awaitable]:
+    """Оборачивает задачу планировщика: она выполняется, только если аренда всё ещё наша."""
+
+    async def _job(*args, **kwargs):
+        if not await elector.validate():
+            logger.info(f"Задача {getattr(func, '__name__', func)} пропущена: реплика не лидер планировщика")
+            return None
+        return await func(*args, **kwargs)
+
+    _job.__name__ = getattr(func, "__name__", "job")
+    _job.__qualname__ = getattr(func, "__qualname__", _job.__name__)
+    return _job
@@ -1,12 +1,93 @@
+import asyncio
+import bisect
 import gzip
 import json
 import pickle
+import re
+import time
+from collections import defaultdict
+from collections.abc import Mapping
 from datetime import date, datetime, timedelta
 
 from rapidfuzz import fuzz, process
 from redis.asyncio.client import Redis
+from redis.exceptions import LockError
+
+from core.config import (
+    CACHE_LIFETIME,
+    DAY_MAP,
+    MOSCOW_TZ,
+    REDIS_CALENDAR_VERSION_KEY,
+    REDIS_SCHEDULE_CACHE_KEY,
+    REDIS_SCHEDULE_HASH_KEY,
+    TIMETABLE_INDEX_PATH,
+)
+from core.metrics import TIMETABLE_SNAPSHOT_STALE
+from core.timeline import DayTimeline, LessonStatus, parse_hhmm
+from core.timetable_index import TimetableIndex, write_timetable_index
+
+_TOKEN_RE = re.compile(r"[0-9a-zа-я]+")
+# Ограничение на длину материализуемого отрезка календаря (защита от бесконечного цикла)
+_MAX_SEMESTER_DAYS = 400
+# Максимальное число закэшированных таймлайнов (группа, дата)
+_MAX_TIMELINES = 4096
+# Блокировка загрузки расписания с сервера и параметры фонового обновления
+_INIT_LOCK_NAME = "timetable_init_lock"
+_INIT_LOCK_TIMEOUT = 300
+_REFRESH_RETRY_DELAY = 30
+_REFRESH_RETRY_MAX_DELAY = 600
+# Как часто сверять версию календаря в Redis (смена дат семестров в другом процессе)
+_CALENDAR_VERSION_CHECK_INTERVAL = 30
+
+
+def _tokenize_subject(text: str) -> list[str]:
+    """Разбивает название предмета на нормализованные токены (нижний регистр, ё→е)."""
+    if not text:
+        return []
+    return _TOKEN_RE.findall(text.lower().replace("ё", "е"))
+
+
+def _parse_minutes(hhmm: str | None) -> int | None:
+    """Переводит строку «ЧЧ:ММ» в минуты от полуночи; None, если формат неожиданный."""
+    try:
+        hours, minutes = (hhmm or "").strip().split(":")
+        return int(hours) * 60 + int(minutes)
+    except ValueError:
+        return None
+
+
+def _has_valid_bounds(lesson: dict) -> bool:
+    """Проверяет, что у пары корректные start_time_raw/end_time_raw."""
+    try:
+        parse_hhmm(lesson["start_time_raw"])
+        parse_hhmm(lesson["end_time_raw"])
+    except (KeyError, ValueError, AttributeError):
+        return False
+    return True
+
+
+def _intersect_postings(left: list[int], right: list[int]) -> list[int]:
+    """Пересечение двух отсортированных posting-списков слиянием."""
+    result: list[int] = []
+    i = j = 0
+    while i < len(left) and j < len(right):
+        if left[i] == right[j]:
+            result.append(left[i])
+            i += 1
+            j += 1
+        elif left[i] < right[j]:
+            i += 1
+        else:
+            j += 1
+    return result
+
 
-from core.config import CACHE_LIFETIME, DAY_MAP, REDIS_SCHEDULE_CACHE_KEY
+def decode_schedule_cache(raw: bytes) -> dict:
+    """Разбирает снапшот расписания из кэша Redis: gzip+pickle или JSON (старый формат)."""
+    try:
+        return pickle.loads(gzip.decompress(raw))
+    except (gzip.BadGzipFile, pickle.UnpicklingError):
+        return json.loads(raw.decode("utf-8"))
 
 
 class TimetableManager:
@@ -15,18 +96,28 @@ class TimetableManager:
     Работает ИСКЛЮЧИТЕЛЬНО с Redis для кэширования.
     """
 
-    def __init__(self, all_schedules_data: dict, redis_client: Redis):
+    def __init__(self, all_schedules_data: dict, redis_client: Redis, schedules: Mapping[str, dict] | None = None):
         if not all_schedules_data:
             raise ValueError("Данные расписания не могут быть пустыми.")
 
         self.redis = redis_client
         self.metadata = all_schedules_data.get("__metadata__", {})
-        self._schedules = {k: v for k, v in all_schedules_data.items() if not k.startswith("__")}
+        if schedules is None:
+            schedules = {k: v for k, v in all_schedules_data.items() if not k.startswith("__")}
+        self._schedules = schedules
         self._teachers_index = all_schedules_data.get("__teachers_index__", {})
         self._classrooms_index = all_schedules_data.get("__classrooms_index__", {})
         self._current_xml_hash = all_schedules_data.get("__current_xml_hash__", "")
         self.semester_start_date = None
         self._use_compression = True  # Включаем сжатие для оптимизации
+        self._index: TimetableIndex | None = None
+        self.is_stale = False
+        self._refresh_task: asyncio.Task | None = None
+        self._calendar_version: int | None = None
+        self._calendar_checked_at = 0.0
+        self.invalidate_calendar()
+        # Индекс предметов строится при первом поиске, чтобы не разбирать все группы на старте
+        self._subject_vocabulary: list[str] | None = None
 
         if "period" in self.metadata:
             try:
@@ -43,99 +134,236 @@ class TimetableManager:
     async def create(cls, redis_client: Redis):
         """
         Асинхронный конструктор. Единственный правильный способ создать экземпляр.
-        Загружает данные из кэша Redis или с сервера.
+
+        Сразу отдаёт самый свежий доступный снапшот: mmap-индекс, кэш Redis, историю версий/резервную
+        копию или fallback-файл. Снапшот не из кэша помечается устаревшим, а загрузка XML с сервера вуза
+        выполняется одним фоновым обновлением под блокировкой. Синхронно сервер опрашивается, только
+        если отдавать нечего.
         """
         print("Инициализация TimetableManager...")
 
-        async with redis_client.lock("timetable_init_lock"):
-            cached_data = await redis_client.get(REDIS_SCHEDULE_CACHE_KEY)
+        indexed_instance = await cls._open_from_index(redis_client)
+        if indexed_instance is not None:
+            return indexed_instance
+
+        cached_data = await redis_client.get(REDIS_SCHEDULE_CACHE_KEY)
+        if cached_data:
+            print("Найден кэш расписания в Redis.")
+            return cls._from_cached(cached_data, redis_client)
+
+        print("Кэш в Redis не найден. Ищем резервную копию или fallback данные...")
+        stale_data = await cls._load_stale_snapshot(redis_client)
+        if stale_data:
+            instance = cls(stale_data, redis_client)
+            instance.mark_stale()
+            instance.start_background_refresh()
+            print("Расписание отдано из резервных данных, обновление с сервера запущено в фоне.")
+            return instance
+
+        print("Резервных данных нет. Загрузка с сервера...")
+        instance = await cls._refresh_snapshot(redis_client, blocking=True)
+        if instance is None:
+            print("Критическая ошибка: расписание недоступно ни в кэше, ни в резервных копиях, ни на сервере.")
+        return instance
+
+    @classmethod
+    def _from_cached(cls, cached_data: bytes, redis_client: Redis) -> "TimetableManager":
+        """Создаёт менеджер из основного кэша Redis и обновляет по нему fallback-файл и индекс."""
+        data = decode_schedule_cache(cached_data)
+
+        # Обновляем fallback файл актуальными данными из кэша
+        try:
+            from core.parser import save_fallback_schedule
+
+            save_fallback_schedule(data)
+            print("Fallback schedule updated with cached data")
+        except Exception as e:
+            print(f"Warning: Failed to update fallback schedule: {e}")
+
+        instance = cls(data, redis_client)
+        instance.write_index()
+        return instance
+
+    @classmethod
+    async def _load_stale_snapshot(cls, redis_client: Redis) -> dict | None:
+        """Последний известный снапшот без обращения к серверу: история/резервная копия, затем fallback-файл."""
+        backup_data = await cls._restore_from_backup(redis_client)
+        if backup_data:
+            # Обновляем fallback файл данными из резервной копии
+            try:
+                from core.parser import save_fallback_schedule
+
+                save_fallback_schedule(backup_data)
+                print("Fallback schedule updated with backup data")
+            except Exception as e:
+                print(f"Warning: Failed to update fallback schedule from backup: {e}")
+            return backup_data
+
+        from core.parser import load_fallback_schedule
 
+        fallback_data = load_fallback_schedule()
+        if fallback_data:
+            print("Используем fallback данные расписания.")
+            return fallback_data
+        return None
+
+    @classmethod
+    async def _refresh_snapshot(cls, redis_client: Redis, blocking: bool = False) -> "TimetableManager | None":
+        """
+        Загружает расписание с сервера вуза и публикует его в кэш Redis.
+
+        Выполняется под блокировкой, поэтому при одновременном старте бота и воркеров сервер опрашивает
+        только один процесс. Если кэш уже опубликован другим процессом, используется он.
+        Без blocking при занятой блокировке сразу возвращает None.
+        """
+        lock = redis_client.lock(_INIT_LOCK_NAME, timeout=_INIT_LOCK_TIMEOUT)
+        if not await lock.acquire(blocking=blocking):
+            return None
+        try:
+            cached_data = await redis_client.get(REDIS_SCHEDULE_CACHE_KEY)
             if cached_data:
-                print("Найден кэш расписания в Redis.")
-                # Создаем временный экземпляр для разжатия данных
-                temp_instance = cls.__new__(cls)
-                temp_instance._use_compression = True
-                data = temp_instance._decompress_data(cached_data)
+                return cls._from_cached(cached_data, redis_client)
 
-                # Обновляем fallback файл актуальными данными из кэша
-                try:
-                    from core.parser import save_fallback_schedule
+            from core.parser import fetch_and_parse_all_schedules
 
-                    save_fallback_schedule(data)
-                    print("Fallback schedule updated with cached data")
-                except Exception as e:
-                    print(f"Warning: Failed to update fallback schedule: {e}")
+            new_data = await fetch_and_parse_all_schedules()
+            if not new_data:
+                return None
+            instance = cls(new_data, redis_client)
+            await instance.save_to_cache()
+            print("Новое расписание загружено и сохранено в кэш Redis.")
+            return instance
+        finally:
+            try:
+                await lock.release()
+            except LockError:
+                pass  # Блокировка истекла по таймауту
+
+    def mark_stale(self):
+        """Помечает снапшот как устаревший (получен не из актуального кэша)."""
+        self.is_stale = True
+        TIMETABLE_SNAPSHOT_STALE.set(1)
+
+    def start_background_refresh(self):
+        """Запускает фоновое обновление устаревшего снапшота, если оно ещё не идёт."""
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+        self._refresh_task = asyncio.create_task(self._refresh_in_background())
+
+    async def _refresh_in_background(self):
+        delay = _REFRESH_RETRY_DELAY
+        while self.is_stale:
+            try:
+                fresh = await type(self)._refresh_snapshot(self.redis)
+            except Exception as e:
+                print(f"Фоновое обновление расписания не удалось: {e}")
+                fresh = None
+            if fresh is not None:
+                self._adopt_snapshot(fresh)
+                print("Устаревший снапшот расписания заменён актуальным.")
+                return
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, _REFRESH_RETRY_MAX_DELAY)
+
+    def _adopt_snapshot(self, fresh: "TimetableManager"):
+        """Подменяет данные этого экземпляра свежим снапшотом (ссылки на менеджер в боте остаются валидными)."""
+        preserved = {
+            key: self.__dict__[key] for key in ("_semester_settings_manager", "_refresh_task") if key in self.__dict__
+        }
+        self.__dict__.update(fresh.__dict__)
+        self.__dict__.update(preserved)
+        self.invalidate_calendar()
+        self.is_stale = False
+        TIMETABLE_SNAPSHOT_STALE.set(0)
 
-                return cls(data, redis_client)
-            else:
-                print("Кэш в Redis не найден. Загрузка с сервера...")
-                from core.parser import fetch_and_parse_all_schedules
-
-                new_data = await fetch_and_parse_all_schedules()
-                if new_data:
-                    temp_instance = cls(new_data, redis_client)
-                    await temp_instance.save_to_cache()
-                    print("Новое расписание загружено и сохранено в кэш Redis.")
-                    return temp_instance
-                else:
-                    # Пытаемся восстановить из последней резервной копии
-                    print("Сервер недоступен. Пытаемся восстановить из резервной копии...")
-                    backup_data = await cls._restore_from_backup(redis_client)
-                    if backup_data:
-                        temp_instance = cls(backup_data, redis_client)
-                        await temp_instance.save_to_cache()  # Восстанавливаем основной кэш
-
-                        # Обновляем fallback файл данными из резервной копии
-                        try:
-                            from core.parser import save_fallback_schedule
-
-                            save_fallback_schedule(backup_data)
-                            print("Fallback schedule updated with backup data")
-                        except Exception as e:
-                            print(f"Warning: Failed to update fallback schedule from backup: {e}")
-
-                        print("Расписание восстановлено из резервной копии!")
-                        return temp_instance
-                    else:
-                        print(
-                            "Критическая ошибка: нет доступных резервных копий расписания. Попытка загрузить fallback данные..."
-                        )
-                        # Пытаемся загрузить fallback данные
-                        from core.parser import load_fallback_schedule
-
-                        fallback_data = load_fallback_schedule()
-                        if fallback_data:
-                            print("Используем fallback данные расписания.")
-                            temp_instance = cls(fallback_data, redis_client)
-                            await temp_instance.save_to_cache()
-
-                            # Обновляем fallback файл (на случай если данные были изменены)
-                            try:
-                                from core.parser import save_fallback_schedule
-
-                                save_fallback_schedule(fallback_data)
-                                print("Fallback schedule file verified and updated")
-                            except Exception as e:
-                                print(f"Warning: Failed to update fallback schedule file: {e}")
-
-                            print("Fallback расписание загружено и сохранено в кэш Redis.")
-                            return temp_instance
-                        else:
-                            print("Критическая ошибка: fallback данные недоступны.")
-                            return None
+    @classmethod
+    def from_index(cls, index: TimetableIndex, redis_client: Redis) -> "TimetableManager":
+        """Создаёт менеджер поверх mmap-индекса: группы и индексы преподавателей/аудиторий читаются лениво."""
+        meta = index.section("meta")
+        data = {
+            "__metadata__": meta.get("__metadata__", {}),
+            "__teachers_index__": index.section("teachers"),
+            "__classrooms_index__": index.section("classrooms"),
+            "__current_xml_hash__": index.xml_hash,
+        }
+        instance = cls(data, redis_client, schedules=index.section("schedules"))
+        instance._index = index
+        return instance
+
+    @classmethod
+    async def _open_from_index(cls, redis_client: Redis) -> "TimetableManager | None":
+        """
+        Быстрый старт: открывает предкомпилированный индекс, если он соответствует актуальному снапшоту.
+
+        Актуальность проверяется по хешу XML в Redis — это короткий ключ, без чтения всего кэша.
+        """
+        if not TIMETABLE_INDEX_PATH.exists():
+            return None
+        try:
+            current_hash = await redis_client.get(REDIS_SCHEDULE_HASH_KEY)
+            if isinstance(current_hash, bytes):
+                current_hash = current_hash.decode()
+            index = TimetableIndex(TIMETABLE_INDEX_PATH)
+        except Exception as e:
+            print(f"Не удалось открыть индекс расписания: {e}")
+            return None
+
+        if not current_hash or not isinstance(current_hash, str) or index.xml_hash != current_hash:
+            index.close()
+            return None
+        print(f"Расписание открыто из индекса {TIMETABLE_INDEX_PATH} (без загрузки кэша).")
+        return cls.from_index(index, redis_client)
+
+    def write_index(self) -> bool:
+        """Компилирует текущий снапшот в индекс на диске, если файл отсутствует или устарел."""
+        if self._index is not None:
+            return False
+        try:
+            if TIMETABLE_INDEX_PATH.exists():
+                with TimetableIndex(TIMETABLE_INDEX_PATH) as existing:
+                    if self._current_xml_hash and existing.xml_hash == self._current_xml_hash:
+                        return False
+        except Exception:
+            pass  # Повреждённый или старый файл просто перезаписываем
+
+        try:
+            write_timetable_index(
+                {
+                    "__metadata__": self.metadata,
+                    "__teachers_index__": self._teachers_index,
+                    "__classrooms_index__": self._classrooms_index,
+                    "__current_xml_hash__": self._current_xml_hash,
+                    **self._schedules,
+                },
+                TIMETABLE_INDEX_PATH,
+            )
+            return True
+        except Exception as e:
+            print(f"Не удалось записать индекс расписания: {e}")
+            return False
 
     @classmethod
     async def _restore_from_backup(cls, redis_client: Redis):
         """
-        Восстанавливает расписание из последней резервной копии в Redis.
+        Восстанавливает расписание из последней версии истории или резервной копии в Redis.
 
         Returns:
             dict: Данные расписания или None если резервных копий нет
         """
         try:
-            # Ищем все резервные копии
-            backup_pattern = "timetable:backup:*"
-            backup_keys = await redis_client.keys(backup_pattern)
+            from core.schedule_history import LEGACY_BACKUP_PATTERN, ScheduleHistoryStore
+
+            history_data = await ScheduleHistoryStore(redis_client).reconstruct()
+            if history_data:
+                groups_count = len([k for k in history_data.keys() if not k.startswith("__")])
+                print(f"Расписание восстановлено из истории версий. Групп: {groups_count}")
+                return history_data
+        except Exception as e:
+            print(f"Ошибка при восстановлении из истории версий: {e}")
+
+        try:
+            # Резервные копии старого формата (полные снимки)
+            backup_keys = await redis_client.keys(LEGACY_BACKUP_PATTERN)
 
             if not backup_keys:
                 print("Резервные копии в Redis не найдены")
@@ -149,10 +377,7 @@ class TimetableManager:
             backup_data_raw = await redis_client.get(latest_backup_key)
 
             if backup_data_raw:
-                # Создаем временный экземпляр для разжатия данных
-                temp_instance = cls.__new__(cls)
-                temp_instance._use_compression = True
-                backup_data = temp_instance._decompress_data(backup_data_raw)
+                backup_data = decode_schedule_cache(backup_data_raw)
 
                 print(
                     f"Резервная копия успешно загружена. Групп: {len([k for k in backup_data.keys() if not k.startswith('__')])}"
@@ -179,6 +404,7 @@ class TimetableManager:
         # Используем сжатие для экономии места в Redis
         compressed_data = self._compress_data(data_to_save)
         await self.redis.set(REDIS_SCHEDULE_CACHE_KEY, compressed_data, ex=CACHE_LIFETIME)
+        self.write_index()
 
     def get_week_type(self, target_date: date) -> tuple[str, str] | None:
         """
@@ -201,32 +427,24 @@ class TimetableManager:
 
         return ("odd", "Нечетная") if week_number % 2 == 1 else ("even", "Четная")
 
-    async def get_academic_week_type(self, target_date: date) -> tuple[str, str]:
-        """
-        Определяет тип недели на основе академического календаря.
-
-        Правила:
-        - 1 сентября всегда нечетная неделя
-        - Первая неделя зимнего семестра (обычно январь) - нечетная
-        - Недели чередуются: нечетная -> четная -> нечетная -> четная
-        - Все дни одной календарной недели (понедельник-воскресенье) имеют одинаковый тип
-        """
-        year = target_date.year
-
-        # Пытаемся получить настройки из базы данных
-        fall_semester_start = None
-        spring_semester_start = None
-
+    async def _load_semester_settings(self) -> tuple[date | None, date | None]:
+        """Даты начала осеннего и весеннего семестров из БД (None — значения по умолчанию)."""
         # Если есть доступ к настройкам семестров, используем их
         if hasattr(self, "_semester_settings_manager"):
             try:
                 # Пытаемся получить настройки из менеджера
                 settings = await self._semester_settings_manager.get_semester_settings()
                 if settings:
-                    fall_semester_start, spring_semester_start = settings
+                    return settings[0], settings[1]
             except:
                 # Если не удалось получить настройки, используем значения по умолчанию
                 pass
+        return None, None
+
+    @staticmethod
+    def _semester_start_for(target_date: date, fall_semester_start: date | None, spring_semester_start: date | None) -> date:
+        """Определяет дату начала семестра, от которой считаются недели для target_date."""
+        year = target_date.year
 
         # Если настройки не получены, используем значения по умолчанию
         if fall_semester_start is None:
@@ -243,40 +461,265 @@ class TimetableManager:
         # Определяем, в каком семестре мы находимся
         if fall_semester_start <= target_date < spring_semester_start:
             # Осенний семестр
-            semester_start = fall_semester_start
-            semester_name = "осеннего"
+            return fall_semester_start
         elif target_date >= spring_semester_start:
             # Весенний семестр
-            semester_start = spring_semester_start
-            semester_name = "весеннего"
-        else:
-            # Лето - используем осенний семестр предыдущего года
-            semester_start = date(year - 1, 9, 1)
-            semester_name = "осеннего"
+            return spring_semester_start
+        # Лето - используем осенний семестр предыдущего года
+        return date(year - 1, 9, 1)
 
+    @staticmethod
+    def _week_type_from_semester_start(semester_start: date, target_date: date) -> tuple[str, str]:
+        """Тип недели по числу календарных недель от недели начала семестра."""
         # Для целей расписания важно, чтобы дни одной календарной недели были одинаковыми,
         # но академические недели считаются от даты начала семестра
 
         # Находим понедельник недели начала семестра
-        semester_start_weekday = semester_start.weekday()
-        start_monday = semester_start - timedelta(days=semester_start_weekday)
+        start_monday = semester_start - timedelta(days=semester_start.weekday())
 
         # Находим понедельник недели, в которую попадает целевая дата
-        target_weekday = target_date.weekday()
-        target_week_monday = target_date - timedelta(days=target_weekday)
+        target_week_monday = target_date - timedelta(days=target_date.weekday())
 
         # Вычисляем количество дней от понедельника начала семестра до понедельника целевой недели
-        days_to_target_week = (target_week_monday - start_monday).days
-
-        week_number = days_to_target_week // 7
+        week_number = (target_week_monday - start_monday).days // 7
 
         # Определяем тип недели (нечетная для even week_numbers)
         is_odd = (week_number % 2) == 0
+        return ("odd", "Нечетная") if is_odd else ("even", "Четная")
+
+    async def get_academic_week_type(self, target_date: date) -> tuple[str, str]:
+        """
+        Определяет тип недели на основе академического календаря.
+
+        Правила:
+        - 1 сентября всегда нечетная неделя
+        - Первая неделя зимнего семестра (обычно январь) - нечетная
+        - Недели чередуются: нечетная -> четная -> нечетная -> четная
+        - Все дни одной календарной недели (понедельник-воскресенье) имеют одинаковый тип
+        """
+        fall_semester_start, spring_semester_start = await self._load_semester_settings()
+        semester_start = self._semester_start_for(target_date, fall_semester_start, spring_semester_start)
+        return self._week_type_from_semester_start(semester_start, target_date)
+
+    # --- Материализованный календарь занятий ---
+
+    async def _ensure_semester_materialized(self, target_date: date) -> date:
+        """
+        Разворачивает календарь семестра, содержащего дату: тип недели для каждого дня.
+
+        Семестр — максимальный непрерывный отрезок дней с одной и той же датой отсчёта недель.
 
-        week_type = "odd" if is_odd else "even"
-        week_name = "Нечетная" if is_odd else "Четная"
+        Returns:
+            date: первый день отрезка — ключ для материализованных вхождений.
+        """
+        await self._sync_calendar_version()
+        if target_date in self._calendar:
+            return self._calendar[target_date][0]
+
+        fall_setting, spring_setting = await self._load_semester_settings()
+        semester_start = self._semester_start_for(target_date, fall_setting, spring_setting)
+
+        first_day = target_date
+        while (target_date - first_day).days < _MAX_SEMESTER_DAYS and (
+            self._semester_start_for(first_day - timedelta(days=1), fall_setting, spring_setting) == semester_start
+        ):
+            first_day -= timedelta(days=1)
+        end_day = target_date + timedelta(days=1)
+        while (end_day - target_date).days < _MAX_SEMESTER_DAYS and (
+            self._semester_start_for(end_day, fall_setting, spring_setting) == semester_start
+        ):
+            end_day += timedelta(days=1)
+
+        self._semester_ends[first_day] = end_day
+        day = first_day
+        while day < end_day:
+            self._calendar[day] = (first_day, self._week_type_from_semester_start(semester_start, day))
+            day += timedelta(days=1)
+        return first_day
+
+    async def _get_week_info(self, target_date: date) -> tuple[str, str]:
+        """Тип недели из материализованного календаря (без повторного расчёта)."""
+        await self._ensure_semester_materialized(target_date)
+        return self._calendar[target_date][1]
+
+    def _entity_lessons(self, entity_type: str, name: str) -> list[tuple[str, str, dict]]:
+        """Список (код недели, день, пара) для группы/преподавателя/аудитории."""
+        if entity_type == "group":
+            group_schedule = self._schedules.get(name.upper()) or {}
+            odd_days = group_schedule.get("odd", {}) or {}
+            even_days = group_schedule.get("even", {}) or {}
+            entries = [("1", day, lesson) for day, lessons in odd_days.items() for lesson in lessons]
+            entries += [("2", day, lesson) for day, lessons in even_days.items() for lesson in lessons]
+            return entries
+        source = {"teacher": self._teachers_index, "classroom": self._classrooms_index}.get(entity_type)
+        if source is None:
+            raise ValueError(f"Неизвестный тип сущности: {entity_type}")
+        return [(lesson.get("week_code", "0"), lesson.get("day"), lesson) for lesson in source.get(name, [])]
+
+    async def _get_entity_occurrences(self, entity_type: str, name: str, target_date: date) -> tuple[list, list, dict]:
+        """
+        Датированные вхождения сущности за семестр, содержащий target_date.
 
-        return (week_type, week_name)
+        Returns:
+            tuple[list[datetime], list[dict], dict]: отсортированные моменты начала, соответствующие
+            пары и индекс «нормализованный предмет → (моменты начала, пары)».
+        """
+        if entity_type == "group":
+            name = name.upper()
+        semester_start = await self._ensure_semester_materialized(target_date)
+        cache_key = (entity_type, name, semester_start)
+        cached = self._occurrences.get(cache_key)
+        if cached is not None:
+            return cached
+
+        by_day_and_week: dict[tuple[str, str], list[dict]] = defaultdict(list)
+        for week_code, day_name, lesson in self._entity_lessons(entity_type, name):
+            weeks = ("odd", "even") if week_code not in ("1", "2") else (("odd",) if week_code == "1" else ("even",))
+            for week_key in weeks:
+                by_day_and_week[(week_key, day_name)].append(lesson)
+
+        pairs = []
+        day = semester_start
+        while day < self._semester_ends[semester_start]:
+            week_key, _ = self._calendar[day][1]
+            for lesson in by_day_and_week.get((week_key, DAY_MAP[day.weekday()]), ()):
+                minutes = _parse_minutes(lesson.get("start_time_raw"))
+                pairs.append((datetime.combine(day, datetime.min.time()) + timedelta(minutes=minutes or 0), lesson))
+            day += timedelta(days=1)
+        pairs.sort(key=lambda pair: pair[0])
+
+        by_subject: dict[str, tuple[list, list]] = {}
+        for start, lesson in pairs:
+            subject_starts, subject_lessons = by_subject.setdefault(
+                " ".join(_tokenize_subject(lesson.get("subject", ""))), ([], [])
+            )
+            subject_starts.append(start)
+            subject_lessons.append(lesson)
+
+        result = ([start for start, _ in pairs], [lesson for _, lesson in pairs], by_subject)
+        self._occurrences[cache_key] = result
+        return result
+
+    async def _lessons_on_date(self, entity_type: str, name: str, target_date: date) -> list[dict]:
+        """Пары сущности на дату: бинарный поиск по материализованным вхождениям."""
+        starts, lessons, _ = await self._get_entity_occurrences(entity_type, name, target_date)
+        day_start = datetime.combine(target_date, datetime.min.time())
+        lo = bisect.bisect_left(starts, day_start)
+        hi = bisect.bisect_left(starts, day_start + timedelta(days=1), lo)
+        return lessons[lo:hi]
+
+    async def get_occurrences(self, entity_type: str, name: str, start_date: date, end_date: date) -> list[dict]:
+        """
+        Возвращает датированные занятия сущности в диапазоне [start_date, end_date] включительно.
+
+        Args:
+            entity_type: "group", "teacher" или "classroom"
+            name: номер группы, каноническое имя преподавателя или номер аудитории
+        """
+        result = []
+        day = start_date
+        while day <= end_date:
+            starts, lessons, _ = await self._get_entity_occurrences(entity_type, name, day)
+            lo = bisect.bisect_left(starts, datetime.combine(day, datetime.min.time()))
+            window_end = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+            hi = bisect.bisect_left(starts, window_end, lo)
+            for start, lesson in zip(starts[lo:hi], lessons[lo:hi]):
+                result.append({**lesson, "date": start.date(), "start": start})
+            # Переходим к следующему семестру, если диапазон его захватывает
+            day = self._semester_ends[self._calendar[day][0]]
+        return result
+
+    async def get_next_occurrence(
+        self, entity_type: str, name: str, subject_query: str, after: datetime | None = None
+    ) -> dict | None:
+        """
+        Ближайшее занятие по предмету после момента after (по умолчанию — сейчас).
+
+        Предмет сопоставляется по вхождению нормализованной строки в название.
+        Для каждого подходящего предмета ближайшее вхождение находится бинарным поиском
+        по его отсортированным моментам начала; просматриваются текущий и следующий семестры.
+        """
+        after = after or datetime.now(MOSCOW_TZ).replace(tzinfo=None)
+        needle = " ".join(_tokenize_subject(subject_query))
+        if not needle:
+            return None
+
+        day = after.date()
+        for _ in range(2):
+            _, _, by_subject = await self._get_entity_occurrences(entity_type, name, day)
+            best = None
+            for subject_key, (starts, lessons) in by_subject.items():
+                if needle not in subject_key:
+                    continue
+                idx = bisect.bisect_right(starts, after)
+                if idx < len(starts) and (best is None or starts[idx] < best[0]):
+                    best = (starts[idx], lessons[idx])
+            if best:
+                start, lesson = best
+                return {**lesson, "date": start.date(), "start": start}
+            day = self._semester_ends[self._calendar[day][0]]
+        return None
+
+    async def get_day_timeline(self, name: str, target_date: date, entity_type: str = "group") -> DayTimeline:
+        """Таймлайн дня (границы пар в минутах), кэшируется по (сущность, дата)."""
+        if entity_type == "group":
+            name = name.upper()
+        cache_key = (entity_type, name, target_date)
+        timeline = self._timelines.get(cache_key)
+        if timeline is None:
+            lessons = await self._lessons_on_date(entity_type, name, target_date)
+            try:
+                timeline = DayTimeline.from_lessons(lessons)
+            except (KeyError, ValueError, AttributeError):
+                # Пары с битым временем не участвуют в поиске «сейчас/далее»
+                timeline = DayTimeline.from_lessons([lesson for lesson in lessons if _has_valid_bounds(lesson)])
+            if len(self._timelines) >= _MAX_TIMELINES:
+                self._timelines.clear()
+            self._timelines[cache_key] = timeline
+        return timeline
+
+    async def get_lesson_status(self, name: str, at: datetime | None = None, entity_type: str = "group") -> LessonStatus:
+        """
+        Текущая/следующая пара и минуты до смены состояния для момента at (по умолчанию — сейчас, МСК).
+
+        Общая дешёвая проверка для заголовков, напоминаний и команды «где я сейчас».
+        """
+        at = at or datetime.now(MOSCOW_TZ)
+        timeline = await self.get_day_timeline(name, at.date(), entity_type=entity_type)
+        return timeline.status_at(at.hour * 60 + at.minute + at.second / 60)
+
+    def invalidate_calendar(self):
+        """Сбрасывает материализованный календарь (например, после изменения дат семестров)."""
+        self._calendar: dict[date, tuple[date, tuple[str, str]]] = {}
+        self._semester_ends: dict[date, date] = {}
+        self._occurrences: dict[tuple[str, str, date], tuple[list, list, dict]] = {}
+        self._timelines: dict[tuple[str, str, date], DayTimeline] = {}
+
+    async def _sync_calendar_version(self):
+        """
+        Сбрасывает календарь, если даты семестров изменили в другом процессе (воркер, другая реплика).
+
+        Версия календаря хранится в Redis и сверяется не чаще раза в _CALENDAR_VERSION_CHECK_INTERVAL секунд.
+        """
+        now = time.monotonic()
+        if now - self._calendar_checked_at < _CALENDAR_VERSION_CHECK_INTERVAL:
+            return
+        self._calendar_checked_at = now
+        try:
+            version = int(await self.redis.get(REDIS_CALENDAR_VERSION_KEY) or 0)
+        except Exception:
+            return
+        if self._calendar_version is not None and version != self._calendar_version:
+            self.invalidate_calendar()
+        self._calendar_version = version
+
+    async def publish_calendar_change(self):
+        """Сбрасывает календарь в этом процессе и сообщает об изменении дат семестров остальным через Redis."""
+        self.invalidate_calendar()
+        try:
+            self._calendar_version = int(await self.redis.incr(REDIS_CALENDAR_VERSION_KEY))
+        except Exception as e:
+            print(f"Не удалось опубликовать смену дат семестров: {e}")
 
     async def get_schedule_for_day(self, group_number: str, target_date: date = None) -> dict | None:
         """Возвращает расписание для группы на конкретный день."""
@@ -300,12 +743,11 @@ class TimetableManager:
 
             return {"error": error_message}
 
-        # Используем новую академическую логику определения недели
-        week_info = await self.get_academic_week_type(target_date)
-        week_key, week_name = week_info
+        # Тип недели берём из материализованного академического календаря
+        _, week_name = await self._get_week_info(target_date)
         day_name = DAY_MAP[target_date.weekday()]
 
-        lessons = group_schedule.get(week_key, {}).get(day_name, []) if day_name else []
+        lessons = await self._lessons_on_date("group", group_number, target_date) if day_name else []
 
         return {
             "group": group_number.upper(),
@@ -400,23 +842,11 @@ class TimetableManager:
                 else:
                     return {"error": f"Преподаватель '{teacher_name}' не найден в индексе."}
 
-        # Используем новую академическую логику определения недели
-        week_info = await self.get_academic_week_type(target_date)
-        week_key_num, week_name = week_info
+        # Тип недели берём из материализованного академического календаря
+        _, week_name = await self._get_week_info(target_date)
         day_name = DAY_MAP[target_date.weekday()]
 
-        lessons_for_day = []
-        if day_name:
-            all_teacher_lessons = self._teachers_index.get(exact_match, [])
-            for lesson in all_teacher_lessons:
-                if lesson.get("day") == day_name:
-                    lesson_week_code = lesson.get("week_code", "0")
-                    is_every_week = lesson_week_code == "0"
-                    is_odd_match = week_key_num == "odd" and lesson_week_code == "1"
-                    is_even_match = week_key_num == "even" and lesson_week_code == "2"
-
-                    if is_every_week or is_odd_match or is_even_match:
-                        lessons_for_day.append(lesson)
+        lessons_for_day = await self._lessons_on_date("teacher", exact_match, target_date) if day_name else []
 
         return {
             "teacher": exact_match,
@@ -429,6 +859,123 @@ class TimetableManager:
             ),
         }
 
+    def _build_subject_index(self):
+        """
+        Строит инвертированный индекс «токен предмета → postings» для текущего снапшота.
+
+        Posting — (группа, код недели, день, время начала) плюс данные пары для вывода.
+        Код недели восстанавливается из odd/even: пара, присутствующая в обеих неделях, имеет код "0".
+        """
+        postings: list[dict] = []
+        index: dict[str, list[int]] = defaultdict(list)
+
+        for group, group_schedule in self._schedules.items():
+            if not isinstance(group_schedule, dict):
+                continue
+            odd_days = group_schedule.get("odd", {}) or {}
+            even_days = group_schedule.get("even", {}) or {}
+            for day in dict.fromkeys([*odd_days.keys(), *even_days.keys()]):
+                odd_lessons = odd_days.get(day, []) or []
+                even_lessons = even_days.get(day, []) or []
+
+                def _key(lesson: dict) -> tuple:
+                    return (
+                        lesson.get("start_time_raw"),
+                        lesson.get("subject"),
+                        lesson.get("type"),
+                        lesson.get("room"),
+                    )
+
+                even_keys = {_key(lesson) for lesson in even_lessons}
+                odd_keys = {_key(lesson) for lesson in odd_lessons}
+                entries = [(lesson, "0" if _key(lesson) in even_keys else "1") for lesson in odd_lessons]
+                entries += [(lesson, "2") for lesson in even_lessons if _key(lesson) not in odd_keys]
+
+                for lesson, week_code in entries:
+                    tokens = set(_tokenize_subject(lesson.get("subject", "")))
+                    if not tokens:
+                        continue
+                    posting_id = len(postings)
+                    postings.append(
+                        {
+                            "group": group,
+                            "week_code": week_code,
+                            "day": day,
+                            "start_time_raw": lesson.get("start_time_raw", ""),
+                            "time": lesson.get("time", ""),
+                            "subject": lesson.get("subject", ""),
+                            "type": lesson.get("type", ""),
+                            "room": lesson.get("room", ""),
+                            "teachers": lesson.get("teachers", ""),
+                            "_tokens": len(tokens),
+                        }
+                    )
+                    for token in tokens:
+                        index[token].append(posting_id)
+
+        self._subject_postings = postings
+        self._subject_index = dict(index)
+        self._subject_vocabulary = sorted(self._subject_index)
+
+    def _postings_for_prefix(self, prefix: str) -> list[int]:
+        """Объединяет posting-списки всех токенов словаря, начинающихся с prefix."""
+        start = bisect.bisect_left(self._subject_vocabulary, prefix)
+        merged: set[int] = set()
+        for token in self._subject_vocabulary[start:]:
+            if not token.startswith(prefix):
+                break
+            merged.update(self._subject_index[token])
+        return sorted(merged)
+
+    def search_subjects(self, query: str, limit: int = 5) -> list[dict]:
+        """
+        Ищет предмет по всем группам через пересечение posting-списков.
+
+        Каждый токен запроса сопоставляется с токенами названия по префиксу (чтобы работали
+        сокращения вроде «теор мех»). Результаты сгруппированы по названию предмета и
+        ранжированы по доле покрытых токенов названия, затем по числу занятий.
+
+        Returns:
+            list[dict]: [{"subject", "score", "occurrences": [...]}, ...]
+        """
+        tokens = _tokenize_subject(query)
+        if not tokens or len("".join(tokens)) < 3:
+            return []
+        if self._subject_vocabulary is None:
+            self._build_subject_index()
+
+        posting_lists = [self._postings_for_prefix(token) for token in tokens]
+        posting_lists.sort(key=len)
+        matched = posting_lists[0]
+        for other in posting_lists[1:]:
+            if not matched:
+                break
+            matched = _intersect_postings(matched, other)
+        if not matched:
+            return []
+
+        day_order = {day: i for i, day in enumerate(DAY_MAP) if day}
+        by_subject: dict[str, list[dict]] = defaultdict(list)
+        for posting_id in matched:
+            posting = self._subject_postings[posting_id]
+            by_subject[posting["subject"]].append(posting)
+
+        results = []
+        for subject, occurrences in by_subject.items():
+            score = len(tokens) / max(occurrences[0]["_tokens"], len(tokens))
+            results.append(
+                {
+                    "subject": subject,
+                    "score": round(score, 3),
+                    "occurrences": sorted(
+                        ({k: v for k, v in o.items() if not k.startswith("_")} for o in occurrences),
+                        key=lambda o: (day_order.get(o["day"], 99), o["start_time_raw"], o["week_code"], o["group"]),
+                    ),
+                }
+            )
+        results.sort(key=lambda r: (-r["score"], -len(r["occurrences"]), r["subject"]))
+        return results[:limit]
+
     def find_classrooms(self, query: str) -> list[str]:
         """Находит аудитории, номер которых начинается с поискового запроса."""
         if not query:
@@ -454,23 +1001,11 @@ class TimetableManager:
         if classroom_number not in self._classrooms_index:
             return {"error": f"Аудитория '{classroom_number}' не найдена в индексе."}
 
-        # Используем новую академическую логику определения недели
-        week_info = await self.get_academic_week_type(target_date)
-        week_key_num, week_name = week_info
+        # Тип недели берём из материализованного академического календаря
+        _, week_name = await self._get_week_info(target_date)
         day_name = DAY_MAP[target_date.weekday()]
 
-        lessons_for_day = []
-        if day_name:
-            all_classroom_lessons = self._classrooms_index.get(classroom_number, [])
-            for lesson in all_classroom_lessons:
-                if lesson.get("day") == day_name:
-                    lesson_week_code = lesson.get("week_code", "0")
-                    is_every_week = lesson_week_code == "0"
-                    is_odd_match = week_key_num == "odd" and lesson_week_code == "1"
-                    is_even_match = week_key_num == "even" and lesson_week_code == "2"
-
-                    if is_every_week or is_odd_match or is_even_match:
-                        lessons_for_day.append(lesson)
+        lessons_for_day = await self._lessons_on_date("classroom", classroom_number, target_date) if day_name else []
 
         return {
             "classroom": classroom_number,
@@ -490,6 +1025,7 @@ class TimetableManager:
     def set_semester_settings_manager(self, settings_manager):
         """Устанавливает менеджер настроек семестров."""
         self._semester_settings_manager = settings_manager
+        self.invalidate_calendar()
 
     async def get_semester_settings_manager(self):
         """Получает менеджер настроек семестров."""
@@ -510,10 +1046,4 @@ class TimetableManager:
         if not self._use_compression:
             return json.loads(compressed_data.decode("utf-8"))
 
-        try:
-            # Пытаемся разжать как сжатые данные
-            decompressed = gzip.decompress(compressed_data)
-            return pickle.loads(decompressed)
-        except (gzip.BadGzipFile, pickle.UnpicklingError):
-            # Если не получилось, пробуем как обычный JSON (обратная совместимость)
-            return json.loads(compressed_data.decode("utf-8"))
+        return decode_schedule_cache(compressed_data)
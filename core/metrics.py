@@ -16,6 +16,16 @@ USERS_TOTAL = Gauge("bot_users_total", "Total number of users in the database")
 # Датчик для количества пользователей с активными подписками на рассылки.
 SUBSCRIBED_USERS = Gauge("bot_subscribed_users", "Number of users with at least one active subscription")
 
+# Подписанные пользователи, заблокировавшие бота: рассылки их пропускают. Доля — от всех подписанных.
+BLOCKED_SUBSCRIBED_USERS = Gauge(
+    "bot_blocked_subscribed_users",
+    "Subscribed users skipped by broadcasts because they blocked the bot",
+)
+BROADCAST_BLOCKED_SHARE = Gauge(
+    "bot_broadcast_blocked_share",
+    "Share of subscribed users skipped by broadcasts because they blocked the bot",
+)
+
 # Гистограмма для измерения времени ответа хэндлеров.
 # Позволяет собирать статистику по распределению времени выполнения (среднее, перцентили).
 # 'handler_name' - метка для идентификации конкретного хэндлера.
@@ -37,6 +47,130 @@ LAST_SCHEDULE_UPDATE_TS = Gauge(
     "Unix timestamp of last successful schedule update",
 )
 
+# 1 — процесс работает на устаревшем снапшоте расписания (резервная копия/fallback), ждёт фонового обновления
+TIMETABLE_SNAPSHOT_STALE = Gauge(
+    "bot_timetable_snapshot_stale",
+    "Whether the timetable snapshot served by this process is stale (1) or fresh (0)",
+)
+
+# Лидерство планировщика среди реплик: 1 — эта реплика выполняет задачи по расписанию
+SCHEDULER_LEADER = Gauge(
+    "bot_scheduler_leader",
+    "Whether this replica holds the scheduler leader lease (1) or is standby (0)",
+)
+SCHEDULER_LEADER_TRANSITIONS = Counter(
+    "bot_scheduler_leader_transitions_total",
+    "Scheduler leadership changes on this replica",
+    ["transition"],  # elected, demoted
+)
+
+# Задачи планировщика (APScheduler): метка job_id — стабильный id задачи из setup_scheduler
+SCHEDULER_JOB_RUNS = Counter(
+    "bot_scheduler_job_runs_total",
+    "Scheduler job executions",
+    ["job_id", "status"],  # success, error
+)
+SCHEDULER_JOB_DURATION = Histogram(
+    "bot_scheduler_job_duration_seconds",
+    "Scheduler job run duration",
+    ["job_id"],
+    buckets=(0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800),
+)
+SCHEDULER_JOB_LATENESS = Histogram(
+    "bot_scheduler_job_lateness_seconds",
+    "Delay between the scheduled fire time and the actual job submission",
+    ["job_id"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 15, 30, 60, 120, 300),
+)
+SCHEDULER_JOB_MISFIRES = Counter(
+    "bot_scheduler_job_misfires_total",
+    "Scheduled runs skipped because they were later than misfire_grace_time",
+    ["job_id"],
+)
+SCHEDULER_JOB_OVERLAPS = Counter(
+    "bot_scheduler_job_overlaps_total",
+    "Runs skipped because the previous run of the job was still in progress",
+    ["job_id"],
+)
+SCHEDULER_JOB_LAST_SUCCESS = Gauge(
+    "bot_scheduler_job_last_success_timestamp_seconds",
+    "Unix time of the last successful run of the job",
+    ["job_id"],
+)
+
+# Файловые резервные копии: вид — db или schedules
+BACKUP_RUNS = Counter(
+    "bot_backup_runs_total",
+    "Backup attempts by outcome",
+    ["kind", "status"],  # created, unchanged, failed
+)
+BACKUP_DURATION = Histogram(
+    "bot_backup_duration_seconds",
+    "Time to produce a backup file",
+    ["kind"],
+    buckets=(0.1, 0.5, 1, 5, 15, 30, 60, 120, 300),
+)
+BACKUP_SIZE_BYTES = Gauge(
+    "bot_backup_size_bytes",
+    "Compressed size of the latest backup file",
+    ["kind"],
+)
+
+# Ресурсы процессов воркера Dramatiq (экспортируются на :9191 в multiprocess-режиме, суммируются по живым процессам)
+WORKER_DB_CONNECTIONS = Gauge(
+    "bot_worker_db_connections",
+    "Database pool connections held by worker processes",
+    ["state"],  # in_use, idle
+    multiprocess_mode="livesum",
+)
+WORKER_REDIS_CONNECTIONS = Gauge(
+    "bot_worker_redis_connections",
+    "Redis pool connections held by worker processes",
+    ["state"],  # in_use, idle
+    multiprocess_mode="livesum",
+)
+WORKER_RESOURCES_CREATED = Counter(
+    "bot_worker_resources_created_total",
+    "Engines and Redis clients created by worker processes (should stay flat while workers run)",
+    ["resource"],  # redis, user_data
+)
+
+# Время ожидания сообщений Dramatiq в очереди по полосам (bot/worker_lanes.py)
+WORKER_QUEUE_WAIT = Histogram(
+    "bot_worker_queue_wait_seconds",
+    "Time a message waited in its queue before a worker started it",
+    ["lane"],  # interactive, time_critical, bulk
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900),
+)
+
+# Пакетная отправка рассылок воркером: исход по каждому получателю пачки
+BROADCAST_BATCH_RECIPIENTS = Counter(
+    "bot_broadcast_batch_recipients_total",
+    "Recipients processed by batch broadcast tasks",
+    ["outcome"],  # sent, blocked, failed, retried, deferred
+)
+
+# Общий лимитер исходящих сообщений воркеров (GCRA в Redis)
+TELEGRAM_SEND_WAIT = Histogram(
+    "bot_telegram_send_wait_seconds",
+    "Time a worker waited for its send slot",
+    buckets=(0, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+)
+TELEGRAM_SEND_LIMITER_FALLBACKS = Counter(
+    "bot_telegram_send_limiter_fallbacks_total",
+    "Sends limited by the local per-process limiter because Redis was unavailable",
+)
+# Общая пауза отправки после 429: сколько раз Telegram вернул retry_after и до какого момента стоят все воркеры
+TELEGRAM_SEND_PAUSES = Counter(
+    "bot_telegram_send_pauses_total",
+    "Telegram 429 responses that paused sending for the whole worker fleet",
+)
+TELEGRAM_SEND_PAUSED_UNTIL = Gauge(
+    "bot_telegram_send_paused_until_timestamp_seconds",
+    "Unix time until which all workers hold outgoing messages after a 429 (in the past when not paused)",
+    multiprocess_mode="max",
+)
+
 # ===== НОВЫЕ МЕТРИКИ ДЛЯ КЭШИРОВАНИЯ ИЗОБРАЖЕНИЙ =====
 
 # Счетчик попаданий в кэш изображений
@@ -234,6 +368,34 @@ NOTIFICATION_DELIVERY_TIME = Histogram(
     ["notification_type"],
 )
 
+# Рассылки: уникальные рендеры текста против числа получателей (разница — сэкономленная работа)
+BROADCAST_RENDERS = Counter(
+    "bot_broadcast_renders_total",
+    "Distinct broadcast messages rendered",
+    ["broadcast"],  # evening, morning
+)
+BROADCAST_RECIPIENTS = Counter(
+    "bot_broadcast_recipients_total",
+    "Broadcast recipients processed",
+    ["broadcast"],
+)
+BROADCAST_OUTBOX_DELIVERIES = Counter(
+    "bot_broadcast_outbox_deliveries_total",
+    "Broadcast outbox delivery state transitions",
+    ["status"],  # queued, done, failed
+)
+BROADCAST_PACING_BACKLOG = Gauge(
+    "bot_broadcast_pacing_backlog_seconds",
+    "Seconds until all planned broadcast deliveries are sent at the global rate",
+)
+
+# Прогноз погоды: откуда взят (кэш процесса, общий кэш Redis, запрос к OpenWeatherMap)
+WEATHER_FORECAST_LOOKUPS = Counter(
+    "bot_weather_forecast_lookups_total",
+    "Weather forecast lookups by source",
+    ["source"],  # local, redis, upstream, failed
+)
+
 # ===== МЕТРИКИ ПАРСЕРА =====
 
 # Статистика парсинга
@@ -10,6 +10,7 @@ import aiohttp
 
 from core.config import API_URL, USER_AGENT
 from core.metrics import ERRORS_TOTAL, RETRIES_TOTAL
+from core.schedule_fingerprints import FINGERPRINTS_DATA_KEY, compute_fingerprints
 
 # Заготовки для условного кэширования
 _LAST_ETAG: str | None = None
@@ -386,6 +387,8 @@ async def fetch_and_parse_all_schedules() -> dict | None:
         all_schedules["__teachers_index__"] = {t: list(l.values()) for t, l in teachers_index.items()}
         all_schedules["__classrooms_index__"] = {c: list(l.values()) for c, l in classrooms_index.items()}
         all_schedules["__current_xml_hash__"] = current_hash
+        # Отпечатки дней по группам: по ним монитор изменений находит группы, для которых нужен дифф
+        all_schedules[FINGERPRINTS_DATA_KEY] = compute_fingerprints(all_schedules)
 
         # Обновляем fallback файл с актуальными данными для оффлайн-режима
         try:
@@ -394,7 +397,8 @@ async def fetch_and_parse_all_schedules() -> dict | None:
         except Exception as e:
             logging.warning(f"Failed to update fallback schedule: {e}")
 
-        print(f"Расписание успешно загружено. Найдено {len(all_schedules)-3} групп.")
+        groups_count = sum(1 for key in all_schedules if not key.startswith("__"))
+        print(f"Расписание успешно загружено. Найдено {groups_count} групп.")
         return all_schedules
 
     except Exception as e:
@@ -0,0 +1,18 @@
+"""
+Разбор значений, прочитанных из Redis.
+
+Клиент создаётся без decode_responses, поэтому ключи и значения приходят как bytes;
+в тестах (fakeredis, моки) они бывают и строками.
+"""
+
+from typing import Optional
+
+
+def as_str(value: bytes | str) -> str:
+    """Значение Redis в виде строки (bytes декодируются как UTF-8)."""
+    return value.decode("utf-8") if isinstance(value, bytes) else str(value)
+
+
+def as_optional_str(value: Optional[bytes | str]) -> Optional[str]:
+    """То же, что as_str, но отсутствующее значение (None) остаётся None."""
+    return None if value is None else as_str(value)
@@ -0,0 +1,121 @@
+"""
+Состояние напоминаний о парах, разложенное по минутным слотам (в Redis).
+
+Вместо отдельной задачи планировщика на каждого пользователя и каждую пару хранится:
+- slots — отсортированное множество минут дня, на которые есть напоминания (одна задача на минуту);
+- slot:<ЧЧ:ММ> — записи слота на уровне группы: «first|<смещение>|<группа>» (напоминание перед
+  первой парой за N минут) и «end|<конец пары>|<группа>» (перерыв или конец занятий);
+- group:<группа> — индекс «пользователь → смещение напоминания» для получателей группы;
+- users — обратный индекс «пользователь → группа», чтобы отмена была O(1).
+
+Получатели слота определяются в момент срабатывания по индексу группы, поэтому отписка или
+смена времени напоминания не требуют перепланирования задач. Ключи живут чуть больше суток.
+"""
+
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from redis.asyncio import Redis
+
+from core.redis_values import as_str
+
+REMINDER_STATE_TTL = 36 * 3600
+
+
+def format_slot(minute: int) -> str:
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+class SlotEntry(NamedTuple):
+    """Запись слота: kind — first/end, value — смещение в минутах или время конца пары."""
+
+    kind: str
+    value: str
+    group: str
+
+    def encode(self) -> str:
+        return f"{self.kind}|{self.value}|{self.group}"
+
+    @classmethod
+    def decode(cls, raw) -> "SlotEntry":
+        kind, value, group = as_str(raw).split("|", 2)
+        return cls(kind, value, group)
+
+
+class ReminderSlotStore:
+    """Хранилище слотов напоминаний и индекса получателей по группам на конкретный день."""
+
+    def __init__(self, redis_client: Redis, prefix: str = "reminders:"):
+        self.redis = redis_client
+        self._prefix = prefix
+
+    def _key(self, day: str, *parts: str) -> str:
+        return self._prefix + ":".join((day, *parts))
+
+    async def _touch(self, *keys: str):
+        for key in keys:
+            await self.redis.expire(key, REMINDER_STATE_TTL)
+
+    async def add_user(self, day: str, user_id: int, group: str, offset: int):
+        """Добавляет (или переносит) пользователя в индекс получателей группы."""
+        users_key = self._key(day, "users")
+        previous = await self.redis.hget(users_key, str(user_id))
+        if previous is not None and as_str(previous) != group:
+            await self.redis.hdel(self._key(day, "group", as_str(previous)), str(user_id))
+        group_key = self._key(day, "group", group)
+        await self.redis.hset(group_key, str(user_id), str(offset))
+        await self.redis.hset(users_key, str(user_id), group)
+        await self._touch(group_key, users_key)
+
+    async def remove_user(self, day: str, user_id: int) -> bool:
+        """Убирает пользователя из получателей на день: два обращения к хешам, без обхода задач."""
+        users_key = self._key(day, "users")
+        group = await self.redis.hget(users_key, str(user_id))
+        if group is None:
+            return False
+        await self.redis.hdel(self._key(day, "group", as_str(group)), str(user_id))
+        await self.redis.hdel(users_key, str(user_id))
+        return True
+
+    async def group_users(self, day: str, group: str) -> Dict[int, int]:
+        """Получатели группы на день: {user_id: смещение напоминания о первой паре}."""
+        raw = await self.redis.hgetall(self._key(day, "group", group))
+        return {int(as_str(user_id)): int(as_str(offset)) for user_id, offset in (raw or {}).items()}
+
+    async def mark_group_planned(self, day: str, group: str) -> bool:
+        """Отмечает, что слоты перерывов группы запланированы. True — если это первый вызов за день."""
+        key = self._key(day, "groups")
+        added = await self.redis.sadd(key, group)
+        await self._touch(key)
+        return bool(added)
+
+    async def add_entry(self, day: str, minute: int, entry: SlotEntry) -> bool:
+        """Добавляет запись в слот. True — если слот на эту минуту появился впервые (нужна задача)."""
+        slot = format_slot(minute)
+        slots_key, slot_key = self._key(day, "slots"), self._key(day, "slot", slot)
+        created = await self.redis.zadd(slots_key, {slot: minute})
+        await self.redis.sadd(slot_key, entry.encode())
+        await self._touch(slots_key, slot_key)
+        return bool(created)
+
+    async def pending_slots(self, day: str, from_minute: int = 0) -> List[Tuple[str, int]]:
+        """Слоты дня, начиная с указанной минуты: [(ЧЧ:ММ, минута)]."""
+        members = await self.redis.zrangebyscore(self._key(day, "slots"), from_minute, "+inf", withscores=True)
+        return [(as_str(slot), int(score)) for slot, score in members]
+
+    async def pop_slot(self, day: str, slot: str) -> List[SlotEntry]:
+        """Забирает записи слота и удаляет его — повторное срабатывание ничего не отправит."""
+        slot_key = self._key(day, "slot", slot)
+        raw = await self.redis.smembers(slot_key)
+        await self.redis.delete(slot_key)
+        await self.redis.zrem(self._key(day, "slots"), slot)
+        entries = []
+        for item in raw or ():
+            try:
+                entries.append(SlotEntry.decode(item))
+            except ValueError:
+                continue
+        return sorted(entries)
+
+    async def user_group(self, day: str, user_id: int) -> Optional[str]:
+        group = await self.redis.hget(self._key(day, "users"), str(user_id))
+        return as_str(group) if group is not None else None
@@ -0,0 +1,123 @@
+"""
+Отпечатки расписания по (группа, код недели, день недели).
+
+Отпечаток — хеш нормализованных пар дня (те же поля, что сравнивает ScheduleDiffDetector),
+поэтому изменение отпечатка означает возможные изменения для пользователей, а совпадение —
+их отсутствие. Отпечатки считаются при парсинге и хранятся в Redis-хеше «группа → отпечатки»:
+при обновлении расписания сравниваются короткие строки, а дифф строится только для изменившихся
+дней изменившихся групп.
+"""
+
+import json
+import logging
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from redis.asyncio import Redis
+
+from core.config import REDIS_SCHEDULE_FINGERPRINTS_KEY
+from core.redis_values import as_str
+from core.schedule_diff import ScheduleDiffDetector
+from core.schedule_history import content_hash
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINTS_DATA_KEY = "__fingerprints__"
+WEEK_CODES = ("odd", "even")
+
+# (код недели, день недели)
+DaySlot = Tuple[str, str]
+
+
+def day_fingerprint(lessons: List[Dict[str, Any]]) -> str:
+    """Отпечаток дня: не зависит от порядка пар и от полей, которые не попадают в уведомления."""
+    normalized = sorted(
+        (ScheduleDiffDetector._normalize_lesson(lesson) for lesson in lessons),
+        key=lambda lesson: (lesson["time"], lesson["subject"], lesson["type"], lesson["room"], lesson["teachers"]),
+    )
+    return content_hash(normalized)[:16]
+
+
+def group_fingerprints(group_schedule: Mapping[str, Any]) -> Dict[str, str]:
+    """Отпечатки группы: {"odd:Понедельник": хеш, ...}. Дни без пар не попадают в словарь."""
+    result = {}
+    for week_code in WEEK_CODES:
+        for day, lessons in (group_schedule.get(week_code) or {}).items():
+            if lessons:
+                result[f"{week_code}:{day}"] = day_fingerprint(lessons)
+    return result
+
+
+def compute_fingerprints(all_schedules: Mapping[str, Any]) -> Dict[str, Dict[str, str]]:
+    """Отпечатки всех групп снапшота (служебные ключи «__...__» пропускаются)."""
+    return {
+        group: group_fingerprints(schedule)
+        for group, schedule in all_schedules.items()
+        if not group.startswith("__") and isinstance(schedule, Mapping)
+    }
+
+
+def changed_slots(old: Mapping[str, Mapping[str, str]], new: Mapping[str, Mapping[str, str]]) -> Dict[str, List[DaySlot]]:
+    """
+    Дни, у которых изменился отпечаток: {группа: [(код недели, день), ...]}.
+
+    Учитываются только группы, известные и в старом, и в новом снапшоте: новые группы
+    ещё никто не выбрал, а исчезнувшие обрабатываются как выпустившиеся.
+    """
+    result = {}
+    for group, new_days in new.items():
+        old_days = old.get(group)
+        if old_days is None or old_days == new_days:
+            continue
+        slots = [key for key in set(old_days) | set(new_days) if old_days.get(key) != new_days.get(key)]
+        result[group] = sorted(tuple(key.split(":", 1)) for key in slots)
+    return result
+
+
+class ScheduleFingerprintStore:
+    """Последние известные отпечатки расписания в Redis: поле хеша на группу."""
+
+    def __init__(self, redis_client: Redis, key: str = REDIS_SCHEDULE_FINGERPRINTS_KEY):
+        self.redis = redis_client
+        self.key = key
+
+    async def load(self) -> Dict[str, Dict[str, str]]:
+        raw = await self.redis.hgetall(self.key) or {}
+        result = {}
+        for group, value in raw.items():
+            try:
+                result[as_str(group)] = json.loads(as_str(value))
+            except ValueError:
+                continue
+        return result
+
+    async def save(
+        self, fingerprints: Mapping[str, Mapping[str, str]], previous: Optional[Mapping[str, Mapping[str, str]]] = None
+    ):
+        """
+        Сохраняет новые отпечатки: перезаписываются только изменившиеся группы.
+
+        previous — уже загруженные сохранённые отпечатки (чтобы не читать хеш повторно).
+        """
+        old = await self.load() if previous is None else previous
+        changed_groups = {
+            group: json.dumps(days, ensure_ascii=False, sort_keys=True)
+            for group, days in fingerprints.items()
+            if old.get(group) != days
+        }
+        removed = [group for group in old if group not in fingerprints]
+        if changed_groups:
+            await self.redis.hset(self.key, mapping=changed_groups)
+        if removed:
+            await self.redis.hdel(self.key, *removed)
+
+    async def update(self, fingerprints: Mapping[str, Mapping[str, str]]) -> Optional[Dict[str, List[DaySlot]]]:
+        """
+        Сохраняет новые отпечатки и возвращает изменившиеся дни.
+
+        Если сохранённых отпечатков ещё нет (первый запуск), возвращает None — сравнивать не с чем.
+        """
+        old = await self.load()
+        await self.save(fingerprints, old)
+        if not old:
+            return None
+        return changed_slots(old, fingerprints)
@@ -0,0 +1,270 @@
+"""
+История расписания с дельта-кодированием.
+
+Вместо полной копии расписания на каждую резервную копию в Redis хранится:
+- базовый снапшот — манифест «ключ → хеш содержимого» самой старой сохранённой версии;
+- дельты — для каждой следующей версии только изменившиеся и удалённые ключи;
+- блобы — содержимое группы (или служебного ключа) по хешу, одинаковое расписание хранится один раз.
+
+Объём растёт пропорционально реальным изменениям. Глубина истории ограничена:
+старые дельты «вливаются» в базовый снапшот, неиспользуемые блобы удаляются.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from redis.asyncio import Redis
+
+from core.config import DAY_MAP, MOSCOW_TZ, REDIS_SCHEDULE_HISTORY_PREFIX, SCHEDULE_HISTORY_MAX_VERSIONS
+from core.redis_values import as_str
+from core.schedule_diff import LessonChange, ScheduleDiffDetector
+
+logger = logging.getLogger(__name__)
+
+# Полные копии старого формата (до истории версий); читаются только как запасной вариант восстановления
+LEGACY_BACKUP_PATTERN = "timetable:backup:*"
+
+
+def content_hash(value: Any) -> str:
+    """Хеш содержимого в канонической JSON-форме (не зависит от порядка ключей)."""
+    canonical = json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _encode(value: Any) -> bytes:
+    return gzip.compress(json.dumps(value, ensure_ascii=False).encode("utf-8"), compresslevel=6)
+
+
+def _decode(raw: bytes | str) -> Any:
+    if isinstance(raw, str):
+        raw = raw.encode("utf-8")
+    return json.loads(gzip.decompress(raw).decode("utf-8"))
+
+
+def _apply_delta(entries: Dict[str, str], delta: dict):
+    entries.update(delta["changed"])
+    for key in delta["removed"]:
+        entries.pop(key, None)
+
+
+def _day_order(day: str) -> int:
+    return DAY_MAP.index(day) if day in DAY_MAP else len(DAY_MAP)
+
+
+@dataclass
+class GroupHistoryDiff:
+    """Что изменилось в расписании группы начиная с указанного момента."""
+
+    group: str
+    since: datetime
+    changed_at: List[datetime] = field(default_factory=list)  # моменты версий, затронувших группу
+    days: List[Tuple[str, str, List[LessonChange]]] = field(default_factory=list)  # (odd/even, день, изменения)
+
+    def has_changes(self) -> bool:
+        return any(changes for _, _, changes in self.days)
+
+
+class ScheduleHistoryStore:
+    """Хранилище версий расписания: базовый снапшот + дельты по группам, адресация блобов по хешу."""
+
+    def __init__(
+        self,
+        redis_client: Redis,
+        max_versions: int = SCHEDULE_HISTORY_MAX_VERSIONS,
+        prefix: str = REDIS_SCHEDULE_HISTORY_PREFIX,
+    ):
+        if max_versions < 1:
+            raise ValueError("max_versions должен быть положительным")
+        self.redis = redis_client
+        self.max_versions = max_versions
+        self._prefix = prefix
+
+    def _key(self, *parts: str) -> str:
+        return self._prefix + ":".join(parts)
+
+    async def _load(self, key: str) -> Optional[dict]:
+        raw = await self.redis.get(key)
+        return _decode(raw) if raw else None
+
+    async def _store_blobs(self, data: Dict[str, Any], hashes: Dict[str, str]):
+        """Сохраняет содержимое, которого ещё нет в хранилище."""
+        for key, digest in hashes.items():
+            if await self.redis.sismember(self._key("blobs"), digest):
+                continue
+            await self.redis.set(self._key("blob", digest), _encode(data[key]))
+            await self.redis.sadd(self._key("blobs"), digest)
+
+    async def _load_chain(self) -> Tuple[Optional[dict], List[dict]]:
+        """Базовый снапшот и все последующие дельты в порядке версий."""
+        base = await self._load(self._key("base"))
+        if base is None:
+            return None, []
+        deltas = []
+        for member in await self.redis.zrange(self._key("log"), 0, -1):
+            version = int(as_str(member))
+            if version <= base["version"]:
+                continue
+            delta = await self._load(self._key("delta", str(version)))
+            if delta is not None:
+                deltas.append(delta)
+        deltas.sort(key=lambda d: d["version"])
+        return base, deltas
+
+    async def record(self, data: dict, at: Optional[datetime] = None) -> Optional[int]:
+        """
+        Записывает новую версию расписания.
+
+        Сохраняются только ключи, содержимое которых изменилось с последней версии.
+        Возвращает номер версии или None, если расписание не изменилось.
+        """
+        at = at or datetime.now(MOSCOW_TZ)
+        manifest = {key: content_hash(value) for key, value in data.items()}
+        head = await self._load(self._key("head"))
+
+        if head is not None:
+            changed = {key: digest for key, digest in manifest.items() if head["entries"].get(key) != digest}
+            removed = sorted(key for key in head["entries"] if key not in manifest)
+            if not changed and not removed:
+                return None
+        else:
+            changed, removed = manifest, []
+
+        await self._store_blobs(data, changed)
+        version = int(await self.redis.incr(self._key("seq")))
+        ts = at.timestamp()
+
+        if head is None:
+            await self.redis.set(self._key("base"), _encode({"version": version, "ts": ts, "entries": manifest}))
+        else:
+            await self.redis.set(
+                self._key("delta", str(version)),
+                _encode({"version": version, "ts": ts, "changed": changed, "removed": removed}),
+            )
+        await self.redis.zadd(self._key("log"), {str(version): ts})
+        await self.redis.set(self._key("head"), _encode({"version": version, "ts": ts, "entries": manifest}))
+
+        logger.info("История расписания: версия %s (изменено ключей: %s, удалено: %s)", version, len(changed), len(removed))
+        await self._enforce_retention()
+        return version
+
+    async def _enforce_retention(self):
+        """Вливает самые старые дельты в базовый снапшот и удаляет неиспользуемые блобы."""
+        excess = await self.redis.zcard(self._key("log")) - self.max_versions
+        if excess <= 0:
+            return
+
+        oldest = [as_str(m) for m in await self.redis.zrange(self._key("log"), 0, excess)]
+        base = await self._load(self._key("base"))
+        if base is None:
+            return
+        for member in oldest[1:]:
+            delta = await self._load(self._key("delta", member))
+            if delta is None:
+                continue
+            _apply_delta(base["entries"], delta)
+            base["version"], base["ts"] = delta["version"], delta["ts"]
+            await self.redis.delete(self._key("delta", member))
+        await self.redis.set(self._key("base"), _encode(base))
+        await self.redis.zrem(self._key("log"), *oldest[:-1])
+
+        # Сборка мусора: блобы, на которые больше не ссылается ни база, ни дельты
+        base, deltas = await self._load_chain()
+        referenced = set(base["entries"].values())
+        for delta in deltas:
+            referenced.update(delta["changed"].values())
+        stale = [d for d in (as_str(m) for m in await self.redis.smembers(self._key("blobs"))) if d not in referenced]
+        if stale:
+            await self.redis.delete(*(self._key("blob", digest) for digest in stale))
+            await self.redis.srem(self._key("blobs"), *stale)
+
+    async def drop_legacy_backups(self) -> int:
+        """
+        Удаляет полные копии старого формата. Вызывать после успешной записи версии:
+        пока история пуста, восстановление опирается на них.
+        """
+        keys = [key async for key in self.redis.scan_iter(match=LEGACY_BACKUP_PATTERN)]
+        if keys:
+            await self.redis.delete(*keys)
+            logger.info("Удалено резервных копий старого формата: %s", len(keys))
+        return len(keys)
+
+    async def list_versions(self) -> List[Tuple[int, datetime]]:
+        """Доступные версии (номер, момент записи) от старых к новым."""
+        base, deltas = await self._load_chain()
+        if base is None:
+            return []
+        return [(item["version"], datetime.fromtimestamp(item["ts"], MOSCOW_TZ)) for item in [base, *deltas]]
+
+    async def _manifest_at(self, at: Optional[datetime]) -> Optional[Dict[str, str]]:
+        if at is None:
+            head = await self._load(self._key("head"))
+            return head["entries"] if head else None
+        base, deltas = await self._load_chain()
+        if base is None or at.timestamp() < base["ts"]:
+            return None
+        entries = dict(base["entries"])
+        for delta in deltas:
+            if delta["ts"] > at.timestamp():
+                break
+            _apply_delta(entries, delta)
+        return entries
+
+    async def reconstruct(self, at: Optional[datetime] = None) -> Optional[dict]:
+        """
+        Восстанавливает полное расписание на момент at (по умолчанию — последняя версия).
+
+        Возвращает None, если момент раньше самой старой сохранённой версии или история пуста.
+        """
+        entries = await self._manifest_at(at)
+        if not entries:
+            return None
+        keys = list(entries)
+        blobs = await self.redis.mget([self._key("blob", entries[key]) for key in keys])
+        if any(blob is None for blob in blobs):
+            logger.error("История расписания повреждена: отсутствуют блобы для части ключей")
+            return None
+        return {key: _decode(blob) for key, blob in zip(keys, blobs)}
+
+    async def get_group_changes(self, group: str, since: datetime) -> Optional[GroupHistoryDiff]:
+        """
+        Что изменилось в расписании группы с момента since до последней версии.
+
+        Если since раньше самой старой сохранённой версии, сравнение идёт с ней.
+        Возвращает None, если история пуста.
+        """
+        group = group.upper()
+        base, deltas = await self._load_chain()
+        if base is None:
+            return None
+
+        since_entries = dict(base["entries"])
+        head_entries = dict(base["entries"])
+        result = GroupHistoryDiff(group=group, since=since)
+        for delta in deltas:
+            _apply_delta(head_entries, delta)
+            if delta["ts"] <= since.timestamp():
+                _apply_delta(since_entries, delta)
+            elif group in delta["changed"] or group in delta["removed"]:
+                result.changed_at.append(datetime.fromtimestamp(delta["ts"], MOSCOW_TZ))
+
+        old_hash, new_hash = since_entries.get(group), head_entries.get(group)
+        if old_hash == new_hash:
+            return result
+
+        old_raw, new_raw = await self.redis.mget([self._key("blob", old_hash or ""), self._key("blob", new_hash or "")])
+        old_schedule = _decode(old_raw) if old_hash and old_raw else {}
+        new_schedule = _decode(new_raw) if new_hash and new_raw else {}
+        for week_code in ("odd", "even"):
+            old_week, new_week = old_schedule.get(week_code, {}), new_schedule.get(week_code, {})
+            for day in sorted(set(old_week) | set(new_week), key=_day_order):
+                changes = ScheduleDiffDetector.compare_day_schedules(
+                    {"lessons": old_week.get(day, [])}, {"lessons": new_week.get(day, [])}
+                )
+                if changes:
+                    result.days.append((week_code, day, changes))
+        return result
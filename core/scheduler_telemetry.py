@@ -0,0 +1,112 @@
+"""
+Телеметрия задач APScheduler.
+
+Слушатель событий планировщика считает по каждой задаче длительность запуска, опоздание
+относительно плановой секунды, пропуски из-за misfire_grace_time, наложения (новый запуск пришёлся
+на ещё работающий предыдущий) и время последнего успешного запуска. По последнему строится алерт
+на задачи, которые перестали выполняться.
+
+Пока реплика в резерве, её планировщик стоит на паузе, и задачи выполняет лидер. После получения
+лидерства APScheduler отбрасывает запуски, пришедшиеся на паузу, как misfire; такие пропуски
+не считаются — это не ошибки этой реплики.
+
+Метка — id задачи. У одноразовых задач с id на каждый запуск (слоты напоминаний) метка — общий
+префикс, чтобы не плодить временные ряды.
+"""
+
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Tuple
+
+from apscheduler.events import (
+    EVENT_JOB_ERROR,
+    EVENT_JOB_EXECUTED,
+    EVENT_JOB_MAX_INSTANCES,
+    EVENT_JOB_MISSED,
+    EVENT_JOB_SUBMITTED,
+    JobEvent,
+)
+from apscheduler.schedulers.base import BaseScheduler
+
+from core.metrics import (
+    SCHEDULER_JOB_DURATION,
+    SCHEDULER_JOB_LAST_SUCCESS,
+    SCHEDULER_JOB_LATENESS,
+    SCHEDULER_JOB_MISFIRES,
+    SCHEDULER_JOB_OVERLAPS,
+    SCHEDULER_JOB_RUNS,
+)
+
+logger = logging.getLogger(__name__)
+
+JOB_EVENTS = EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES
+# Задачи с id на каждый запуск: «reminder_slot_2026-10-18_08:00» → «reminder_slot»
+DYNAMIC_JOB_PREFIXES = ("reminder_slot_",)
+
+
+def _as_utc(moment: datetime) -> datetime:
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+class SchedulerTelemetry:
+    """Слушатель событий APScheduler, экспортирующий метрики задач в Prometheus."""
+
+    def __init__(self, dynamic_prefixes: Iterable[str] = DYNAMIC_JOB_PREFIXES):
+        self.dynamic_prefixes = tuple(dynamic_prefixes)
+        # (id задачи, плановое время) → момент постановки на выполнение (monotonic)
+        self._started: Dict[Tuple[str, datetime], float] = {}
+        # Момент последнего снятия планировщика с паузы (UTC): запуски раньше него выполнял лидер
+        self._active_since: Optional[datetime] = None
+
+    def install(self, scheduler: BaseScheduler) -> "SchedulerTelemetry":
+        scheduler.add_listener(self, JOB_EVENTS)
+        return self
+
+    def mark_active(self):
+        """Вызывается перед возобновлением планировщика новым лидером."""
+        self._active_since = datetime.now(timezone.utc)
+
+    def label(self, job_id: str) -> str:
+        for prefix in self.dynamic_prefixes:
+            if job_id.startswith(prefix):
+                return prefix.rstrip("_")
+        return job_id
+
+    def __call__(self, event: JobEvent):
+        try:
+            self._handle(event)
+        except Exception as e:
+            # Телеметрия не должна ломать диспетчеризацию событий планировщика
+            logger.warning(f"Ошибка учёта события задачи {getattr(event, 'job_id', '?')}: {e}")
+
+    def _handle(self, event: JobEvent):
+        job_id = self.label(event.job_id)
+        if event.code == EVENT_JOB_SUBMITTED:
+            started = time.monotonic()
+            now = datetime.now(timezone.utc)
+            for run_time in event.scheduled_run_times:
+                self._started[(event.job_id, run_time)] = started
+            if event.scheduled_run_times:
+                lateness = (now - _as_utc(event.scheduled_run_times[-1])).total_seconds()
+                SCHEDULER_JOB_LATENESS.labels(job_id=job_id).observe(max(0.0, lateness))
+        elif event.code in (EVENT_JOB_EXECUTED, EVENT_JOB_ERROR):
+            started = self._started.pop((event.job_id, event.scheduled_run_time), None)
+            if started is not None:
+                SCHEDULER_JOB_DURATION.labels(job_id=job_id).observe(time.monotonic() - started)
+            if event.code == EVENT_JOB_EXECUTED:
+                SCHEDULER_JOB_RUNS.labels(job_id=job_id, status="success").inc()
+                SCHEDULER_JOB_LAST_SUCCESS.labels(job_id=job_id).set(time.time())
+            else:
+                SCHEDULER_JOB_RUNS.labels(job_id=job_id, status="error").inc()
+        elif event.code == EVENT_JOB_MISSED:
+            # Опоздавший запуск отбрасывается уже после постановки на выполнение
+            self._started.pop((event.job_id, event.scheduled_run_time), None)
+            if self._active_since is not None and _as_utc(event.scheduled_run_time) < self._active_since:
+                logger.debug(f"Задача {event.job_id}: запуск {event.scheduled_run_time} пришёлся на резерв, не учитывается")
+                return
+            SCHEDULER_JOB_MISFIRES.labels(job_id=job_id).inc()
+            logger.warning(f"Задача {event.job_id} пропустила запуск {event.scheduled_run_time} (misfire)")
+        elif event.code == EVENT_JOB_MAX_INSTANCES:
+            SCHEDULER_JOB_OVERLAPS.labels(job_id=job_id).inc()
+            logger.warning(f"Задача {event.job_id} не запущена: предыдущий запуск ещё выполняется")
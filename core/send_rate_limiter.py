@@ -0,0 +1,211 @@
+"""
+Общий для всех воркеров лимитер исходящих сообщений в Telegram (GCRA в Redis).
+
+`AsyncLimiter` ограничивает только свой процесс: при `dramatiq --processes N` или нескольких
+контейнерах воркера фактическая скорость умножается и Telegram отвечает 429. Здесь состояние
+лимита — «теоретическое время прибытия» (TAT) алгоритма GCRA — хранится в Redis, и одна
+атомарная Lua-функция проверяет сразу общий лимит бота и лимит конкретного чата, резервирует
+слот и возвращает, сколько ждать до него. Вызывающий спит ровно это время и отправляет,
+без повторных опросов.
+
+Ответ 429 (retry_after) на любой отправке ставит в Redis общую паузу «не отправлять до T»: Lua-функция
+считает момент окончания паузы нижней границей общего лимита, поэтому все потоки, процессы и контейнеры
+воркера останавливаются вместе и продолжают ровно в T, снова с общим темпом, а не все разом.
+
+Время берётся из Redis (TIME), поэтому расхождение часов между хостами воркеров не влияет на лимит.
+Если Redis недоступен, лимитер деградирует до локального AsyncLimiter процесса (и локальной паузы).
+"""
+
+import asyncio
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Optional, Tuple
+
+from aiolimiter import AsyncLimiter
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from core.config import REDIS_SEND_LIMITER_PREFIX, TELEGRAM_SEND_RATE_PER_SECOND
+from core.metrics import TELEGRAM_SEND_LIMITER_FALLBACKS, TELEGRAM_SEND_PAUSED_UNTIL, TELEGRAM_SEND_PAUSES, TELEGRAM_SEND_WAIT
+
+logger = logging.getLogger(__name__)
+
+# GCRA сразу по нескольким ключам (общий лимит, лимит чата). Все ключи проверяются до изменения любого из них,
+# слот резервируется только если по всем лимитам ждать не дольше ARGV[1] мс.
+# KEYS[1] — общая пауза после 429 (мс до которого не отправлять), далее TAT каждого лимита, первый из них — общий;
+# ARGV[1] — максимальное ожидание, далее пары (интервал, допуск) в мс для каждого лимита.
+# Пока действует пауза, TAT общего лимита не раньше её конца: слоты после паузы снова идут с общим темпом.
+# Общий лимит расходует ближайший свободный интервал, а не момент слота: иначе сообщение, ждущее лимита
+# своего чата, задерживало бы отправку всем остальным чатам.
+# Возвращает {1, ожидание} — слот зарезервирован; {0, ожидание} — ждать дольше максимума, ничего не изменено.
+GCRA_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local paused_until = tonumber(redis.call('GET', KEYS[1]) or '0')
+local max_wait = tonumber(ARGV[1])
+local tats = {}
+local wait = 0
+for i = 2, #KEYS do
+  local tolerance = tonumber(ARGV[2 * i - 1])
+  local tat = math.max(tonumber(redis.call('GET', KEYS[i]) or '0'), now)
+  if i == 2 then
+    tat = math.max(tat, paused_until)
+  end
+  tats[i] = tat
+  wait = math.max(wait, tat - tolerance - now)
+end
+if wait > max_wait then
+  return {0, wait}
+end
+local slot = now + wait
+for i = 2, #KEYS do
+  local tat = tats[i]
+  if i > 2 then
+    tat = math.max(tat, slot)
+  end
+  tat = tat + tonumber(ARGV[2 * i - 2])
+  redis.call('SET', KEYS[i], tostring(tat), 'PX', tat - now)
+end
+return {1, wait}
+"""
+
+# Продлевает общую паузу до «сейчас + ARGV[1] мс» (сокращать чужую, более длинную паузу нельзя).
+# Возвращает {продлена ли, конец паузы в мс по часам Redis}.
+PAUSE_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local until_ms = now + tonumber(ARGV[1])
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+if current >= until_ms then
+  return {0, current}
+end
+redis.call('SET', KEYS[1], tostring(until_ms), 'PX', tonumber(ARGV[1]))
+return {1, until_ms}
+"""
+
+
+@dataclass(frozen=True)
+class Limit:
+    """rate сообщений за period секунд, до burst подряд без ожидания."""
+
+    rate: float
+    period: float = 1.0
+    burst: int = 1
+
+    @property
+    def interval_ms(self) -> int:
+        # Округление вверх: фактическая скорость не превышает заданную
+        return math.ceil(self.period * 1000 / self.rate)
+
+    @property
+    def tolerance_ms(self) -> int:
+        return self.interval_ms * (max(1, self.burst) - 1)
+
+
+# Лимиты Telegram: в личный чат — не чаще сообщения в секунду, в группу — не более 20 в минуту
+PRIVATE_CHAT_LIMIT = Limit(rate=1, period=1.0)
+GROUP_CHAT_LIMIT = Limit(rate=20, period=60.0, burst=3)
+# Дольше этого слот не резервируется: при перегрузке лимитер ждёт и пробует снова
+MAX_RESERVATION_WAIT = 10.0
+
+
+class SendRateLimiter:
+    """Лимитер исходящих сообщений: общий бюджет бота и лимит получателя, состояние в Redis."""
+
+    def __init__(
+        self,
+        redis_factory: Callable[[], Redis],
+        rate: int = TELEGRAM_SEND_RATE_PER_SECOND,
+        key_prefix: str = REDIS_SEND_LIMITER_PREFIX,
+        max_wait: float = MAX_RESERVATION_WAIT,
+    ):
+        self.redis_factory = redis_factory
+        self.global_limit = Limit(rate=max(1, rate))
+        self.key_prefix = key_prefix
+        self.max_wait = max_wait
+        self._fallback = AsyncLimiter(max(1, rate), 1)
+        # Пауза процесса на случай недоступного Redis (time.monotonic)
+        self._local_paused_until = 0.0
+
+    @staticmethod
+    def chat_limit(chat_id: int) -> Limit:
+        return GROUP_CHAT_LIMIT if chat_id < 0 else PRIVATE_CHAT_LIMIT
+
+    async def reserve(self, chat_id: Optional[int] = None) -> Tuple[bool, float]:
+        """
+        Резервирует слот отправки. Возвращает (зарезервирован, ожидание в секундах).
+
+        Если ждать пришлось бы дольше max_wait, слот не резервируется и состояние не меняется.
+        """
+        keys = [f"{self.key_prefix}pause", f"{self.key_prefix}global"]
+        args = [int(self.max_wait * 1000), self.global_limit.interval_ms, self.global_limit.tolerance_ms]
+        if chat_id is not None:
+            limit = self.chat_limit(chat_id)
+            keys.append(f"{self.key_prefix}chat:{chat_id}")
+            args += [limit.interval_ms, limit.tolerance_ms]
+        reserved, wait_ms = await self.redis_factory().eval(GCRA_SCRIPT, len(keys), *keys, *args)
+        return bool(reserved), int(wait_ms) / 1000
+
+    async def pause(self, retry_after: float) -> bool:
+        """
+        Останавливает отправку всем воркерам на retry_after секунд (ответ 429 от Telegram).
+
+        Возвращает True, если пауза продлена; False — уже действует пауза не короче этой.
+        """
+        retry_after_ms = max(1, math.ceil(retry_after * 1000))
+        TELEGRAM_SEND_PAUSES.inc()
+        try:
+            extended, until_ms = await self.redis_factory().eval(PAUSE_SCRIPT, 1, f"{self.key_prefix}pause", retry_after_ms)
+        except (RedisError, OSError) as e:
+            logger.warning(f"Не удалось поставить общую паузу отправки ({e}), пауза только в этом процессе")
+            self._local_paused_until = max(self._local_paused_until, time.monotonic() + retry_after_ms / 1000)
+            return True
+        if extended:
+            TELEGRAM_SEND_PAUSED_UNTIL.set(int(until_ms) / 1000)
+            logger.warning(f"Telegram ответил 429: отправка всех воркеров приостановлена на {retry_after_ms} мс")
+        return bool(extended)
+
+    async def acquire(self, chat_id: Optional[int] = None) -> float:
+        """Ждёт своего слота отправки (в чат chat_id, если указан). Возвращает время ожидания."""
+        waited = 0.0
+        while True:
+            try:
+                reserved, wait = await self.reserve(chat_id)
+            except (RedisError, OSError) as e:
+                TELEGRAM_SEND_LIMITER_FALLBACKS.inc()
+                logger.warning(f"Лимитер отправки недоступен ({e}), используем локальный лимит процесса")
+                paused = self._local_paused_until - time.monotonic()
+                if paused > 0:
+                    await asyncio.sleep(paused)
+                    waited += paused
+                await self._fallback.acquire()
+                return waited
+            if reserved:
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                waited += wait
+                TELEGRAM_SEND_WAIT.observe(waited)
+                return waited
+            # Очередь длиннее max_wait: ждём, пока слот окажется в пределах допустимого ожидания
+            pause = max(wait - self.max_wait, 0.01)
+            await asyncio.sleep(pause)
+            waited += pause
+
+    @asynccontextmanager
+    async def chat(self, chat_id: Optional[int] = None) -> AsyncIterator[None]:
+        """
+        `async with limiter.chat(user_id): await bot.send_message(...)`.
+
+        Ошибка с атрибутом retry_after (TelegramRetryAfter) ставит общую паузу и пробрасывается дальше.
+        """
+        await self.acquire(chat_id)
+        try:
+            yield
+        except Exception as e:
+            retry_after = getattr(e, "retry_after", None)
+            if isinstance(retry_after, (int, float)) and retry_after > 0:
+                await self.pause(retry_after)
+            raise
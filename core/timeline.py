@@ -0,0 +1,97 @@
+"""
+Таймлайн учебного дня: границы пар в целых минутах от полуночи и быстрый поиск
+«какая пара идёт сейчас / какая следующая» бинарным поиском.
+
+Используется динамическими заголовками, напоминаниями и менеджером расписания.
+"""
+
+import bisect
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+
+def parse_hhmm(value: str) -> int:
+    """Переводит «ЧЧ:ММ» в минуты от полуночи. Бросает ValueError при неверном формате."""
+    hours, minutes = value.strip().split(":")
+    hours_int, minutes_int = int(hours), int(minutes)
+    if not (0 <= hours_int < 24 and 0 <= minutes_int < 60):
+        raise ValueError(f"Некорректное время: {value!r}")
+    return hours_int * 60 + minutes_int
+
+
+@dataclass
+class LessonStatus:
+    """Состояние учебного дня в конкретный момент."""
+
+    state: str  # no_lessons, before, lesson, break, finished
+    current: Optional[Dict[str, Any]] = None
+    next: Optional[Dict[str, Any]] = None
+    minutes_remaining: Optional[int] = None  # до конца текущей пары или до начала следующей
+    passed: int = 0
+    total: int = 0
+
+
+@dataclass
+class DayTimeline:
+    """Отсортированные границы пар одного дня."""
+
+    lessons: List[Dict[str, Any]] = field(default_factory=list)
+    starts: List[int] = field(default_factory=list)
+    ends: List[int] = field(default_factory=list)
+    sorted_ends: List[int] = field(default_factory=list)
+
+    @classmethod
+    def from_lessons(cls, lessons: List[Dict[str, Any]]) -> "DayTimeline":
+        """
+        Строит таймлайн, разбирая время каждой пары ровно один раз.
+
+        Бросает KeyError/ValueError, если у пары нет корректных start_time_raw/end_time_raw.
+        """
+        bounds = [(parse_hhmm(lesson["start_time_raw"]), parse_hhmm(lesson["end_time_raw"]), lesson) for lesson in lessons]
+        bounds.sort(key=lambda item: item[0])
+        return cls(
+            lessons=[lesson for _, _, lesson in bounds],
+            starts=[start for start, _, _ in bounds],
+            ends=[end for _, end, _ in bounds],
+            sorted_ends=sorted(end for _, end, _ in bounds),
+        )
+
+    def passed_count(self, minute: float) -> int:
+        """Количество пар, закончившихся строго до указанного момента."""
+        return bisect.bisect_left(self.sorted_ends, minute)
+
+    def status_at(self, minute: float) -> LessonStatus:
+        """Определяет текущую/следующую пару для момента (минуты от полуночи, допускаются доли)."""
+        total = len(self.lessons)
+        if not total:
+            return LessonStatus(state="no_lessons")
+
+        passed = self.passed_count(minute)
+        idx = bisect.bisect_right(self.starts, minute) - 1
+
+        if idx < 0:
+            return LessonStatus(
+                state="before",
+                next=self.lessons[0],
+                minutes_remaining=int(self.starts[0] - minute),
+                passed=passed,
+                total=total,
+            )
+        if minute <= self.ends[idx]:
+            return LessonStatus(
+                state="lesson",
+                current=self.lessons[idx],
+                next=self.lessons[idx + 1] if idx + 1 < total else None,
+                minutes_remaining=int(self.ends[idx] - minute),
+                passed=passed,
+                total=total,
+            )
+        if idx + 1 < total:
+            return LessonStatus(
+                state="break",
+                next=self.lessons[idx + 1],
+                minutes_remaining=int(self.starts[idx + 1] - minute),
+                passed=passed,
+                total=total,
+            )
+        return LessonStatus(state="finished", passed=passed, total=total)
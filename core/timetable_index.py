@@ -0,0 +1,273 @@
+"""
+Предкомпилированный индекс расписания на диске.
+
+Формат (little-endian) рассчитан на чтение через mmap без полной загрузки в память:
+
+    заголовок | таблица смещений строк | данные строк | каталог секций | таблицы ключей | записи
+
+- все строки (названия групп, предметы, аудитории, имена полей) хранятся один раз в таблице строк;
+- секция (schedules, teachers, classrooms, meta) — отсортированная таблица «ключ → смещение записи»,
+  поиск ключа идёт бинарным поиском прямо по отображённому файлу;
+- запись — компактное бинарное представление JSON-значения, строки в ней заданы номерами.
+
+Файл записывается один раз на снапшот расписания (атомарной заменой), процессы бота и воркеров
+открывают его через mmap и разбирают только запрошенные записи. Страницы файла делятся между
+процессами через page cache, поэтому время старта и RSS не растут вместе с размером расписания.
+"""
+
+import mmap
+import os
+import struct
+from collections.abc import Iterator, Mapping
+from pathlib import Path
+from typing import Any, Dict
+
+MAGIC = b"VTTI"
+FORMAT_VERSION = 1
+
+# magic, версия, число секций, число строк, смещения: таблицы строк, данных строк, каталога секций
+_HEADER = struct.Struct("<4sHHIQQQ")
+_STRING_ENTRY = struct.Struct("<QI")  # смещение относительно начала данных строк, длина
+_SECTION_ENTRY = struct.Struct("<IIQ")  # id имени секции, число ключей, смещение таблицы ключей
+_KEY_ENTRY = struct.Struct("<IQI")  # id ключа, смещение записи, длина записи
+_U32 = struct.Struct("<I")
+_I64 = struct.Struct("<q")
+_F64 = struct.Struct("<d")
+
+_SECTIONS = ("schedules", "teachers", "classrooms", "meta")
+
+
+class _Encoder:
+    """Кодирует JSON-значения в бинарные записи, собирая общую таблицу строк."""
+
+    def __init__(self):
+        self.strings: list[str] = []
+        self._ids: Dict[str, int] = {}
+
+    def intern(self, value: str) -> int:
+        string_id = self._ids.get(value)
+        if string_id is None:
+            string_id = self._ids[value] = len(self.strings)
+            self.strings.append(value)
+        return string_id
+
+    def encode(self, value: Any, out: bytearray):
+        if value is None:
+            out += b"N"
+        elif value is True:
+            out += b"T"
+        elif value is False:
+            out += b"F"
+        elif isinstance(value, int):
+            out += b"I" + _I64.pack(value)
+        elif isinstance(value, float):
+            out += b"D" + _F64.pack(value)
+        elif isinstance(value, str):
+            out += b"S" + _U32.pack(self.intern(value))
+        elif isinstance(value, (list, tuple)):
+            out += b"L" + _U32.pack(len(value))
+            for item in value:
+                self.encode(item, out)
+        elif isinstance(value, Mapping):
+            out += b"M" + _U32.pack(len(value))
+            for key, item in value.items():
+                out += _U32.pack(self.intern(str(key)))
+                self.encode(item, out)
+        else:
+            raise TypeError(f"Неподдерживаемый тип значения в расписании: {type(value).__name__}")
+
+
+def _split_sections(data: Mapping) -> Dict[str, Mapping]:
+    """Раскладывает данные расписания в формате TimetableManager по секциям индекса."""
+    return {
+        "schedules": {k: v for k, v in data.items() if not k.startswith("__")},
+        "teachers": data.get("__teachers_index__") or {},
+        "classrooms": data.get("__classrooms_index__") or {},
+        "meta": {
+            k: v for k, v in data.items() if k.startswith("__") and k not in ("__teachers_index__", "__classrooms_index__")
+        },
+    }
+
+
+def write_timetable_index(data: Mapping, path: Path) -> Path:
+    """
+    Компилирует снапшот расписания в индекс и атомарно заменяет файл по указанному пути.
+
+    Уже открытые читатели продолжают работать со старым файлом до переоткрытия.
+    """
+    encoder = _Encoder()
+    records = bytearray()
+    sections = []
+    for name, section in _split_sections(data).items():
+        entries = []
+        for key in sorted(section):
+            start = len(records)
+            encoder.encode(section[key], records)
+            entries.append((encoder.intern(key), start, len(records) - start))
+        sections.append((encoder.intern(name), entries))
+
+    encoded_strings = [s.encode("utf-8") for s in encoder.strings]
+    strings_index_offset = _HEADER.size
+    strings_data_offset = strings_index_offset + _STRING_ENTRY.size * len(encoded_strings)
+    sections_offset = strings_data_offset + sum(len(s) for s in encoded_strings)
+    keys_offset = sections_offset + _SECTION_ENTRY.size * len(sections)
+    records_offset = keys_offset + _KEY_ENTRY.size * sum(len(entries) for _, entries in sections)
+
+    out = bytearray(
+        _HEADER.pack(
+            MAGIC,
+            FORMAT_VERSION,
+            len(sections),
+            len(encoded_strings),
+            strings_index_offset,
+            strings_data_offset,
+            sections_offset,
+        )
+    )
+    position = 0
+    for encoded in encoded_strings:
+        out += _STRING_ENTRY.pack(position, len(encoded))
+        position += len(encoded)
+    for encoded in encoded_strings:
+        out += encoded
+
+    key_table_offset = keys_offset
+    for name_id, entries in sections:
+        out += _SECTION_ENTRY.pack(name_id, len(entries), key_table_offset)
+        key_table_offset += _KEY_ENTRY.size * len(entries)
+    for _, entries in sections:
+        for key_id, start, length in entries:
+            out += _KEY_ENTRY.pack(key_id, records_offset + start, length)
+    out += records
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(out)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return path
+
+
+class IndexSection(Mapping):
+    """Секция индекса как ленивый read-only словарь: значения разбираются при обращении."""
+
+    def __init__(self, index: "TimetableIndex", count: int, table_offset: int):
+        self._index = index
+        self._count = count
+        self._table_offset = table_offset
+
+    def _entry(self, position: int) -> tuple[int, int, int]:
+        return _KEY_ENTRY.unpack_from(self._index._buffer, self._table_offset + position * _KEY_ENTRY.size)
+
+    def _find(self, key: str) -> int:
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._index.string(self._entry(middle)[0]) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._count and self._index.string(self._entry(low)[0]) == key:
+            return low
+        return -1
+
+    def __getitem__(self, key: str) -> Any:
+        position = self._find(key) if isinstance(key, str) else -1
+        if position < 0:
+            raise KeyError(key)
+        _, offset, _ = self._entry(position)
+        return self._index._decode(offset)[0]
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and self._find(key) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        for position in range(self._count):
+            yield self._index.string(self._entry(position)[0])
+
+    def __len__(self) -> int:
+        return self._count
+
+
+class TimetableIndex:
+    """Открытый через mmap индекс расписания."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, section_count, string_count, strings_index, strings_data, sections_offset = _HEADER.unpack_from(
+                self._buffer, 0
+            )
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise ValueError(f"Неподдерживаемый формат индекса расписания: {self.path}")
+            self._string_count = string_count
+            self._strings_index = strings_index
+            self._strings_data = strings_data
+            self._sections: Dict[str, IndexSection] = {}
+            for position in range(section_count):
+                name_id, count, table_offset = _SECTION_ENTRY.unpack_from(
+                    self._buffer, sections_offset + position * _SECTION_ENTRY.size
+                )
+                self._sections[self.string(name_id)] = IndexSection(self, count, table_offset)
+        except (struct.error, ValueError, UnicodeDecodeError):
+            self.close()
+            raise
+
+    def string(self, string_id: int) -> str:
+        if not 0 <= string_id < self._string_count:
+            raise ValueError(f"Некорректный номер строки в индексе: {string_id}")
+        offset, length = _STRING_ENTRY.unpack_from(self._buffer, self._strings_index + string_id * _STRING_ENTRY.size)
+        start = self._strings_data + offset
+        return self._buffer[start : start + length].decode("utf-8")
+
+    def _decode(self, offset: int) -> tuple[Any, int]:
+        tag = self._buffer[offset : offset + 1]
+        offset += 1
+        if tag == b"S":
+            return self.string(_U32.unpack_from(self._buffer, offset)[0]), offset + _U32.size
+        if tag == b"M":
+            count = _U32.unpack_from(self._buffer, offset)[0]
+            offset += _U32.size
+            result = {}
+            for _ in range(count):
+                key = self.string(_U32.unpack_from(self._buffer, offset)[0])
+                result[key], offset = self._decode(offset + _U32.size)
+            return result, offset
+        if tag == b"L":
+            count = _U32.unpack_from(self._buffer, offset)[0]
+            offset += _U32.size
+            items = []
+            for _ in range(count):
+                item, offset = self._decode(offset)
+                items.append(item)
+            return items, offset
+        if tag == b"I":
+            return _I64.unpack_from(self._buffer, offset)[0], offset + _I64.size
+        if tag == b"D":
+            return _F64.unpack_from(self._buffer, offset)[0], offset + _F64.size
+        if tag in (b"N", b"T", b"F"):
+            return {b"N": None, b"T": True, b"F": False}[tag], offset
+        raise ValueError(f"Повреждённая запись индекса расписания (смещение {offset - 1})")
+
+    def section(self, name: str) -> IndexSection:
+        if name not in _SECTIONS:
+            raise KeyError(name)
+        return self._sections.get(name) or IndexSection(self, 0, 0)
+
+    @property
+    def xml_hash(self) -> str:
+        return self.section("meta").get("__current_xml_hash__") or ""
+
+    def close(self):
+        self._buffer.close()
+
+    def __enter__(self) -> "TimetableIndex":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
@@ -2,18 +2,49 @@ import json
 import logging
 from datetime import datetime, timedelta, timezone
 from functools import wraps
-from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple, TypeVar
 
 from redis.asyncio.client import Redis
 from sqlalchemy import case, event, func, or_, select, update
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
-from core.config import MOSCOW_TZ
+from core.config import (
+    DEFAULT_EVENING_DIGEST_TIME,
+    DEFAULT_MORNING_DIGEST_TIME,
+    EVENING_DIGEST_SLOTS,
+    MORNING_DIGEST_SLOTS,
+    MOSCOW_TZ,
+)
 from core.db import User
 
 logger = logging.getLogger(__name__)
 T = TypeVar("T")
 
+# Настройки, по которым можно выбрать получателей рассылки
+BROADCAST_SETTINGS = ("evening_notify", "morning_summary", "lesson_reminders")
+# Сводки с выбираемым временем: настройка → (колонка времени, допустимые слоты, слот по умолчанию)
+DIGEST_TIME_SETTINGS = {
+    "evening_notify": ("evening_time", EVENING_DIGEST_SLOTS, DEFAULT_EVENING_DIGEST_TIME),
+    "morning_summary": ("morning_time", MORNING_DIGEST_SLOTS, DEFAULT_MORNING_DIGEST_TIME),
+}
+
+
+def lesson_reminder_offset(minutes: Optional[int]) -> int:
+    """За сколько минут до пары напоминать: по умолчанию 20 минут, даже если в настройках хранится 60."""
+    return 20 if minutes is None or minutes == 60 else minutes
+
+
+class BroadcastRecipient(NamedTuple):
+    """Всё, что нужно рассылке о получателе, без отдельного запроса на каждого пользователя."""
+
+    user_id: int
+    group: str
+    user_type: str
+    evening_notify: bool
+    morning_summary: bool
+    lesson_reminders: bool
+    reminder_time_minutes: int
+
 
 def cached(ttl: int = 3600) -> Callable:
     """
@@ -117,6 +148,13 @@ class UserDataManager:
             self._redis_client = await get_redis_client()
         return self._redis_client
 
+    async def close(self) -> None:
+        """Закрывает пул соединений с БД и Redis-клиент кэша."""
+        if self._redis_client is not None:
+            await self._redis_client.aclose()
+            self._redis_client = None
+        await self.engine.dispose()
+
     async def clear_user_cache(self) -> None:
         """Очищает кэш пользователей (вызывается при изменении данных)."""
         if not self._redis_client:
@@ -145,11 +183,18 @@ class UserDataManager:
             logger.warning(f"Failed to clear user cache: {e}")
 
     async def register_user(self, user_id: int, username: Optional[str]) -> None:
-        """Регистрирует нового пользователя или обновляет дату последней активности."""
+        """
+        Регистрирует нового пользователя или обновляет дату последней активности.
+
+        Пользователь снова пишет боту — значит, он его разблокировал: флаг is_blocked снимается.
+        """
         async with self.async_session_maker() as session:
             user = await session.get(User, user_id)
             if user:
                 user.last_active_date = datetime.now(timezone.utc).replace(tzinfo=None)
+                if user.is_blocked:
+                    user.is_blocked = False
+                    logger.info(f"User {user_id} is active again, blocked flag cleared")
             else:
                 user = User(user_id=user_id, username=username)
                 session.add(user)
@@ -201,6 +246,8 @@ class UserDataManager:
                     "morning_summary": user.morning_summary,
                     "lesson_reminders": user.lesson_reminders,
                     "reminder_time_minutes": user.reminder_time_minutes,
+                    "evening_time": user.evening_time,
+                    "morning_time": user.morning_time,
                     "theme": user.theme,
                 }
             return {
@@ -208,6 +255,8 @@ class UserDataManager:
                 "morning_summary": False,
                 "lesson_reminders": False,
                 "reminder_time_minutes": 60,
+                "evening_time": DEFAULT_EVENING_DIGEST_TIME,
+                "morning_time": DEFAULT_MORNING_DIGEST_TIME,
                 "theme": "standard",
             }
 
@@ -238,6 +287,21 @@ class UserDataManager:
         # Очищаем кэш пользователей после изменения времени напоминания
         await self.clear_user_cache()
 
+    async def set_digest_time(self, user_id: int, setting_name: str, slot: str) -> bool:
+        """Устанавливает время сводки (evening_notify / morning_summary). Возвращает False для чужого слота."""
+        if setting_name not in DIGEST_TIME_SETTINGS:
+            logging.warning(f"Attempt to set time for invalid setting: {setting_name}")
+            return False
+        column, slots, _ = DIGEST_TIME_SETTINGS[setting_name]
+        if slot not in slots:
+            logging.warning(f"Invalid digest slot '{slot}' for {setting_name} (user {user_id})")
+            return False
+        async with self.async_session_maker() as session:
+            await session.execute(update(User).where(User.user_id == user_id).values({column: slot}))
+            await session.commit()
+        await self.clear_user_cache()
+        return True
+
     async def get_full_user_info(self, user_id: int) -> Optional[User]:
         """Возвращает полный объект User по его ID."""
         async with self.async_session_maker() as session:
@@ -266,6 +330,30 @@ class UserDataManager:
         # Очищаем кэш пользователей после изменения темы
         await self.clear_user_cache()
 
+    async def mark_users_blocked(self, user_ids: List[int]) -> int:
+        """
+        Отмечает пользователей, заблокировавших бота: рассылки перестают их выбирать.
+
+        Возвращает число пользователей, отмеченных впервые.
+        """
+        if not user_ids:
+            return 0
+        async with self.async_session_maker() as session:
+            stmt = (
+                update(User)
+                .where(User.user_id.in_(user_ids), User.is_blocked == False)
+                .values(is_blocked=True)
+                .execution_options(synchronize_session=False)
+            )
+            result = await session.execute(stmt)
+            await session.commit()
+            marked = result.rowcount or 0
+
+        if marked:
+            # Закэшированные списки получателей ещё содержат этих пользователей
+            await self.clear_user_cache()
+        return marked
+
     # --- Методы для статистики ---
     async def get_total_users_count(self) -> int:
         async with self.async_session_maker() as session:
@@ -288,6 +376,16 @@ class UserDataManager:
             result = await session.scalar(stmt)
             return result or 0
 
+    async def get_blocked_subscribed_users_count(self) -> int:
+        """Подписанные пользователи, заблокировавшие бота (их пропускают рассылки)."""
+        async with self.async_session_maker() as session:
+            stmt = select(func.count(User.user_id)).where(
+                User.is_blocked == True,
+                or_(User.evening_notify, User.morning_summary, User.lesson_reminders),
+            )
+            result = await session.scalar(stmt)
+            return result or 0
+
     async def get_active_users_by_period(self, days: int) -> int:
         async with self.async_session_maker() as session:
             start_date = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days)
@@ -302,6 +400,42 @@ class UserDataManager:
             result = await session.execute(stmt)
             return [(row.user_id, row.group) for row in result.fetchall()]
 
+    async def get_student_groups(self) -> List[str]:
+        """Различные группы, выбранные студентами."""
+        async with self.async_session_maker() as session:
+            stmt = select(User.group).where(User.user_type == "student", User.group.isnot(None)).distinct()
+            result = await session.scalars(stmt)
+            return list(result)
+
+    async def clear_groups(self, groups: List[str]) -> List[Tuple[int, str]]:
+        """
+        Сбрасывает группу у всех студентов указанных групп одним UPDATE.
+
+        Возвращает затронутых пользователей с их прежней группой; кэш рассылок очищается один раз.
+        """
+        if not groups:
+            return []
+        condition = (User.group.in_(groups), User.user_type == "student")
+        async with self.async_session_maker() as session:
+            result = await session.execute(select(User.user_id, User.group).where(*condition))
+            affected = [tuple(row) for row in result.all()]
+            if affected:
+                await session.execute(update(User).where(*condition).values(group=None))
+            await session.commit()
+
+        if affected:
+            await self.clear_user_cache()
+        return affected
+
+    async def get_users_in_groups(self, groups: List[str]) -> List[Tuple[int, str]]:
+        """Получает пользователей указанных групп (по индексу idx_user_group), кроме заблокировавших бота."""
+        if not groups:
+            return []
+        async with self.async_session_maker() as session:
+            stmt = select(User.user_id, User.group).where(User.group.in_(groups), User.is_blocked == False)
+            result = await session.execute(stmt)
+            return [tuple(row) for row in result.all()]
+
     async def get_top_groups(self, limit: int = 5) -> List[Tuple[str, int]]:
         async with self.async_session_maker() as session:
             stmt = (
@@ -363,9 +497,12 @@ class UserDataManager:
             result = await session.execute(stmt)
             return {row.group_size_category: row.number_of_groups for row in result}
 
-    async def get_all_user_ids(self) -> List[int]:
+    async def get_all_user_ids(self, exclude_blocked: bool = False) -> List[int]:
+        """ID всех пользователей; exclude_blocked — без заблокировавших бота (получатели рассылок)."""
         async with self.async_session_maker() as session:
             stmt = select(User.user_id)
+            if exclude_blocked:
+                stmt = stmt.where(User.is_blocked == False)
             result = await session.scalars(stmt)
             return list(result)
 
@@ -374,7 +511,9 @@ class UserDataManager:
     async def get_users_for_evening_notify(self) -> List[Tuple[int, str]]:
         """Получает пользователей для вечерних уведомлений с кэшированием."""
         async with self.async_session_maker() as session:
-            stmt = select(User.user_id, User.group).where(User.evening_notify == True, User.group.isnot(None))
+            stmt = select(User.user_id, User.group).where(
+                User.evening_notify == True, User.group.isnot(None), User.is_blocked == False
+            )
             result = await session.execute(stmt)
             return [tuple(row) for row in result.all()]
 
@@ -382,27 +521,64 @@ class UserDataManager:
     async def get_users_for_morning_summary(self) -> List[Tuple[int, str]]:
         """Получает пользователей для утренних уведомлений с кэшированием."""
         async with self.async_session_maker() as session:
-            stmt = select(User.user_id, User.group).where(User.morning_summary == True, User.group.isnot(None))
+            stmt = select(User.user_id, User.group).where(
+                User.morning_summary == True, User.group.isnot(None), User.is_blocked == False
+            )
             result = await session.execute(stmt)
             return [tuple(row) for row in result.all()]
 
+    async def iter_broadcast_recipients(
+        self, setting: str, batch_size: int = 1000, slot: Optional[str] = None
+    ) -> AsyncIterator[BroadcastRecipient]:
+        """
+        Потоково отдаёт получателей рассылки с включённой настройкой setting.
+
+        Один запрос с серверным курсором вместо get_full_user_info на каждого пользователя:
+        строки приходят пачками по batch_size, обработка начинается до загрузки всего списка.
+        slot — время сводки «ЧЧ:ММ»: только пользователи, выбравшие этот слот. Пользователи со слотом,
+        которого больше нет в списке, получают сводку в слот по умолчанию.
+        Пользователи, заблокировавшие бота, пропускаются.
+        """
+        if setting not in BROADCAST_SETTINGS:
+            raise ValueError(f"Неизвестная настройка рассылки: {setting}")
+        conditions = [getattr(User, setting) == True, User.group.isnot(None), User.is_blocked == False]
+        if slot is not None:
+            if setting not in DIGEST_TIME_SETTINGS:
+                raise ValueError(f"Для настройки {setting} время не выбирается")
+            column_name, slots, default = DIGEST_TIME_SETTINGS[setting]
+            column = getattr(User, column_name)
+            conditions.append(or_(column == slot, column.notin_(slots)) if slot == default else column == slot)
+        stmt = (
+            select(
+                User.user_id,
+                User.group,
+                User.user_type,
+                User.evening_notify,
+                User.morning_summary,
+                User.lesson_reminders,
+                User.reminder_time_minutes,
+            )
+            .where(*conditions)
+            .execution_options(yield_per=batch_size)
+        )
+        async with self.async_session_maker() as session:
+            result = await session.stream(stmt)
+            async for row in result:
+                yield BroadcastRecipient(*row)
+
     @cached(ttl=3600)  # Кэшируем на 1 час
     async def get_users_for_lesson_reminders(self) -> List[Tuple[int, str, int]]:
         """Получает пользователей для напоминаний о парах, включая время напоминания с кэшированием."""
         async with self.async_session_maker() as session:
             stmt = select(User.user_id, User.group, User.reminder_time_minutes).where(
-                User.lesson_reminders == True, User.group.isnot(None)
+                User.lesson_reminders == True, User.group.isnot(None), User.is_blocked == False
             )
             result = await session.execute(stmt)
             rows = result.all()
             adjusted: List[Tuple[int, str, int]] = []
             for row in rows:
                 user_id, group, minutes = row
-                # По требованиям рассылки, дефолтное значение для напоминаний — 20 минут,
-                # даже если в настройках по умолчанию хранится 60.
-                if minutes is None or minutes == 60:
-                    minutes = 20
-                adjusted.append((user_id, group, minutes))
+                adjusted.append((user_id, group, lesson_reminder_offset(minutes)))
             return adjusted
 
     async def get_admin_users(self) -> List[int]:
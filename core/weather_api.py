@@ -1,31 +1,70 @@
 import asyncio
+import json
 import logging
 from datetime import datetime, time, timedelta, timezone
 from typing import Any, Dict, Optional
 
 import aiohttp
+from redis.asyncio import Redis
 
-from core.config import MOSCOW_TZ, OPENWEATHERMAP_API_KEY, OPENWEATHERMAP_CITY_ID, OPENWEATHERMAP_UNITS
-from core.metrics import ERRORS_TOTAL, RETRIES_TOTAL
+from core.config import (
+    MOSCOW_TZ,
+    OPENWEATHERMAP_API_KEY,
+    OPENWEATHERMAP_BASE_URL,
+    OPENWEATHERMAP_CITY_ID,
+    OPENWEATHERMAP_UNITS,
+    REDIS_WEATHER_FORECAST_PREFIX,
+)
+from core.metrics import ERRORS_TOTAL, RETRIES_TOTAL, WEATHER_FORECAST_LOOKUPS
 
 
 class WeatherAPI:
-    BASE_URL = "https://api.openweathermap.org/data/2.5/forecast"
+    BASE_URL = OPENWEATHERMAP_BASE_URL
     CACHE_DURATION_HOURS = 1  # Кэш погоды будет храниться 1 час
     _cache: Dict[str, Dict[str, Any]] = {}  # Словарь для хранения кэша: {'дата_час_прогноза': {'timestamp': ..., 'data': ...}}
+    # OpenWeatherMap пересчитывает 5-дневный прогноз раз в 3 часа (UTC); новый прогноз появляется с задержкой
+    FORECAST_UPDATE_HOURS = 3
+    FORECAST_PUBLISH_LAG = timedelta(minutes=15)
+    # Single-flight между процессами: один запрос к API, остальные ждут результат в Redis
+    FETCH_LOCK_SECONDS = 20
+    FETCH_WAIT_SECONDS = 5.0
+    _inflight: Dict[str, "asyncio.Future"] = {}  # Запросы к API, выполняющиеся в этом процессе
 
-    def __init__(self, api_key: str, city_id: str, units: str = "metric"):
+    def __init__(
+        self,
+        api_key: str,
+        city_id: str,
+        units: str = "metric",
+        redis_client: Redis | None = None,
+        base_url: str | None = None,
+    ):
         if not api_key:
             logging.error("OpenWeatherMap API key is not provided!")
             raise ValueError("API key cannot be empty.")
         self.api_key = api_key
         self.city_id = city_id
         self.units = units
+        self.redis = redis_client
+        self.base_url = base_url or self.BASE_URL
+
+    @property
+    def forecast_key(self) -> str:
+        return f"{REDIS_WEATHER_FORECAST_PREFIX}{self.city_id}:{self.units}"
+
+    @classmethod
+    def forecast_ttl(cls, now: datetime | None = None) -> int:
+        """Секунды до появления следующего прогноза: ближайшая 3-часовая граница UTC плюс задержка публикации."""
+        now = (now or datetime.now(timezone.utc)).astimezone(timezone.utc)
+        hour = (now.hour // cls.FORECAST_UPDATE_HOURS) * cls.FORECAST_UPDATE_HOURS
+        expires = now.replace(hour=hour, minute=0, second=0, microsecond=0) + cls.FORECAST_PUBLISH_LAG
+        if expires <= now:
+            expires += timedelta(hours=cls.FORECAST_UPDATE_HOURS)
+        return max(60, int((expires - now).total_seconds()))
 
     async def get_forecast_for_time(self, target_datetime: datetime) -> Optional[Dict[str, Any]]:
         """
         Получает прогноз погоды для ближайшего доступного временного интервала
-        к target_datetime. Использует кэш.
+        к target_datetime. Использует кэш процесса и общий кэш прогноза в Redis.
         """
         # Формируем ключ кэша на основе даты и часа, для которого нужен прогноз
         # Округляем до ближайшего 3-часового интервала, т.к. OWM дает каждые 3 часа
@@ -40,8 +79,130 @@ class WeatherAPI:
             # Если кэш свежий (младше CACHE_DURATION_HOURS часов)
             if datetime.now(timezone.utc).replace(tzinfo=None) - cache_timestamp < timedelta(hours=self.CACHE_DURATION_HOURS):
                 logging.info(f"Использую кэшированный прогноз для {cache_key}.")
+                WEATHER_FORECAST_LOOKUPS.labels(source="local").inc()
                 return cached_entry["data"]
 
+        data = await self._get_forecast()
+        if data is None:
+            return None
+
+        closest_forecast_item = None
+        min_diff = timedelta(days=999)
+
+        for forecast_item in data.get("list", []):
+            forecast_utc_dt = datetime.fromtimestamp(forecast_item["dt"], tz=timezone.utc)  # OWM время всегда в UTC
+
+            # Ищем прогноз, который находится в том же 3-часовом блоке, что и target_datetime
+            # Или ближайший в будущем, если target_datetime очень близко к границе блока
+            if forecast_utc_dt.date() == target_utc_dt.date() and (forecast_utc_dt.hour // 3) * 3 == target_hour_rounded:
+                closest_forecast_item = forecast_item
+                break  # Нашли точный блок, дальше не ищем
+
+            # Если не нашли точный блок, ищем ближайший по времени
+            time_diff = abs(target_utc_dt - forecast_utc_dt)
+            if time_diff < min_diff:
+                closest_forecast_item = forecast_item
+                min_diff = time_diff
+
+        if closest_forecast_item:
+            weather_description = closest_forecast_item.get("weather", [{}])[0].get("description", "неизвестно")
+            temp = closest_forecast_item.get("main", {}).get("temp", "N/A")
+            humidity = closest_forecast_item.get("main", {}).get("humidity", "N/A")
+            wind_speed = closest_forecast_item.get("wind", {}).get("speed", "N/A")
+
+            icon_code = closest_forecast_item.get("weather", [{}])[0].get("icon")
+            emoji = self._get_weather_emoji(icon_code)
+
+            result_data = {
+                "temperature": round(temp),
+                "description": weather_description,
+                "emoji": emoji,
+                "humidity": round(humidity),
+                "wind_speed": round(wind_speed),
+                "forecast_time": datetime.fromtimestamp(closest_forecast_item["dt"], tz=MOSCOW_TZ).strftime("%H:%M"),
+            }
+            self._cache[cache_key] = {
+                "timestamp": datetime.now(timezone.utc).replace(tzinfo=None),
+                "data": result_data,
+            }
+            return result_data
+        return None
+
+    async def prefetch(self) -> bool:
+        """Заранее обновляет общий кэш прогноза (перед рассылками), чтобы рассылка не ждала API."""
+        data = await self._fetch_upstream()
+        if data is None:
+            return False
+        await self._store_shared(data)
+        return True
+
+    async def _load_shared(self) -> Optional[Dict[str, Any]]:
+        if self.redis is None:
+            return None
+        try:
+            raw = await self.redis.get(self.forecast_key)
+            return json.loads(raw) if raw else None
+        except Exception as e:
+            logging.warning(f"Не удалось прочитать прогноз погоды из Redis: {e}")
+            return None
+
+    async def _store_shared(self, data: Dict[str, Any]):
+        if self.redis is None:
+            return
+        try:
+            payload = json.dumps({"list": data.get("list", [])}, ensure_ascii=False)
+            await self.redis.set(self.forecast_key, payload, ex=self.forecast_ttl())
+        except Exception as e:
+            logging.warning(f"Не удалось сохранить прогноз погоды в Redis: {e}")
+
+    async def _get_forecast(self) -> Optional[Dict[str, Any]]:
+        """Прогноз из общего кэша; при промахе — один запрос к API на процесс (single-flight)."""
+        shared = await self._load_shared()
+        if shared is not None:
+            WEATHER_FORECAST_LOOKUPS.labels(source="redis").inc()
+            return shared
+
+        key = self.forecast_key
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._refresh_shared())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: отмена одного ожидающего не должна отменять общий запрос
+        return await asyncio.shield(future)
+
+    async def _refresh_shared(self) -> Optional[Dict[str, Any]]:
+        """Запрос к API от имени всех процессов: остальные ждут, пока прогноз появится в Redis."""
+        lock_key = f"{self.forecast_key}:lock"
+        locked = False
+        if self.redis is not None:
+            try:
+                locked = bool(await self.redis.set(lock_key, "1", nx=True, ex=self.FETCH_LOCK_SECONDS))
+            except Exception:
+                locked = False
+            if not locked:
+                loop = asyncio.get_running_loop()
+                deadline = loop.time() + self.FETCH_WAIT_SECONDS
+                while loop.time() < deadline:
+                    await asyncio.sleep(0.1)
+                    shared = await self._load_shared()
+                    if shared is not None:
+                        WEATHER_FORECAST_LOOKUPS.labels(source="redis").inc()
+                        return shared
+                # Владелец блокировки не успел — запрашиваем сами, чтобы не остаться без погоды
+        try:
+            data = await self._fetch_upstream()
+            if data is not None:
+                await self._store_shared(data)
+            return data
+        finally:
+            if locked:
+                try:
+                    await self.redis.delete(lock_key)
+                except Exception:
+                    pass
+
+    async def _fetch_upstream(self) -> Optional[Dict[str, Any]]:
         params = {
             "id": self.city_id,
             "appid": self.api_key,
@@ -54,9 +215,9 @@ class WeatherAPI:
                 # Исправление таймаута в session.get
                 for attempt in range(3):
                     try:
-                        logging.info(f"Выполняю запрос к OpenWeatherMap API для {cache_key} (попытка {attempt + 1})...")
+                        logging.info(f"Выполняю запрос к OpenWeatherMap API (попытка {attempt + 1})...")
                         async with session.get(
-                            self.BASE_URL,
+                            self.base_url,
                             params=params,
                             timeout=aiohttp.ClientTimeout(total=5),
                         ) as response:
@@ -96,6 +257,7 @@ class WeatherAPI:
                         return None
                 else:
                     logging.error("Все попытки получить прогноз погоды завершились неудачей.")
+                    WEATHER_FORECAST_LOOKUPS.labels(source="failed").inc()
                     ERRORS_TOTAL.labels(source="weather").inc()
                     return None
         except Exception as e:
@@ -103,47 +265,8 @@ class WeatherAPI:
             ERRORS_TOTAL.labels(source="weather").inc()
             return None
 
-        closest_forecast_item = None
-        min_diff = timedelta(days=999)
-
-        for forecast_item in data.get("list", []):
-            forecast_utc_dt = datetime.fromtimestamp(forecast_item["dt"], tz=timezone.utc)  # OWM время всегда в UTC
-
-            # Ищем прогноз, который находится в том же 3-часовом блоке, что и target_datetime
-            # Или ближайший в будущем, если target_datetime очень близко к границе блока
-            if forecast_utc_dt.date() == target_utc_dt.date() and (forecast_utc_dt.hour // 3) * 3 == target_hour_rounded:
-                closest_forecast_item = forecast_item
-                break  # Нашли точный блок, дальше не ищем
-
-            # Если не нашли точный блок, ищем ближайший по времени
-            time_diff = abs(target_utc_dt - forecast_utc_dt)
-            if time_diff < min_diff:
-                closest_forecast_item = forecast_item
-                min_diff = time_diff
-
-        if closest_forecast_item:
-            weather_description = closest_forecast_item.get("weather", [{}])[0].get("description", "неизвестно")
-            temp = closest_forecast_item.get("main", {}).get("temp", "N/A")
-            humidity = closest_forecast_item.get("main", {}).get("humidity", "N/A")
-            wind_speed = closest_forecast_item.get("wind", {}).get("speed", "N/A")
-
-            icon_code = closest_forecast_item.get("weather", [{}])[0].get("icon")
-            emoji = self._get_weather_emoji(icon_code)
-
-            result_data = {
-                "temperature": round(temp),
-                "description": weather_description,
-                "emoji": emoji,
-                "humidity": round(humidity),
-                "wind_speed": round(wind_speed),
-                "forecast_time": datetime.fromtimestamp(closest_forecast_item["dt"], tz=MOSCOW_TZ).strftime("%H:%M"),
-            }
-            self._cache[cache_key] = {
-                "timestamp": datetime.now(timezone.utc).replace(tzinfo=None),
-                "data": result_data,
-            }
-            return result_data
-        return None
+        WEATHER_FORECAST_LOOKUPS.labels(source="upstream").inc()
+        return data
 
     def _get_weather_emoji(self, icon_code: str) -> str:
         """Преобразует код иконки OpenWeatherMap в эмодзи."""
@@ -49,11 +49,14 @@ from bot.middlewares.user_data_middleware import UserDataMiddleware
 # from bot.middlewares.chat_cleanup_middleware import ChatCleanupMiddleware  # Автоочистка отключена
 from bot.scheduler import setup_scheduler
 from core.alert_webhook import run_alert_webhook_server
+from core.broadcast_outbox import BroadcastOutbox
+from core.broadcast_pacing import BroadcastPacer
 from core.business_alerts import start_business_monitoring
 
 # --- Импорты ядра ---
-from core.config import ADMIN_IDS
+from core.config import ADMIN_IDS, BROADCAST_SEND_CHUNK_SIZE
 from core.image_generator import shutdown_image_generator
+from core.leader_election import LeaderElector
 from core.manager import TimetableManager
 from core.user_data import UserDataManager
 
@@ -254,6 +257,12 @@ async def main():
         return
 
     user_data_manager = UserDataManager(db_url=db_url or "", redis_url=redis_url)
+    broadcast_outbox = BroadcastOutbox(
+        user_data_manager.async_session_maker,
+        redis_client,
+        pacer=BroadcastPacer(redis_client),
+        chunk_size=BROADCAST_SEND_CHUNK_SIZE,
+    )
     logging.info("Менеджеры данных инициализированы.")
 
     storage = RedisStorage(redis=redis_client, key_builder=DefaultKeyBuilder(with_destiny=True))
@@ -268,11 +277,16 @@ async def main():
     )
     dp = Dispatcher(storage=storage)
 
+    # При нескольких репликах задачи планировщика выполняет только держатель аренды в Redis;
+    # смену лидерства (пауза, возобновление и восстановление задач на сегодня) подключает setup_scheduler
+    leader_elector = LeaderElector(redis_client)
     scheduler = setup_scheduler(
         bot=bot,
         manager=timetable_manager,
         user_data_manager=user_data_manager,
         redis_client=redis_client,
+        broadcast_outbox=broadcast_outbox,
+        leader=leader_elector,
     )
 
     # Подключение Middleware
@@ -288,7 +302,14 @@ async def main():
     dp.update.middleware(
         lambda handler, event, data: handler(
             event,
-            {**data, "bot": bot, "scheduler": scheduler, "redis_client": redis_client},
+            {
+                **data,
+                "bot": bot,
+                "scheduler": scheduler,
+                "redis_client": redis_client,
+                "broadcast_outbox": broadcast_outbox,
+                "leader_elector": leader_elector,
+            },
         )
     )
     dp.errors.register(error_handler)
@@ -362,7 +383,9 @@ async def main():
             logging.error(f"Не удалось удалить webhook: {e}")
 
         await set_bot_commands(bot)
-        scheduler.start()
+        # Планировщик стартует на паузе и возобновляется, когда реплика получает лидерство
+        scheduler.start(paused=True)
+        asyncio.create_task(leader_elector.run())
 
         async def _notify_admins_start():
             if ADMIN_IDS:
@@ -388,6 +411,11 @@ async def main():
             raise
     finally:
         # Корректно останавливаем планировщик и ресурсы
+        # Освобождаем аренду сразу, чтобы резервная реплика не ждала истечения TTL
+        try:
+            await leader_elector.release()
+        except Exception:
+            pass
         try:
             scheduler.shutdown()
         except Exception:
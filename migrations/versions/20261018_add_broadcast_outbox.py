@@ -0,0 +1,61 @@
+"""add broadcast outbox tables
+
+Revision ID: add_broadcast_outbox_20261018
+Revises: b344ca4372f8
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "add_broadcast_outbox_20261018"
+down_revision: Union[str, None] = "b344ca4372f8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "broadcast_jobs",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("kind", sa.String(length=32), nullable=False),
+        sa.Column("status", sa.String(length=16), server_default=sa.text("'sending'"), nullable=False),
+        sa.Column("texts", sa.Text(), nullable=True),
+        sa.Column("from_chat_id", sa.BigInteger(), nullable=True),
+        sa.Column("message_id", sa.BigInteger(), nullable=True),
+        sa.Column("total", sa.Integer(), server_default=sa.text("0"), nullable=False),
+        sa.Column("checkpoint", sa.BigInteger(), server_default=sa.text("0"), nullable=False),
+        sa.Column("heartbeat_at", sa.TIMESTAMP(), nullable=True),
+        sa.Column("created_by", sa.BigInteger(), nullable=True),
+        sa.Column("created_at", sa.TIMESTAMP(), server_default=sa.text("now()"), nullable=True),
+        sa.Column("expires_at", sa.TIMESTAMP(), nullable=True),
+        sa.Column("finished_at", sa.TIMESTAMP(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("idx_broadcast_jobs_status", "broadcast_jobs", ["status"])
+    op.create_index("idx_broadcast_jobs_created_at", "broadcast_jobs", ["created_at"])
+
+    op.create_table(
+        "broadcast_deliveries",
+        sa.Column("id", sa.BigInteger(), nullable=False),
+        sa.Column("job_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.BigInteger(), nullable=False),
+        sa.Column("text_hash", sa.String(length=64), nullable=True),
+        sa.Column("status", sa.String(length=16), server_default=sa.text("'pending'"), nullable=False),
+        sa.Column("updated_at", sa.TIMESTAMP(), server_default=sa.text("now()"), nullable=True),
+        sa.ForeignKeyConstraint(["job_id"], ["broadcast_jobs.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("job_id", "user_id", name="uq_broadcast_delivery_job_user"),
+    )
+    op.create_index("idx_broadcast_deliveries_job_status", "broadcast_deliveries", ["job_id", "status"])
+
+
+def downgrade() -> None:
+    op.drop_index("idx_broadcast_deliveries_job_status", table_name="broadcast_deliveries")
+    op.drop_table("broadcast_deliveries")
+    op.drop_index("idx_broadcast_jobs_created_at", table_name="broadcast_jobs")
+    op.drop_index("idx_broadcast_jobs_status", table_name="broadcast_jobs")
+    op.drop_table("broadcast_jobs")
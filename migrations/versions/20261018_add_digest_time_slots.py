@@ -0,0 +1,32 @@
+"""add digest time slots to users
+
+Revision ID: add_digest_time_slots_20261018
+Revises: add_broadcast_outbox_20261018
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "add_digest_time_slots_20261018"
+down_revision: Union[str, None] = "add_broadcast_outbox_20261018"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Существующие пользователи получают прежнее время сводок
+    op.add_column("users", sa.Column("evening_time", sa.String(length=5), server_default="20:00", nullable=False))
+    op.add_column("users", sa.Column("morning_time", sa.String(length=5), server_default="08:00", nullable=False))
+    op.create_index("idx_user_evening_slot", "users", ["evening_notify", "evening_time"], unique=False)
+    op.create_index("idx_user_morning_slot", "users", ["morning_summary", "morning_time"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("idx_user_morning_slot", table_name="users")
+    op.drop_index("idx_user_evening_slot", table_name="users")
+    op.drop_column("users", "morning_time")
+    op.drop_column("users", "evening_time")
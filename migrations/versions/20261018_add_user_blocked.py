@@ -0,0 +1,28 @@
+"""add blocked flag to users
+
+Revision ID: add_user_blocked_20261018
+Revises: add_digest_time_slots_20261018
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "add_user_blocked_20261018"
+down_revision: Union[str, None] = "add_digest_time_slots_20261018"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Существующие пользователи считаются доступными, пока отправка не вернёт «бот заблокирован»
+    op.add_column("users", sa.Column("is_blocked", sa.Boolean(), server_default="f", nullable=False))
+    op.create_index("idx_user_blocked", "users", ["is_blocked"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("idx_user_blocked", table_name="users")
+    op.drop_column("users", "is_blocked")
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Накладные расходы общего лимитера отправки (core/send_rate_limiter.py) на один токен.
+
+Запуск:
+    python scripts/bench_send_rate_limiter.py --tokens 5000 --redis redis://localhost:6379/0
+Без --redis используется fakeredis (внутрипроцессный, без сети: показывает стоимость самого скрипта и клиента).
+
+Меряется только резервирование слота (один EVAL с двумя ключами), без сна до слота,
+и для сравнения — AsyncLimiter процесса, который лимитер заменил.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiolimiter import AsyncLimiter  # noqa: E402
+from redis.asyncio import Redis  # noqa: E402
+
+from core.send_rate_limiter import SendRateLimiter  # noqa: E402
+
+
+async def bench_reserve(redis: Redis, tokens: int, chats: int) -> float:
+    limiter = SendRateLimiter(lambda: redis, rate=1000, key_prefix="bench:{telegram}:", max_wait=3600)
+    started = time.perf_counter()
+    for index in range(tokens):
+        await limiter.reserve(index % chats)
+    return (time.perf_counter() - started) / tokens
+
+
+async def bench_local(tokens: int) -> float:
+    limiter = AsyncLimiter(tokens, 1)
+    started = time.perf_counter()
+    for _ in range(tokens):
+        await limiter.acquire()
+    return (time.perf_counter() - started) / tokens
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Накладные расходы GCRA-лимитера на токен")
+    parser.add_argument("--tokens", type=int, default=5000)
+    parser.add_argument("--chats", type=int, default=1000, help="число разных получателей")
+    parser.add_argument("--redis", default=None, help="URL Redis; по умолчанию fakeredis")
+    args = parser.parse_args()
+
+    if args.redis:
+        redis = Redis.from_url(args.redis)
+        source = args.redis
+    else:
+        import fakeredis
+
+        redis = fakeredis.FakeAsyncRedis()
+        source = "fakeredis"
+    try:
+        gcra = await bench_reserve(redis, args.tokens, args.chats)
+        await redis.delete(*[key async for key in redis.scan_iter("bench:{telegram}:*")])
+    finally:
+        await redis.aclose()
+    local = await bench_local(args.tokens)
+
+    print(f"GCRA в Redis ({source}): {gcra * 1e6:8.1f} мкс/токен ({1 / gcra:,.0f} токенов/с на поток)")
+    print(f"AsyncLimiter процесса:   {local * 1e6:8.1f} мкс/токен")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Сравнение скорости отправки сообщений акторами: «asyncio.run + новый Bot на сообщение» (как было)
+против общей среды выполнения потока (bot/worker_runtime.py: долгоживущий loop и один Bot).
+
+Запуск (заглушка Bot API поднимается в этом же процессе, в отдельном потоке):
+    python scripts/bench_worker_runtime.py --messages 500 --threads 4 --delay 0.005
+
+Заглушка работает по HTTP, поэтому цифры не учитывают TLS-рукопожатие с api.telegram.org,
+которое старый вариант платил на каждом сообщении: реальный выигрыш больше.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.default import DefaultBotProperties  # noqa: E402
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+
+from bot import worker_runtime  # noqa: E402
+from scripts.fake_bot_api import STATS, create_app  # noqa: E402
+
+TOKEN = "123456:BENCHMARK"
+
+
+def start_server(host: str, port: int, delay: float) -> tuple[web.Application, asyncio.AbstractEventLoop]:
+    app = create_app(delay)
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(app)
+    ready = threading.Event()
+
+    def serve():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(runner.setup())
+        loop.run_until_complete(web.TCPSite(runner, host, port).start())
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=serve, daemon=True).start()
+    ready.wait()
+    return app, loop
+
+
+def make_factory(base_url: str):
+    def factory() -> Bot:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(base_url))
+        return Bot(token=TOKEN, session=session, default=DefaultBotProperties(parse_mode="HTML"))
+
+    return factory
+
+
+def per_message_bot(factory, user_id: int):
+    """Старый путь актора: новый loop и новый Bot (сессия, соединение) на каждое сообщение."""
+
+    async def _inner():
+        bot = factory()
+        async with bot:
+            await bot.send_message(user_id, "Тестовое сообщение", disable_web_page_preview=True)
+
+    asyncio.run(_inner())
+
+
+def shared_runtime(factory, user_id: int):
+    """Новый путь актора: корутина выполняется в loop рабочего потока с общим Bot."""
+
+    async def _inner():
+        async with worker_runtime.bot_session(factory) as bot:
+            await bot.send_message(user_id, "Тестовое сообщение", disable_web_page_preview=True)
+
+    worker_runtime.run(_inner())
+
+
+def bench(name: str, task, factory, app: web.Application, messages: int, threads: int) -> float:
+    stats = app[STATS]
+    stats["requests"], stats["connections"] = 0, 0
+    stats["_peers"].clear()
+    per_thread = messages // threads
+
+    def worker_thread(offset: int):
+        # Так же, как WorkerRuntimeMiddleware в рабочем потоке Dramatiq
+        if task is shared_runtime:
+            worker_runtime.boot(factory)
+        try:
+            for index in range(per_thread):
+                task(factory, offset + index)
+        finally:
+            worker_runtime.shutdown()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(worker_thread, [n * per_thread for n in range(threads)]))
+    elapsed = time.perf_counter() - started
+    rate = stats["requests"] / elapsed
+    print(
+        f"{name:<28} {stats['requests']:>6} сообщений за {elapsed:6.2f} с: "
+        f"{rate:8.1f} сообщ/с, соединений {stats['connections']}"
+    )
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк среды выполнения акторов против asyncio.run на сообщение")
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=4, help="как DRAMATIQ_BULK_THREADS")
+    parser.add_argument("--delay", type=float, default=0.0, help="задержка ответа заглушки, с")
+    parser.add_argument("--port", type=int, default=8091)
+    args = parser.parse_args()
+
+    app, _ = start_server("127.0.0.1", args.port, args.delay)
+    factory = make_factory(f"http://127.0.0.1:{args.port}")
+
+    before = bench("asyncio.run + новый Bot", per_message_bot, factory, app, args.messages, args.threads)
+    after = bench("общий loop и Bot потока", shared_runtime, factory, app, args.messages, args.threads)
+    print(f"Ускорение: x{after / before:.1f}")
+
+
+if __name__ == "__main__":
+    main()
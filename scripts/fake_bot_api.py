@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Локальная заглушка Telegram Bot API (sendMessage, copyMessage, getMe) для нагрузочных проверок без сети.
+
+Запуск:
+    python scripts/fake_bot_api.py --port 8081 --delay 0.01
+и в .env:
+    TELEGRAM_API_BASE_URL=http://127.0.0.1:8081
+
+Считает запросы и новые TCP-соединения (app[STATS]), чтобы было видно, переиспользуют ли
+клиенты keep-alive соединения.
+"""
+
+import argparse
+import asyncio
+import time
+
+from aiohttp import web
+
+STATS = web.AppKey("stats", dict)
+
+
+def _message(chat_id: int, message_id: int, text: str | None = None) -> dict:
+    message = {"message_id": message_id, "date": int(time.time()), "chat": {"id": chat_id, "type": "private"}}
+    if text is not None:
+        message["text"] = text
+    return message
+
+
+def create_app(delay: float = 0.0) -> web.Application:
+    """Приложение-заглушка. delay — искусственная задержка ответа (имитация сетевой задержки до Telegram)."""
+
+    async def method(request: web.Request) -> web.Response:
+        stats = request.app[STATS]
+        stats["requests"] += 1
+        # Новое соединение — новый клиентский порт
+        peer = request.transport.get_extra_info("peername") if request.transport else None
+        if peer not in stats["_peers"]:
+            stats["_peers"].add(peer)
+            stats["connections"] += 1
+        data = await request.post() if request.can_read_body else {}
+        if delay:
+            await asyncio.sleep(delay)
+        name = request.match_info["method"]
+        chat_id = int(data.get("chat_id", 0) or 0)
+        if name == "sendMessage":
+            result = _message(chat_id, stats["requests"], data.get("text", ""))
+        elif name == "copyMessage":
+            result = {"message_id": stats["requests"]}
+        elif name == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Fake"}
+        else:
+            return web.json_response({"ok": False, "error_code": 404, "description": "Not Found"}, status=404)
+        return web.json_response({"ok": True, "result": result})
+
+    app = web.Application()
+    app[STATS] = {"requests": 0, "connections": 0, "_peers": set()}
+    app.router.add_post("/bot{token}/{method}", method)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--delay", type=float, default=0.0)
+    args = parser.parse_args()
+    web.run_app(create_app(args.delay), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
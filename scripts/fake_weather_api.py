@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Локальная заглушка OpenWeatherMap (/data/2.5/forecast) для разработки и тестов без сети.
+
+Запуск:
+    python scripts/fake_weather_api.py --port 8089 --delay 0.5
+и в .env:
+    OPENWEATHERMAP_BASE_URL=http://127.0.0.1:8089/data/2.5/forecast
+
+Отдаёт 5-дневный прогноз с шагом 3 часа от текущего момента и считает запросы
+(app[STATS]["requests"]), чтобы проверять кэширование и single-flight.
+"""
+
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from aiohttp import web
+
+FORECAST_PATH = "/data/2.5/forecast"
+STATS = web.AppKey("stats", dict)
+
+
+def build_forecast(now: datetime | None = None, points: int = 40, temperature: float = 5.0) -> dict:
+    """Прогноз в формате OpenWeatherMap: точки каждые 3 часа, начиная с текущего 3-часового блока UTC."""
+    now = (now or datetime.now(timezone.utc)).astimezone(timezone.utc)
+    start = now.replace(hour=(now.hour // 3) * 3, minute=0, second=0, microsecond=0)
+    items = []
+    for index in range(points):
+        moment = start + timedelta(hours=3 * index)
+        items.append(
+            {
+                "dt": int(moment.timestamp()),
+                "main": {"temp": temperature + index % 8, "humidity": 70},
+                "weather": [{"description": "пасмурно", "icon": "04d"}],
+                "wind": {"speed": 3.0},
+            }
+        )
+    return {"cod": "200", "cnt": len(items), "list": items}
+
+
+def create_app(delay: float = 0.0) -> web.Application:
+    """Приложение-заглушка. delay — искусственная задержка ответа (для проверки одновременных запросов)."""
+
+    async def forecast(request: web.Request) -> web.Response:
+        if not request.query.get("appid"):
+            return web.json_response({"cod": 401, "message": "Invalid API key"}, status=401)
+        request.app[STATS]["requests"] += 1
+        if delay:
+            await asyncio.sleep(delay)
+        return web.json_response(build_forecast())
+
+    app = web.Application()
+    app[STATS] = {"requests": 0}
+    app.router.add_get(FORECAST_PATH, forecast)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка OpenWeatherMap forecast API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--delay", type=float, default=0.0)
+    args = parser.parse_args()
+    web.run_app(create_app(args.delay), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
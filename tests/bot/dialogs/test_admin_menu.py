@@ -197,15 +197,20 @@ class TestAdminMenuHandlers:
         mock_manager.middleware_data["user_data_manager"].get_users_for_lesson_reminders.return_value = [
             (123, "TEST_GROUP", "test@example.com")
         ]
-        mock_manager.middleware_data["manager"].get_schedule_for_day.return_value = {
-            "lessons": [{"subject": "TEST", "time": "9:00-10:30"}]
-        }
+        mock_manager.middleware_data["manager"].get_occurrences.return_value = [
+            {"subject": "TEST", "time": "9:00-10:30", "date": date.today()}
+        ]
 
         await on_test_reminders_for_week(mock_callback, MagicMock(), mock_manager)
 
         mock_callback.answer.assert_called_once_with("🚀 Начинаю тест планировщика напоминаний...")
-        # Проверяем, что бот отправил сообщения
-        assert mock_manager.middleware_data["bot"].send_message.call_count > 0
+        # Неделя запрашивается одним диапазоном, а не семью запросами по дням
+        mock_manager.middleware_data["manager"].get_occurrences.assert_awaited_once_with(
+            "group", "TEST_GROUP", date.today(), date.today() + timedelta(days=6)
+        )
+        mock_manager.middleware_data["manager"].get_schedule_for_day.assert_not_called()
+        texts = [call.args[1] for call in mock_manager.middleware_data["bot"].send_message.call_args_list]
+        assert sum("Нет пар" in text for text in texts) == 6
 
     @pytest.mark.asyncio
     async def test_on_test_reminders_for_week_no_users(self, mock_callback, mock_manager):
@@ -263,11 +268,14 @@ class TestAdminMenuHandlers:
                 date(2025, 2, 9),
             ]
             mock_instance.update_semester_settings.return_value = True
+            mock_manager.middleware_data["manager"] = AsyncMock()
 
             await on_fall_semester_input(mock_message, MagicMock(), mock_manager, "01.09.2024")
 
             mock_message.answer.assert_called_with("✅ Дата начала осеннего семестра успешно обновлена!")
             mock_manager.switch_to.assert_called_once()
+            # Календарь недель пересчитывается по новым датам
+            mock_manager.middleware_data["manager"].publish_calendar_change.assert_awaited_once()
 
     @pytest.mark.asyncio
     async def test_on_fall_semester_input_invalid_format(self, mock_message, mock_manager):
@@ -292,11 +300,14 @@ class TestAdminMenuHandlers:
                 date(2025, 2, 9),
             ]
             mock_instance.update_semester_settings.return_value = True
+            mock_manager.middleware_data["manager"] = AsyncMock()
 
             await on_spring_semester_input(mock_message, MagicMock(), mock_manager, "09.02.2025")
 
             mock_message.answer.assert_called_with("✅ Дата начала весеннего семестра успешно обновлена!")
             mock_manager.switch_to.assert_called_once()
+            # Календарь недель пересчитывается по новым датам
+            mock_manager.middleware_data["manager"].publish_calendar_change.assert_awaited_once()
 
     @pytest.mark.asyncio
     async def test_on_broadcast_received_success(self, mock_message, mock_manager):
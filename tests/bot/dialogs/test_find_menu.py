@@ -2,7 +2,14 @@ from unittest.mock import AsyncMock, MagicMock
 
 import pytest
 
-from bot.dialogs.find_menu import get_find_data, on_classroom_input, on_item_selected, on_teacher_input
+from bot.dialogs.find_menu import (
+    get_find_data,
+    get_subject_search_data,
+    on_classroom_input,
+    on_item_selected,
+    on_subject_input,
+    on_teacher_input,
+)
 from bot.dialogs.states import FindMenu
 
 
@@ -53,6 +60,35 @@ class TestFindMenu:
         assert mock_manager.dialog_data["classroom_number"] == "418"
         mock_manager.switch_to.assert_called_with(FindMenu.view_result)
 
+    async def test_on_subject_input(self, mock_manager):
+        mock_message = AsyncMock(text="теор мех")
+        mock_manager.timetable_manager.search_subjects.return_value = [{"subject": "Теоретическая механика"}]
+        await on_subject_input(mock_message, None, mock_manager)
+        assert mock_manager.dialog_data["subject_query"] == "теор мех"
+        mock_manager.switch_to.assert_called_with(FindMenu.subject_result)
+
+        mock_manager.reset_mock()
+        mock_manager.dialog_data = {}
+        mock_manager.timetable_manager.search_subjects.return_value = []
+        await on_subject_input(mock_message, None, mock_manager)
+        mock_message.answer.assert_called_once()
+        mock_manager.switch_to.assert_not_called()
+
+    async def test_get_subject_search_data(self, mock_manager):
+        mock_manager.dialog_data = {"subject_query": "физика"}
+        mock_manager.timetable_manager.search_subjects.return_value = [
+            {
+                "subject": "Физика",
+                "score": 1.0,
+                "occurrences": [
+                    {"group": "Е411", "day": "Вторник", "time": "09:00-10:30", "week_code": "1"},
+                    {"group": "Е412", "day": "Вторник", "time": "09:00-10:30", "week_code": "1"},
+                ],
+            }
+        ]
+        data = await get_subject_search_data(mock_manager)
+        assert "Вт 09:00-10:30 (нечёт.): Е411, Е412" in data["result_text"]
+
     async def test_on_item_selected(self, mock_manager):
         # Teacher
         mock_manager.dialog_data = {"search_type": "teacher"}
@@ -180,6 +180,8 @@ class TestScheduleViewHandlers:
         assert "schedule_text" in result
         assert "has_lessons" in result
         assert result["has_lessons"] is True
+        # Заголовок строится по кэшированному таймлайну менеджера
+        manager_obj.get_day_timeline.assert_awaited_once_with("TEST_GROUP", date(2024, 1, 15), entity_type="group")
 
     @pytest.mark.asyncio
     async def test_on_full_week_image_click(self, mock_callback, mock_manager):
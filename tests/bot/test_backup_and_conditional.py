@@ -16,10 +16,11 @@ async def test_backup_creates_snapshot(mocker):
         return b"hash"
 
     redis.get.side_effect = fake_get
-    redis.set = AsyncMock()
+    store = mocker.patch.object(scheduler_module, "ScheduleHistoryStore")
+    store.return_value.record = AsyncMock(return_value=1)
 
     await backup_current_schedule(redis)
-    assert any(k[0][0].startswith("timetable:backup:") for k in redis.set.call_args_list)
+    store.return_value.record.assert_awaited_once_with({"sample": 1})
 
 
 @pytest.mark.asyncio
@@ -1,3 +1,4 @@
+import json
 from datetime import datetime, time, timedelta
 from pathlib import Path
 from unittest.mock import AsyncMock, MagicMock, Mock, patch
@@ -10,24 +11,98 @@ from bot.scheduler import (
     cancel_reminders_for_user,
     cleanup_image_cache,
     collect_db_metrics,
+    dispatch_outbox_delivery,
     evening_broadcast,
+    fire_reminder_slot,
     handle_graduated_groups,
     lesson_reminders_planner,
     monitor_schedule_changes,
     morning_summary_broadcast,
     plan_reminders_for_user,
+    prefetch_weather_forecast,
     print_progress_bar,
+    restore_reminder_slots,
     send_schedule_diff_notifications,
     setup_scheduler,
 )
-from core.config import MOSCOW_TZ
+from core.config import EVENING_DIGEST_SLOTS, MORNING_DIGEST_SLOTS, MOSCOW_TZ
+from core.reminder_slots import ReminderSlotStore, SlotEntry
+from core.user_data import BroadcastRecipient
+
+
+class ReminderRedis:
+    """In-memory замена Redis для команд хранилища слотов напоминаний."""
+
+    def __init__(self):
+        self.hashes, self.sets, self.zsets = {}, {}, {}
+
+    async def hget(self, key, field):
+        return self.hashes.get(key, {}).get(field)
+
+    async def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = value
+
+    async def hdel(self, key, *fields):
+        for field in fields:
+            self.hashes.get(key, {}).pop(field, None)
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    async def sadd(self, key, *members):
+        before = len(self.sets.setdefault(key, set()))
+        self.sets[key].update(members)
+        return len(self.sets[key]) - before
+
+    async def smembers(self, key):
+        return set(self.sets.get(key, set()))
+
+    async def zadd(self, key, mapping):
+        zset = self.zsets.setdefault(key, {})
+        added = len(set(mapping) - set(zset))
+        zset.update(mapping)
+        return added
+
+    async def zrangebyscore(self, key, low, high, withscores=False):
+        items = sorted((score, member) for member, score in self.zsets.get(key, {}).items() if score >= low)
+        return [(member, score) for score, member in items]
+
+    async def zrem(self, key, *members):
+        for member in members:
+            self.zsets.get(key, {}).pop(member, None)
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.hashes.pop(key, None)
+            self.sets.pop(key, None)
+
+    async def expire(self, key, seconds):
+        return True
+
+
+@pytest.fixture(autouse=True)
+def reminder_store(monkeypatch):
+    store = ReminderSlotStore(ReminderRedis())
+    monkeypatch.setattr("bot.scheduler.reminder_slot_store", store)
+    return store
+
+
+def recipients_stream(*rows):
+    """Мок потокового iter_broadcast_recipients: строки (user_id, group[, user_type[, reminder_time_minutes]])."""
+
+    async def _stream(*_, **__):
+        for user_id, group, *rest in rows:
+            user_type = rest[0] if rest else "student"
+            minutes = rest[1] if len(rest) > 1 else 60
+            yield BroadcastRecipient(user_id, group, user_type, True, True, True, minutes)
+
+    return MagicMock(side_effect=_stream)
 
 
 @pytest.fixture
 def mock_user_data_manager():
     manager = AsyncMock()
-    manager.get_users_for_evening_notify.return_value = [(1, "О735Б"), (2, "О735А")]
-    manager.get_users_for_morning_summary.return_value = [(1, "О735Б"), (2, "О735А")]
+    manager.iter_broadcast_recipients = recipients_stream((1, "О735Б"), (2, "О735А"))
     manager.get_users_for_lesson_reminders.return_value = [
         (1, "О735Б", 20),
         (2, "О735А", 15),
@@ -130,12 +205,84 @@ async def test_evening_broadcast_success(mock_user_data_manager, mock_timetable_
 
     assert mock_send_task.send.call_count == 2
     mock_metrics.labels.assert_called_with(actor_name="send_message_task")
+    # Тип пользователя берётся из той же выборки, без запроса на каждого получателя
+    mock_user_data_manager.iter_broadcast_recipients.assert_called_once_with("evening_notify", slot=None)
+    mock_user_data_manager.get_full_user_info.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_evening_broadcast_teacher_uses_teacher_schedule(mock_user_data_manager, mock_timetable_manager, monkeypatch):
+    mock_weather_api = AsyncMock()
+    mock_weather_api.get_forecast_for_time.return_value = None
+    monkeypatch.setattr("bot.scheduler.WeatherAPI", lambda *args: mock_weather_api)
+    mock_send_task = MagicMock()
+    monkeypatch.setattr("bot.scheduler.send_message_task", mock_send_task)
+    mock_user_data_manager.iter_broadcast_recipients = recipients_stream((7, "Иванов И.И.", "teacher"))
+    mock_timetable_manager.get_teacher_schedule = AsyncMock(return_value={"lessons": []})
+
+    await evening_broadcast(mock_user_data_manager, mock_timetable_manager)
+
+    mock_timetable_manager.get_teacher_schedule.assert_awaited_once()
+    assert "Завтра занятий не запланировано." in mock_send_task.send.call_args.args[1]
+
+
+@pytest.mark.asyncio
+async def test_evening_broadcast_renders_once_per_group(mock_user_data_manager, mock_timetable_manager, monkeypatch):
+    mock_weather_api = AsyncMock()
+    mock_weather_api.get_forecast_for_time.return_value = None
+    monkeypatch.setattr("bot.scheduler.WeatherAPI", lambda *args: mock_weather_api)
+    mock_text_task = MagicMock()
+    monkeypatch.setattr("bot.scheduler.send_broadcast_text_task", mock_text_task)
+    # Текст зависит от группы: разные группы не совпадут даже при одинаковом случайном приветствии
+    mock_format = MagicMock(side_effect=["расписание Б", "расписание А"])
+    monkeypatch.setattr("bot.scheduler.format_schedule_text", mock_format)
+    mock_user_data_manager.iter_broadcast_recipients = recipients_stream(
+        (1, "О735Б"), (2, "О735Б"), (3, "О735А"), (4, "О735Б")
+    )
+    redis = AsyncMock()
+
+    await evening_broadcast(mock_user_data_manager, mock_timetable_manager, redis)
+
+    # Два уникальных текста на четырёх получателей
+    assert mock_format.call_count == 2
+    assert mock_timetable_manager.get_schedule_for_day.await_count == 2
+    assert redis.set.await_count == 2
+    keys = [call.args[1] for call in mock_text_task.send.call_args_list]
+    assert [call.args[0] for call in mock_text_task.send.call_args_list] == [1, 2, 3, 4]
+    assert keys[0] == keys[1] == keys[3] != keys[2]
+    assert keys[0].startswith("broadcast:text:")
+    assert redis.set.await_args_list[0].kwargs["ex"] > 0
+
+
+@pytest.mark.asyncio
+async def test_evening_broadcast_records_job_in_outbox(mock_user_data_manager, mock_timetable_manager, monkeypatch):
+    mock_weather_api = AsyncMock()
+    mock_weather_api.get_forecast_for_time.return_value = None
+    monkeypatch.setattr("bot.scheduler.WeatherAPI", lambda *args: mock_weather_api)
+    mock_text_task = MagicMock()
+    monkeypatch.setattr("bot.scheduler.send_broadcast_text_task", mock_text_task)
+    monkeypatch.setattr("bot.scheduler.format_schedule_text", MagicMock(side_effect=["расписание Б", "расписание А"]))
+    mock_user_data_manager.iter_broadcast_recipients = recipients_stream((1, "О735Б"), (2, "О735А"), (3, "О735Б"))
+    outbox = MagicMock()
+    outbox.create_job = AsyncMock(return_value=42)
+    outbox.pump = AsyncMock(return_value=3)
+
+    await evening_broadcast(mock_user_data_manager, mock_timetable_manager, AsyncMock(), outbox)
+
+    # Доставки не уходят в очередь напрямую — сначала журнал, затем продюсер outbox
+    mock_text_task.send.assert_not_called()
+    kind, recipients = outbox.create_job.await_args.args
+    texts = outbox.create_job.await_args.kwargs["texts"]
+    assert kind == "evening" and len(texts) == 2
+    assert [uid for uid, _ in recipients] == [1, 2, 3]
+    assert recipients[0][1] == recipients[2][1] != recipients[1][1]
+    outbox.pump.assert_awaited_once_with(42, dispatch_outbox_delivery)
 
 
 @pytest.mark.asyncio
 async def test_evening_broadcast_no_users(mock_timetable_manager, monkeypatch):
     mock_user_data_manager = AsyncMock()
-    mock_user_data_manager.get_users_for_evening_notify.return_value = []
+    mock_user_data_manager.iter_broadcast_recipients = recipients_stream()
 
     # Мокаем WeatherAPI чтобы избежать ошибки с API ключом
     mock_weather_api = AsyncMock()
@@ -203,7 +350,7 @@ async def test_morning_summary_broadcast_success(mock_user_data_manager, mock_ti
 @pytest.mark.asyncio
 async def test_morning_summary_broadcast_no_users(mock_timetable_manager, monkeypatch):
     mock_user_data_manager = AsyncMock()
-    mock_user_data_manager.get_users_for_morning_summary.return_value = []
+    mock_user_data_manager.iter_broadcast_recipients = recipients_stream()
 
     # Мокаем WeatherAPI чтобы избежать ошибки с API ключом
     mock_weather_api = AsyncMock()
@@ -268,7 +415,7 @@ async def test_lesson_reminders_planner_success(mock_scheduler, mock_user_data_m
 @pytest.mark.asyncio
 async def test_lesson_reminders_planner_no_users(mock_scheduler, mock_timetable_manager):
     mock_user_data_manager = AsyncMock()
-    mock_user_data_manager.get_users_for_lesson_reminders.return_value = []
+    mock_user_data_manager.iter_broadcast_recipients = recipients_stream()
 
     await lesson_reminders_planner(mock_scheduler, mock_user_data_manager, mock_timetable_manager)
 
@@ -321,15 +468,17 @@ async def test_lesson_reminders_planner_past_lessons(
 
 
 @pytest.mark.asyncio
-async def test_cancel_reminders_for_user_success(mock_scheduler, monkeypatch):
-    # Мокаем datetime для корректной работы
-    mock_now = datetime.now(MOSCOW_TZ)
-    monkeypatch.setattr("bot.scheduler.datetime", MagicMock(now=lambda tz: mock_now))
+async def test_cancel_reminders_for_user_success(mock_scheduler, reminder_store):
+    today = datetime.now(MOSCOW_TZ).date().isoformat()
+    await reminder_store.add_user(today, 1, "О735Б", 60)
+    await reminder_store.add_user(today, 2, "О735Б", 30)
 
     await cancel_reminders_for_user(mock_scheduler, 1)
 
-    # Проверяем, что задачи удалены
-    assert mock_scheduler.remove_job.call_count > 0
+    # Пользователь убран из индекса группы без обхода задач планировщика
+    assert await reminder_store.group_users(today, "О735Б") == {2: 30}
+    mock_scheduler.get_jobs.assert_not_called()
+    mock_scheduler.remove_job.assert_not_called()
 
 
 @pytest.mark.asyncio
@@ -341,6 +490,50 @@ async def test_cancel_reminders_for_user_exception_handling(mock_scheduler):
     await cancel_reminders_for_user(mock_scheduler, 1)
 
 
+@pytest.mark.asyncio
+async def test_reminder_slots_one_job_per_minute_and_recipients_at_fire_time(
+    mock_scheduler, mock_user_data_manager, mock_timetable_manager, reminder_store, monkeypatch
+):
+    mock_now = datetime.now(MOSCOW_TZ).replace(hour=6, minute=0, second=0, microsecond=0)
+    monkeypatch.setattr("bot.scheduler.datetime", MagicMock(now=lambda tz: mock_now, combine=datetime.combine))
+    mock_user_data_manager.iter_broadcast_recipients = recipients_stream(
+        (1, "О735Б", "student", 45), (2, "О735Б", "student", 45), (3, "О735Б", "student", 30), (4, "О735Б", "teacher", 45)
+    )
+    mock_reminder_task = MagicMock()
+    monkeypatch.setattr("bot.scheduler.send_lesson_reminder_task", mock_reminder_task)
+
+    await lesson_reminders_planner(mock_scheduler, mock_user_data_manager, mock_timetable_manager)
+
+    # Слоты 08:15 и 08:30 (за 45 и 30 минут до первой пары) и концы двух пар — по одной задаче на минуту
+    jobs = {call.kwargs["id"]: call.kwargs["args"] for call in mock_scheduler.add_job.call_args_list}
+    today = mock_now.date().isoformat()
+    assert sorted(jobs) == [f"reminder_slot_{today}_{slot}" for slot in ("08:15", "08:30", "10:30", "12:10")]
+    assert mock_timetable_manager.get_schedule_for_day.await_count == 1
+    # Тип пользователя приходит в потоке получателей: отдельных запросов на пользователя нет
+    mock_user_data_manager.iter_broadcast_recipients.assert_called_once_with("lesson_reminders")
+    mock_user_data_manager.get_full_user_info.assert_not_awaited()
+
+    # Отписка после планирования учитывается при срабатывании без перепланирования задач
+    await cancel_reminders_for_user(mock_scheduler, 2)
+    await fire_reminder_slot(*jobs[f"reminder_slot_{today}_08:15"])
+    assert [call.args[0] for call in mock_reminder_task.send.call_args_list] == [1]
+    assert mock_reminder_task.send.call_args.args[2:] == ("first", None, 45)
+
+    mock_reminder_task.send.reset_mock()
+    await fire_reminder_slot(*jobs[f"reminder_slot_{today}_10:30"])
+    assert sorted(call.args[0] for call in mock_reminder_task.send.call_args_list) == [1, 3]
+    assert mock_reminder_task.send.call_args.args[1]["subject"] == "Физика"
+    assert mock_reminder_task.send.call_args.args[2:] == ("break", 10, None)
+
+    # Слот срабатывает один раз; после рестарта восстанавливаются только оставшиеся слоты
+    mock_reminder_task.send.reset_mock()
+    await fire_reminder_slot(*jobs[f"reminder_slot_{today}_10:30"])
+    mock_reminder_task.send.assert_not_called()
+    restored = MagicMock()
+    await restore_reminder_slots(restored, mock_timetable_manager)
+    assert sorted(call.kwargs["id"][-5:] for call in restored.add_job.call_args_list) == ["08:30", "12:10"]
+
+
 @pytest.mark.asyncio
 async def test_plan_reminders_for_user_success(mock_scheduler, mock_user_data_manager, mock_timetable_manager, monkeypatch):
     # Мокаем datetime: фиксируем раннее утро, чтобы время напоминаний было в будущем
@@ -492,10 +685,44 @@ async def test_monitor_schedule_changes_with_changes(mock_user_data_manager, moc
     # Проверяем, что хеш обновлен (используем правильный ключ)
     mock_redis.set.assert_called_with("timetable:schedule_hash", "new_hash_value")
 
-    # Проверяем, что функция дифф-уведомлений НЕ была вызвана (отключена)
+    # Сохранённых отпечатков ещё нет (первый запуск) — сравнивать не с чем, дифф не строится
     mock_diff_notifications.assert_not_called()
 
 
+@pytest.mark.asyncio
+@pytest.mark.parametrize("send_fails", [False, True])
+async def test_monitor_schedule_changes_saves_fingerprints_after_notifications(
+    mock_user_data_manager, mock_redis, mock_bot, monkeypatch, send_fails
+):
+    lesson = {"time": "09:00-10:30", "subject": "Математика", "type": "лек", "room": "202", "teachers": "Иванов"}
+    new_schedule_data = {"__current_xml_hash__": "new_hash_value", "О735Б": {"odd": {"Понедельник": [lesson]}}}
+    monkeypatch.setattr("bot.scheduler.fetch_and_parse_all_schedules", AsyncMock(return_value=new_schedule_data))
+    mock_manager = MagicMock()
+    mock_manager.save_to_cache = AsyncMock()
+    monkeypatch.setattr("bot.scheduler.TimetableManager", lambda *args: mock_manager)
+    monkeypatch.setattr("bot.scheduler.ScheduleHistoryStore", MagicMock())
+    monkeypatch.setattr("bot.scheduler.global_timetable_manager_instance", MagicMock(), raising=False)
+    monkeypatch.setattr("bot.scheduler.SCHEDULE_DIFF_NOTIFICATIONS", True)
+
+    calls = []
+    store = MagicMock()
+    store.load = AsyncMock(return_value={"О735Б": {"odd:Понедельник": "old"}})
+    store.save = AsyncMock(side_effect=lambda *args: calls.append("save"))
+    monkeypatch.setattr("bot.scheduler.ScheduleFingerprintStore", lambda *args: store)
+
+    async def notify(*args):
+        calls.append("notify")
+        if send_fails:
+            raise RuntimeError("broker down")
+
+    monkeypatch.setattr("bot.scheduler.send_schedule_diff_notifications", notify)
+
+    await monitor_schedule_changes(mock_user_data_manager, mock_redis, mock_bot)
+
+    # Отпечатки обновляются только после постановки уведомлений; при ошибке остаются прежними
+    assert calls == (["notify"] if send_fails else ["notify", "save"])
+
+
 @pytest.mark.asyncio
 async def test_monitor_schedule_changes_parser_failure(mock_user_data_manager, mock_redis, mock_bot, monkeypatch):
     # Мокаем fetch_and_parse_all_schedules с ошибкой
@@ -511,18 +738,18 @@ async def test_monitor_schedule_changes_parser_failure(mock_user_data_manager, m
 
 @pytest.mark.asyncio
 async def test_backup_current_schedule_success(mock_redis, monkeypatch):
-    # Мокаем datetime
-    mock_dt = MagicMock()
-    mock_dt.now.return_value.strftime.return_value = "20250101_120000"
-    monkeypatch.setattr("bot.scheduler._dt", mock_dt)
-
-    # Мокаем REDIS_SCHEDULE_CACHE_KEY из core.config
-    monkeypatch.setattr("core.config.REDIS_SCHEDULE_CACHE_KEY", "schedule:cache")
+    mock_redis.get.return_value = json.dumps({"O735Б": {"odd": {}, "even": {}}}).encode("utf-8")
+    mock_store = MagicMock()
+    mock_store.return_value.record = AsyncMock(return_value=3)
+    mock_store.return_value.drop_legacy_backups = AsyncMock(return_value=0)
+    monkeypatch.setattr("bot.scheduler.ScheduleHistoryStore", mock_store)
 
     await backup_current_schedule(mock_redis)
 
-    # Проверяем, что резервная копия создана
-    mock_redis.set.assert_called_with("timetable:backup:20250101_120000", mock_redis.get.return_value)
+    # В историю уходит разобранное расписание, полная копия под timetable:backup:* больше не пишется
+    mock_store.return_value.record.assert_awaited_once_with({"O735Б": {"odd": {}, "even": {}}})
+    mock_store.return_value.drop_legacy_backups.assert_awaited_once()
+    mock_redis.set.assert_not_called()
 
 
 @pytest.mark.asyncio
@@ -533,7 +760,7 @@ async def test_backup_current_schedule_no_cache_data(mock_redis, monkeypatch):
     # Мокаем datetime
     mock_dt = MagicMock()
     mock_dt.now.return_value.strftime.return_value = "20250101_120000"
-    monkeypatch.setattr("bot.scheduler._dt", mock_dt)
+    monkeypatch.setattr("bot.scheduler.datetime", mock_dt)
 
     # Мокаем REDIS_SCHEDULE_CACHE_KEY из core.config
     monkeypatch.setattr("core.config.REDIS_SCHEDULE_CACHE_KEY", "schedule:cache")
@@ -619,6 +846,58 @@ def test_setup_scheduler_success(mock_bot, mock_timetable_manager, mock_user_dat
     assert mock_scheduler_instance.add_job.call_count >= 6
 
 
+@pytest.mark.asyncio
+async def test_new_leader_rebuilds_reminder_slots_after_failover(
+    mock_bot, mock_timetable_manager, mock_user_data_manager, mock_redis, reminder_store, monkeypatch
+):
+    mock_now = datetime.now(MOSCOW_TZ).replace(hour=7, minute=0, second=0, microsecond=0)
+    monkeypatch.setattr("bot.scheduler.datetime", MagicMock(now=lambda tz: mock_now, combine=datetime.combine))
+    standby = MagicMock()
+    monkeypatch.setattr("bot.scheduler.AsyncIOScheduler", MagicMock(return_value=standby))
+    leader = MagicMock()
+    leader.validate = AsyncMock(return_value=True)
+    setup_scheduler(mock_bot, mock_timetable_manager, mock_user_data_manager, mock_redis, leader=leader)
+    monkeypatch.setattr("bot.scheduler.reminder_slot_store", reminder_store)
+
+    # Прежний лидер запланировал слот 08:00 и упал: задача слота была только в его планировщике
+    today = mock_now.date().isoformat()
+    await reminder_store.add_entry(today, 8 * 60, SlotEntry("first", "60", "О735Б"))
+    standby.add_job.reset_mock()
+
+    leader.on_elected()
+
+    standby.resume.assert_called_once()
+    jobs = {call.kwargs["id"]: call for call in standby.add_job.call_args_list}
+    # Утреннее планирование уже прошло — запускается повторно вместе с восстановлением слотов
+    assert set(jobs) == {"restore_reminder_slots", "lesson_reminders_catch_up"}
+    restore = jobs["restore_reminder_slots"]
+    await restore.args[0](*restore.kwargs["args"])
+    assert standby.add_job.call_args.kwargs["id"] == f"reminder_slot_{today}_08:00"
+
+    leader.on_demoted()
+    standby.pause.assert_called_once()
+
+
+def test_setup_scheduler_adds_digest_job_per_slot(
+    mock_bot, mock_timetable_manager, mock_user_data_manager, mock_redis, monkeypatch
+):
+    mock_scheduler_instance = MagicMock()
+    monkeypatch.setattr("bot.scheduler.AsyncIOScheduler", MagicMock(return_value=mock_scheduler_instance))
+    monkeypatch.setattr("bot.scheduler.os.getenv", lambda key, default: "0")
+
+    setup_scheduler(mock_bot, mock_timetable_manager, mock_user_data_manager, mock_redis)
+
+    calls = mock_scheduler_instance.add_job.call_args_list
+    evening = {
+        (c.kwargs["hour"], c.kwargs["minute"]): c.kwargs["kwargs"]["slot"] for c in calls if c.args[0] is evening_broadcast
+    }
+    morning = [c.kwargs["kwargs"]["slot"] for c in calls if c.args[0] is morning_summary_broadcast]
+    prefetch = {(c.kwargs["hour"], c.kwargs["minute"]) for c in calls if c.args[0] is prefetch_weather_forecast}
+    assert evening[(20, 0)] == "20:00" and sorted(evening.values()) == sorted(EVENING_DIGEST_SLOTS)
+    assert sorted(morning) == sorted(MORNING_DIGEST_SLOTS)
+    assert (19, 50) in prefetch and (7, 50) in prefetch
+
+
 def test_setup_scheduler_with_image_cache_jobs(
     mock_bot, mock_timetable_manager, mock_user_data_manager, mock_redis, monkeypatch
 ):
@@ -659,7 +938,7 @@ async def test_evening_broadcast_weather_api_error(mock_user_data_manager, mock_
     monkeypatch.setattr("bot.scheduler.TASKS_SENT_TO_QUEUE", mock_metrics)
 
     # Мокаем пользователей для уведомления
-    mock_user_data_manager.get_users_for_evening_notify.return_value = [(1, "О735Б")]
+    mock_user_data_manager.iter_broadcast_recipients = recipients_stream((1, "О735Б"))
 
     # Мокаем расписание
     mock_timetable_manager.get_schedule_for_day = AsyncMock(return_value={"lessons": []})
@@ -692,7 +971,7 @@ async def test_morning_summary_broadcast_weather_api_error(mock_user_data_manage
     monkeypatch.setattr("bot.scheduler.TASKS_SENT_TO_QUEUE", mock_metrics)
 
     # Мокаем пользователей для уведомления
-    mock_user_data_manager.get_users_for_morning_summary.return_value = [(1, "О735Б")]
+    mock_user_data_manager.iter_broadcast_recipients = recipients_stream((1, "О735Б"))
 
     # Мокаем расписание
     mock_timetable_manager.get_schedule_for_day = AsyncMock(return_value={"lessons": [{"time": "09:00-10:30"}]})
@@ -941,170 +1220,139 @@ def test_print_progress_bar():
 
 
 @pytest.mark.asyncio
-async def test_handle_graduated_groups_success(mock_user_data_manager, mock_timetable_manager):
-    """Тест успешной обработки выпустившихся групп."""
+async def test_handle_graduated_groups_single_update_for_vanished_groups(
+    mock_user_data_manager, mock_timetable_manager, monkeypatch
+):
+    """Группы, пропавшие из снапшота, сбрасываются одним вызовом, уведомления уходят в очередь."""
     mock_redis = AsyncMock()
+    mock_timetable_manager._schedules = {"CURRENT_GROUP": {}, "__metadata__": {}}
+    mock_user_data_manager.clear_groups.return_value = [(1, "OLD_GROUP_1"), (2, "OLD_GROUP_2"), (3, "OLD_GROUP_1")]
+    mock_send_task = MagicMock()
+    monkeypatch.setattr("bot.scheduler.send_message_task", mock_send_task)
 
-    # Настраиваем моки
-    mock_user_data_manager.get_all_users_with_groups.return_value = [
-        (1, "OLD_GROUP_1"),
-        (2, "OLD_GROUP_2"),
-    ]
-    mock_timetable_manager._schedules = {"CURRENT_GROUP": {"odd": {"lessons": []}}}
-
-    await handle_graduated_groups(mock_user_data_manager, mock_timetable_manager, mock_redis)
+    affected = await handle_graduated_groups(
+        mock_user_data_manager,
+        mock_timetable_manager,
+        mock_redis,
+        vanished_groups={"OLD_GROUP_1", "OLD_GROUP_2", "CURRENT_GROUP"},
+    )
 
-    # Проверяем что функции были вызваны
-    mock_user_data_manager.get_all_users_with_groups.assert_called_once()
+    assert affected == 3
+    mock_user_data_manager.clear_groups.assert_awaited_once_with(["OLD_GROUP_1", "OLD_GROUP_2"])
+    mock_user_data_manager.get_student_groups.assert_not_called()
+    assert [call.args[0] for call in mock_send_task.send.call_args_list] == [1, 2, 3]
+    assert "OLD_GROUP_2" in mock_send_task.send.call_args_list[1].args[1]
+    mock_user_data_manager.set_user_group.assert_not_called()
 
 
 @pytest.mark.asyncio
-async def test_handle_graduated_groups_no_graduated_groups(mock_user_data_manager, mock_timetable_manager):
-    """Тест обработки выпустившихся групп, когда их нет."""
+async def test_handle_graduated_groups_manual_check_uses_distinct_groups(mock_user_data_manager, mock_timetable_manager):
+    """Ручная проверка: группы берутся одним DISTINCT-запросом, актуальные не трогаются."""
     mock_redis = AsyncMock()
+    mock_timetable_manager._schedules = {"CURRENT_GROUP": {}}
+    mock_user_data_manager.get_student_groups.return_value = ["current_group"]
+
+    assert await handle_graduated_groups(mock_user_data_manager, mock_timetable_manager, mock_redis) == 0
+    mock_user_data_manager.clear_groups.assert_not_called()
 
-    # Настраиваем моки - все группы актуальны
-    mock_user_data_manager.get_all_users_with_groups.return_value = [(1, "CURRENT_GROUP")]
-    mock_timetable_manager._schedules = {"CURRENT_GROUP": {"odd": {"lessons": []}}}
 
-    await handle_graduated_groups(mock_user_data_manager, mock_timetable_manager, mock_redis)
+@pytest.mark.asyncio
+async def test_handle_graduated_groups_ignores_empty_snapshot(mock_user_data_manager, mock_timetable_manager):
+    """Снапшот без групп — сбой загрузки: пользователей не сбрасываем."""
+    mock_redis = AsyncMock()
+    mock_timetable_manager._schedules = {"__metadata__": {}}
 
-    # Проверяем что функция завершилась без ошибок
-    mock_user_data_manager.get_all_users_with_groups.assert_called_once()
+    assert await handle_graduated_groups(mock_user_data_manager, mock_timetable_manager, mock_redis, {"OLD"}) == 0
+    mock_user_data_manager.clear_groups.assert_not_called()
 
 
 @pytest.mark.asyncio
 async def test_handle_graduated_groups_exception_handling(mock_user_data_manager, mock_timetable_manager):
     """Тест обработки исключений в handle_graduated_groups."""
     mock_redis = AsyncMock()
-
-    # Настраиваем мок, который вызывает исключение
-    mock_user_data_manager.get_all_users_with_groups.side_effect = Exception("Test error")
+    mock_timetable_manager._schedules = {"CURRENT_GROUP": {}}
+    mock_user_data_manager.get_student_groups.side_effect = Exception("Test error")
 
     # Функция должна обработать исключение без падения
-    try:
-        await handle_graduated_groups(mock_user_data_manager, mock_timetable_manager, mock_redis)
-        # Если дошли сюда, значит исключение обработано
-        assert True
-    except Exception:
-        pytest.fail("handle_graduated_groups не должна падать при исключениях")
+    assert await handle_graduated_groups(mock_user_data_manager, mock_timetable_manager, mock_redis) == 0
 
 
-# --- Дополнительные тесты для send_schedule_diff_notifications ---
+# --- Дифф-уведомления по отпечаткам дней ---
 
 
-@pytest.mark.asyncio
-async def test_send_schedule_diff_notifications_no_users(mock_user_data_manager, mock_timetable_manager, mock_redis):
-    """Тест отправки дифф-уведомлений без пользователей."""
-    mock_user_data_manager.get_all_users_with_groups.return_value = []
+def diff_managers(week_code="odd"):
+    lesson = {"time": "09:00-10:30", "subject": "Математика", "type": "лек", "room": "101", "teachers": "Иванов"}
+    old_manager, new_manager = MagicMock(), MagicMock()
+    old_manager._schedules = {
+        "О735Б": {"odd": {"Понедельник": [lesson]}, "even": {}},
+        "И101": {"odd": {"Понедельник": [lesson]}, "even": {}},
+    }
+    new_manager._schedules = {
+        "О735Б": {"odd": {"Понедельник": [{**lesson, "room": "202"}]}, "even": {}},
+        "И101": {"odd": {"Понедельник": [lesson]}, "even": {}},
+    }
+    new_manager.get_academic_week_type = AsyncMock(return_value=(week_code, ""))
+    return old_manager, new_manager
 
-    # Мокаем TimetableManager для сравнения
-    old_manager = MagicMock()
-    new_manager = MagicMock()
-    mock_timetable_manager.get_schedule_for_day = AsyncMock()
 
-    await send_schedule_diff_notifications(mock_user_data_manager, old_manager, new_manager)
+@pytest.mark.asyncio
+async def test_send_schedule_diff_notifications_without_changed_groups(mock_user_data_manager):
+    old_manager, new_manager = diff_managers()
 
-    # Не должно вызывать ошибки
-    assert True
+    assert await send_schedule_diff_notifications(mock_user_data_manager, old_manager, new_manager, {}) == 0
+    mock_user_data_manager.get_users_in_groups.assert_not_called()
 
 
 @pytest.mark.asyncio
-async def test_send_schedule_diff_notifications_with_changes(
-    mock_user_data_manager, mock_timetable_manager, mock_redis, monkeypatch
-):
-    """Тест отправки дифф-уведомлений с изменениями."""
-    # Настраиваем пользователей
-    mock_user_data_manager.get_all_users_with_groups.return_value = [(1, "О735Б")]
-
-    # Мокаем старое и новое расписание
-    old_schedule = {"lessons": [{"subject": "Математика", "time": "09:00-10:30"}]}
-    new_schedule = {"lessons": [{"subject": "Математика (ИЗМЕНЕНО)", "time": "09:00-10:30"}]}
-
-    old_manager = MagicMock()
-    new_manager = MagicMock()
-    old_manager.get_schedule_for_day = AsyncMock(return_value=old_schedule)
-    new_manager.get_schedule_for_day = AsyncMock(return_value=new_schedule)
-
-    # Мокаем ScheduleDiffDetector
-    mock_diff = MagicMock()
-    mock_diff.has_changes.return_value = True
-    monkeypatch.setattr(
-        "bot.scheduler.ScheduleDiffDetector.compare_group_schedules",
-        lambda **kwargs: mock_diff,
-    )
-
-    # Мокаем ScheduleDiffFormatter
-    mock_formatter = MagicMock()
-    mock_formatter.format_group_diff.return_value = "Изменения в расписании"
-    monkeypatch.setattr(
-        "bot.scheduler.ScheduleDiffFormatter.format_group_diff",
-        mock_formatter.format_group_diff,
-    )
-
-    # Мокаем send_message_task
+async def test_send_schedule_diff_notifications_loads_only_changed_groups(mock_user_data_manager, monkeypatch):
+    old_manager, new_manager = diff_managers()
+    mock_user_data_manager.get_users_in_groups.return_value = [(1, "О735Б"), (2, "О735Б")]
+    mock_user_data_manager.get_admin_users.return_value = []
     mock_send_task = MagicMock()
     monkeypatch.setattr("bot.scheduler.send_message_task", mock_send_task)
 
-    # Мокаем метрики
-    mock_metrics = MagicMock()
-    monkeypatch.setattr("bot.scheduler.TASKS_SENT_TO_QUEUE", mock_metrics)
-
-    await send_schedule_diff_notifications(mock_user_data_manager, old_manager, new_manager)
+    sent = await send_schedule_diff_notifications(
+        mock_user_data_manager, old_manager, new_manager, {"О735Б": [("odd", "Понедельник")]}
+    )
 
-    # Проверяем, что уведомления отправлены
-    mock_send_task.send.assert_called()
-    mock_metrics.labels.assert_called()
+    assert sent == 2
+    mock_user_data_manager.get_users_in_groups.assert_awaited_once_with(["О735Б"])
+    assert [call.args[0] for call in mock_send_task.send.call_args_list] == [1, 2]
+    message = mock_send_task.send.call_args_list[0].args[1]
+    assert "Изменена аудитория" in message and "101" in message and "202" in message
 
 
 @pytest.mark.asyncio
-async def test_send_schedule_diff_notifications_no_changes(
-    mock_user_data_manager, mock_timetable_manager, mock_redis, monkeypatch
-):
-    """Тест отправки дифф-уведомлений без изменений."""
-    # Настраиваем пользователей
-    mock_user_data_manager.get_all_users_with_groups.return_value = [(1, "О735Б")]
-
-    # Мокаем одинаковое расписание
-    same_schedule = {"lessons": [{"subject": "Математика", "time": "09:00-10:30"}]}
-
-    old_manager = MagicMock()
-    new_manager = MagicMock()
-    old_manager.get_schedule_for_day = AsyncMock(return_value=same_schedule)
-    new_manager.get_schedule_for_day = AsyncMock(return_value=same_schedule)
-
-    # Мокаем ScheduleDiffDetector без изменений
-    mock_diff = MagicMock()
-    mock_diff.has_changes.return_value = False
-    monkeypatch.setattr(
-        "bot.scheduler.ScheduleDiffDetector.compare_group_schedules",
-        lambda **kwargs: mock_diff,
-    )
+async def test_send_schedule_diff_notifications_fan_out_through_outbox(mock_user_data_manager, monkeypatch):
+    old_manager, new_manager = diff_managers()
+    mock_user_data_manager.get_users_in_groups.return_value = [(1, "О735Б"), (2, "О735Б")]
+    mock_user_data_manager.get_admin_users.return_value = []
+    outbox = MagicMock()
+    outbox.create_job = AsyncMock(return_value=7)
+    outbox.pump = AsyncMock(return_value=2)
 
-    await send_schedule_diff_notifications(mock_user_data_manager, old_manager, new_manager)
+    await send_schedule_diff_notifications(
+        mock_user_data_manager, old_manager, new_manager, {"О735Б": [("odd", "Понедельник")]}, outbox
+    )
 
-    # Не должно отправлять уведомления
-    assert True  # Просто проверяем, что не падает
+    kind, recipients = outbox.create_job.call_args.args
+    texts = outbox.create_job.call_args.kwargs["texts"]
+    assert kind == "schedule_diff"
+    assert len(texts) == 1 and {digest for _, digest in recipients} == set(texts)
+    outbox.pump.assert_awaited_once_with(7, dispatch_outbox_delivery)
 
 
 @pytest.mark.asyncio
-async def test_send_schedule_diff_notifications_exception_in_comparison(
-    mock_user_data_manager, mock_timetable_manager, mock_redis, monkeypatch
-):
-    """Тест обработки исключений при сравнении расписаний."""
-    # Настраиваем пользователей
-    mock_user_data_manager.get_all_users_with_groups.return_value = [(1, "О735Б")]
-
-    # Мокаем старое и новое расписание с ошибкой
-    old_manager = MagicMock()
-    new_manager = MagicMock()
-    old_manager.get_schedule_for_day = AsyncMock(side_effect=Exception("DB Error"))
-    new_manager.get_schedule_for_day = AsyncMock()
+async def test_send_schedule_diff_notifications_skips_days_outside_horizon(mock_user_data_manager):
+    # В ближайшие дни только чётная неделя — изменение нечётного понедельника никого не касается
+    old_manager, new_manager = diff_managers(week_code="even")
 
-    await send_schedule_diff_notifications(mock_user_data_manager, old_manager, new_manager)
+    sent = await send_schedule_diff_notifications(
+        mock_user_data_manager, old_manager, new_manager, {"О735Б": [("odd", "Понедельник")]}
+    )
 
-    # Не должно падать при ошибках сравнения
-    assert True
+    assert sent == 0
+    mock_user_data_manager.get_users_in_groups.assert_not_called()
 
 
 # --- Дополнительные тесты для auto_backup ---
@@ -1126,7 +1374,7 @@ async def test_auto_backup_with_gzip_pickle_data(mock_redis, monkeypatch):
     # Мокаем datetime
     mock_dt_class = MagicMock()
     mock_dt_class.now.return_value.strftime.return_value = "20250101_120000"
-    monkeypatch.setattr("bot.scheduler._dt", mock_dt_class)
+    monkeypatch.setattr("bot.scheduler.datetime", mock_dt_class)
 
     # Мокаем REDIS_SCHEDULE_CACHE_KEY
     monkeypatch.setattr("core.config.REDIS_SCHEDULE_CACHE_KEY", "schedule:cache")
@@ -1152,7 +1400,7 @@ async def test_auto_backup_with_json_data(mock_redis, monkeypatch):
     # Мокаем datetime
     mock_dt_class = MagicMock()
     mock_dt_class.now.return_value.strftime.return_value = "20250101_120000"
-    monkeypatch.setattr("bot.scheduler._dt", mock_dt_class)
+    monkeypatch.setattr("bot.scheduler.datetime", mock_dt_class)
 
     # Мокаем REDIS_SCHEDULE_CACHE_KEY
     monkeypatch.setattr("core.config.REDIS_SCHEDULE_CACHE_KEY", "schedule:cache")
@@ -1185,7 +1433,7 @@ async def test_auto_backup_database_success(mock_redis, monkeypatch):
     # Мокаем datetime
     mock_dt_class = MagicMock()
     mock_dt_class.now.return_value.strftime.return_value = "20250101_120000"
-    monkeypatch.setattr("bot.scheduler._dt", mock_dt_class)
+    monkeypatch.setattr("bot.scheduler.datetime", mock_dt_class)
 
     await auto_backup(mock_redis)
 
@@ -1211,7 +1459,7 @@ async def test_auto_backup_database_timeout(mock_redis, monkeypatch):
     # Мокаем datetime
     mock_dt_class = MagicMock()
     mock_dt_class.now.return_value.strftime.return_value = "20250101_120000"
-    monkeypatch.setattr("bot.scheduler._dt", mock_dt_class)
+    monkeypatch.setattr("bot.scheduler.datetime", mock_dt_class)
 
     # Не должно падать при таймауте
     await auto_backup(mock_redis)
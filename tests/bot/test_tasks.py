@@ -15,6 +15,7 @@ from bot.tasks import (
     generate_week_image_task,
     log,
     rate_limiter,
+    send_broadcast_batch_task,
     send_lesson_reminder_task,
     send_message_task,
     send_week_original_if_subscribed_task,
@@ -568,3 +569,49 @@ def test_log_configuration():
     assert hasattr(log, "info")
     assert hasattr(log, "error")
     assert hasattr(log, "warning")
+
+
+def test_broadcast_batch_acks_each_recipient_and_retries_only_failed():
+    """Пачка: подтверждение по каждому получателю, отдельный повтор только для временной ошибки."""
+    from aiogram.exceptions import TelegramBadRequest
+
+    outcomes = [True, False, ConnectionError("reset"), TelegramBadRequest("sendMessage", "chat not found"), True]
+    recipients = [[delivery_id, 100 + delivery_id] for delivery_id in range(1, 6)]
+
+    with patch("bot.tasks._send_message", AsyncMock(side_effect=outcomes)) as mock_send:
+        with patch("bot.tasks._ack_deliveries", AsyncMock()) as mock_ack:
+            with patch("bot.tasks._retry_individually") as mock_retry:
+                with patch("bot.tasks._mark_blocked", AsyncMock()) as mock_blocked:
+                    send_broadcast_batch_task(recipients, text="Привет")
+
+    assert mock_send.await_count == 5
+    mock_ack.assert_awaited_once_with([(1, True), (2, False), (4, False), (5, True)])
+    mock_retry.assert_called_once_with(3, 103, None, "Привет", None, None)
+    # Заблокировавший бота отмечается, чтобы следующие рассылки его не выбирали
+    mock_blocked.assert_awaited_once_with([102])
+
+
+def test_broadcast_batch_defers_rest_on_retry_after():
+    """429 в середине пачки: отправленные подтверждаются, остаток откладывается одной пачкой."""
+    from aiogram.exceptions import TelegramRetryAfter
+    from aiogram.methods import SendMessage
+
+    retry_after = TelegramRetryAfter(SendMessage(chat_id=102, text="x"), "Too Many Requests", retry_after=3)
+    recipients = [[1, 101], [2, 102], [3, 103]]
+
+    redis = AsyncMock()
+    redis.get.return_value = "Привет"
+
+    with patch("bot.tasks._send_message", AsyncMock(side_effect=[True, retry_after])) as mock_send:
+        with patch("bot.tasks.resources.redis", return_value=redis):
+            with patch("bot.tasks._ack_deliveries", AsyncMock()) as mock_ack:
+                with patch.object(send_broadcast_batch_task, "send_with_options") as mock_defer:
+                    send_broadcast_batch_task(recipients, text_key="broadcast:text:abc")
+
+    mock_send.assert_any_await(101, "Привет")
+
+    mock_ack.assert_awaited_once_with([(1, True)])
+    mock_defer.assert_called_once()
+    assert mock_defer.call_args.kwargs["args"] == ([[2, 102], [3, 103]],)
+    assert mock_defer.call_args.kwargs["delay"] == 3000
+    assert mock_defer.call_args.kwargs["kwargs"]["text_key"] == "broadcast:text:abc"
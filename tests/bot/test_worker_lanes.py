@@ -0,0 +1,61 @@
+import dramatiq
+from dramatiq.brokers.stub import StubBroker
+from prometheus_client import REGISTRY
+
+from bot import tasks
+from bot.worker_lanes import BULK, INTERACTIVE, LEGACY_DEFAULT, TIME_CRITICAL, QueueWaitMiddleware, lane
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_actors_are_split_into_lanes():
+    interactive = (tasks.generate_week_image_task, tasks.check_theme_subscription_task)
+    bulk = (
+        tasks.send_message_task,
+        tasks.send_broadcast_text_task,
+        tasks.copy_message_task,
+        tasks.send_broadcast_batch_task,
+    )
+    assert {actor.queue_name for actor in interactive} == {INTERACTIVE}
+    assert tasks.send_lesson_reminder_task.queue_name == TIME_CRITICAL
+    assert {actor.queue_name for actor in bulk} == {BULK}
+    # Интерактивные задачи выполняются раньше массовых, если процесс слушает обе очереди
+    by_priority = (tasks.generate_week_image_task, tasks.send_lesson_reminder_task, tasks.send_message_task)
+    priorities = [actor.priority for actor in by_priority]
+    assert priorities == sorted(set(priorities))
+    # Сообщения, поставленные в default до разделения на полосы, не остаются без потребителя
+    assert LEGACY_DEFAULT in tasks.rabbitmq_broker.get_declared_queues()
+
+
+def test_queue_wait_is_observed_per_lane_without_delay():
+    broker = StubBroker()
+    broker.add_middleware(QueueWaitMiddleware())
+
+    @dramatiq.actor(broker=broker, **lane(INTERACTIVE))
+    def interactive():
+        pass
+
+    @dramatiq.actor(broker=broker, **lane(BULK))
+    def bulk():
+        pass
+
+    before = {name: sample("bot_worker_queue_wait_seconds_count", lane=name) for name in (INTERACTIVE, BULK)}
+    bulk_sum = sample("bot_worker_queue_wait_seconds_sum", lane=BULK)
+
+    worker = dramatiq.Worker(broker, worker_threads=1, worker_timeout=50)
+    worker.start()
+    try:
+        interactive.send()
+        # Задержка отложенного сообщения не считается ожиданием в очереди
+        bulk.send_with_options(delay=300)
+        broker.join(interactive.queue_name)
+        broker.join(bulk.queue_name)
+        worker.join()
+    finally:
+        worker.stop()
+
+    assert sample("bot_worker_queue_wait_seconds_count", lane=INTERACTIVE) == before[INTERACTIVE] + 1
+    assert sample("bot_worker_queue_wait_seconds_count", lane=BULK) == before[BULK] + 1
+    assert sample("bot_worker_queue_wait_seconds_sum", lane=BULK) - bulk_sum < 0.3
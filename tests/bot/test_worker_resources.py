@@ -0,0 +1,89 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+from prometheus_client import REGISTRY
+
+from bot import worker_runtime
+from bot.worker_resources import WorkerResources
+
+
+class FakeRedis:
+    def __init__(self, decode_responses):
+        self.decode_responses = decode_responses
+        self.connection_pool = SimpleNamespace(_in_use_connections={1}, _available_connections=[2, 3])
+        self.closed = False
+
+    async def aclose(self):
+        self.closed = True
+
+
+class FakeUserData:
+    def __init__(self):
+        pool = SimpleNamespace(checkedout=lambda: 2, checkedin=lambda: 5)
+        self.engine = SimpleNamespace(sync_engine=SimpleNamespace(pool=pool))
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_resources_are_shared_per_worker_loop_and_released_on_thread_shutdown():
+    redis_clients, user_data = [], []
+
+    def redis_factory(decode_responses):
+        redis_clients.append(FakeRedis(decode_responses))
+        return redis_clients[-1]
+
+    def user_data_factory():
+        user_data.append(FakeUserData())
+        return user_data[-1]
+
+    resources = WorkerResources(redis_factory, user_data_factory)
+    created = sample("bot_worker_resources_created_total", resource="redis")
+    seen = []
+
+    async def task():
+        seen.append((resources.redis(), resources.redis(decode_responses=False), resources.user_data()))
+        resources.observe()
+        return (
+            sample("bot_worker_redis_connections", state="in_use"),
+            sample("bot_worker_db_connections", state="idle"),
+        )
+
+    def worker_thread():
+        worker_runtime.boot(lambda: None)
+        try:
+            results.extend(worker_runtime.run(task()) for _ in range(3))
+        finally:
+            worker_runtime.shutdown()
+
+    results = []
+    thread = threading.Thread(target=worker_thread)
+    thread.start()
+    thread.join()
+
+    # Три задачи одного потока используют одни и те же клиенты: по одному на режим и один UserDataManager
+    assert len(redis_clients) == 2 and len(user_data) == 1
+    assert all(item == seen[0] for item in seen)
+    assert sample("bot_worker_resources_created_total", resource="redis") == created + 2
+    assert results[0] == (2.0, 5.0)
+    # Остановка потока закрывает ресурсы и обнуляет метрики соединений
+    assert all(client.closed for client in redis_clients) and user_data[0].closed
+    assert sample("bot_worker_redis_connections", state="in_use") == 0
+    assert sample("bot_worker_db_connections", state="idle") == 0
+
+
+def test_each_loop_gets_its_own_clients():
+    resources = WorkerResources(FakeRedis, FakeUserData)
+
+    async def get():
+        return resources.redis()
+
+    first = asyncio.run(get())
+    second = asyncio.run(get())
+    assert first is not second
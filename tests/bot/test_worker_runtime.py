@@ -0,0 +1,101 @@
+import asyncio
+
+import dramatiq
+import pytest
+from dramatiq.brokers.stub import StubBroker
+
+from bot import worker_runtime
+
+
+class FakeSession:
+    def __init__(self):
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBot:
+    def __init__(self):
+        self.session = FakeSession()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+
+class BotFactory:
+    def __init__(self):
+        self.created = []
+
+    def __call__(self):
+        bot = FakeBot()
+        self.created.append(bot)
+        return bot
+
+
+def test_worker_threads_reuse_loop_and_bot_until_shutdown():
+    factory = BotFactory()
+    broker = StubBroker()
+    broker.add_middleware(worker_runtime.WorkerRuntimeMiddleware(factory))
+    seen = []
+
+    @dramatiq.actor(broker=broker)
+    def send(index):
+        async def _inner():
+            async with worker_runtime.bot_session(factory) as bot:
+                seen.append((id(asyncio.get_running_loop()), bot))
+
+        worker_runtime.run(_inner())
+
+    worker = dramatiq.Worker(broker, worker_threads=1)
+    worker.start()
+    try:
+        for index in range(5):
+            send.send(index)
+        broker.join(send.queue_name)
+        worker.join()
+    finally:
+        worker.stop()
+
+    # Один loop и одна сессия на все сообщения потока; при остановке воркера сессия закрыта
+    assert len(seen) == 5
+    assert len({loop_id for loop_id, _ in seen}) == 1
+    assert len(factory.created) == 1 and all(bot is factory.created[0] for _, bot in seen)
+    assert factory.created[0].session.closed
+
+
+def test_outside_worker_falls_back_to_temporary_bot():
+    factory = BotFactory()
+
+    async def use():
+        async with worker_runtime.bot_session(factory) as bot:
+            return bot
+
+    bot = worker_runtime.run(use())
+    assert worker_runtime.current() is None
+    assert factory.created == [bot] and bot.session.closed
+
+
+def test_failed_task_is_cancelled_and_loop_stays_usable():
+    runtime = worker_runtime.WorkerRuntime(BotFactory())
+    leftover = []
+
+    async def failing():
+        leftover.append(asyncio.ensure_future(asyncio.sleep(3600)))
+        raise RuntimeError("boom")
+
+    async def interrupted():
+        raise KeyboardInterrupt
+
+    try:
+        with pytest.raises(RuntimeError):
+            runtime.run(failing())
+        with pytest.raises(KeyboardInterrupt):
+            runtime.run(interrupted())
+        assert runtime.run(asyncio.sleep(0, result="ok")) == "ok"
+    finally:
+        runtime.close()
+    assert runtime.loop.is_closed() and leftover[0].cancelled()
@@ -22,6 +22,13 @@ if sys.platform.startswith("win"):
         pass
 
 
+@pytest.fixture(autouse=True)
+def isolated_timetable_index(tmp_path, monkeypatch):
+    """Индекс расписания, который пишет TimetableManager, уходит во временную папку теста."""
+    monkeypatch.setattr("core.manager.TIMETABLE_INDEX_PATH", tmp_path / "timetable.idx")
+    return tmp_path / "timetable.idx"
+
+
 @pytest.fixture
 def mock_dialog_manager():
     """Фикстура для мока DialogManager"""
@@ -0,0 +1,69 @@
+import gzip
+import json
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+from core.backups import BackupStore, pg_dump_command
+
+
+class Clock(datetime):
+    current = datetime(2026, 10, 18, 2, 0)
+
+    @classmethod
+    def now(cls, tz=None):
+        return tz.localize(cls.current) if tz else cls.current
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    monkeypatch.setattr("core.backups.datetime", Clock)
+    Clock.current = datetime(2026, 10, 18, 2, 0)
+    return Clock
+
+
+def test_pg_dump_command_understands_driver_urls():
+    cmd, env = pg_dump_command("postgresql+asyncpg://bot:secret@db:5432/timetable")
+    assert cmd[-4:] == ["-U", "bot", "-d", "timetable"]
+    assert env["PGPASSWORD"] == "secret"
+
+
+@pytest.mark.asyncio
+async def test_json_backups_are_deduplicated_and_rotated(tmp_path, clock):
+    store = BackupStore(tmp_path, keep_count=2, max_age_days=30)
+
+    first = await store.save_json("schedules", {"A": [1]})
+    clock.current += timedelta(hours=6)
+    assert await store.save_json("schedules", {"A": [1]}) is None
+    with gzip.open(first, "rt", encoding="utf-8") as f:
+        assert json.load(f) == {"A": [1]}
+
+    for version in (2, 3):
+        clock.current += timedelta(days=1)
+        await store.save_json("schedules", {"A": [version]})
+    # Хранятся две последние копии
+    assert [item.created_at.day for item in store.list("schedules")] == [20, 19]
+
+    # Даже если все копии старше срока хранения, самая свежая остаётся
+    clock.current += timedelta(days=60)
+    store.prune("schedules")
+    assert len(store.list("schedules")) == 1
+
+
+@pytest.mark.asyncio
+async def test_command_output_is_streamed_compressed_and_deduplicated(tmp_path, clock):
+    store = BackupStore(tmp_path)
+    cmd = [sys.executable, "-c", "import sys; sys.stdout.write('-- dump\\n' * 200000)"]
+
+    path = await store.save_command_output("db", cmd)
+    assert path.name.endswith(".sql.gz") and path.stat().st_size < 100_000
+    with gzip.open(path, "rt") as f:
+        assert f.read() == "-- dump\n" * 200000
+
+    clock.current += timedelta(days=1)
+    assert await store.save_command_output("db", cmd) is None
+
+    with pytest.raises(RuntimeError):
+        await store.save_command_output("db", [sys.executable, "-c", "import sys; sys.exit(3)"])
+    assert [p.name for p in tmp_path.iterdir()] == [path.name]
@@ -0,0 +1,145 @@
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from core.broadcast_outbox import BroadcastOutbox, text_hash
+from core.db import Base, BroadcastDelivery, BroadcastJob
+
+
+class AcksRedis:
+    """Минимальная in-memory замена Redis: тексты рассылки и список подтверждений."""
+
+    def __init__(self):
+        self.values = {}
+        self.lists = {}
+
+    async def set(self, key, value, **_):
+        self.values[key] = value
+
+    async def rpush(self, key, *values):
+        self.lists.setdefault(key, []).extend(values)
+
+    async def lpop(self, key, count=None):
+        items = self.lists.get(key, [])
+        popped, self.lists[key] = items[:count], items[count:]
+        return popped or None
+
+
+@pytest.fixture
+async def session_factory():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    try:
+        yield async_sessionmaker(engine, expire_on_commit=False)
+    finally:
+        await engine.dispose()
+
+
+class CrashingDispatch:
+    """Собирает доставки и «роняет» продюсер после заданного числа вызовов."""
+
+    def __init__(self, crash_after=None):
+        self.crash_after = crash_after
+        self.sent = []
+
+    def __call__(self, delivery):
+        if self.crash_after is not None and len(self.sent) >= self.crash_after:
+            raise RuntimeError("producer crashed")
+        self.sent.append(delivery)
+
+
+async def delivery_statuses(session_factory, job_id):
+    async with session_factory() as session:
+        rows = await session.execute(
+            select(BroadcastDelivery.user_id, BroadcastDelivery.status).where(BroadcastDelivery.job_id == job_id)
+        )
+        return dict(rows.all())
+
+
+@pytest.mark.asyncio
+async def test_pump_resumes_from_checkpoint_after_crash(session_factory):
+    outbox = BroadcastOutbox(session_factory, batch_size=3)
+    digest = text_hash("Привет")
+    job_id = await outbox.create_job("admin_text", [(uid, digest) for uid in range(1, 11)], texts={digest: "Привет"})
+
+    crashed = CrashingDispatch(crash_after=4)
+    with pytest.raises(RuntimeError):
+        await outbox.pump(job_id, crashed)
+
+    # Первая пачка зафиксирована чекпоинтом, незавершённая вторая будет поставлена повторно
+    statuses = await delivery_statuses(session_factory, job_id)
+    assert [uid for uid, status in sorted(statuses.items()) if status == "queued"] == [1, 2, 3]
+
+    # Пока аренда упавшего продюсера не истекла, задание никто не подхватывает
+    assert await outbox.resume_unfinished(CrashingDispatch()) == []
+
+    async with session_factory() as session:
+        await session.execute(update(BroadcastJob).values(heartbeat_at=None))
+        await session.commit()
+    resumed = CrashingDispatch()
+    assert await outbox.resume_unfinished(resumed) == [job_id]
+    assert [d.user_id for d in resumed.sent] == list(range(4, 11))
+    assert all(d.text == "Привет" and d.text_key is None for d in resumed.sent)
+
+    progress = await outbox.get_progress(job_id)
+    assert (progress.status, progress.queued, progress.total) == ("enqueued", 10, 10)
+
+
+@pytest.mark.asyncio
+async def test_acks_complete_job_and_report_progress(session_factory):
+    redis = AcksRedis()
+    outbox = BroadcastOutbox(session_factory, redis)
+    digest = text_hash("Текст")
+    job_id = await outbox.create_job("evening", [(1, digest), (2, digest), (2, digest), (3, digest)], texts={digest: "Текст"})
+
+    dispatch = CrashingDispatch()
+    assert await outbox.pump(job_id, dispatch) == 3
+    assert redis.values[f"broadcast:text:{digest}"] == "Текст"
+    assert {d.text_key for d in dispatch.sent} == {f"broadcast:text:{digest}"}
+    # Повторная постановка уже поставленного задания ничего не отправляет
+    assert await outbox.pump(job_id, dispatch) == 0
+
+    ids = {d.user_id: d.delivery_id for d in dispatch.sent}
+    await redis.rpush("broadcast:outbox:acks", f"{ids[1]}:1", f"{ids[2]}:0")
+    await outbox.tick(dispatch)
+    progress = await outbox.get_progress(job_id)
+    assert (progress.done, progress.failed, progress.queued) == (1, 1, 1)
+    assert progress.percent_delivered == 33.3
+    assert not progress.finished
+
+    await redis.rpush("broadcast:outbox:acks", f"{ids[3]}:1")
+    await outbox.tick(dispatch)
+    progress = (await outbox.list_recent_progress())[0]
+    assert progress.status == "done" and progress.percent_delivered == 66.7
+
+
+@pytest.mark.asyncio
+async def test_expired_job_is_not_resumed(session_factory):
+    outbox = BroadcastOutbox(session_factory)
+    job_id = await outbox.create_job("morning", [(1, None)], message_id=5, from_chat_id=7, expires_in=timedelta(hours=-1))
+
+    dispatch = CrashingDispatch()
+    assert await outbox.tick(dispatch) == []
+    assert dispatch.sent == []
+    assert (await outbox.get_progress(job_id)).status == "expired"
+    assert await outbox.create_job("morning", []) is None
+
+
+@pytest.mark.asyncio
+async def test_pump_merges_deliveries_with_same_payload_into_chunks(session_factory):
+    outbox = BroadcastOutbox(session_factory, AcksRedis(), batch_size=4, chunk_size=3)
+    hello, bye = text_hash("Привет"), text_hash("Пока")
+    recipients = [(1, hello), (2, hello), (3, hello), (4, hello), (5, bye), (6, bye), (7, hello)]
+    job_id = await outbox.create_job("evening", recipients, texts={hello: "Привет", bye: "Пока"})
+
+    dispatch = CrashingDispatch()
+    assert await outbox.pump(job_id, dispatch) == 7
+
+    # Пачки не пересекают границы выборки из БД (batch_size) и смену текста; одиночная доставка остаётся одиночной
+    chunks = [[user_id for _, user_id in d.recipients] or [d.user_id] for d in dispatch.sent]
+    assert chunks == [[1, 2, 3], [4], [5, 6], [7]]
+    assert dispatch.sent[0].delivery_id == dispatch.sent[0].recipients[0][0]
+    assert dispatch.sent[2].text_key == f"broadcast:text:{bye}"
@@ -0,0 +1,109 @@
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from core.broadcast_outbox import BroadcastOutbox, text_hash
+from core.broadcast_pacing import RESERVE_SCRIPT, BroadcastPacer
+from core.db import Base
+
+NOW = 1_760_000_000.0
+
+
+class PacingRedis:
+    """Минимальная in-memory замена Redis: ключ горизонта, хеш планов и скрипт резервации (без повторной резервации)."""
+
+    def __init__(self):
+        self.values = {}
+        self.hashes = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def set(self, key, value, **_):
+        self.values[key] = value
+
+    async def eval(self, script, numkeys, key, plans_key, now, duration, grace, job_id):
+        assert script == RESERVE_SCRIPT
+        start = max(float(now), float(self.values.get(key, 0)))
+        self.values[key] = str(start + duration)
+        return str(start).encode()
+
+    async def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update(mapping)
+
+    async def hmget(self, key, fields):
+        return [self.hashes.get(key, {}).get(field) for field in fields]
+
+    async def expire(self, key, seconds):
+        return True
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    monkeypatch.setattr("core.broadcast_pacing.time.time", lambda: NOW)
+
+
+@pytest.fixture
+async def session_factory():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    try:
+        yield async_sessionmaker(engine, expire_on_commit=False)
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_broadcasts_share_global_slots(clock):
+    redis = PacingRedis()
+    pacer = BroadcastPacer(redis, rate=10)
+
+    first = await pacer.reserve(1, "evening", 25)
+    second = await pacer.reserve(2, "admin_text", 5)
+
+    # Вторая рассылка встаёт за первой: суммарный темп не превышает общий бюджет
+    assert first.start == NOW and first.finish == NOW + 3
+    assert second.start == first.finish and second.finish == NOW + 4
+    assert [first.delay_ms(index, NOW) for index in (0, 9, 10, 24)] == [0, 0, 1000, 2000]
+    assert (await pacer.horizon()).timestamp() == NOW + 4
+
+    plans = await pacer.get_plans([1, 2, 3])
+    assert set(plans) == {1, 2} and plans[2].eta == second.eta
+
+
+@pytest.mark.asyncio
+async def test_re_reserving_a_job_reuses_its_slots(clock):
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")  # Lua-скрипты в fakeredis
+    redis = fakeredis.FakeAsyncRedis()
+    pacer = BroadcastPacer(redis, rate=10, key_prefix="test:pacing:")
+    try:
+        first = await pacer.reserve(1, "evening", 50)
+        second = await pacer.reserve(2, "admin_text", 10)
+        assert (first.finish, second.finish) == (NOW + 5, NOW + 6)
+
+        # Продюсер первой рассылки перезапустился: оставшиеся доставки встают в её окно, горизонт не растёт
+        resumed = await pacer.reserve(1, "evening", 30)
+        assert resumed.start == NOW and resumed.finish == NOW + 3
+        assert (await pacer.horizon()).timestamp() == NOW + 6
+
+        # Последнее задание, не помещающееся в своё окно, продлевает его, а не встаёт в конец очереди
+        extended = await pacer.reserve(2, "admin_text", 20)
+        assert extended.start == NOW + 5 and (await pacer.horizon()).timestamp() == NOW + 7
+    finally:
+        await redis.aclose()
+
+
+@pytest.mark.asyncio
+async def test_pump_schedules_deliveries_into_slots_and_reports_eta(clock, session_factory):
+    redis = PacingRedis()
+    outbox = BroadcastOutbox(session_factory, redis, batch_size=4, pacer=BroadcastPacer(redis, rate=3))
+    digest = text_hash("Привет")
+    job_id = await outbox.create_job("admin_text", [(uid, digest) for uid in range(1, 8)], texts={digest: "Привет"})
+
+    sent = []
+    assert await outbox.pump(job_id, sent.append) == 7
+    assert [delivery.delay_ms for delivery in sent] == [0, 0, 0, 1000, 1000, 1000, 2000]
+
+    [progress] = await outbox.list_recent_progress()
+    assert progress.eta.timestamp() == NOW + 3
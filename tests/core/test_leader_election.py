@@ -0,0 +1,128 @@
+import pytest
+
+from core.leader_election import RELEASE_SCRIPT, RENEW_SCRIPT, LeaderElector, leader_only
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class LeaseRedis:
+    """Минимальная in-memory замена Redis: GET, SET NX PX и Lua-скрипты аренды."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.values = {}
+        self.expires = {}
+        self.down = False
+
+    def _alive(self, key):
+        if self.down:
+            raise ConnectionError("redis is down")
+        if key in self.expires and self.expires[key] <= self.clock():
+            self.values.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.values
+
+    async def get(self, key):
+        return self.values[key] if self._alive(key) else None
+
+    async def set(self, key, value, nx=False, px=None):
+        if nx and self._alive(key):
+            return None
+        self.values[key] = value
+        if px is not None:
+            self.expires[key] = self.clock() + px / 1000
+        return True
+
+    async def eval(self, script, numkeys, key, value, *args):
+        if not self._alive(key) or self.values[key] != value:
+            return 0
+        if script == RENEW_SCRIPT:
+            self.expires[key] = self.clock() + int(args[0]) / 1000
+            return 1
+        assert script == RELEASE_SCRIPT
+        del self.values[key]
+        self.expires.pop(key, None)
+        return 1
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr("core.leader_election.time.monotonic", clock)
+    return clock
+
+
+@pytest.mark.asyncio
+async def test_single_leader_and_failover(clock):
+    redis = LeaseRedis(clock)
+    events = []
+    first = LeaderElector(redis, ttl=15, identity="a", on_elected=lambda: events.append("a+"))
+    second = LeaderElector(redis, ttl=15, identity="b", on_elected=lambda: events.append("b+"))
+
+    assert await first.step() and first.is_leader
+    assert not await second.step() and not second.is_leader
+
+    # Лидер продлевает аренду — резерв не может её захватить даже спустя несколько TTL
+    for _ in range(5):
+        clock.now += 5
+        assert await first.step()
+        assert not await second.step()
+
+    # Лидер «завис»: аренда истекает, резерв забирает её
+    clock.now += 16
+    assert not first.is_leader
+    assert await second.step()
+    assert await second.current_leader() == "b"
+    assert events == ["a+", "b+"]
+
+    # Бывший лидер после паузы не проходит проверку перед задачей и снимает лидерство при продлении
+    assert not await first.validate()
+    assert not await first.step()
+    assert await second.validate()
+
+
+@pytest.mark.asyncio
+async def test_demotes_itself_when_redis_is_unreachable(clock):
+    redis = LeaseRedis(clock)
+    demoted = []
+    elector = LeaderElector(redis, ttl=15, identity="a", on_demoted=lambda: demoted.append(True))
+    assert await elector.step()
+
+    redis.down = True
+    clock.now += 5
+    # До локального дедлайна лидерство сохраняется, но задачи без подтверждения аренды не запускаются
+    assert await elector.step()
+    assert not await elector.validate()
+
+    clock.now += 11
+    assert not await elector.step()
+    assert demoted == [True]
+
+
+@pytest.mark.asyncio
+async def test_release_hands_over_immediately_and_skips_fenced_jobs(clock):
+    redis = LeaseRedis(clock)
+    first = LeaderElector(redis, ttl=15, identity="a")
+    second = LeaderElector(redis, ttl=15, identity="b")
+    calls = []
+
+    async def job(name):
+        calls.append(name)
+
+    assert await first.step()
+    await leader_only(first, job)("first")
+    await leader_only(second, job)("second")
+    assert calls == ["first"]
+
+    await first.release()
+    assert await redis.get("scheduler:leader") is None
+    assert await second.step()
+    await leader_only(first, job)("first")
+    await leader_only(second, job)("second")
+    assert calls == ["first", "second"]
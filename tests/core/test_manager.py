@@ -1,7 +1,7 @@
 import gzip
 import json
 import pickle
-from datetime import date
+from datetime import date, datetime, timedelta
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
@@ -269,6 +269,164 @@ def test_classrooms_fuzzy():
     assert "505" in res
 
 
+def make_subject_manager():
+    lesson = lambda subject, start, room="101": {  # noqa: E731
+        "subject": subject,
+        "type": "лек",
+        "time": f"{start}-10:30",
+        "start_time_raw": start,
+        "room": room,
+        "teachers": "Иванов",
+    }
+    data = {
+        "__metadata__": {},
+        "О735Б": {
+            "odd": {"Понедельник": [lesson("Теоретическая механика", "09:00")]},
+            "even": {"Понедельник": [lesson("Теоретическая механика", "09:00")]},
+        },
+        "О735А": {
+            "odd": {"Среда": [lesson("Теоретическая механика", "10:40")]},
+            "even": {"Среда": [lesson("Механика жидкости и газа", "10:40")]},
+        },
+        "Е411": {
+            "odd": {"Вторник": [lesson("Физика", "09:00")]},
+            "even": {},
+        },
+    }
+    return TimetableManager(data, DummyRedis())
+
+
+def test_search_subjects_intersects_postings():
+    m = make_subject_manager()
+    results = m.search_subjects("теоретическая механика")
+    assert [r["subject"] for r in results] == ["Теоретическая механика"]
+    occurrences = results[0]["occurrences"]
+    assert {(o["group"], o["week_code"], o["day"]) for o in occurrences} == {
+        ("О735Б", "0", "Понедельник"),
+        ("О735А", "1", "Среда"),
+    }
+
+
+def test_search_subjects_prefix_and_ranking():
+    m = make_subject_manager()
+    results = m.search_subjects("мех")
+    assert {r["subject"] for r in results} == {"Теоретическая механика", "Механика жидкости и газа"}
+    # Более короткое название покрывается запросом полнее и стоит выше
+    assert results[0]["subject"] == "Теоретическая механика"
+    assert results[1]["occurrences"][0]["week_code"] == "2"
+
+
+def test_search_subjects_prefix_applies_to_every_token():
+    m = make_subject_manager()
+    # Сокращения: каждый токен запроса — префикс токена названия
+    for query in ("теор мех", "теоретическая мех", "теор механика"):
+        assert [r["subject"] for r in m.search_subjects(query)] == ["Теоретическая механика"]
+    assert m.search_subjects("теор химия") == []
+
+
+def test_search_subjects_no_match_and_short_query():
+    m = make_subject_manager()
+    assert m.search_subjects("химия") == []
+    assert m.search_subjects("те") == []
+    assert m.search_subjects("физика механика") == []
+
+
+@pytest.mark.asyncio
+async def test_materialized_calendar_matches_academic_week_type():
+    m = make_subject_manager()
+    day = date(2024, 8, 1)
+    while day < date(2025, 10, 1):
+        assert await m._get_week_info(day) == await m.get_academic_week_type(day)
+        day += timedelta(days=3)
+
+
+@pytest.mark.asyncio
+async def test_lessons_on_date_follow_materialized_week_parity():
+    m = make_subject_manager()
+    # 2024-09-02 — понедельник; О735Б занимается по понедельникам каждую неделю
+    assert [l["subject"] for l in await m._lessons_on_date("group", "о735б", date(2024, 9, 2))] == ["Теоретическая механика"]
+    assert len(await m._lessons_on_date("group", "О735Б", date(2024, 9, 9))) == 1
+    # О735А по средам: теормех на нечётной неделе, механика жидкости — на чётной
+    odd = await m._lessons_on_date("group", "О735А", date(2024, 9, 4))
+    even = await m._lessons_on_date("group", "О735А", date(2024, 9, 11))
+    assert [l["subject"] for l in odd] == ["Теоретическая механика"]
+    assert [l["subject"] for l in even] == ["Механика жидкости и газа"]
+
+
+@pytest.mark.asyncio
+async def test_get_occurrences_range_and_next_occurrence():
+    m = make_subject_manager()
+    # 2024-09-02 — понедельник; О735Б занимается по понедельникам каждую неделю
+    occurrences = await m.get_occurrences("group", "о735б", date(2024, 9, 2), date(2024, 9, 15))
+    assert [o["date"] for o in occurrences] == [date(2024, 9, 2), date(2024, 9, 9)]
+    assert occurrences[0]["start"] == datetime(2024, 9, 2, 9, 0)
+    # Диапазон через границу семестров собирается из обоих материализованных отрезков
+    across = await m.get_occurrences("group", "О735Б", date(2025, 1, 27), date(2025, 2, 16))
+    assert [o["date"] for o in across] == [date(2025, 1, 27), date(2025, 2, 3), date(2025, 2, 10)]
+
+    # О735А: теормех только по нечётным средам
+    first = await m.get_next_occurrence("group", "О735А", "теоретическая", after=datetime(2024, 9, 2, 12, 0))
+    week_type, _ = await m.get_academic_week_type(first["date"])
+    assert first["date"].weekday() == 2 and week_type == "odd"
+    second = await m.get_next_occurrence("group", "О735А", "теоретическая", after=first["start"])
+    assert (second["date"] - first["date"]).days == 14
+
+    assert await m.get_next_occurrence("group", "О735А", "химия", after=datetime(2024, 9, 2)) is None
+
+
+class VersionRedis(DummyRedis):
+    def __init__(self):
+        self.values = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def incr(self, key):
+        self.values[key] = int(self.values.get(key, 0)) + 1
+        return self.values[key]
+
+
+@pytest.mark.asyncio
+async def test_calendar_change_published_through_redis(monkeypatch):
+    monkeypatch.setattr("core.manager._CALENDAR_VERSION_CHECK_INTERVAL", 0)
+    redis = VersionRedis()
+    admin, worker = make_subject_manager(), make_subject_manager()
+    admin.redis = worker.redis = redis
+    await worker._get_week_info(date(2024, 9, 4))
+    assert worker._calendar
+
+    # Админ сменил даты семестров в своём процессе — воркер сбрасывает календарь при следующем обращении
+    await admin.publish_calendar_change()
+    worker._calendar[date(2030, 1, 1)] = (date(2030, 1, 1), ("odd", "stale"))
+    await worker._get_week_info(date(2024, 9, 4))
+    assert date(2030, 1, 1) not in worker._calendar
+    # Без новых изменений календарь не сбрасывается
+    await worker._get_week_info(date(2024, 9, 5))
+    assert date(2024, 9, 4) in worker._calendar
+
+
+@pytest.mark.asyncio
+async def test_get_lesson_status_uses_cached_timeline():
+    lesson = {"subject": "Физика", "start_time_raw": "09:00", "end_time_raw": "10:30", "time": "09:00-10:30"}
+    broken = {"subject": "Битая", "start_time_raw": "??", "end_time_raw": "10:30", "time": "?"}
+    data = {"__metadata__": {}, "О735Б": {"odd": {"Понедельник": [lesson, broken]}, "even": {"Понедельник": [lesson]}}}
+    m = TimetableManager(data, DummyRedis())
+
+    # 2024-09-02 — понедельник
+    status = await m.get_lesson_status("о735б", at=datetime(2024, 9, 2, 9, 30))
+    assert status.state == "lesson"
+    assert status.current["subject"] == "Физика"
+    assert status.minutes_remaining == 60
+    assert status.total == 1
+
+    timeline = await m.get_day_timeline("О735Б", date(2024, 9, 2))
+    assert timeline is await m.get_day_timeline("о735б", date(2024, 9, 2))
+    assert (await m.get_lesson_status("О735Б", at=datetime(2024, 9, 3, 9, 30))).state == "no_lessons"
+
+    m.invalidate_calendar()
+    assert await m.get_day_timeline("О735Б", date(2024, 9, 2)) is not timeline
+
+
 @pytest.mark.asyncio
 async def test_teacher_and_classroom_schedule_paths():
     data = {
@@ -309,6 +467,62 @@ async def test_teacher_and_classroom_schedule_paths():
 # --- Тесты для оффлайн режима (fallback) ---
 
 
+def make_lock_redis(cached=None, acquired=True):
+    redis = AsyncMock()
+    redis.get.return_value = cached
+    lock = MagicMock()
+    lock.acquire = AsyncMock(return_value=acquired)
+    lock.release = AsyncMock()
+    redis.lock = MagicMock(return_value=lock)
+    return redis, lock
+
+
+@pytest.mark.asyncio
+async def test_create_serves_stale_backup_and_refreshes_in_background(mocker, sample_schedules):
+    redis, lock = make_lock_redis()
+    stale = {"__metadata__": {}, "О735А": {"odd": {}, "even": {}}}
+    mocker.patch.object(TimetableManager, "_restore_from_backup", AsyncMock(return_value=stale))
+    mocker.patch("core.parser.save_fallback_schedule")
+    fetch = mocker.patch("core.parser.fetch_and_parse_all_schedules", new_callable=AsyncMock)
+    fetch.return_value = sample_schedules
+
+    manager = await TimetableManager.create(redis)
+
+    # Ответ отдан сразу из резервной копии, сервер вуза ещё не опрашивался
+    assert manager.is_stale
+    assert "О735А" in manager._schedules
+    fetch.assert_not_called()
+
+    await manager._refresh_task
+    assert not manager.is_stale
+    assert "O735Б" in manager._schedules
+    fetch.assert_awaited_once()
+    lock.acquire.assert_awaited_once_with(blocking=False)
+    lock.release.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_refresh_skips_when_other_process_holds_lock(mocker):
+    redis, lock = make_lock_redis(acquired=False)
+    fetch = mocker.patch("core.parser.fetch_and_parse_all_schedules", new_callable=AsyncMock)
+
+    assert await TimetableManager._refresh_snapshot(redis) is None
+    fetch.assert_not_called()
+    lock.release.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_refresh_uses_cache_published_by_other_process(mocker, sample_schedules):
+    redis, _ = make_lock_redis(cached=json.dumps(sample_schedules).encode("utf-8"))
+    mocker.patch("core.parser.save_fallback_schedule")
+    fetch = mocker.patch("core.parser.fetch_and_parse_all_schedules", new_callable=AsyncMock)
+
+    manager = await TimetableManager._refresh_snapshot(redis, blocking=True)
+
+    assert "O735Б" in manager._schedules
+    fetch.assert_not_called()
+
+
 @pytest.mark.asyncio
 async def test_timetable_manager_create_with_fallback_data(monkeypatch):
     """Тест создания TimetableManager с fallback данными."""
@@ -0,0 +1,66 @@
+import pytest
+
+from core.schedule_fingerprints import ScheduleFingerprintStore, changed_slots, compute_fingerprints, day_fingerprint
+
+LESSON = {"time": "09:00-10:30", "subject": "Физика", "type": "лек", "room": "101", "teachers": "Петров"}
+OTHER = {"time": "10:50-12:20", "subject": "Химия", "type": "пр", "room": "202", "teachers": "Сидоров"}
+
+
+class HashRedis:
+    def __init__(self):
+        self.hashes = {}
+        self.writes = 0
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    async def hset(self, key, mapping):
+        self.writes += 1
+        self.hashes.setdefault(key, {}).update(mapping)
+
+    async def hdel(self, key, *fields):
+        for field in fields:
+            self.hashes.get(key, {}).pop(field, None)
+
+
+def snapshot(**groups):
+    return {"__current_xml_hash__": "x", **groups}
+
+
+def test_day_fingerprint_ignores_lesson_order_and_service_fields():
+    assert day_fingerprint([LESSON, OTHER]) == day_fingerprint([OTHER, {**LESSON, "start_time_raw": "09:00"}])
+    assert day_fingerprint([LESSON]) != day_fingerprint([{**LESSON, "room": "102"}])
+
+
+def test_changed_slots_only_for_changed_days_of_known_groups():
+    old = compute_fingerprints(
+        snapshot(
+            A={"odd": {"Понедельник": [LESSON], "Вторник": [OTHER]}, "even": {}},
+            B={"odd": {"Понедельник": [LESSON]}, "even": {}},
+        )
+    )
+    new = compute_fingerprints(
+        snapshot(
+            A={"odd": {"Понедельник": [{**LESSON, "room": "303"}], "Вторник": [OTHER]}, "even": {"Среда": [OTHER]}},
+            B={"odd": {"Понедельник": [LESSON]}, "even": {}},
+            NEW={"odd": {"Понедельник": [LESSON]}, "even": {}},
+        )
+    )
+    assert "__current_xml_hash__" not in new
+    assert changed_slots(old, new) == {"A": [("even", "Среда"), ("odd", "Понедельник")]}
+
+
+@pytest.mark.asyncio
+async def test_store_returns_none_on_first_run_and_rewrites_only_changed_groups():
+    redis = HashRedis()
+    store = ScheduleFingerprintStore(redis, key="fp")
+    first = compute_fingerprints(snapshot(A={"odd": {"Понедельник": [LESSON]}}, B={"odd": {"Вторник": [OTHER]}}))
+    assert await store.update(first) is None
+
+    second = compute_fingerprints(snapshot(A={"odd": {"Понедельник": [OTHER]}}, B={"odd": {"Вторник": [OTHER]}}))
+    redis.writes = 0
+    assert await store.update(second) == {"A": [("odd", "Понедельник")]}
+    assert redis.writes == 1 and set(redis.hashes["fp"]) == {"A", "B"}
+
+    assert await store.update(second) == {}
+    assert await store.load() == second
@@ -0,0 +1,161 @@
+from datetime import datetime, timedelta
+from fnmatch import fnmatch
+
+import pytest
+
+from core.config import MOSCOW_TZ
+from core.schedule_diff import ChangeType
+from core.schedule_history import ScheduleHistoryStore, content_hash
+
+
+class InMemoryRedis:
+    """Минимальная in-memory замена Redis для команд, которые использует история."""
+
+    def __init__(self):
+        self.values = {}
+        self.sets = {}
+        self.zsets = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def set(self, key, value, **_):
+        self.values[key] = value
+
+    async def mget(self, keys):
+        return [self.values.get(key) for key in keys]
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+
+    async def scan_iter(self, match):
+        for key in list(self.values):
+            if fnmatch(key, match):
+                yield key
+
+    async def incr(self, key):
+        self.values[key] = int(self.values.get(key, 0)) + 1
+        return self.values[key]
+
+    async def sismember(self, key, member):
+        return member in self.sets.get(key, set())
+
+    async def sadd(self, key, *members):
+        self.sets.setdefault(key, set()).update(members)
+
+    async def srem(self, key, *members):
+        self.sets.get(key, set()).difference_update(members)
+
+    async def smembers(self, key):
+        return {m.encode() for m in self.sets.get(key, set())}
+
+    async def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    async def zcard(self, key):
+        return len(self.zsets.get(key, {}))
+
+    async def zrange(self, key, start, end):
+        members = sorted(self.zsets.get(key, {}).items(), key=lambda item: item[1])
+        end = len(members) if end == -1 else end + 1
+        return [m.encode() for m, _ in members[start:end]]
+
+    async def zrem(self, key, *members):
+        for member in members:
+            self.zsets.get(key, {}).pop(member, None)
+
+
+def lesson(subject, room="101"):
+    return {"time": "09:00-10:30", "subject": subject, "type": "лек", "room": room, "teachers": "Иванов"}
+
+
+def schedule(room="101", extra_group=True):
+    data = {
+        "__metadata__": {"period": {"StartYear": "2024"}},
+        "О735Б": {"odd": {"Понедельник": [lesson("Физика", room)]}, "even": {}},
+    }
+    if extra_group:
+        data["Е411"] = {"odd": {}, "even": {"Вторник": [lesson("Химия")]}}
+    return data
+
+
+T0 = datetime(2025, 1, 10, 12, 0, tzinfo=MOSCOW_TZ)
+
+
+def test_content_hash_ignores_key_order():
+    assert content_hash({"a": 1, "b": [1, 2]}) == content_hash({"b": [1, 2], "a": 1})
+
+
+@pytest.mark.asyncio
+async def test_record_stores_only_changed_groups():
+    redis = InMemoryRedis()
+    store = ScheduleHistoryStore(redis)
+
+    assert await store.record(schedule(), at=T0) == 1
+    assert await store.record(schedule(), at=T0 + timedelta(hours=6)) is None
+    assert await store.record(schedule(room="202"), at=T0 + timedelta(hours=12)) == 2
+
+    # 3 ключа в базе + 1 новая версия группы О735Б
+    assert len(redis.sets["timetable:history:blobs"]) == 4
+    assert [v for v, _ in await store.list_versions()] == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_reconstruct_point_in_time_and_removed_groups():
+    store = ScheduleHistoryStore(InMemoryRedis())
+    await store.record(schedule(), at=T0)
+    await store.record(schedule(room="202", extra_group=False), at=T0 + timedelta(days=1))
+
+    assert await store.reconstruct() == schedule(room="202", extra_group=False)
+    assert await store.reconstruct(at=T0 + timedelta(hours=1)) == schedule()
+    assert await store.reconstruct(at=T0 - timedelta(days=1)) is None
+
+
+@pytest.mark.asyncio
+async def test_group_changes_since():
+    store = ScheduleHistoryStore(InMemoryRedis())
+    await store.record(schedule(), at=T0)
+    await store.record(schedule(room="202"), at=T0 + timedelta(days=2))
+
+    diff = await store.get_group_changes("о735б", since=T0 + timedelta(days=1))
+    assert diff.has_changes()
+    assert diff.changed_at == [T0 + timedelta(days=2)]
+    ((week_code, day, changes),) = diff.days
+    assert (week_code, day) == ("odd", "Понедельник")
+    assert changes[0].change_type == ChangeType.ROOM_CHANGED
+    assert (changes[0].old_value, changes[0].new_value) == ("101", "202")
+
+    unchanged = await store.get_group_changes("Е411", since=T0 + timedelta(days=1))
+    assert not unchanged.has_changes() and unchanged.changed_at == []
+    assert not (await store.get_group_changes("О735Б", since=T0 + timedelta(days=3))).has_changes()
+
+
+@pytest.mark.asyncio
+async def test_retention_folds_deltas_into_base_and_collects_blobs():
+    redis = InMemoryRedis()
+    store = ScheduleHistoryStore(redis, max_versions=2)
+    for i, room in enumerate(["101", "202", "303", "404"]):
+        await store.record(schedule(room=room), at=T0 + timedelta(days=i))
+
+    versions = await store.list_versions()
+    assert [v for v, _ in versions] == [3, 4]
+    assert await store.reconstruct(at=T0 + timedelta(days=2)) == schedule(room="303")
+    assert await store.reconstruct(at=T0 + timedelta(days=1)) is None
+    assert await store.reconstruct() == schedule(room="404")
+    # Блобы старых вариантов О735Б удалены: метаданные, Е411 и две версии О735Б
+    assert len(redis.sets["timetable:history:blobs"]) == 4
+    assert sum(key.startswith("timetable:history:blob:") for key in redis.values) == 4
+
+
+@pytest.mark.asyncio
+async def test_drop_legacy_backups_keeps_history():
+    redis = InMemoryRedis()
+    store = ScheduleHistoryStore(redis)
+    await store.record(schedule(), at=T0)
+    redis.values["timetable:backup:20250101_120000"] = b"{}"
+    redis.values["timetable:backup:20250102_120000"] = b"{}"
+
+    assert await store.drop_legacy_backups() == 2
+    assert not any(key.startswith("timetable:backup:") for key in redis.values)
+    assert await store.reconstruct() == schedule()
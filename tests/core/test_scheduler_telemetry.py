@@ -0,0 +1,86 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from apscheduler.events import (
+    EVENT_JOB_EXECUTED,
+    EVENT_JOB_MAX_INSTANCES,
+    EVENT_JOB_MISSED,
+    EVENT_JOB_SUBMITTED,
+    JobExecutionEvent,
+    JobSubmissionEvent,
+)
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from prometheus_client import REGISTRY
+
+from core.scheduler_telemetry import SchedulerTelemetry
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_dynamic_ids_collapse_and_overlaps_and_misfires_are_counted():
+    telemetry = SchedulerTelemetry()
+    assert telemetry.label("reminder_slot_2026-10-18_08:00") == "reminder_slot"
+    assert telemetry.label("collect_db_metrics") == "collect_db_metrics"
+
+    run_time = datetime.now(timezone.utc) - timedelta(seconds=30)
+    overlaps = sample("bot_scheduler_job_overlaps_total", job_id="telemetry_slow")
+    misfires = sample("bot_scheduler_job_misfires_total", job_id="telemetry_slow")
+    late = sample("bot_scheduler_job_lateness_seconds_count", job_id="telemetry_slow")
+
+    telemetry(JobSubmissionEvent(EVENT_JOB_SUBMITTED, "telemetry_slow", "default", [run_time]))
+    telemetry(JobSubmissionEvent(EVENT_JOB_MAX_INSTANCES, "telemetry_slow", "default", [run_time]))
+    telemetry(JobExecutionEvent(EVENT_JOB_MISSED, "telemetry_slow", "default", run_time))
+    telemetry(JobExecutionEvent(EVENT_JOB_EXECUTED, "telemetry_slow", "default", run_time + timedelta(days=1)))
+
+    assert sample("bot_scheduler_job_overlaps_total", job_id="telemetry_slow") == overlaps + 1
+    assert sample("bot_scheduler_job_misfires_total", job_id="telemetry_slow") == misfires + 1
+    assert sample("bot_scheduler_job_lateness_seconds_count", job_id="telemetry_slow") == late + 1
+    assert sample("bot_scheduler_job_lateness_seconds_sum", job_id="telemetry_slow") >= 30
+    # Запуск, отброшенный как misfire, не оставляет незакрытых замеров
+    assert telemetry._started == {}
+
+
+def test_runs_missed_while_standby_are_not_misfires():
+    telemetry = SchedulerTelemetry()
+    before = sample("bot_scheduler_job_misfires_total", job_id="telemetry_failover")
+    standby_run = datetime.now(timezone.utc) - timedelta(hours=1)
+
+    # Новый лидер возобновляет планировщик: запуск, пришедшийся на резерв, отбрасывается без учёта
+    telemetry.mark_active()
+    telemetry(JobExecutionEvent(EVENT_JOB_MISSED, "telemetry_failover", "default", standby_run))
+    assert sample("bot_scheduler_job_misfires_total", job_id="telemetry_failover") == before
+
+    telemetry(JobExecutionEvent(EVENT_JOB_MISSED, "telemetry_failover", "default", datetime.now(timezone.utc)))
+    assert sample("bot_scheduler_job_misfires_total", job_id="telemetry_failover") == before + 1
+
+
+@pytest.mark.asyncio
+async def test_listener_records_duration_status_and_last_success():
+    scheduler = AsyncIOScheduler(timezone="UTC")
+    SchedulerTelemetry().install(scheduler)
+    finished = asyncio.Event()
+
+    async def ok_job():
+        await asyncio.sleep(0.05)
+
+    async def failing_job():
+        finished.set()
+        raise RuntimeError("boom")
+
+    scheduler.add_job(ok_job, "date", id="telemetry_ok")
+    scheduler.add_job(failing_job, "date", run_date=datetime.now(timezone.utc) + timedelta(seconds=0.2), id="telemetry_fail")
+    scheduler.start()
+    try:
+        await asyncio.wait_for(finished.wait(), timeout=5)
+        await asyncio.sleep(0.1)
+    finally:
+        scheduler.shutdown(wait=False)
+
+    assert sample("bot_scheduler_job_runs_total", job_id="telemetry_ok", status="success") == 1
+    assert sample("bot_scheduler_job_duration_seconds_sum", job_id="telemetry_ok") >= 0.05
+    assert sample("bot_scheduler_job_last_success_timestamp_seconds", job_id="telemetry_ok") > 0
+    assert sample("bot_scheduler_job_runs_total", job_id="telemetry_fail", status="error") == 1
+    assert sample("bot_scheduler_job_last_success_timestamp_seconds", job_id="telemetry_fail") == 0
@@ -0,0 +1,119 @@
+import time
+
+import pytest
+from prometheus_client import REGISTRY
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from core.send_rate_limiter import SendRateLimiter
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")  # Lua-скрипты в fakeredis
+
+
+@pytest.fixture
+async def redis():
+    client = fakeredis.FakeAsyncRedis()
+    try:
+        yield client
+    finally:
+        await client.aclose()
+
+
+def limiter(redis, **kwargs):
+    return SendRateLimiter(lambda: redis, key_prefix="test:{tg}:", **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_global_budget_spaces_sends_across_chats(redis):
+    send = limiter(redis, rate=10)
+    waits = [(await send.reserve(chat_id))[1] for chat_id in (1, 2, 3)]
+    # 10 в секунду: слоты через 100 мс, независимо от получателя
+    assert waits[0] == 0
+    assert 0.08 <= waits[1] <= 0.1 and 0.18 <= waits[2] <= 0.2
+
+
+@pytest.mark.asyncio
+async def test_per_chat_limit_applies_on_top_of_global_budget(redis):
+    send = limiter(redis, rate=1000)
+    assert await send.reserve(42) == (True, 0)
+    reserved, wait = await send.reserve(42)
+    assert reserved and 0.95 <= wait <= 1.0
+    # Другой чат не ждёт лимит чата 42
+    reserved, wait = await send.reserve(43)
+    assert reserved and wait <= 0.01
+
+    # Группа: до трёх сообщений подряд, дальше — 20 в минуту
+    group_waits = [(await send.reserve(-100))[1] for _ in range(4)]
+    assert max(group_waits[:3]) <= 0.01 and 2.9 <= group_waits[3] <= 3.0
+
+
+@pytest.mark.asyncio
+async def test_reservation_beyond_max_wait_is_refused_without_side_effects(redis):
+    send = limiter(redis, rate=10, max_wait=0.15)
+    assert (await send.reserve(1))[0] and (await send.reserve(2))[0]
+    refused = await send.reserve(3)
+    assert refused[0] is False and refused[1] > 0.15
+    # Отказ не занял слот: следующий получатель видит то же ожидание
+    assert (await send.reserve(4))[1] == pytest.approx(refused[1], abs=0.02)
+
+
+@pytest.mark.asyncio
+async def test_acquire_sleeps_until_reserved_slot(redis):
+    send = limiter(redis, rate=20)
+    started = time.perf_counter()
+    for chat_id in range(3):
+        async with send.chat(chat_id):
+            pass
+    assert 0.08 <= time.perf_counter() - started < 0.5
+
+
+@pytest.mark.asyncio
+async def test_falls_back_to_local_limit_when_redis_is_down():
+    class DownRedis:
+        async def eval(self, *args):
+            raise RedisConnectionError("connection refused")
+
+    before = REGISTRY.get_sample_value("bot_telegram_send_limiter_fallbacks_total") or 0
+    send = SendRateLimiter(DownRedis, rate=5)
+    assert await send.acquire(1) == 0
+    assert REGISTRY.get_sample_value("bot_telegram_send_limiter_fallbacks_total") == before + 1
+
+
+@pytest.mark.asyncio
+async def test_retry_after_pauses_every_sender_until_window_ends(redis):
+    # Два лимитера — как два процесса воркера с общим Redis
+    first, second = limiter(redis, rate=10), limiter(redis, rate=10)
+    before = REGISTRY.get_sample_value("bot_telegram_send_pauses_total") or 0
+
+    class TooManyRequests(Exception):
+        retry_after = 2
+
+    with pytest.raises(TooManyRequests):
+        async with first.chat(1):
+            raise TooManyRequests()
+
+    assert REGISTRY.get_sample_value("bot_telegram_send_pauses_total") == before + 1
+    paused_until = REGISTRY.get_sample_value("bot_telegram_send_paused_until_timestamp_seconds")
+    assert paused_until == pytest.approx(time.time() + 2, abs=0.5)
+
+    # Другой процесс ждёт конца паузы, следующие слоты после неё снова идут с общим темпом
+    reserved, wait = await second.reserve(2)
+    assert reserved and 1.9 <= wait <= 2.0
+    reserved, wait = await second.reserve(3)
+    assert reserved and 1.99 <= wait <= 2.1
+
+    # Более короткий 429 не сокращает действующую паузу
+    assert await second.pause(1) is False
+
+
+@pytest.mark.asyncio
+async def test_pause_is_kept_locally_when_redis_is_down():
+    class DownRedis:
+        async def eval(self, *args):
+            raise RedisConnectionError("connection refused")
+
+    send = SendRateLimiter(DownRedis, rate=100)
+    await send.pause(0.1)
+    started = time.perf_counter()
+    await send.acquire(1)
+    assert time.perf_counter() - started >= 0.09
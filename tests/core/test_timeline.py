@@ -0,0 +1,56 @@
+import pytest
+
+from core.timeline import DayTimeline, parse_hhmm
+
+
+def make_timeline():
+    return DayTimeline.from_lessons(
+        [
+            {"subject": "Физика", "start_time_raw": "10:50", "end_time_raw": "12:20"},
+            {"subject": "Математика", "start_time_raw": "09:00", "end_time_raw": "10:30"},
+        ]
+    )
+
+
+def test_parse_hhmm():
+    assert parse_hhmm("09:05") == 545
+    with pytest.raises(ValueError):
+        parse_hhmm("25:00")
+    with pytest.raises(ValueError):
+        parse_hhmm("invalid")
+
+
+def test_from_lessons_sorts_by_start():
+    timeline = make_timeline()
+    assert [lesson["subject"] for lesson in timeline.lessons] == ["Математика", "Физика"]
+    assert timeline.starts == [540, 650]
+
+
+@pytest.mark.parametrize(
+    "minute, state, current, nxt, remaining, passed",
+    [
+        (480, "before", None, "Математика", 60, 0),
+        (540, "lesson", "Математика", "Физика", 90, 0),
+        (600.5, "lesson", "Математика", "Физика", 29, 0),
+        (640, "break", None, "Физика", 10, 1),
+        (700, "lesson", "Физика", None, 40, 1),
+        (800, "finished", None, None, None, 2),
+    ],
+)
+def test_status_at(minute, state, current, nxt, remaining, passed):
+    status = make_timeline().status_at(minute)
+    assert status.state == state
+    assert (status.current or {}).get("subject") == current
+    assert (status.next or {}).get("subject") == nxt
+    assert status.minutes_remaining == remaining
+    assert status.passed == passed
+    assert status.total == 2
+
+
+def test_empty_timeline():
+    assert DayTimeline.from_lessons([]).status_at(600).state == "no_lessons"
+
+
+def test_from_lessons_rejects_bad_time():
+    with pytest.raises(ValueError):
+        DayTimeline.from_lessons([{"start_time_raw": "xx", "end_time_raw": "10:30"}])
@@ -0,0 +1,80 @@
+import pytest
+
+from core.manager import TimetableManager
+from core.timetable_index import TimetableIndex, write_timetable_index
+
+
+def lesson(subject, start="09:00", end="10:30"):
+    return {
+        "time": f"{start}-{end}",
+        "start_time_raw": start,
+        "end_time_raw": end,
+        "subject": subject,
+        "type": "лек",
+        "room": "325",
+        "teachers": "Иванов И.И.",
+        "week_code": 1,
+        "is_online": False,
+        "weight": 1.5,
+        "note": None,
+    }
+
+
+SAMPLE = {
+    "__metadata__": {"period": {"StartYear": "2024", "StartMonth": "09", "StartDay": "01"}},
+    "__current_xml_hash__": "abc123",
+    "__teachers_index__": {"Иванов И.И.": [{**lesson("Физика"), "group": "О735Б"}]},
+    "__classrooms_index__": {"325": [{**lesson("Физика"), "group": "О735Б"}]},
+    "О735Б": {"odd": {"Понедельник": [lesson("Физика")]}, "even": {}},
+    "Е411": {"odd": {}, "even": {"Вторник": [lesson("Химия", "10:50", "12:20")]}},
+    "А101": {"odd": {}, "even": {}},
+}
+
+
+def test_index_roundtrip_and_lookup(tmp_path):
+    path = write_timetable_index(SAMPLE, tmp_path / "timetable.idx")
+    with TimetableIndex(path) as index:
+        schedules = index.section("schedules")
+        assert len(schedules) == 3
+        assert list(schedules) == sorted(["О735Б", "Е411", "А101"])
+        assert "Е411" in schedules and "Е412" not in schedules
+        assert schedules["О735Б"] == SAMPLE["О735Б"]
+        assert schedules.get("Е412") is None
+        assert dict(index.section("teachers")) == SAMPLE["__teachers_index__"]
+        assert index.section("meta")["__metadata__"] == SAMPLE["__metadata__"]
+        assert index.xml_hash == "abc123"
+
+
+def test_index_rejects_foreign_file(tmp_path):
+    path = tmp_path / "broken.idx"
+    path.write_bytes(b"not an index at all, just some bytes" * 2)
+    with pytest.raises(ValueError):
+        TimetableIndex(path)
+
+
+@pytest.mark.asyncio
+async def test_manager_from_index_reads_lazily(tmp_path):
+    path = write_timetable_index(SAMPLE, tmp_path / "timetable.idx")
+    manager = TimetableManager.from_index(TimetableIndex(path), redis_client=None)
+
+    assert manager.get_current_xml_hash() == "abc123"
+    assert manager.find_teachers("иванов") == ["Иванов И.И."]
+    assert "О735Б" in manager._schedules
+    assert manager.search_subjects("физика")[0]["subject"] == "Физика"
+
+
+@pytest.mark.asyncio
+async def test_create_uses_fresh_index(isolated_timetable_index, mocker):
+    TimetableManager(SAMPLE, redis_client=None).write_index()
+    redis = mocker.AsyncMock()
+    redis.get.return_value = b"abc123"
+
+    manager = await TimetableManager.create(redis)
+
+    assert manager._index is not None
+    # Кэш целиком не читается и блокировка инициализации не берётся
+    redis.get.assert_awaited_once()
+    redis.lock.assert_not_called()
+
+    redis.get.return_value = b"other-hash"
+    assert await TimetableManager._open_from_index(redis) is None
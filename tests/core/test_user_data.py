@@ -1,7 +1,7 @@
 from unittest.mock import AsyncMock, MagicMock
 
 import pytest
-from sqlalchemy import text
+from sqlalchemy import text, update
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
 from core.db import Base, User
@@ -101,6 +101,23 @@ async def test_set_reminder_time_and_retrieve(manager_db: UserDataManager):
     assert (2, "G", 45) in reminders
 
 
+@pytest.mark.asyncio
+async def test_clear_groups_resets_students_of_vanished_groups_only(manager_db: UserDataManager):
+    for user_id, group in ((1, "OLD1"), (2, "OLD1"), (3, "OLD2"), (4, "CURRENT")):
+        await manager_db.register_user(user_id, f"u{user_id}")
+        await manager_db.set_user_group(user_id, group)
+    await manager_db.register_user(5, "teacher")
+    await manager_db.set_user_type(5, "teacher")
+    await manager_db.set_user_group(5, "OLD1")
+
+    assert sorted(await manager_db.get_student_groups()) == ["CURRENT", "OLD1", "OLD2"]
+    affected = await manager_db.clear_groups(["OLD1", "OLD2"])
+
+    assert sorted(affected) == [(1, "OLD1"), (2, "OLD1"), (3, "OLD2")]
+    assert [await manager_db.get_user_group(user_id) for user_id in (1, 3, 4, 5)] == [None, None, "CURRENT", "OLD1"]
+    assert await manager_db.clear_groups(["OLD1"]) == []
+
+
 @pytest.mark.asyncio
 async def test_counts_methods(manager_db: UserDataManager):
     await manager_db.register_user(10, "a")
@@ -136,6 +153,77 @@ async def test_users_for_evening_morning_and_lesson_reminders(
     assert rem == [(1, "G", 20), (2, "G", 20)]
 
 
+@pytest.mark.asyncio
+async def test_iter_broadcast_recipients_single_query(manager_db: UserDataManager):
+    await manager_db.register_user(1, "u1")
+    await manager_db.set_user_group(1, "G")
+    await manager_db.register_user(2, "u2")
+    await manager_db.set_user_group(2, "Иванов И.И.")
+    await manager_db.set_user_type(2, "teacher")
+    await manager_db.update_setting(2, "morning_summary", False)
+    await manager_db.register_user(3, "u3")  # без группы — не получатель
+
+    evening = [r async for r in manager_db.iter_broadcast_recipients("evening_notify", batch_size=1)]
+    morning = [r async for r in manager_db.iter_broadcast_recipients("morning_summary")]
+
+    assert sorted((r.user_id, r.group, r.user_type) for r in evening) == [
+        (1, "G", "student"),
+        (2, "ИВАНОВ И.И.", "teacher"),
+    ]
+    assert [(r.user_id, r.morning_summary, r.reminder_time_minutes) for r in morning] == [(1, True, 60)]
+    with pytest.raises(ValueError):
+        [r async for r in manager_db.iter_broadcast_recipients("theme")]
+
+
+@pytest.mark.asyncio
+async def test_iter_broadcast_recipients_by_digest_slot(manager_db: UserDataManager):
+    for user_id in (1, 2, 3):
+        await manager_db.register_user(user_id, f"u{user_id}")
+        await manager_db.set_user_group(user_id, "G")
+    assert await manager_db.set_digest_time(2, "evening_notify", "18:00")
+    assert not await manager_db.set_digest_time(3, "evening_notify", "03:00")
+    assert not await manager_db.set_digest_time(3, "lesson_reminders", "18:00")
+    # Слот, убранный из списка, достаётся слоту по умолчанию, а не теряется
+    async with manager_db.async_session_maker() as session:
+        await session.execute(update(User).where(User.user_id == 3).values(evening_time="23:30"))
+        await session.commit()
+
+    async def slot_users(setting, slot):
+        return sorted([r.user_id async for r in manager_db.iter_broadcast_recipients(setting, slot=slot)])
+
+    assert await slot_users("evening_notify", "18:00") == [2]
+    assert await slot_users("evening_notify", "20:00") == [1, 3]
+    assert await slot_users("evening_notify", "21:00") == []
+    assert await slot_users("morning_summary", "08:00") == [1, 2, 3]
+    assert (await manager_db.get_user_settings(2))["evening_time"] == "18:00"
+    with pytest.raises(ValueError):
+        await slot_users("lesson_reminders", "08:00")
+
+
+@pytest.mark.asyncio
+async def test_blocked_users_are_skipped_until_they_interact_again(manager_db: UserDataManager):
+    for user_id in (1, 2, 3):
+        await manager_db.register_user(user_id, f"u{user_id}")
+        await manager_db.set_user_group(user_id, "G")
+
+    assert await manager_db.mark_users_blocked([2, 3]) == 2
+    assert await manager_db.mark_users_blocked([2]) == 0  # уже отмечен
+
+    assert await manager_db.get_users_for_evening_notify() == [(1, "G")]
+    assert await manager_db.get_users_for_morning_summary() == [(1, "G")]
+    assert await manager_db.get_users_for_lesson_reminders() == [(1, "G", 20)]
+    assert [r.user_id async for r in manager_db.iter_broadcast_recipients("evening_notify")] == [1]
+    assert await manager_db.get_users_in_groups(["G"]) == [(1, "G")]
+    assert await manager_db.get_all_user_ids(exclude_blocked=True) == [1]
+    assert sorted(await manager_db.get_all_user_ids()) == [1, 2, 3]
+    assert await manager_db.get_blocked_subscribed_users_count() == 2
+
+    # Пользователь снова написал боту — снова получает рассылки
+    await manager_db.register_user(2, "u2")
+    assert sorted(await manager_db.get_all_user_ids(exclude_blocked=True)) == [1, 2]
+    assert await manager_db.get_blocked_subscribed_users_count() == 1
+
+
 class TestUserDataManagerWithSQLAlchemy:
     @pytest.mark.asyncio
     async def test_register_new_user(self, manager_with_db: UserDataManager):
@@ -1,9 +1,12 @@
+import asyncio
 from datetime import datetime, timezone
 from unittest.mock import AsyncMock, MagicMock
 
 import pytest
+from aiohttp.test_utils import TestServer
 
 from core.weather_api import WeatherAPI
+from scripts.fake_weather_api import FORECAST_PATH, STATS, create_app
 
 
 @pytest.fixture
@@ -140,3 +143,82 @@ async def test_weather_api_cache_hit(monkeypatch):
     }
     result = await api.get_forecast_for_time(target)
     assert result is not None
+
+
+class ForecastRedis:
+    """Минимальная in-memory замена Redis: GET/SET NX EX/DELETE."""
+
+    def __init__(self):
+        self.values = {}
+        self.ttls = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        self.ttls[key] = ex
+        return True
+
+    async def delete(self, key):
+        self.values.pop(key, None)
+
+
+@pytest.fixture
+async def weather_stub():
+    server = TestServer(create_app(delay=0.2))
+    await server.start_server()
+    try:
+        yield server
+    finally:
+        await server.close()
+
+
+def test_forecast_ttl_follows_forecast_updates():
+    # Прогноз пересчитывается в 09:00, 12:00 UTC... и публикуется с задержкой в 15 минут
+    assert WeatherAPI.forecast_ttl(datetime(2026, 10, 18, 9, 5, tzinfo=timezone.utc)) == 10 * 60
+    assert WeatherAPI.forecast_ttl(datetime(2026, 10, 18, 10, 20, tzinfo=timezone.utc)) == 115 * 60
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_upstream_request(weather_stub):
+    WeatherAPI._cache.clear()
+    redis = ForecastRedis()
+    url = str(weather_stub.make_url(FORECAST_PATH))
+    api = WeatherAPI("k", "1", redis_client=redis, base_url=url)
+
+    target = datetime.now(timezone.utc)
+    results = await asyncio.gather(*(api.get_forecast_for_time(target) for _ in range(5)))
+
+    assert all(result and result["emoji"] == "☁️" for result in results)
+    assert weather_stub.app[STATS]["requests"] == 1
+    assert 0 < redis.ttls[api.forecast_key] <= WeatherAPI.forecast_ttl()
+    assert f"{api.forecast_key}:lock" not in redis.values
+
+    # Другой процесс (пустой кэш процесса) берёт прогноз из Redis, не обращаясь к API
+    WeatherAPI._cache.clear()
+    other = WeatherAPI("k", "1", redis_client=redis, base_url=url)
+    assert await other.get_forecast_for_time(target) == results[0]
+    assert weather_stub.app[STATS]["requests"] == 1
+
+
+@pytest.mark.asyncio
+async def test_waits_for_forecast_fetched_by_another_process(weather_stub):
+    WeatherAPI._cache.clear()
+    redis = ForecastRedis()
+    url = str(weather_stub.make_url(FORECAST_PATH))
+    api = WeatherAPI("k", "1", redis_client=redis, base_url=url)
+    # Блокировку держит другой процесс, который сейчас запрашивает прогноз
+    await redis.set(f"{api.forecast_key}:lock", "1")
+    owner = WeatherAPI("k", "1", redis_client=redis, base_url=url)
+
+    async def other_process():
+        await asyncio.sleep(0.15)
+        assert await owner.prefetch()
+
+    result, _ = await asyncio.gather(api.get_forecast_for_time(datetime.now(timezone.utc)), other_process())
+
+    assert result is not None
+    assert weather_stub.app[STATS]["requests"] == 1